@@ -25,7 +25,7 @@ VOLUME_LIMIT_MULTIPLIER = 6.0
 # Адрес сервера скачивания тикеров
 DOWNLOAD_SERVER_IP: str = "192.168.0.201"
 # Порт сервера скачивания тикеров
-DOWNLOAD_SERVER_PORTL: int =  58001
+DOWNLOAD_SERVER_PORT: int =  58001
 
 # Адресс поднимаемого сервера сигналов
 ALERT_SERVER_IP: str = "192.168.0.202"
@@ -33,3 +33,34 @@ ALERT_SERVER_IP: str = "192.168.0.202"
 ALERT_SERVER_PORT: int = 58002
 
 
+# Сколько минут запрашивать у сервера скачивания одним запросом диапазона
+RANGE_REQUEST_MINUTES: int = 720
+# Сколько первых фрагментов сервер отправляет на запрос диапазона без списка фрагментов
+# (RANGE_FIRST_BURST_FRAGMENTS сервера скачивания), остальные запрашиваются явно
+RANGE_FIRST_BURST_FRAGMENTS: int = 4
+# Сколько недостающих фрагментов перезапрашивать за раз
+RANGE_FRAGMENTS_PER_REQUEST: int = 64
+# Пауза после последнего фрагмента, после которой недошедшие фрагменты считаются потерянными (сек)
+RANGE_FRAGMENT_GAP: float = 0.5
+# Сколько запросов диапазона держать в полёте одновременно при скачивании истории
+DOWNLOAD_WINDOW: int = 4
+# Начальный, минимальный и максимальный таймаут повтора запроса диапазона без ответа (RTO, сек)
+RTO_INITIAL: float = 1.0
+RTO_MIN: float = 0.2
+RTO_MAX: float = 8.0
+# Пауза перед повтором запроса, на который сервер ответил BUSY; удваивается до BUSY_RETRY_MAX (сек)
+BUSY_RETRY_DELAY: float = 0.5
+BUSY_RETRY_MAX: float = 10.0
+# Размер буфера приёма UDP клиента (байт)
+RANGE_RECEIVE_BUFFER: int = 4 * 1024 * 1024
+# Получать закрытые минуты рассылкой сервера скачивания (иначе – опрос раз в минуту)
+PUSH_SUBSCRIPTION_ENABLED: bool = True
+# Сколько ждать рассылку новой минуты, прежде чем выполнить тик с опросом сервера (сек)
+PUSH_WAIT_TIMEOUT: float = 90.0
+# Через сколько секунд после начала минуты (по времени сервера) запускать тик без подписки (сек)
+TICK_MINUTE_OFFSET: float = 2.0
+# Считать скользящие окна объёмов и цен накопительно (за тик учитывается только новая минута),
+# иначе – полным пересчётом хранилища функциями analytic_utils
+INCREMENTAL_ANALYTICS: bool = True
+# Реализация функций аналитики: "python" – циклы analytic_utils, "numpy" – векторные vector_analytics
+ANALYTICS_ENGINE: str = "numpy"
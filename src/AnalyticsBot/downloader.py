@@ -1,9 +1,9 @@
 import asyncio
-import time
 
 from typing import List
 from typing import Optional
 from collections import OrderedDict
+from collections import deque
 from datetime import datetime
 
 from AnalyticsBot.udp_client import UDPClient
@@ -11,19 +11,16 @@ from AnalyticsBot.bot_types import KlineRecord
 from AnalyticsBot.logger import logger
 from AnalyticsBot.config import *
 from AnalyticsBot.protocol_download import ServerResponseStatus
-from AnalyticsBot.protocol_download import SymbolsResponse
-from AnalyticsBot.protocol_download import TimeResponse
 
 
-def get_server_time_diff() -> Optional[int]:
+async def request_server_time_diff(client: UDPClient, server_addr: tuple = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT), timeout: float = 10.0) -> Optional[int]:
     """
-    Запрашивает время сервера и возвращает разницу (серверное время - локальное время клиента) в миллисекундах.
+    Разница (серверное время - локальное время клиента) в миллисекундах через клиент client.
     Если запрос не удался, возвращает None.
     """
-    server_addr = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT)
     client_timestamp_ms = int(datetime.now().timestamp() * 1000)
     try:
-        response = asyncio.run(_request_time_async(client_timestamp_ms, server_addr))
+        response = await client.request_time(client_timestamp_ms, server_addr, timeout)
         if response and response.status == 0:
             diff = response.server_time_ms - client_timestamp_ms
             logger.debug(f"Разница времени с сервером: {diff} мс")
@@ -35,106 +32,121 @@ def get_server_time_diff() -> Optional[int]:
         logger.error(f"Исключение при получении времени: {e}")
         return None
 
-async def _request_time_async(client_timestamp_ms: int, server_addr: tuple, timeout: float = 10.0) -> Optional[TimeResponse]:
-    async with UDPClient() as client:
-        return await client.request_time(client_timestamp_ms, server_addr, timeout)
-
 # ========================================================================================================== #
 
-async def _request_symbols_async(server_addr: tuple, timeout: float = 10.0) -> Optional[SymbolsResponse]:
-    """Асинхронно запрашивает список символов с сервера."""
-    async with UDPClient() as client:
-        # Номер минуты (можно передать 0, сервер должен вернуть актуальный список)
-        request_time = int(datetime.now().timestamp() // 60)
-        response = await client.request_symbols(request_time, server_addr, timeout)
-        return response
-
-def get_trading_symbols_from_server(retry_delay: float = 10.0) -> List[str]:
+async def request_trading_symbols(client: UDPClient, server_addr: tuple = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT), retry_delay: float = 10.0, timeout: float = 10.0) -> List[str]:
     """
-    Синхронная обёртка для получения списка символов с UDP-сервера.
+    Получает список символов с UDP-сервера через клиент client.
     При статусе BUSY (2) или временных ошибках (таймаут, исключение) выполняет бесконечные повторные запросы
     с задержкой retry_delay секунд. При других статусах (например, NOT_FOUND) возвращает пустой список.
     """
-    server_addr = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT)
     attempt = 0
     while True:
         attempt += 1
         try:
-            response = asyncio.run(_request_symbols_async(server_addr))
+            # Номер минуты (можно передать 0, сервер должен вернуть актуальный список)
+            request_time = int(datetime.now().timestamp() // 60)
+            response = await client.request_symbols(request_time, server_addr, timeout)
             if response and response.status == ServerResponseStatus.OK:
                 logger.info(f"Получено {len(response.symbols)} символов с сервера (попытка {attempt})")
                 return response.symbols
             elif response and response.status == ServerResponseStatus.BUSY:
                 logger.warning(f"Сервер занят (BUSY), повтор через {retry_delay} сек... (попытка {attempt})")
-                time.sleep(retry_delay)
+                await asyncio.sleep(retry_delay)
                 continue
             else:
                 logger.error(f"Ошибка получения символов: статус {response.status if response else 'None'}")
                 return []
         except Exception as e:
             logger.error(f"Исключение при получении символов: {e}, повтор через {retry_delay} сек... (попытка {attempt})")
-            time.sleep(retry_delay)
+            await asyncio.sleep(retry_delay)
             continue
     
 # ========================================================================================================== #
-async def download_candles(trackable_tickers: List[str], minutes: int, end_time: datetime, server_addr: tuple = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT), timeout: float = 10.0 ) -> OrderedDict[int, list[KlineRecord]]:
+async def download_candles(trackable_tickers: List[str], minutes: int, end_time: datetime, server_addr: tuple = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT), timeout: float = 10.0, window: int = DOWNLOAD_WINDOW, client: Optional[UDPClient] = None) -> OrderedDict[int, list[KlineRecord]]:
     """
     Асинхронная внутренняя функция, выполняющая запросы к UDP-серверу.
-    Возвращает список списков KlineRecord, сгруппированных по тикерам.
+    Диапазон скачивается запросами KLINES_RANGE_REQUEST по RANGE_REQUEST_MINUTES минут,
+    сервер сам отфильтровывает тикеры по маске номеров из своей таблицы тикеров.
+
+    Через один клиент одновременно идут до window запросов: как только один кусок диапазона
+    скачан, отправляется следующий. Запрос без ответа повторяется через адаптивный RTO клиента,
+    BUSY откладывает повтор только своего куска. Куски складываются в результат в порядке
+    прихода ответов.
+    client – общий клиент вызывающего; если не задан, создаётся свой на время скачивания.
+    Возвращает свечи, сгруппированные по минутам.
     """
+    if client is None:
+        async with UDPClient() as own_client:
+            return await download_candles(trackable_tickers, minutes, end_time, server_addr, timeout, window, own_client)
+
     end_minute = int(end_time.timestamp() // 60)
     start_minute = end_minute - minutes  # включительно, получим minutes свечей: [start_minute, end_minute-1]
 
-    # Словарь для накопления данных по тикерам
+    # Словарь для накопления данных по минутам
     result: OrderedDict[int, list[KlineRecord]] = OrderedDict()
 
-    # Создаём клиент и подключаемся
-    async with UDPClient() as client:
-        # Для каждой минуты из диапазона
-        for minute in range(start_minute, end_minute):
-            success = False
-            # Можно добавить повторные попытки при таймауте/ошибке
-            for attempt in range(3):  # до 3 попыток
-                try:
-                    response = await client.request_klines(
-                        minute_number=minute,
-                        server_addr=server_addr,
-                        timeout=timeout
-                    )
-                    # Обрабатываем статус ответа
-                    if response.status == ServerResponseStatus.OK:
-                        # Фильтруем записи только по интересующим тикерам
-                        filtered = [rec for rec in response.records if rec.symbol in trackable_tickers]
-                        result[minute] = filtered
-                        success = True
-                        break  # успешно
-                    elif response.status == ServerResponseStatus.BUSY:
-                        logger.warning(f"Сервер занят, попытка {attempt+1} для минуты {minute}")
-                        await asyncio.sleep(10)  # ждём 10 секунду перед повтором
-                        attempt = attempt - 1
-                        continue
-                    elif response.status == ServerResponseStatus.NOT_FOUND:
-                        logger.warning(f"Минута {minute} не найдена на сервере, пропускаем")
-                        # TODO: Надор промаркировать 
-                        break  # не повторяем, данных нет
-                    else:
-                        logger.error(f"Неизвестный статус {response.status} для минуты {minute}, пропускаем")
-                        break
-
-                except asyncio.TimeoutError:
-                    logger.warning(f"Таймаут при запросе минуты {minute}, попытка {attempt+1}")
-                    if attempt == 2:
-                        logger.warning(f"Пропускаем минуту {minute} после 3 неудачных попыток")
-
-                except Exception as e:
-                    logger.error(f"Ошибка при запросе минуты {minute}: {e}")
-                    break  # другие ошибки не повторяем
-                
-            if success:
-                logger.debug(f"Минута {minute} принесла {len(result[minute])} тикеров")
-            else:
-                logger.debug(f"Минута {minute} не загружена")
+    # Очередь кусков диапазона (начало, количество минут)
+    chunks = deque((chunk_start, min(RANGE_REQUEST_MINUTES, end_minute - chunk_start))
+                   for chunk_start in range(start_minute, end_minute, RANGE_REQUEST_MINUTES))
+
+    async def worker():
+        while chunks:
+            chunk_start, chunk_count = chunks.popleft()
+            await _download_chunk(client, trackable_tickers, chunk_start, chunk_count, server_addr, timeout, result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(window, len(chunks))))))
+
+    # Минуты по возрастанию
+    result = OrderedDict(sorted(result.items()))
 
     logger.debug(f"Всего скачано {len(result)} минут для {len(trackable_tickers)} тикеров")
 
     return result
+
+async def _download_chunk(client: UDPClient, trackable_tickers: List[str], chunk_start: int, chunk_count: int,
+                          server_addr: tuple, timeout: float, result: OrderedDict[int, list[KlineRecord]]) -> None:
+    """Скачивает минуты [chunk_start, chunk_start + chunk_count) и добавляет их в result."""
+    attempt = 0
+    busy_delay = BUSY_RETRY_DELAY
+    while attempt < 3:  # до 3 попыток
+        try:
+            response = await client.request_klines_range(
+                start_minute=chunk_start,
+                count=chunk_count,
+                server_addr=server_addr,
+                symbols=trackable_tickers,
+                timeout=timeout
+            )
+            # Обрабатываем статус ответа
+            if response.status == ServerResponseStatus.OK:
+                for minute_response in response.minutes:
+                    result[minute_response.minute_number] = minute_response.records
+                break  # успешно
+            elif response.status == ServerResponseStatus.BUSY:
+                logger.warning(f"Сервер занят, повтор для минут {chunk_start}+{chunk_count} через {busy_delay:.1f} сек")
+                # Ждёт только этот кусок, попытку не засчитываем
+                await asyncio.sleep(busy_delay)
+                busy_delay = min(busy_delay * 2, BUSY_RETRY_MAX)
+                continue
+            elif response.status == ServerResponseStatus.NOT_FOUND:
+                logger.warning(f"Минуты {chunk_start}+{chunk_count} не найдены на сервере, пропускаем")
+                break  # не повторяем, данных нет
+            else:
+                logger.error(f"Неизвестный статус {response.status} для минут {chunk_start}+{chunk_count}, пропускаем")
+                break
+
+        except (asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"Ошибка при запросе минут {chunk_start}+{chunk_count}, попытка {attempt+1}: {e}")
+            if attempt == 2:
+                logger.warning(f"Пропускаем минуты {chunk_start}+{chunk_count} после 3 неудачных попыток")
+
+        except Exception as e:
+            logger.error(f"Ошибка при запросе минут {chunk_start}+{chunk_count}: {e}")
+            break  # другие ошибки не повторяем
+
+        attempt += 1
+
+    missing = [m for m in range(chunk_start, chunk_start + chunk_count) if m not in result]
+    if missing:
+        logger.debug(f"Не загружено {len(missing)} минут из {chunk_start}+{chunk_count}")
@@ -0,0 +1,289 @@
+"""
+Инкрементальный расчёт скользящих окон doTick.
+
+Полный пересчёт на каждом тике проходит все MAX_CACHED_CANDLES минут хранилища, чтобы учесть
+одну новую. Здесь окна ведутся накопительно: новая минута прибавляется, минута, вышедшая
+из окна, вычитается, и тик стоит O(тикеров) вместо O(тикеров * минут).
+
+Окна те же, что у функций analytic_utils:
+  • 10м объёмы – сумма quote_assets_volume за последние 10 минут;
+  • часовые объёмы – HOURS_VOLUMES_SLIDED_WINDOW_PERIOD блоков по 60 минут, которые,
+    как в calculate_1h_records, заканчиваются последней минутой хранилища;
+  • максимум high за последние HOURS_PRICES_SLIDED_WINDOW_PERIOD таких блоков.
+
+Последние минуты лежат в кольцевом буфере [минута, тикер], поэтому при добавлении
+минуты известна и вычитаемая. Максимум по окну считается на двух стеках: при опустошении
+«старого» стека буфер сворачивается в суффиксные максимумы один раз на окно, и на минуту
+выходит амортизированно O(тикеров). В тот же момент суммы пересчитываются из буфера
+заново, чтобы ошибка округления от вычитаний не накапливалась.
+"""
+
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from AnalyticsBot.logger import logger
+from AnalyticsBot.config import *
+
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.bot_types import Volume_10m
+from AnalyticsBot.storage_follower import StorageFollower
+
+# Номера полей в KlineColumns.values
+HIGH_FIELD = 2
+QUOTE_VOLUME_FIELD = 5
+
+# Длина окна 10м объёмов (минут)
+VOLUME_10M_MINUTES = 10
+
+class IncrementalAnalytics(StorageFollower):
+    """
+    Скользящие окна по всем тикерам хранилища, обновляемые по одной минуте.
+
+    Минуты должны идти подряд: пропущенная минута учитывается как минута без свечей,
+    а минута не новее последней учтённой отбрасывается.
+    """
+
+    def __init__(self,
+                 volume_hours: int = HOURS_VOLUMES_SLIDED_WINDOW_PERIOD,
+                 price_hours: int = HOURS_PRICES_SLIDED_WINDOW_PERIOD,
+                 symbols_capacity: int = 64):
+        if volume_hours <= 0 or price_hours <= 0:
+            raise ValueError("window hours must be positive")
+
+        self.volume_hours = volume_hours
+        self.price_hours = price_hours
+        self.volume_minutes = volume_hours * 60
+        self.price_minutes = price_hours * 60
+        # Буфер хранит на минуту больше самого длинного окна: вычитаемая минута ещё на месте
+        self.capacity = max(VOLUME_10M_MINUTES, self.volume_minutes, self.price_minutes) + 1
+        self.span = self.capacity - 1
+
+        self._columns: dict[str, int] = {}
+        self._symbols: list[str] = []
+        self._width = max(1, symbols_capacity)
+        # Кеш сопоставления тикеров минуты колонкам: список тикеров от минуты к минуте обычно тот же
+        self._last_symbols: Optional[list[str]] = None
+        self._last_columns: Optional[np.ndarray] = None
+
+        # Номера минут, по которым сдвигаются границы часовых блоков
+        self._block_offsets = 60 * np.arange(volume_hours + 1)
+        self._allocate(self._width)
+        self.reset()
+
+    def _allocate(self, width: int) -> None:
+        self._ring_volume = np.zeros((self.capacity, width), dtype=np.float64)
+        self._ring_high = np.full((self.capacity, width), -np.inf, dtype=np.float64)
+        self._ring_present = np.zeros((self.capacity, width), dtype=np.int32)
+
+        self._volume_10m = np.zeros(width, dtype=np.float64)
+        self._present_10m = np.zeros(width, dtype=np.int32)
+        # [блок, тикер], блок 0 – самый новый
+        self._hour_volume = np.zeros((self.volume_hours, width), dtype=np.float64)
+        self._present_hours = np.zeros(width, dtype=np.int32)
+        self._present_price = np.zeros(width, dtype=np.int32)
+
+        # Два стека максимумов: «старый» – суффиксные максимумы, «новый» – текущий максимум
+        self._front = np.empty((0, width), dtype=np.float64)
+        self._front_pos = 0
+        self._back_max = np.full(width, -np.inf, dtype=np.float64)
+        self._back_len = 0
+
+    def reset(self) -> None:
+        """Забывает все учтённые минуты (колонки тикеров сохраняются)."""
+        self._allocate(self._width)
+        self.last_minute: Optional[int] = None
+        # Сколько минут учтено с последнего сброса
+        self.minutes = 0
+
+    @property
+    def symbols(self) -> list[str]:
+        return list(self._symbols)
+
+    def _grow(self, width: int) -> None:
+        """Расширяет все массивы до width колонок (новые тикеры не встречались в окне)."""
+        extra = width - self._width
+
+        def pad(array: np.ndarray, value) -> np.ndarray:
+            padding = np.full(array.shape[:-1] + (extra,), value, dtype=array.dtype)
+            return np.concatenate([array, padding], axis=-1)
+
+        self._ring_volume = pad(self._ring_volume, 0.0)
+        self._ring_high = pad(self._ring_high, -np.inf)
+        self._ring_present = pad(self._ring_present, 0)
+        self._volume_10m = pad(self._volume_10m, 0.0)
+        self._present_10m = pad(self._present_10m, 0)
+        self._hour_volume = pad(self._hour_volume, 0.0)
+        self._present_hours = pad(self._present_hours, 0)
+        self._present_price = pad(self._present_price, 0)
+        self._front = pad(self._front, -np.inf)
+        self._back_max = pad(self._back_max, -np.inf)
+        self._width = width
+
+    def _column(self, symbol: str) -> int:
+        column = self._columns.get(symbol)
+        if column is None:
+            column = len(self._symbols)
+            if column >= self._width:
+                self._grow(self._width * 2)
+            self._columns[symbol] = column
+            self._symbols.append(symbol)
+        return column
+
+    def _minute_values(self, candles: Sequence[KlineRecord]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Колонки, объёмы и максимумы свечей одной минуты."""
+        if isinstance(candles, KlineColumns):
+            symbols = candles.symbols
+            volumes = candles.values[:, QUOTE_VOLUME_FIELD]
+            highs = candles.values[:, HIGH_FIELD]
+        else:
+            symbols = [c.symbol for c in candles]
+            volumes = np.array([c.quote_assets_volume for c in candles], dtype=np.float64)
+            highs = np.array([c.high for c in candles], dtype=np.float64)
+
+        if symbols != self._last_symbols:
+            self._last_columns = np.array([self._column(s) for s in symbols], dtype=np.intp)
+            self._last_symbols = list(symbols)
+        return self._last_columns, volumes, highs
+
+    def push(self, minute: int, candles: Sequence[KlineRecord]) -> bool:
+        """
+        Учитывает свечи минуты minute. False – минута не новее последней учтённой.
+        Пропуск перед minute заполняется пустыми минутами.
+        """
+        if self.last_minute is not None and minute <= self.last_minute:
+            logger.warning(f"Минута {minute} не новее последней учтённой {self.last_minute}, пропускаем")
+            return False
+
+        columns, volumes, highs = self._minute_values(candles)
+
+        if self.last_minute is not None and minute - self.last_minute > 1:
+            missing = minute - self.last_minute - 1
+            logger.warning(f"Пропуск {missing} минут перед {minute} в скользящих окнах")
+            if missing >= self.capacity:
+                self.reset()
+            else:
+                empty = np.empty(0, dtype=np.intp)
+                for gap_minute in range(self.last_minute + 1, minute):
+                    self._push_row(gap_minute, empty, np.empty(0), np.empty(0))
+
+        self._push_row(minute, columns, volumes, highs)
+        return True
+
+    def _push_row(self, minute: int, columns: np.ndarray, volumes: np.ndarray, highs: np.ndarray) -> None:
+        capacity = self.capacity
+        slot = minute % capacity
+
+        # Строка буфера с номером minute % capacity принадлежала минуте minute - capacity,
+        # которая уже вне всех окон
+        self._ring_volume[slot] = 0.0
+        self._ring_high[slot] = -np.inf
+        self._ring_present[slot] = 0
+        self._ring_volume[slot, columns] = volumes
+        self._ring_high[slot, columns] = highs
+        self._ring_present[slot, columns] = 1
+
+        self.last_minute = minute
+        self.minutes += 1
+
+        # Пока окно не заполнено, вычитаемые строки ещё не записывались и равны нулю
+        out_10m = (minute - VOLUME_10M_MINUTES) % capacity
+        self._volume_10m += self._ring_volume[slot] - self._ring_volume[out_10m]
+        self._present_10m += self._ring_present[slot] - self._ring_present[out_10m]
+
+        # Каждая граница часовых блоков сдвигается на минуту: блок k получает минуту
+        # minute - 60k и отдаёт минуту minute - 60(k + 1) следующему блоку
+        edges = (minute - self._block_offsets) % capacity
+        self._hour_volume += self._ring_volume[edges[:-1]] - self._ring_volume[edges[1:]]
+        self._present_hours += self._ring_present[slot] - self._ring_present[edges[-1]]
+
+        out_price = (minute - self.price_minutes) % capacity
+        self._present_price += self._ring_present[slot] - self._ring_present[out_price]
+
+        np.maximum(self._back_max, self._ring_high[slot], out=self._back_max)
+        self._back_len += 1
+        if self.minutes > self.price_minutes:
+            if self._front_pos == len(self._front):
+                self._fold()
+            self._front_pos += 1
+
+    def _fold(self) -> None:
+        """
+        Переносит «новый» стек максимумов в «старый» (суффиксные максимумы от старых минут
+        к новым) и пересчитывает суммы из буфера.
+        """
+        slots = np.arange(self.last_minute - self._back_len + 1, self.last_minute + 1) % self.capacity
+        highs = self._ring_high[slots]
+        self._front = np.maximum.accumulate(highs[::-1], axis=0)[::-1]
+        self._front_pos = 0
+        self._back_max = np.full(self._width, -np.inf, dtype=np.float64)
+        self._back_len = 0
+
+        self._volume_10m = self._window_sum(0, VOLUME_10M_MINUTES)
+        for block in range(self.volume_hours):
+            self._hour_volume[block] = self._window_sum(block * 60, 60)
+
+    def _window_sum(self, skip: int, length: int) -> np.ndarray:
+        """Сумма объёмов length минут, заканчивающихся за skip минут до последней."""
+        end = self.last_minute - skip
+        slots = np.arange(end - length + 1, end + 1) % self.capacity
+        return self._ring_volume[slots].sum(axis=0)
+
+    def _lookup(self, symbols: Sequence[str]) -> list[tuple[str, int]]:
+        return [(s, self._columns[s]) for s in symbols if s in self._columns]
+
+    def volumes_10m(self, symbols: Sequence[str]) -> Optional[List[Volume_10m]]:
+        """
+        10м объёмы тикеров symbols, как calculate_10m_volumes_slidedWindow.
+        В ответ попадают тикеры, у которых есть все 10 минут окна; None – учтено меньше 10 минут.
+        """
+        if self.minutes < VOLUME_10M_MINUTES:
+            return None
+
+        open_time = (self.last_minute - VOLUME_10M_MINUTES + 1) * 60000
+        close_time = self.last_minute * 60000
+        return [
+            Volume_10m(ticker=symbol, volume=float(self._volume_10m[column]),
+                       open_time=open_time, close_time=close_time)
+            for symbol, column in self._lookup(symbols)
+            if self._present_10m[column] == VOLUME_10M_MINUTES
+        ]
+
+    def volumes_slided_window(self, symbols: Sequence[str]) -> Optional[Dict[str, Dict[str, float]]]:
+        """
+        Объёмы часовых блоков в формате calculate_volumes_slidedWindow:
+        {тикер: {'total_volume_1': самый старый час, ..., 'total_volume_N': самый новый}}.
+        В ответ попадают тикеры, у которых есть все минуты окна; None – окно ещё не заполнено.
+        """
+        if self.minutes < self.volume_minutes:
+            logger.warning(f"Недостаточно данных для обработки. Учтено {self.minutes} минут")
+            return None
+
+        hours = self.volume_hours
+        result: Dict[str, Dict[str, float]] = {}
+        for symbol, column in self._lookup(symbols):
+            if self._present_hours[column] != self.volume_minutes:
+                continue
+            volumes = self._hour_volume[::-1, column].tolist()
+            result[symbol] = {f'total_volume_{i}': volumes[i - 1] for i in range(1, hours + 1)}
+        return result
+
+    def max_highs(self, symbols: Sequence[str]) -> Optional[Dict[str, float]]:
+        """
+        Максимум high за последние price_hours часовых блоков, как calculate_prices_slidedWindow.
+        В ответ попадают тикеры, у которых в окне есть хотя бы одна свеча; None – окно ещё не заполнено.
+        """
+        if self.minutes < self.price_minutes:
+            logger.warning(f"Недостаточно данных для окна цен. Учтено {self.minutes} минут")
+            return None
+
+        if self._front_pos < len(self._front):
+            highs = np.maximum(self._front[self._front_pos], self._back_max)
+        else:
+            highs = self._back_max
+        return {symbol: float(highs[column]) for symbol, column in self._lookup(symbols)
+                if self._present_price[column] > 0}
@@ -0,0 +1,160 @@
+import asyncio
+
+from typing import Callable
+from typing import Optional
+from typing import Sequence
+from collections import OrderedDict
+from datetime import datetime
+
+from AnalyticsBot.logger import logger
+from AnalyticsBot.config import *
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.udp_client import UDPClient
+from AnalyticsBot.downloader import download_candles
+from AnalyticsBot.protocol_download import KlinesPush
+from AnalyticsBot.protocol_download import ServerResponseStatus
+
+class KlinePushSubscription:
+    """
+    Подписка на рассылку закрытых минут сервера скачивания в текущем цикле событий.
+
+    Работает через переданный UDPClient, поэтому делит сокет с остальными запросами к серверу.
+    Минуты приходят сразу после публикации на сервере и передаются в on_minute (по умолчанию –
+    в очередь, из которой их забирает wait_minutes). Если между рассылками пропущены минуты
+    (потерянный пакет, разрыв номеров рассылки), они докачиваются запросами диапазона; пока
+    пропуск не докачан, минуты после него не доставляются.
+    """
+
+    def __init__(self, client: UDPClient, server_addr: tuple = (DOWNLOAD_SERVER_IP, DOWNLOAD_SERVER_PORT),
+                 on_minute: Optional[Callable[[int, Sequence[KlineRecord]], None]] = None):
+        self.server_addr = server_addr
+        self._client = client
+
+        # Рассылки, ожидающие обработки (по порядку поступления)
+        self._pushes: asyncio.Queue[KlinesPush] = asyncio.Queue()
+        # Готовые минуты для wait_minutes: (номер минуты, свечи)
+        self._minutes: asyncio.Queue[tuple[int, Sequence[KlineRecord]]] = asyncio.Queue()
+        self._on_minute = on_minute or (lambda minute, records: self._minutes.put_nowait((minute, records)))
+
+        self._symbols: Optional[set[str]] = None
+        self._last_minute: Optional[int] = None
+        self._last_sequence: Optional[int] = None
+        # Токен подписки от сервера (0 – ещё не получен)
+        self._token = 0
+
+    def set_symbols(self, symbols: list[str]) -> None:
+        """Тикеры, которые оставлять в полученных минутах (None – все)."""
+        self._symbols = set(symbols) if symbols is not None else None
+
+    def start_from(self, last_minute: int) -> None:
+        """
+        Последняя минута, которая уже есть у клиента: всё, что новее, будет доставлено.
+        Назад не сдвигается – минуты, уже переданные в on_minute, повторно не доставляются.
+        """
+        if self._last_minute is None or last_minute > self._last_minute:
+            self._last_minute = last_minute
+
+    async def run(self):
+        """Подписывается и продлевает подписку, пока задачу не отменят; при отмене отписывается."""
+        self._client.set_push_handler(self._pushes.put_nowait)
+        consumer = asyncio.create_task(self._consume())
+        try:
+            while True:
+                renew_after = await self._subscribe()
+                await asyncio.sleep(renew_after)
+        finally:
+            consumer.cancel()
+            try:
+                await self._client.unsubscribe(self.server_addr, self._token, timeout=1.0)
+            except Exception:
+                pass
+            if self._client.protocol is not None:
+                self._client.set_push_handler(None)
+
+    async def _subscribe(self) -> float:
+        """Подписывается или продлевает подписку. Возвращает, через сколько секунд продлить."""
+        try:
+            response = await self._client.subscribe(self.server_addr, self._token)
+            if response.status == ServerResponseStatus.CONFIRM_SUBSCRIPTION:
+                # Первая подписка (или сервер перезапустился): подтверждаем адрес выданным токеном
+                self._token = response.token
+                response = await self._client.subscribe(self.server_addr, self._token)
+            if response.status != ServerResponseStatus.OK:
+                logger.warning(f"Сервер отклонил подписку: статус {response.status}")
+                return 5.0
+            logger.debug(f"Подписка продлена: sequence={response.sequence}, ttl={response.ttl_seconds}с")
+            # Продлеваем с запасом, чтобы подписка не истекла из-за потерянного пакета
+            return max(1.0, response.ttl_seconds / 3)
+        except Exception as e:
+            logger.warning(f"Не удалось подписаться на рассылку минут: {e}")
+            return 5.0
+
+    async def _consume(self):
+        """Обрабатывает рассылки строго по порядку, докачивая пропущенные минуты."""
+        while True:
+            push: KlinesPush = await self._pushes.get()
+            minute = push.kline.minute_number
+
+            if self._last_sequence is not None and push.sequence != self._last_sequence + 1:
+                logger.warning(f"Разрыв номеров рассылки: ожидался {self._last_sequence + 1}, получен {push.sequence}")
+            self._last_sequence = push.sequence
+
+            if self._last_minute is not None and minute <= self._last_minute:
+                continue
+
+            if self._last_minute is not None and minute > self._last_minute + 1:
+                if not await self._pull(self._last_minute + 1, minute - self._last_minute - 1):
+                    # Минута после недокачанного пропуска не доставляется, иначе пропуск останется
+                    # навсегда. Следующая рассылка снова запросит диапазон с первой недоставленной
+                    # минуты (вместе с этой), а без рассылок недостающее скачает тик с опросом сервера
+                    continue
+
+            self._deliver(minute, push.kline.records)
+
+    async def _pull(self, start_minute: int, count: int) -> bool:
+        """
+        Докачивает пропущенные минуты [start_minute, start_minute + count) кусками по
+        RANGE_REQUEST_MINUTES и доставляет их подряд до первой недокачанной.
+        Возвращает True, если докачаны все.
+        """
+        logger.info(f"Докачиваем {count} пропущенных минут начиная с {start_minute}")
+        try:
+            klines = await download_candles(sorted(self._symbols) if self._symbols else [], count,
+                                            datetime.fromtimestamp((start_minute + count) * 60),
+                                            self.server_addr, client=self._client)
+        except Exception as e:
+            logger.error(f"Не удалось докачать пропущенные минуты: {e}")
+            return False
+
+        for minute in range(start_minute, start_minute + count):
+            if minute not in klines:
+                logger.warning(f"Минута {minute} не докачана, повторим со следующей рассылкой")
+                return False
+            self._deliver(minute, klines[minute])
+        return True
+
+    def _deliver(self, minute: int, records: Sequence[KlineRecord]):
+        if self._symbols is not None:
+            if isinstance(records, KlineColumns):
+                records = records.select(self._symbols)
+            else:
+                records = [rec for rec in records if rec.symbol in self._symbols]
+        self._on_minute(minute, records)
+        self._last_minute = minute
+
+    async def wait_minutes(self, timeout: float) -> OrderedDict[int, list[KlineRecord]]:
+        """
+        Ждёт хотя бы одну новую минуту (не дольше timeout секунд) и забирает все накопившиеся.
+        Пустой словарь – за timeout ничего не пришло.
+        """
+        result: OrderedDict[int, list[KlineRecord]] = OrderedDict()
+        try:
+            minute, records = await asyncio.wait_for(self._minutes.get(), timeout)
+        except asyncio.TimeoutError:
+            return result
+        result[minute] = records
+        while not self._minutes.empty():
+            minute, records = self._minutes.get_nowait()
+            result[minute] = records
+        return result
@@ -16,6 +16,7 @@ logger.info(str(f"src_path = {src_path}"))
 logger.info(str(f"analytics_bot_src_path = {analytics_bot_src_path}"))
 
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Optional
 from typing import Dict
@@ -35,29 +36,46 @@ from AnalyticsBot.storage_utils import save_1h_records
 from AnalyticsBot.storage_utils import save_klines_to_ram
 from AnalyticsBot.storage_utils import is_storage_consistent
 
-from AnalyticsBot.analytic_utils import validate_ticker
-from AnalyticsBot.analytic_utils import calculate_10m_volumes_slidedWindow
 from AnalyticsBot.analytic_utils import isWindow10mValid
-from AnalyticsBot.analytic_utils import calculate_1h_records
-from AnalyticsBot.analytic_utils import calculate_volumes_slidedWindow
-from AnalyticsBot.analytic_utils import calculate_prices_slidedWindow
-from AnalyticsBot.analytic_utils import check_price_overlimit
-from AnalyticsBot.analytic_utils import check_volume_overlimit
 
+if ANALYTICS_ENGINE == "numpy":
+    from AnalyticsBot.vector_analytics import calculate_10m_volumes_slidedWindow
+    from AnalyticsBot.vector_analytics import calculate_1h_records
+    from AnalyticsBot.vector_analytics import calculate_volumes_slidedWindow
+    from AnalyticsBot.vector_analytics import calculate_prices_slidedWindow
+    from AnalyticsBot.vector_analytics import check_price_overlimit
+    from AnalyticsBot.vector_analytics import check_volume_overlimit
+else:
+    from AnalyticsBot.analytic_utils import calculate_10m_volumes_slidedWindow
+    from AnalyticsBot.analytic_utils import calculate_1h_records
+    from AnalyticsBot.analytic_utils import calculate_volumes_slidedWindow
+    from AnalyticsBot.analytic_utils import calculate_prices_slidedWindow
+    from AnalyticsBot.analytic_utils import check_price_overlimit
+    from AnalyticsBot.analytic_utils import check_volume_overlimit
+
+from AnalyticsBot.incremental_analytics import IncrementalAnalytics
+from AnalyticsBot.validity_tracker import ValidityTracker
+
+from AnalyticsBot.udp_client import UDPClient
 from AnalyticsBot.downloader import download_candles
-from AnalyticsBot.downloader import get_server_time_diff
-from AnalyticsBot.downloader import get_trading_symbols_from_server
+from AnalyticsBot.downloader import request_server_time_diff
+from AnalyticsBot.downloader import request_trading_symbols
 
 from AnalyticsBot.alert_server import *
-from AnalyticsBot.alert_server_thread import *
+from AnalyticsBot.kline_push import KlinePushSubscription
 
-alert_thread = AlertServerThread()
+alert_server = AlertServer()
+analytics = IncrementalAnalytics()
+tracker = ValidityTracker()
+# Аналитика тика считается в отдельном потоке, чтобы не останавливать цикл событий
+# (приём рассылки минут, регистрация клиентов сигналов). Один поток – тики не пересекаются.
+analytics_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
 
-def download_candles_reccursively(servertime_ms: int, trackable_tickers: list[str], minutes: int) -> OrderedDict[int, list[KlineRecord]]:
+async def download_candles_reccursively(client: UDPClient, servertime_ms: int, trackable_tickers: list[str], minutes: int) -> OrderedDict[int, list[KlineRecord]]:
     logger.info(f"✅ Запущено предварительное скачивание архивных данных {minutes} минутных свеч...")
     download_start_time = time.time()
     end_time = datetime.fromtimestamp(servertime_ms / 1000.0)
-    klines_1m_full: OrderedDict[int, list[KlineRecord]] = asyncio.run(download_candles(trackable_tickers, minutes, end_time))
+    klines_1m_full: OrderedDict[int, list[KlineRecord]] = await download_candles(trackable_tickers, minutes, end_time, client=client)
     download_stop_time = time.time()
     logger.info(f"✅ Скачивание завершено.")
 
@@ -76,7 +94,7 @@ def download_candles_reccursively(servertime_ms: int, trackable_tickers: list[st
         # Запускаем второй этап скачивания
         logger.info(f"✅ Запущено предварительное скачивание архивных данных {int(duration_minutes)} минутных свеч...")
         download_start_time = time.time()
-        sub_klines: OrderedDict[int, list[KlineRecord]] = asyncio.run(download_candles(trackable_tickers, int(duration_minutes), end_time))
+        sub_klines: OrderedDict[int, list[KlineRecord]] = await download_candles(trackable_tickers, int(duration_minutes), end_time, client=client)
         download_stop_time = time.time()
         logger.info(f"✅ Скачивание завершено.")
 
@@ -89,8 +107,8 @@ def download_candles_reccursively(servertime_ms: int, trackable_tickers: list[st
     return klines_1m_full
 
     
-def getTrackedTickers() -> list[str]:
-    symbols = get_trading_symbols_from_server()
+async def getTrackedTickers(client: UDPClient) -> list[str]:
+    symbols = await request_trading_symbols(client)
     if not symbols:
         return []
     
@@ -112,9 +130,11 @@ def getTrackedTickers() -> list[str]:
     #     "BNBUSDT"
     # ]
 
-def doTick(servertime_ms: int):
+async def doTick(client: UDPClient, servertime_ms: int, subscription: Optional[KlinePushSubscription] = None):
     """
-    Функция ежеминутного тика
+    Функция ежеминутного тика.
+    Обмен с сервером идёт в цикле событий через общий клиент, аналитика (analyzeTick) – в analytics_executor.
+    subscription – подписка на рассылку минут: её фильтр тикеров обновляется вместе со списком тикеров.
     """
 
     # ====================== Step 1 ========================= #
@@ -123,11 +143,14 @@ def doTick(servertime_ms: int):
     # ======================================================= # 
     logger.debug("Обновляем список тикеров...")
     # TODO: Необходимо отработать моменты, когда отслеживаемые тикеры закрываются для торговли
-    binance_trackable_tickers: list[str] = getTrackedTickers()
+    binance_trackable_tickers: list[str] = await getTrackedTickers(client)
     if len(binance_trackable_tickers) == 0:
         logger.error("❌ Не удалось получить список тикеров")
         return
     logger.debug(f"✅ Найдено торгующихся тикеров: {len(binance_trackable_tickers)}")
+    if subscription is not None:
+        # Листинги и делистинги: рассылка должна доставлять новые тикеры и отбрасывать ушедшие
+        subscription.set_symbols(binance_trackable_tickers)
     # ====================== Step 2 ========================= #
     # Подключаемся к серверу и скачиваем оттуда недостающие свечи.
     # Скачивание идёт до тех пор, пока мы не получим свечи текущей закрытой минуты.
@@ -149,10 +172,13 @@ def doTick(servertime_ms: int):
             logger.info(f"Найдены {missing_minutes} недостающих минут. Скачиваем...")
 
             # Как быстро ты скачаешь 60-80мб?
-            klines_missing: OrderedDict[int, list[KlineRecord]] = download_candles_reccursively(servertime_ms, binance_trackable_tickers, missing_minutes)
+            klines_missing: OrderedDict[int, list[KlineRecord]] = await download_candles_reccursively(client, servertime_ms, binance_trackable_tickers, missing_minutes)
 
             if klines_missing:
                 save_klines_to_ram(klines_missing)
+                if subscription is not None:
+                    # Рассылка, застрявшая на недокачанном пропуске, продолжает после скачанных минут
+                    subscription.start_from(max(get_1m_candles().keys()))
             else:
                 logger.warning("❌ Не удалось загрузить недостающие минутные свечи")
         else:
@@ -163,7 +189,7 @@ def doTick(servertime_ms: int):
         logger.error(f"❌ Попытка восстановить хранилище с помщью сети. Скачиваем  {MAX_CACHED_CANDLES} минут по всем тикерам.")
 
         # Как быстро ты скачаешь 60-80мб?
-        klines_missing: OrderedDict[int, list[KlineRecord]] = download_candles_reccursively(servertime_ms, binance_trackable_tickers, MAX_CACHED_CANDLES)
+        klines_missing: OrderedDict[int, list[KlineRecord]] = await download_candles_reccursively(client, servertime_ms, binance_trackable_tickers, MAX_CACHED_CANDLES)
 
         if klines_missing:
             save_klines_to_ram(klines_missing)
@@ -171,27 +197,57 @@ def doTick(servertime_ms: int):
         else:
             logger.warning("❌ Не удалось загрузить недостающие минутные свечи. Функционирование невозможно.")
             return
+
+    # Шаги 3-9: расчёт в отдельном потоке, хранилище до его окончания не меняется
+    alerts: Optional[List[AlertRecord]] = await asyncio.get_running_loop().run_in_executor(
+        analytics_executor, analyzeTick, servertime_ms)
+    if not alerts:
+        return
+    # ====================== Step 10 ======================== #
+    # Оповещаю подключенных клиентов о новом сигнале и актуальной точке входа в сделку
+    #
+    # ======================================================= #
+    logger.debug(f"Рассылаем алерты клиентам...")
+
+    for alert in alerts:
+        await alert_server.send_alert(alert)
+        logger.info(f"🌐 Отправили алерт {alert}")
+
+    logger.debug(f"Все алерты разосланы клиентам...")
+
+def analyzeTick(servertime_ms: int) -> Optional[List[AlertRecord]]:
+    """
+    Аналитика тика по хранилищу (шаги 3-9): возвращает алерты для рассылки
+    или None, если их нет или тик пропущен.
+    """
     # ====================== Step 3 ========================= #
     # Проверка хранилища на валидность.
     # На этом этапе надо отсеить все некорректные записи.
     # Некорректными считаются те записи, по которым нет валидных свечей за период MAX_CACHED_CANDLES
     # Дальнейшая аналитика проводится ботом только по валидным записям.
     # 
+    # Счётчики валидности ведёт tracker: за тик учитываются только новые минуты,
+    # а тикер с некорректной свечой снова становится валидным, когда она уходит из окна.
+    #
     # TODO: Необходим механизм перезапроса у Download сервера данных по указанным свечам, 
-    # TODO: Либо пометка их как временно невалидных. 
     # TODO: (делистнули или наоброт залистили несколько часов назад)
     #
     # ======================================================= # 
     logger.info(f"Запускаю проверку хранилища на консистентность...")
     raw_klines: OrderedDict[int, list[KlineRecord]] = get_1m_candles()
-    validated_klines = validate_ticker(raw_klines)    # применяем фильтрацию
-    save_klines_to_ram(validated_klines)
-    logger.info(f"Проведена валидация хранилища. Пригодно {len(validated_klines)} торговых пар для составления аналитики.")
+    added_minutes = tracker.sync(raw_klines)
+    tracker.log_changes()
+    logger.debug(f"В проверку тикеров добавлено {added_minutes} минут")
 
     logger.debug(f"Проверяем хранили на консистентность...")
-    if not is_storage_consistent(validated_klines):
+    if tracker.last_minute is None or tracker.missing_minutes:
         logger.error("Список candle_1m_records не содержит непрерывный диапазон минутных свечей.")
         return
+
+    # Последняя минута содержит все актуальные тикеры
+    last_minute = tracker.last_minute
+    last_minute_candles = tracker.select(raw_klines[last_minute])
+    logger.info(f"Проведена валидация хранилища. Пригодно {len(last_minute_candles)} торговых пар для составления аналитики.")
     
     logger.debug(f"✅ Проверка хранилища успешно пройдена.")
     # ====================== Step 4 ========================= #
@@ -202,22 +258,29 @@ def doTick(servertime_ms: int):
     #
     # ======================================================= # 
     logger.debug(f"Обновляю скользящие 10м объёмы...")
-    klines_1m: OrderedDict[int, list[KlineRecord]] = get_recent_1m_klines(MAX_CACHED_CANDLES)
-    if (len(klines_1m) < 10):
-        logger.error(f"❌ Найдено только {len(klines_1m)} минутных свечей в хранилище.")
+    if (len(raw_klines) < 10):
+        logger.error(f"❌ Найдено только {len(raw_klines)} минутных свечей в хранилище.")
         logger.error(f"❌ Нужно хотя бы 10. Пропускаем тик.")
         return
 
-    volumes_10m: Optional[List[Volume_10m]] = calculate_10m_volumes_slidedWindow(klines_1m)
+    expected_tickers = [c.symbol for c in last_minute_candles]
+
+    if INCREMENTAL_ANALYTICS:
+        # Окна учитывают только минуты, пришедшие с прошлого тика
+        added_minutes = analytics.sync(raw_klines)
+        logger.debug(f"В скользящие окна добавлено {added_minutes} минут")
+        volumes_10m: Optional[List[Volume_10m]] = analytics.volumes_10m(expected_tickers)
+    else:
+        # Окно считается по позициям тикеров в минуте: листинги, делистинги и невалидные
+        # тикеры отсеиваются, иначе длины минут разойдутся
+        klines_1m: OrderedDict[int, list[KlineRecord]] = tracker.filter(get_recent_1m_klines(10))
+        volumes_10m: Optional[List[Volume_10m]] = calculate_10m_volumes_slidedWindow(klines_1m)
+
     if volumes_10m is None:
         logger.error(f"❌ Ошибка вычисления 10м объёмов. Пропускаем тик.")
         return
     
     # Проверка валидности окна: должны быть данные по всем валидным тикерам
-    # Последняя минута после валидации (validated_klines) содержит все актуальные тикеры
-    last_minute = max(validated_klines.keys())
-    expected_tickers = [c.symbol for c in validated_klines[last_minute]]
-
     if not isWindow10mValid(volumes_10m, expected_tickers):
         logger.error("❌ Скользящее окно 10м объёмов не содержит все тикеры. Пропускаем тик.")
         return
@@ -230,18 +293,20 @@ def doTick(servertime_ms: int):
     # TODO: Нужно покрыть тестами этот этап
     #
     # ======================================================= # 
-    logger.debug(f"Обновляю скользящую часовую статистику...")
+    # При накопительном расчёте часовые блоки ведёт analytics, отдельный шаг не нужен
+    if not INCREMENTAL_ANALYTICS:
+        logger.debug(f"Обновляю скользящую часовую статистику...")
 
-    hours_statistic: Optional[OrderedDict[int, list[HoursRecord]]] = calculate_1h_records(validated_klines)
-    if hours_statistic is None:
-        logger.error(f"❌ Ошибка вычисления часовой статистики. Пропускаем тик.")
-        return
-    
-    if not save_1h_records(hours_statistic):
-        logger.error(f"❌ Ошибка сохранении часовой статистики в RAM. Пропускаем тик.")
-        return
+        hours_statistic: Optional[OrderedDict[int, list[HoursRecord]]] = calculate_1h_records(tracker.filter(raw_klines))
+        if hours_statistic is None:
+            logger.error(f"❌ Ошибка вычисления часовой статистики. Пропускаем тик.")
+            return
+        
+        if not save_1h_records(hours_statistic):
+            logger.error(f"❌ Ошибка сохранении часовой статистики в RAM. Пропускаем тик.")
+            return
 
-    logger.debug(f"✅ Обновление часовой статистики успешно. Получилось {len(hours_statistic)} отметок")
+        logger.debug(f"✅ Обновление часовой статистики успешно. Получилось {len(hours_statistic)} отметок")
     # ====================== Step 6 ========================= #
     # Расчёт HOURS_VOLUMES_SLIDED_WINDOW_PERIOD часовое скользящее окона объёмов для всех валидных тикеров.
     # Защитный интервал состовляет HOURS_VOLUMES_PROTECTIVE_INTERVAL минут.
@@ -254,14 +319,17 @@ def doTick(servertime_ms: int):
     # ======================================================= # 
     logger.debug(f"Обновляю часовое скользящее окно объёмов...")
 
-    # Получаем самые свежие часовые файлы
-    h1_records: dict[int, list[HoursRecord]] = get_recent_1h_klines(HOURS_VOLUMES_SLIDED_WINDOW_PERIOD)
+    if INCREMENTAL_ANALYTICS:
+        volumes_10h: Optional[Dict[str, Dict[str, float]]] = analytics.volumes_slided_window(expected_tickers)
+    else:
+        # Получаем самые свежие часовые файлы
+        h1_records: dict[int, list[HoursRecord]] = get_recent_1h_klines(HOURS_VOLUMES_SLIDED_WINDOW_PERIOD)
 
-    if h1_records is None or len(h1_records) != HOURS_VOLUMES_SLIDED_WINDOW_PERIOD:
-        logger.error("❌ Не найдено часовых файлов для обработки часового скользящего окна объёмов. Пропускаем тик.")
-        return
-    
-    volumes_10h: Optional[Dict[str, Dict[str, float]]] = calculate_volumes_slidedWindow(h1_records, HOURS_VOLUMES_SLIDED_WINDOW_PERIOD)
+        if h1_records is None or len(h1_records) != HOURS_VOLUMES_SLIDED_WINDOW_PERIOD:
+            logger.error("❌ Не найдено часовых файлов для обработки часового скользящего окна объёмов. Пропускаем тик.")
+            return
+        
+        volumes_10h: Optional[Dict[str, Dict[str, float]]] = calculate_volumes_slidedWindow(h1_records, HOURS_VOLUMES_SLIDED_WINDOW_PERIOD)
 
     if volumes_10h is None:
         logger.error(f"❌ Ошибка вычисления часового скользящего окна объёмов. Пропускаем тик.")
@@ -280,13 +348,16 @@ def doTick(servertime_ms: int):
     # ======================================================= # 
     logger.debug(f"Обновляю часовое скользящее окно цен...")
 
-    h1_records: dict[int, list[HoursRecord]] = get_recent_1h_klines(HOURS_PRICES_SLIDED_WINDOW_PERIOD)
+    if INCREMENTAL_ANALYTICS:
+        max_highs: Optional[Dict[str, float]] = analytics.max_highs(expected_tickers)
+    else:
+        h1_records: dict[int, list[HoursRecord]] = get_recent_1h_klines(HOURS_PRICES_SLIDED_WINDOW_PERIOD)
 
-    if h1_records is None or len(h1_records) != HOURS_PRICES_SLIDED_WINDOW_PERIOD:
-        logger.error("❌ Не найдено часовых файлов для обработки скользящего окна цен. Пропускаем тик.")
-        return
-    
-    max_highs: Optional[Dict[str, float]] = calculate_prices_slidedWindow(h1_records, HOURS_PRICES_SLIDED_WINDOW_PERIOD)
+        if h1_records is None or len(h1_records) != HOURS_PRICES_SLIDED_WINDOW_PERIOD:
+            logger.error("❌ Не найдено часовых файлов для обработки скользящего окна цен. Пропускаем тик.")
+            return
+        
+        max_highs: Optional[Dict[str, float]] = calculate_prices_slidedWindow(h1_records, HOURS_PRICES_SLIDED_WINDOW_PERIOD)
 
     if max_highs is None:
         logger.error("❌ Обработка ценового часового окна прошла с ошибкой. Пропускаем тик.")
@@ -304,8 +375,6 @@ def doTick(servertime_ms: int):
     # Список тикеров, у которых превышен лимит на цены
     price_overlimit_tickers = []
 
-    last_minute_key = max(validated_klines.keys())
-    last_minute_candles = validated_klines[last_minute_key]
     price_alerts: Optional[dict[str, float]] = check_price_overlimit(last_minute_candles, max_highs)
 
     if price_alerts is None:
@@ -337,10 +406,10 @@ def doTick(servertime_ms: int):
     else:
         overlimit_tickers = [candle for candle in last_minute_candles if candle.symbol in volume_alerts]
         logger.info(f"✅ Проверка закончена. Зафиксировано {len(overlimit_tickers)} превышений")
-    # ====================== Step 10 ======================== #
-    # Оповещаю подключенных клиентов о новом сигнале и актуальной точке входа в сделку
+    # ======================================================= #
+    # Формирую алерты; рассылает их doTick в цикле событий
     #
-    # ======================================================= # 
+    # ======================================================= #
     logger.debug(f"Формируем алерты для отправки...")
     alerts: List[AlertRecord] = []
     for kline in overlimit_tickers:
@@ -348,22 +417,64 @@ def doTick(servertime_ms: int):
         logger.info(f"🔥🔥🔥 Зафиксирован алекрт по тикеру {kline.symbol}  time={alert.time} 🔥🔥🔥")
         alerts.append(alert)
 
-    logger.debug(f"Рассылаем алерты клиентам...")
+    return alerts
 
-    for alert in alerts:
-        alert_thread.send_alert(alert)
-        logger.info(f"🌐 Отправили алерт {alert}")
 
-    logger.debug(f"Все алерты разосланы клиентам...")
+async def tickLoop(client: UDPClient, subscription: Optional[KlinePushSubscription]):
+    """
+    Ежеминутные тики. С подпиской тик запускает рассылка новой минуты,
+    без неё – начало минуты по времени сервера плюс TICK_MINUTE_OFFSET секунд.
+    """
+    while True:
+        if subscription is not None:
+            pushed_klines = await subscription.wait_minutes(PUSH_WAIT_TIMEOUT)
+            if pushed_klines:
+                logger.debug(f"Получено рассылкой {len(pushed_klines)} минут")
+                save_klines_to_ram(pushed_klines)
+            else:
+                logger.warning(f"За {PUSH_WAIT_TIMEOUT} секунд не пришло ни одной минуты, выполняем тик с опросом сервера")
 
-def main():
+        start_time = time.time()
 
-    logger.info("Скрипт-стартер запущен.")
+        logger.info("# ====================== doTick ========================= #")
 
-    try:
+        server_time_diff_ms = int(time.time() * 1000)
+        diff = await request_server_time_diff(client)
+        if diff is not None:
+            logger.info(f"Текущая разница времени с сервером: {diff} мс")
+        else:
+            logger.warning("Не удалось получить разницу времени")
+            logger.info("# ===================== End Tick ======================== #")
+            logger.info("retry after 30s....")
+            await asyncio.sleep(30)
+            continue
+
+        await doTick(client, server_time_diff_ms, subscription)
+
+        logger.info("# ===================== End Tick ======================== #")
+        logger.info("")
+
+        elapsed = time.time() - start_time
+
+        # При подписке следующий тик запустит рассылка новой минуты
+        if subscription is None:
+            # Ждём начала следующей минуты по времени сервера
+            servertime_s = time.time() + diff / 1000
+            wait_time = 60 - servertime_s % 60 + TICK_MINUTE_OFFSET
+            logger.info(f"Function took {elapsed:.2f}s, waiting {wait_time:.2f}s")
+            await asyncio.sleep(wait_time)
+        else:
+            logger.info(f"Function took {elapsed:.2f}s")
+
+async def run():
+    """
+    Единственный цикл событий бота: общий UDPClient для всех запросов к серверу скачивания,
+    сервер сигналов, подписка на рассылку минут и задача ежеминутных тиков.
+    """
+    async with UDPClient() as client:
 
         # Получаем разницу времени с сервером
-        diff = get_server_time_diff()
+        diff = await request_server_time_diff(client)
         if diff is None:
             logger.error("❌ Не удалось получить время сервера. Выход.")
             return
@@ -372,14 +483,14 @@ def main():
 
         logger.info(f"Получаю список актуальных тикеров...")
         # TODO: Необходимо отработать моменты, когда отслеживаемые тикеры закрываются для торговли
-        trackable_tickers: list[str] = getTrackedTickers()
+        trackable_tickers: list[str] = await getTrackedTickers(client)
         if len(trackable_tickers) == 0:
             logger.error("❌ Не удалось получить список тикеров")
             return
         logger.info(f"✅ Найдено торгующихся тикеров: {len(trackable_tickers)}")
         # ======================================================= # 
 
-        klines_1m_full: OrderedDict[int, list[KlineRecord]] = download_candles_reccursively(servertime_ms, trackable_tickers, MAX_CACHED_CANDLES)
+        klines_1m_full: OrderedDict[int, list[KlineRecord]] = await download_candles_reccursively(client, servertime_ms, trackable_tickers, MAX_CACHED_CANDLES)
 
         logger.info(f"✅ Актуальные архивные данные за {len(klines_1m_full)} минут получены.")
 
@@ -398,46 +509,38 @@ def main():
         logger.info(f"✅ Проверка хранилища успешно пройдена.")
 
         logger.info(f"Запускаю основной аналитический цикл анализа...")
-        
-        # Запускаем сервер алертов в фоновом потоке
-        alert_thread.start()
-
-        while True:
-            start_time = time.time()
-
-            logger.info("# ====================== doTick ========================= #")
-
-            server_time_diff_ms = int(time.time() * 1000) 
-            diff = get_server_time_diff()
-            if diff is not None:
-                servertime_ms = server_time_diff_ms + diff
-                logger.info(f"Текущая разница времени с сервером: {diff} мс")
-            else:
-                logger.warning("Не удалось получить разницу времени")
-                logger.info("# ===================== End Tick ======================== #")
-                logger.info("retry after 30s....")
-                time.sleep(30)
-                continue;
-
-            doTick(server_time_diff_ms)
 
-            logger.info("# ===================== End Tick ======================== #")
-            logger.info("")
+        # Сервер алертов работает в этом же цикле событий
+        await alert_server.start()
+
+        # Подписываемся на рассылку закрытых минут: тик запускается сразу после закрытия минуты
+        subscription: Optional[KlinePushSubscription] = None
+        background: list[asyncio.Task] = []
+        if PUSH_SUBSCRIPTION_ENABLED:
+            subscription = KlinePushSubscription(client)
+            subscription.set_symbols(trackable_tickers)
+            subscription.start_from(max(get_1m_candles().keys()))
+            background.append(asyncio.create_task(subscription.run()))
+
+        try:
+            await tickLoop(client, subscription)
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+            alert_server.stop()
 
-            # Вычисляем сколько осталось ждать
-            elapsed = time.time() - start_time
-            wait_time = max(0, 60 - elapsed)  # минимум 0 секунд
-
-            logger.info(f"Function took {elapsed:.2f}s, waiting {wait_time:.2f}s")
+def main():
 
-            if wait_time > 0:
-                time.sleep(wait_time)
+    logger.info("Скрипт-стартер запущен.")
 
+    try:
+        asyncio.run(run())
     except KeyboardInterrupt:
         logger.info("Получен сигнал прерывания...")
-        alert_thread.stop()
-        alert_thread.join(timeout=2)
         logger.info("Остановлено пользователем")
+    finally:
+        analytics_executor.shutdown(wait=False, cancel_futures=True)
 
-main()
-
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
+import zlib
+
 from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterable
+from typing import Sequence
 
 from bot_types import KlineRecord
 
@@ -18,6 +23,40 @@ class PacketType(IntEnum):
     TIME_REQUEST = 3
     TIME_RESPONSE = 128 + TIME_REQUEST
 
+    # Запрос диапазона минут / фрагмент ответа (ответ состоит из нескольких пакетов)
+    KLINES_RANGE_REQUEST = 4
+    KLINES_RANGE_RESPONSE = 128 + KLINES_RANGE_REQUEST
+
+    # Подписка/отписка на рассылку закрытых минут
+    SUBSCRIBE_REQUEST = 5
+    SUBSCRIBE_RESPONSE = 128 + SUBSCRIBE_REQUEST
+    UNSUBSCRIBE_REQUEST = 6
+    UNSUBSCRIBE_RESPONSE = 128 + UNSUBSCRIBE_REQUEST
+
+    # Рассылка закрытой минуты подписчикам (сервер -> клиент, без запроса)
+    KLINES_PUSH = 128 + 7
+
+    # Запрос/ответ для получения таблицы номеров тикеров
+    SYMBOL_TABLE_REQUEST = 8
+    SYMBOL_TABLE_RESPONSE = 128 + SYMBOL_TABLE_REQUEST
+
+    # Запрос/ответ для получения свечей за минуту по выбранным тикерам (записи с номерами тикеров)
+    KLINES_SUBSET_REQUEST = 9
+    KLINES_SUBSET_RESPONSE = 128 + KLINES_SUBSET_REQUEST
+
+class PayloadVersion(IntEnum):
+    """
+    Кодирование свечей в payload (необязательный байт версии после данных пакета, без него – ROWS).
+    В запросе – старшая версия, которую понимает клиент; в ответе – версия, которой закодированы данные.
+    """
+    # записи KlineRecordSerializer, сжатые zlib
+    ROWS = 0
+    # колоночный кодек kline_codec без zlib
+    COLUMNAR = 1
+
+# Старшая поддерживаемая версия кодирования
+PAYLOAD_VERSION = PayloadVersion.COLUMNAR
+
 
 @dataclass
 class Packet:
@@ -27,6 +66,8 @@ class Packet:
     packet_number: int
     # размер поля данных пакета (4 байта)
     packet_lenght: int
+    # версия кодирования payload (необязательный 1 байт после данных, не входит в packet_lenght)
+    payload_version: PayloadVersion = PayloadVersion.ROWS
 
 class ServerResponseStatus:
     # успех
@@ -35,6 +76,10 @@ class ServerResponseStatus:
     NOT_FOUND = 1
     # сервер занят
     BUSY = 2
+    # версия таблицы номеров тикеров в запросе устарела – клиент должен запросить таблицу заново
+    TABLE_CHANGED = 3
+    # подписка не подтверждена – клиент должен повторить запрос с токеном из ответа
+    CONFIRM_SUBSCRIPTION = 4
 
 # ============================== Symbols requests ==================================================== #
 
@@ -64,8 +109,8 @@ class KlineResponse:
     minute_number: int
     # код статуса
     status: int
-    # список записей              
-    records: list[KlineRecord]
+    # список записей (при разборе ответа – KlineColumns)
+    records: Sequence[KlineRecord]
 
 # ============================== Kline requests ==================================================== #
 
@@ -82,4 +127,142 @@ class TimeResponse:
      # текущее время сервера (скорректированное) в миллисекундах
     server_time_ms: int
 
-    
\ No newline at end of file
+# ============================== Symbol table ==================================================== #
+
+@dataclass(frozen=True)
+class SymbolTable:
+    """
+    Таблица номеров тикеров сервера: номер тикера – его индекс в symbols.
+    Версия – CRC32 имён, поэтому одинаковые таблицы на сервере и клиенте имеют одинаковую версию.
+    """
+    # версия таблицы (4 байта)
+    version: int
+    # тикеры по номерам
+    symbols: tuple[str, ...]
+    # <ТИКЕР, НОМЕР>
+    ids: dict[str, int] = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'ids', {symbol: i for i, symbol in enumerate(self.symbols)})
+
+    @staticmethod
+    def build(symbols: Iterable[str]) -> 'SymbolTable':
+        symbols = tuple(symbols)
+        return SymbolTable(version=SymbolTable.version_of(symbols), symbols=symbols)
+
+    @staticmethod
+    def version_of(symbols: Iterable[str]) -> int:
+        return zlib.crc32(b''.join(s.encode('utf-8')[:16].ljust(16, b'\x00') for s in symbols))
+
+    def bitmap(self, symbols: Iterable[str]) -> bytes:
+        """Битовая маска номеров тикеров: бит i (младший бит байта i // 8 – первый) – тикер с номером i.
+        Тикеры, которых нет в таблице, пропускаются."""
+        mask = bytearray((len(self.symbols) + 7) // 8)
+        for symbol in symbols:
+            i = self.ids.get(symbol)
+            if i is not None:
+                mask[i >> 3] |= 1 << (i & 7)
+        return bytes(mask)
+
+@dataclass
+class SymbolTableRequest:
+    pass
+
+@dataclass
+class SymbolTableResponse:
+    # код статуса (4 байта)
+    status: int
+    # таблица номеров тикеров
+    table: SymbolTable
+
+@dataclass
+class KlinesSubsetRequest:
+    # номер минуты (4 байта)
+    minute_number: int
+    # версия таблицы номеров тикеров, по которой построена маска (4 байта)
+    table_version: int
+    # битовая маска нужных номеров тикеров
+    symbol_bitmap: bytes
+
+# ============================== Kline range requests ==================================================== #
+
+@dataclass
+class KlinesRangeRequest:
+    # первая минута диапазона (4 байта)
+    start_minute: int
+    # количество минут (4 байта)
+    count: int
+    # версия таблицы номеров тикеров, по которой построена маска (4 байта)
+    table_version: int = 0
+    # битовая маска нужных номеров тикеров (пустая – все тикеры, записи с именами тикеров)
+    symbol_bitmap: bytes = b''
+    # номера фрагментов для (пере)отправки (пустой список – первые фрагменты потока)
+    fragments: list[int] = field(default_factory=list)
+
+@dataclass
+class KlinesRangeFragment:
+    # первая минута диапазона (4 байта)
+    start_minute: int
+    # количество минут (4 байта)
+    count: int
+    # код статуса (4 байта)
+    status: int
+    # CRC32 всего потока (4 байта): фрагменты с разным CRC относятся к разным версиям данных
+    stream_crc: int
+    # номер фрагмента (2 байта)
+    fragment_index: int
+    # всего фрагментов в потоке (2 байта)
+    fragment_count: int
+    # часть потока
+    data: bytes
+    # версия кодирования потока (из заголовка пакета, в payload не входит)
+    payload_version: int = PayloadVersion.ROWS
+
+@dataclass
+class KlinesRangeResponse:
+    # код статуса
+    status: int
+    # ответы по минутам, за которые на сервере есть свечи
+    minutes: list[KlineResponse]
+
+# ============================== Push subscription ==================================================== #
+
+@dataclass
+class SubscribeRequest:
+    """
+    Подписка на рассылку закрытых минут. Подписку нужно продлевать чаще, чем раз в TTL.
+    Сервер включает рассылку только после запроса с токеном, выданным на адрес клиента:
+    так подписать чужой (поддельный) адрес нельзя.
+    """
+    # токен из последнего SubscribeResponse (4 байта, 0 – токена ещё нет)
+    token: int = 0
+
+@dataclass
+class SubscribeResponse:
+    # код статуса (4 байта)
+    status: int
+    # номер последней разосланной минуты (4 байта, 0 – рассылок ещё не было)
+    sequence: int
+    # последняя опубликованная минута (4 байта)
+    published_minute: int
+    # время жизни подписки в секундах (4 байта)
+    ttl_seconds: int
+    # токен адреса клиента, который нужно передавать в следующих запросах (4 байта)
+    token: int = 0
+
+@dataclass
+class UnsubscribeRequest:
+    # токен подписки (4 байта): без верного токена подписка не снимается
+    token: int = 0
+
+@dataclass
+class UnsubscribeResponse:
+    # код статуса (4 байта)
+    status: int
+
+@dataclass
+class KlinesPush:
+    # порядковый номер рассылки (4 байта): пропуск номера – потерянная минута
+    sequence: int
+    # минута в том же формате, что и ответ на KLINES_REQUEST
+    kline: KlineResponse
@@ -0,0 +1,70 @@
+"""
+Общая основа состояний, которые ведутся по минутам хранилища свечей.
+
+Наследники (скользящие окна IncrementalAnalytics, счётчики ValidityTracker) реализуют
+добавление одной минуты, а дописывание новых минут и построение заново при разрыве
+делает StorageFollower.sync.
+"""
+
+from abc import ABC
+from abc import abstractmethod
+from collections import OrderedDict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from AnalyticsBot.logger import logger
+
+from AnalyticsBot.bot_types import KlineRecord
+
+class StorageFollower(ABC):
+    """
+    Основа для состояний, которые ведутся по минутам хранилища свечей.
+
+    sync дописывает минуты после последней учтённой; при первом вызове или разрыве состояние
+    строится заново по последним span минутам хранилища. Наследник задаёт span и реализует
+    reset() и push(minute, candles).
+    """
+
+    # Сколько последних минут хранилища нужно, чтобы построить состояние заново
+    span: int
+    last_minute: Optional[int] = None
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Очищает состояние."""
+
+    @abstractmethod
+    def push(self, minute: int, candles: Sequence[KlineRecord]) -> bool:
+        """Учитывает следующую минуту; возвращает False, если минута отброшена."""
+
+    def sync(self, candle_dict: OrderedDict[int, List[KlineRecord]]) -> int:
+        """
+        Учитывает минуты хранилища после последней учтённой и возвращает их количество.
+        Если последней учтённой минуты в хранилище нет (первый вызов, хранилище собрано
+        заново), состояние строится по последним минутам хранилища.
+        """
+        if self.last_minute is None or self.last_minute not in candle_dict:
+            return self.rebuild(candle_dict)
+
+        added = 0
+        minute = self.last_minute + 1
+        while minute in candle_dict:
+            self.push(minute, candle_dict[minute])
+            minute += 1
+            added += 1
+
+        # Новые минуты дописываются в конец хранилища: если последняя новее учтённой,
+        # перед ней разрыв, и состояние проще построить заново
+        if candle_dict and next(reversed(candle_dict)) > self.last_minute:
+            return self.rebuild(candle_dict)
+        return added
+
+    def rebuild(self, candle_dict: OrderedDict[int, List[KlineRecord]]) -> int:
+        """Строит состояние заново по последним span минутам хранилища."""
+        self.reset()
+        minutes = sorted(candle_dict.keys())[-self.span:]
+        for minute in minutes:
+            self.push(minute, candle_dict[minute])
+        logger.info(f"{type(self).__name__}: состояние построено заново по {len(minutes)} минутам")
+        return len(minutes)
@@ -7,7 +7,10 @@ from AnalyticsBot.logger import logger
 from AnalyticsBot.config import *
 from collections import OrderedDict
 
+import numpy as np
+
 from AnalyticsBot.bot_types import KlineRecord 
+from AnalyticsBot.bot_types import KlineColumns
 from AnalyticsBot.bot_types import HoursRecord 
 from AnalyticsBot.bot_types import AlertRecord 
 
@@ -50,6 +53,14 @@ def is_storage_consistent(candle_dict: OrderedDict[int, List[KlineRecord]]) -> b
 
     # 2. Проверка совпадения open_time с ключом
     for minute, records in candle_dict.items():
+        # Колонки проверяем целиком, не создавая KlineRecord
+        if isinstance(records, KlineColumns):
+            wrong = np.flatnonzero(records.open_time != minute * 60000)
+            if wrong.size:
+                print(f"Ошибка: запись {records[int(wrong[0])]} имеет open_time={_format_ts(int(records.open_time[wrong[0]]))}, "
+                      f"не совпадающий с ключом {_format_ts(minute * 60000)}")
+                return False
+            continue
         for record in records:
             if record.open_time != minute * 60000:
                 print(f"Ошибка: запись {record} имеет open_time={_format_ts(record.open_time)}, "
@@ -1,6 +1,8 @@
 import asyncio
+import socket
+import zlib
 
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Callable
 
 from AnalyticsBot.logger import logger
 from AnalyticsBot.config import *
@@ -16,6 +18,12 @@ class UDPClientProtocol(asyncio.DatagramProtocol):
         self.transport = None
         self.pending_futures: Dict[int, asyncio.Future] = {}
         self.timeout_handles: Dict[int, asyncio.TimerHandle] = {}
+        # Запросы диапазонов: на один packet_number приходит несколько фрагментов
+        self.pending_ranges: Dict[int, RangeCollector] = {}
+        # Обработчик рассылки закрытых минут (KLINES_PUSH)
+        self.push_handler: Optional[Callable[[KlinesPush], None]] = None
+        # Таблица номеров тикеров сервера для разбора KLINES_SUBSET_RESPONSE и потоков с маской
+        self.symbol_table: Optional[SymbolTable] = None
 
     def connection_made(self, transport):
         self.transport = transport
@@ -25,9 +33,19 @@ class UDPClientProtocol(asyncio.DatagramProtocol):
         if not parsed:
             logger.error("Некорректный заголовок пакета")
             return
-        ptype, packet_number, payload = parsed
+        ptype, version, packet_number, payload = parsed
 
-        if ptype not in (PacketType.KLINES_RESPONSE, PacketType.SYMBOLS_RESPONSE,  PacketType.TIME_RESPONSE):
+        if ptype == PacketType.KLINES_RANGE_RESPONSE:
+            self._range_fragment_received(packet_number, payload, version)
+            return
+
+        if ptype == PacketType.KLINES_PUSH:
+            self._push_received(payload, version)
+            return
+
+        if ptype not in (PacketType.KLINES_RESPONSE, PacketType.SYMBOLS_RESPONSE,  PacketType.TIME_RESPONSE,
+                         PacketType.SUBSCRIBE_RESPONSE, PacketType.UNSUBSCRIBE_RESPONSE,
+                         PacketType.SYMBOL_TABLE_RESPONSE, PacketType.KLINES_SUBSET_RESPONSE):
             logger.warning(f"Получен пакет не-ответ: {ptype}")
             return
 
@@ -42,9 +60,18 @@ class UDPClientProtocol(asyncio.DatagramProtocol):
 
         try:
             if ptype == PacketType.KLINES_RESPONSE:
-                response = self.serializer.deserialize_kline_response(payload)
+                response = self.serializer.deserialize_kline_response(payload, payload_version=version)
             elif ptype == PacketType.TIME_RESPONSE:
                 response = self.serializer.deserialize_time_response(payload)
+            elif ptype == PacketType.SUBSCRIBE_RESPONSE:
+                response = self.serializer.deserialize_subscribe_response(payload)
+            elif ptype == PacketType.UNSUBSCRIBE_RESPONSE:
+                response = self.serializer.deserialize_unsubscribe_response(payload)
+            elif ptype == PacketType.SYMBOL_TABLE_RESPONSE:
+                response = self.serializer.deserialize_symbol_table_response(payload)
+            elif ptype == PacketType.KLINES_SUBSET_RESPONSE:
+                symbols = self.symbol_table.symbols if self.symbol_table is not None else ()
+                response = self.serializer.deserialize_kline_response(payload, symbols, version)
             else:
                 response = self.serializer.deserialize_symbols_response(payload)
 
@@ -56,11 +83,49 @@ class UDPClientProtocol(asyncio.DatagramProtocol):
         except Exception as e:
             future.set_exception(e)
 
+    def _push_received(self, payload: bytes, version: int):
+        if self.push_handler is None:
+            logger.debug("Получена рассылка минуты без подписки")
+            return
+        push = self.serializer.deserialize_klines_push(payload, version)
+        if push is None:
+            logger.error("Некорректный пакет рассылки минуты")
+            return
+        try:
+            self.push_handler(push)
+        except Exception as e:
+            logger.error(f"Ошибка обработки рассылки минуты: {e}")
+
+    def _range_fragment_received(self, packet_number: int, payload: bytes, version: int):
+        collector = self.pending_ranges.get(packet_number)
+        if collector is None:
+            logger.debug(f"Фрагмент с неизвестным packet_number={packet_number}")
+            return
+
+        fragment = self.serializer.deserialize_kline_range_fragment(payload, version)
+        if fragment is None:
+            logger.error("Некорректный фрагмент диапазона")
+            return
+
+        if collector.add(fragment):
+            self._finish_range(packet_number)
+        else:
+            # Перезапускаем таймер паузы: фрагменты, не пришедшие за паузу, считаем потерянными
+            collector.restart_gap_timer(lambda: self._finish_range(packet_number))
+
+    def _finish_range(self, packet_number: int):
+        collector = self.pending_ranges.pop(packet_number, None)
+        if collector is not None:
+            collector.finish()
+
     def error_received(self, exc):
         for future in self.pending_futures.values():
             if not future.done():
                 future.set_exception(exc)
         self.pending_futures.clear()
+        for collector in self.pending_ranges.values():
+            collector.fail(exc)
+        self.pending_ranges.clear()
         for handle in self.timeout_handles.values():
             handle.cancel()
         self.timeout_handles.clear()
@@ -84,13 +149,147 @@ class UDPClientProtocol(asyncio.DatagramProtocol):
         self.transport.sendto(data, addr)
         return await future
 
+    async def send_range_request(self, data: bytes, addr: Tuple[str, int], packet_number: int, expected: Optional[list[int]],
+                                 timeout: float, rtt: Optional["RttEstimator"] = None) -> list[KlinesRangeFragment]:
+        """
+        Отправляет запрос диапазона и собирает фрагменты ответа.
+
+        Ожидание заканчивается, когда пришли все ожидаемые фрагменты, когда после последнего
+        фрагмента прошла пауза RANGE_FRAGMENT_GAP, или по таймауту.
+
+        Если задан rtt, запрос без единого фрагмента ответа повторяется через RTO (с удвоением
+        на каждый повтор) с тем же packet_number, так что запоздавший ответ на первую отправку
+        тоже принимается. Время до первого фрагмента запроса без повторов уточняет RTO.
+
+        Returns:
+            полученные фрагменты (возможно, не все). Пустой список – ответа не было.
+        """
+        if self.transport is None:
+            raise RuntimeError("Транспорт не инициализирован")
+        loop = asyncio.get_running_loop()
+        collector = RangeCollector(loop.create_future(), expected)
+        self.pending_ranges[packet_number] = collector
+
+        handle = loop.call_later(timeout, self._finish_range, packet_number)
+        sent_at = loop.time()
+        retransmits = 0
+        retransmit_handle: Optional[asyncio.TimerHandle] = None
+
+        def retransmit(rto: float):
+            nonlocal retransmits, retransmit_handle
+            if collector.fragments or collector.future.done() or self.transport is None:
+                return
+            retransmits += 1
+            rtt.backoff()
+            logger.debug(f"Нет ответа на запрос диапазона {packet_number} за {rto:.2f}с, повтор {retransmits}")
+            self.transport.sendto(data, addr)
+            retransmit_handle = loop.call_later(2 * rto, retransmit, 2 * rto)
+
+        try:
+            self.transport.sendto(data, addr)
+            if rtt is not None:
+                retransmit_handle = loop.call_later(rtt.rto, retransmit, rtt.rto)
+            fragments = await collector.future
+            if rtt is not None and retransmits == 0 and collector.first_fragment_at is not None:
+                rtt.sample(collector.first_fragment_at - sent_at)
+            return fragments
+        finally:
+            handle.cancel()
+            if retransmit_handle is not None:
+                retransmit_handle.cancel()
+            collector.cancel_gap_timer()
+            self.pending_ranges.pop(packet_number, None)
+
+class RttEstimator:
+    """
+    Время ответа сервера и таймаут повтора запроса (RTO), как у TCP (RFC 6298).
+
+    SRTT и RTTVAR – экспоненциальные средние задержки и её отклонения, RTO = SRTT + 4 * RTTVAR
+    в пределах [min_rto, max_rto]. Повтор по таймауту удваивает RTO до следующего замера.
+    Замеры берутся только с запросов без повторов (алгоритм Карна): ответ на повторённый
+    запрос нельзя отнести к конкретной отправке.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self, initial: float = RTO_INITIAL, min_rto: float = RTO_MIN, max_rto: float = RTO_MAX):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.rto = min(max(initial, min_rto), max_rto)
+
+    def sample(self, rtt: float) -> None:
+        """Учитывает время ответа rtt секунд на запрос без повторов."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+    def backoff(self) -> None:
+        """Учитывает повтор запроса по таймауту."""
+        self.rto = min(self.rto * 2, self.max_rto)
+
+class RangeCollector:
+    """Накопитель фрагментов ответа на один запрос диапазона."""
+
+    def __init__(self, future: asyncio.Future, expected: Optional[list[int]]):
+        self.future = future
+        # Ожидаемые номера фрагментов (None – первые фрагменты потока, количество заранее неизвестно)
+        self.expected = set(expected) if expected else None
+        self.fragments: list[KlinesRangeFragment] = []
+        self._received: set[int] = set()
+        # Время прихода первого фрагмента (loop.time())
+        self.first_fragment_at: Optional[float] = None
+        self._gap_handle: Optional[asyncio.TimerHandle] = None
+
+    def add(self, fragment: KlinesRangeFragment) -> bool:
+        """Добавляет фрагмент. True – больше ждать нечего."""
+        if self.first_fragment_at is None:
+            self.first_fragment_at = asyncio.get_running_loop().time()
+        self.fragments.append(fragment)
+        self._received.add(fragment.fragment_index)
+        if fragment.status != ServerResponseStatus.OK:
+            return True
+        expected = self.expected
+        if expected is None:
+            expected = set(range(min(fragment.fragment_count, RANGE_FIRST_BURST_FRAGMENTS)))
+        return expected <= self._received
+
+    def restart_gap_timer(self, callback) -> None:
+        self.cancel_gap_timer()
+        self._gap_handle = asyncio.get_running_loop().call_later(RANGE_FRAGMENT_GAP, callback)
+
+    def cancel_gap_timer(self) -> None:
+        if self._gap_handle is not None:
+            self._gap_handle.cancel()
+            self._gap_handle = None
+
+    def finish(self) -> None:
+        self.cancel_gap_timer()
+        if not self.future.done():
+            self.future.set_result(self.fragments)
+
+    def fail(self, exc: Exception) -> None:
+        self.cancel_gap_timer()
+        if not self.future.done():
+            self.future.set_exception(exc)
 
 class UDPClient:
-    def __init__(self, serializer: Optional[ProtocolSerializer] = None):
+    def __init__(self, serializer: Optional[ProtocolSerializer] = None, payload_version: int = PAYLOAD_VERSION):
         self.serializer = serializer or ProtocolSerializer()
+        # Самая новая версия payload свечей, которую понимает клиент: сервер отвечает в ней или в более старой
+        self.payload_version = payload_version
         self.transport = None
         self.protocol = None
         self._packet_counter = 0
+        # Таймаут повтора запросов диапазона по измеренному времени ответа сервера
+        self.rtt = RttEstimator()
+        self._table_lock = asyncio.Lock()
 
     async def __aenter__(self):
         await self.connect()
@@ -105,6 +304,13 @@ class UDPClient:
             lambda: UDPClientProtocol(self.serializer),
             local_addr=(ALERT_SERVER_IP, 0)
         )
+        # Ответ на запрос диапазона приходит пачкой фрагментов – увеличиваем буфер приёма
+        sock = self.transport.get_extra_info('socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RANGE_RECEIVE_BUFFER)
+            except OSError as e:
+                logger.warning(f"Не удалось увеличить буфер приёма UDP: {e}")
 
     def _next_packet_number(self) -> int:
         self._packet_counter += 1
@@ -115,7 +321,7 @@ class UDPClient:
             raise RuntimeError("Клиент не подключён. Вызовите connect() или используйте async with.")
         pnum = packet_number if packet_number is not None else self._next_packet_number()
         req = KlineRequest(minute_number=minute_number)
-        data = self.serializer.serialize_kline_request(req, pnum)
+        data = self.serializer.serialize_kline_request(req, pnum, self.payload_version)
         response = await self.protocol.send_request(data, server_addr, pnum, timeout)
         if not isinstance(response, KlineResponse):
             raise TypeError(f"Ожидался KlineResponse, получен {type(response)}")
@@ -143,6 +349,165 @@ class UDPClient:
             raise TypeError(f"Ожидался TimeResponse, получен {type(response)}")
         return response
 
+    async def request_symbol_table(self, server_addr: Tuple[str, int], timeout: float = 10.0, packet_number: Optional[int] = None) -> SymbolTableResponse:
+        """Запрашивает таблицу номеров тикеров; при успехе она запоминается для запросов с маской тикеров."""
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+        pnum = packet_number if packet_number is not None else self._next_packet_number()
+        data = self.serializer.serialize_symbol_table_request(SymbolTableRequest(), pnum)
+        response = await self.protocol.send_request(data, server_addr, pnum, timeout)
+        if not isinstance(response, SymbolTableResponse):
+            raise TypeError(f"Ожидался SymbolTableResponse, получен {type(response)}")
+        if response.status == ServerResponseStatus.OK:
+            self.protocol.symbol_table = response.table
+        return response
+
+    async def _current_symbol_table(self, server_addr: Tuple[str, int], timeout: float) -> tuple[int, Optional[SymbolTable]]:
+        """(статус, таблица): запомненная таблица или, если её нет, свежая с сервера."""
+        if self.protocol.symbol_table is not None:
+            return ServerResponseStatus.OK, self.protocol.symbol_table
+        # Параллельные запросы ждут одну таблицу, а не запрашивают каждый свою
+        async with self._table_lock:
+            if self.protocol.symbol_table is not None:
+                return ServerResponseStatus.OK, self.protocol.symbol_table
+            response = await self.request_symbol_table(server_addr, timeout)
+            return response.status, self.protocol.symbol_table
+
+    async def request_klines_subset(self, minute_number: int, server_addr: Tuple[str, int], symbols: list[str], timeout: float = 10.0) -> KlineResponse:
+        """
+        Запрашивает свечи за минуту только по указанным тикерам (KLINES_SUBSET_REQUEST).
+        Если таблица номеров тикеров на сервере сменилась, она запрашивается заново и запрос повторяется.
+        """
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+        response = None
+        for _ in range(2):
+            status, table = await self._current_symbol_table(server_addr, timeout)
+            if status != ServerResponseStatus.OK:
+                return KlineResponse(minute_number=minute_number, status=status, records=[])
+            pnum = self._next_packet_number()
+            req = KlinesSubsetRequest(minute_number=minute_number, table_version=table.version,
+                                      symbol_bitmap=table.bitmap(symbols))
+            data = self.serializer.serialize_kline_subset_request(req, pnum, self.payload_version)
+            response = await self.protocol.send_request(data, server_addr, pnum, timeout)
+            if not isinstance(response, KlineResponse):
+                raise TypeError(f"Ожидался KlineResponse, получен {type(response)}")
+            if response.status != ServerResponseStatus.TABLE_CHANGED:
+                break
+            logger.info("Таблица тикеров сервера изменилась, запрашиваем заново")
+            self.protocol.symbol_table = None
+        return response
+
+    def set_push_handler(self, handler: Optional[Callable[[KlinesPush], None]]) -> None:
+        """Устанавливает обработчик рассылки закрытых минут (вызывается в цикле событий клиента)."""
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+        self.protocol.push_handler = handler
+
+    async def subscribe(self, server_addr: Tuple[str, int], token: int = 0, timeout: float = 10.0,
+                        packet_number: Optional[int] = None) -> SubscribeResponse:
+        """
+        Подписывается (или продлевает подписку) на рассылку закрытых минут.
+        token – токен из прошлого ответа; без верного токена сервер отвечает CONFIRM_SUBSCRIPTION с новым.
+        """
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+        pnum = packet_number if packet_number is not None else self._next_packet_number()
+        data = self.serializer.serialize_subscribe_request(SubscribeRequest(token=token), pnum, self.payload_version)
+        response = await self.protocol.send_request(data, server_addr, pnum, timeout)
+        if not isinstance(response, SubscribeResponse):
+            raise TypeError(f"Ожидался SubscribeResponse, получен {type(response)}")
+        return response
+
+    async def unsubscribe(self, server_addr: Tuple[str, int], token: int = 0, timeout: float = 10.0,
+                          packet_number: Optional[int] = None) -> UnsubscribeResponse:
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+        pnum = packet_number if packet_number is not None else self._next_packet_number()
+        data = self.serializer.serialize_unsubscribe_request(UnsubscribeRequest(token=token), pnum)
+        response = await self.protocol.send_request(data, server_addr, pnum, timeout)
+        if not isinstance(response, UnsubscribeResponse):
+            raise TypeError(f"Ожидался UnsubscribeResponse, получен {type(response)}")
+        return response
+
+    async def request_klines_range(self, start_minute: int, count: int, server_addr: Tuple[str, int], symbols: Optional[list[str]] = None, timeout: float = 10.0) -> KlinesRangeResponse:
+        """
+        Скачивает диапазон минут [start_minute, start_minute + count) запросами KLINES_RANGE_REQUEST.
+
+        Сервер отвечает первыми RANGE_FIRST_BURST_FRAGMENTS фрагментами потока, остальные
+        (и потерянные) запрашиваются выборочно, по RANGE_FRAGMENTS_PER_REQUEST за раз. Если данные на сервере обновились
+        (сменился CRC потока), сборка начинается заново.
+
+        symbols – нужные тикеры: передаются маской номеров по таблице тикеров сервера,
+        записи приходят с номерами вместо имён. Если таблица сменилась, она запрашивается заново.
+
+        Raises:
+            asyncio.TimeoutError: сервер не ответил ни одним фрагментом
+            ValueError: собранный поток не совпал с CRC или не разобрался
+        """
+        if not self.protocol:
+            raise RuntimeError("Клиент не подключён.")
+
+        if not symbols:
+            return await self._request_klines_range(start_minute, count, server_addr, None, b'', timeout)
+
+        response = None
+        for _ in range(2):
+            status, table = await self._current_symbol_table(server_addr, timeout)
+            if status != ServerResponseStatus.OK:
+                return KlinesRangeResponse(status=status, minutes=[])
+            response = await self._request_klines_range(start_minute, count, server_addr, table, table.bitmap(symbols), timeout)
+            if response.status != ServerResponseStatus.TABLE_CHANGED:
+                break
+            logger.info("Таблица тикеров сервера изменилась, запрашиваем заново")
+            self.protocol.symbol_table = None
+        return response
+
+    async def _request_klines_range(self, start_minute: int, count: int, server_addr: Tuple[str, int],
+                                    table: Optional[SymbolTable], symbol_bitmap: bytes, timeout: float) -> KlinesRangeResponse:
+        """Собирает поток диапазона; table – таблица, по которой построена маска (None – все тикеры)."""
+        received: Dict[int, bytes] = {}
+        stream_crc: Optional[int] = None
+        stream_version = PayloadVersion.ROWS
+        fragment_count = 0
+        requested: list[int] = []
+
+        while True:
+            pnum = self._next_packet_number()
+            req = KlinesRangeRequest(start_minute=start_minute, count=count,
+                                     table_version=table.version if table is not None else 0,
+                                     symbol_bitmap=symbol_bitmap, fragments=requested)
+            data = self.serializer.serialize_kline_range_request(req, pnum, self.payload_version)
+            fragments = await self.protocol.send_range_request(data, server_addr, pnum, requested, timeout, self.rtt)
+            if not fragments:
+                raise asyncio.TimeoutError(f"Таймаут {timeout}с для диапазона {start_minute}+{count}")
+
+            for fragment in fragments:
+                if fragment.status != ServerResponseStatus.OK:
+                    return KlinesRangeResponse(status=fragment.status, minutes=[])
+                if fragment.stream_crc != stream_crc:
+                    if stream_crc is not None:
+                        logger.debug(f"Данные диапазона {start_minute}+{count} обновились, сборка начинается заново")
+                    received.clear()
+                    stream_crc = fragment.stream_crc
+                    stream_version = fragment.payload_version
+                    fragment_count = fragment.fragment_count
+                received[fragment.fragment_index] = fragment.data
+
+            missing = [i for i in range(fragment_count) if i not in received]
+            if not missing:
+                break
+            requested = missing[:RANGE_FRAGMENTS_PER_REQUEST]
+
+        stream = b''.join(received[i] for i in range(fragment_count))
+        if zlib.crc32(stream) != stream_crc:
+            raise ValueError(f"CRC потока диапазона {start_minute}+{count} не совпал")
+        minutes = self.serializer.deserialize_kline_range_stream(stream, table.symbols if table is not None else None,
+                                                                 stream_version)
+        if minutes is None:
+            raise ValueError(f"Ошибка десериализации потока диапазона {start_minute}+{count}")
+        return KlinesRangeResponse(status=ServerResponseStatus.OK, minutes=minutes)
+
     def close(self):
         if self.transport:
             self.transport.close()
@@ -0,0 +1,285 @@
+"""
+Инкрементальная проверка тикеров хранилища вместо полного прохода validate_ticker.
+
+По каждому тикеру ведутся счётчики за окно последних MAX_CACHED_CANDLES минут:
+сколько минут он присутствует, сколько из них с нулевым объёмом и сколько с некорректной
+свечой (отрицательный объём, high < low, open/close вне [low, high], open_time не своей минуты).
+Флаги каждой минуты лежат в кольцевом буфере: когда минута уходит из окна, её флаги
+вычитаются из счётчиков. Добавление минуты стоит O(тикеров минуты), ответ «валиден ли тикер»
+– O(1), и тикер с испорченной минутой снова становится валидным, когда она уходит из окна.
+
+Критерии те же, что у validate_ticker: тикер есть во всех минутах окна, в окне нет
+некорректных свечей, а нулевых объёмов не больше половины.
+"""
+
+from collections import OrderedDict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from AnalyticsBot.logger import logger
+from AnalyticsBot.config import *
+
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.storage_follower import StorageFollower
+
+# Флаги тикера в минуте
+PRESENT = 1
+ZERO_VOLUME = 2
+INVALID = 4
+
+# Индексы полей KlineColumns.values
+OPEN, CLOSE, HIGH, LOW, VOLUME, QUOTE_VOLUME = range(6)
+
+# Сколько тикеров перечислять в логе смены валидности
+LOGGED_SYMBOLS = 20
+
+class ValidityTracker(StorageFollower):
+    """
+    Валидность тикеров за окно window последних минут.
+
+    Пока учтено меньше window минут, окном считаются все учтённые минуты – как у
+    validate_ticker на неполном хранилище. Пропущенные минуты (разрыв хранилища) считаются
+    минутами без свечей и тоже выходят из окна со временем.
+    """
+
+    def __init__(self, window: int = MAX_CACHED_CANDLES, max_zero_ratio: float = 0.5,
+                 symbols_capacity: int = 64):
+        if window <= 0:
+            raise ValueError("window must be positive")
+
+        self.window = window
+        self.span = window
+        self.max_zero_ratio = max_zero_ratio
+
+        self._columns: dict[str, int] = {}
+        self._symbols: list[str] = []
+        self._width = max(1, symbols_capacity)
+        self._last_symbols: Optional[list[str]] = None
+        self._last_columns: Optional[np.ndarray] = None
+        self._valid_before: Optional[set[str]] = None
+
+        self._allocate(self._width)
+        self.reset()
+
+    def _allocate(self, width: int) -> None:
+        # Флаги [минута, тикер] и пропущенные минуты окна
+        self._flags = np.zeros((self.window, width), dtype=np.uint8)
+        self._missing = np.zeros(self.window, dtype=bool)
+
+        self._present = np.zeros(width, dtype=np.int32)
+        self._zero = np.zeros(width, dtype=np.int32)
+        self._invalid = np.zeros(width, dtype=np.int32)
+        # Первая и последняя минута, в которой тикер встречался (для причин отбраковки)
+        self._first_seen = np.full(width, -1, dtype=np.int64)
+        self._last_seen = np.full(width, -1, dtype=np.int64)
+
+    def reset(self) -> None:
+        """Забывает все учтённые минуты (колонки тикеров сохраняются)."""
+        self._allocate(self._width)
+        self.last_minute: Optional[int] = None
+        # Сколько минут учтено с последнего сброса
+        self.minutes = 0
+        # Сколько пропущенных минут в окне
+        self.missing_minutes = 0
+
+    @property
+    def symbols(self) -> list[str]:
+        return list(self._symbols)
+
+    @property
+    def expected(self) -> int:
+        """Длина окна в минутах: столько раз должен встретиться валидный тикер."""
+        return min(self.minutes, self.window)
+
+    def _grow(self, width: int) -> None:
+        extra = width - self._width
+
+        def pad(array: np.ndarray, value) -> np.ndarray:
+            padding = np.full(array.shape[:-1] + (extra,), value, dtype=array.dtype)
+            return np.concatenate([array, padding], axis=-1)
+
+        self._flags = pad(self._flags, 0)
+        self._present = pad(self._present, 0)
+        self._zero = pad(self._zero, 0)
+        self._invalid = pad(self._invalid, 0)
+        self._first_seen = pad(self._first_seen, -1)
+        self._last_seen = pad(self._last_seen, -1)
+        self._width = width
+
+    def _column(self, symbol: str) -> int:
+        column = self._columns.get(symbol)
+        if column is None:
+            column = len(self._symbols)
+            if column >= self._width:
+                self._grow(self._width * 2)
+            self._columns[symbol] = column
+            self._symbols.append(symbol)
+        return column
+
+    def _minute_flags(self, minute: int, candles: Sequence[KlineRecord]) -> tuple[np.ndarray, np.ndarray]:
+        """Колонки и флаги свечей одной минуты."""
+        if not isinstance(candles, KlineColumns):
+            candles = KlineColumns.from_records(candles)
+
+        values = candles.values
+        invalid = ((values[:, QUOTE_VOLUME] < 0) | (values[:, VOLUME] < 0)
+                   | (values[:, HIGH] < values[:, LOW])
+                   | (values[:, OPEN] < values[:, LOW]) | (values[:, OPEN] > values[:, HIGH])
+                   | (values[:, CLOSE] < values[:, LOW]) | (values[:, CLOSE] > values[:, HIGH])
+                   | (candles.open_time != minute * 60000))
+        flags = (PRESENT
+                 | np.where(values[:, QUOTE_VOLUME] == 0, ZERO_VOLUME, 0)
+                 | np.where(invalid, INVALID, 0)).astype(np.uint8)
+
+        if invalid.any():
+            bad = [candles.symbols[i] for i in np.flatnonzero(invalid)[:LOGGED_SYMBOLS].tolist()]
+            logger.warning(f"Некорректные свечи в минуте {minute}: {int(invalid.sum())} шт. ({', '.join(bad)})")
+
+        if candles.symbols != self._last_symbols:
+            self._last_columns = np.array([self._column(s) for s in candles.symbols], dtype=np.intp)
+            self._last_symbols = list(candles.symbols)
+        return self._last_columns, flags
+
+    def push(self, minute: int, candles: Sequence[KlineRecord]) -> bool:
+        """
+        Учитывает свечи минуты minute. False – минута не новее последней учтённой.
+        Пропуск перед minute учитывается как минуты без свечей.
+        """
+        if self.last_minute is not None and minute <= self.last_minute:
+            logger.warning(f"Минута {minute} не новее последней учтённой {self.last_minute}, пропускаем")
+            return False
+
+        columns, flags = self._minute_flags(minute, candles)
+
+        if self.last_minute is not None and minute - self.last_minute > 1:
+            missing = minute - self.last_minute - 1
+            logger.warning(f"Пропуск {missing} минут перед {minute} при проверке тикеров")
+            if missing >= self.window:
+                # Всё окно ушло в пропуск: проверка начинается заново с этой минуты
+                self.reset()
+            else:
+                empty = np.empty(0, dtype=np.intp)
+                for gap_minute in range(self.last_minute + 1, minute):
+                    self._push_row(gap_minute, empty, np.empty(0, dtype=np.uint8), missing=True)
+
+        self._push_row(minute, columns, flags, missing=False)
+        return True
+
+    def _push_row(self, minute: int, columns: np.ndarray, flags: np.ndarray, missing: bool) -> None:
+        slot = minute % self.window
+
+        # Минута minute - window уходит из окна
+        if self.minutes >= self.window:
+            old = self._flags[slot]
+            self._present -= old & PRESENT
+            self._zero -= (old & ZERO_VOLUME) >> 1
+            self._invalid -= (old & INVALID) >> 2
+            self.missing_minutes -= int(self._missing[slot])
+
+        row = self._flags[slot]
+        row[:] = 0
+        row[columns] = flags
+        self._missing[slot] = missing
+        self.missing_minutes += int(missing)
+
+        self._present += row & PRESENT
+        self._zero += (row & ZERO_VOLUME) >> 1
+        self._invalid += (row & INVALID) >> 2
+        first = columns[self._first_seen[columns] < 0]
+        self._first_seen[first] = minute
+        self._last_seen[columns] = minute
+
+        self.last_minute = minute
+        self.minutes += 1
+
+    def valid_mask(self) -> np.ndarray:
+        """Маска валидных тикеров по колонкам (в порядке symbols)."""
+        count = len(self._symbols)
+        expected = self.expected
+        if expected == 0:
+            return np.zeros(count, dtype=bool)
+        present = self._present[:count]
+        zero = self._zero[:count]
+        return ((present == expected) & (self._invalid[:count] == 0)
+                & (zero < expected) & (zero <= self.max_zero_ratio * expected))
+
+    def is_valid(self, symbol: str) -> bool:
+        """Валиден ли тикер за окно, O(1)."""
+        column = self._columns.get(symbol)
+        if column is None or self.expected == 0:
+            return False
+        expected = self.expected
+        zero = self._zero[column]
+        return bool(self._present[column] == expected and self._invalid[column] == 0
+                    and zero < expected and zero <= self.max_zero_ratio * expected)
+
+    def reason(self, symbol: str) -> Optional[str]:
+        """Причина отбраковки тикера или None, если он валиден."""
+        column = self._columns.get(symbol)
+        if column is None:
+            return "тикер не встречался"
+        if self.is_valid(symbol):
+            return None
+
+        expected = self.expected
+        window_start = self.last_minute - expected + 1
+        if self._invalid[column]:
+            return f"некорректные свечи в {self._invalid[column]} минутах окна"
+        if self._present[column] != expected:
+            if self._last_seen[column] < self.last_minute:
+                return f"последнее появление {self._last_seen[column]} (ожидалось {self.last_minute})"
+            if self._first_seen[column] > window_start:
+                return f"первое появление {self._first_seen[column]} (ожидалось {window_start})"
+            return f"присутствует только в {self._present[column]} из {expected} минут"
+        return f"{self._zero[column] / expected:.1%} нулевых объёмов"
+
+    def valid_symbols(self) -> set[str]:
+        return {self._symbols[i] for i in np.flatnonzero(self.valid_mask()).tolist()}
+
+    def select(self, candles: Sequence[KlineRecord]) -> Sequence[KlineRecord]:
+        """Свечи минуты только валидных тикеров."""
+        valid = self.valid_symbols()
+        if isinstance(candles, KlineColumns):
+            return candles.select(valid)
+        return [c for c in candles if c.symbol in valid]
+
+    def filter(self, candle_dict: OrderedDict[int, List[KlineRecord]]) -> OrderedDict[int, List[KlineRecord]]:
+        """
+        Хранилище только с валидными тикерами – то, что возвращала validate_ticker.
+        Проходит всё хранилище, нужно только полному пересчёту окон.
+        """
+        valid = self.valid_symbols()
+        result = OrderedDict()
+        for minute, candles in candle_dict.items():
+            if isinstance(candles, KlineColumns):
+                filtered = candles.select(valid)
+            else:
+                filtered = [c for c in candles if c.symbol in valid]
+            if len(filtered):
+                result[minute] = filtered
+        return result
+
+    def log_changes(self) -> None:
+        """Пишет в лог тикеры, которые с прошлого вызова стали невалидными или снова валидными."""
+        valid = self.valid_symbols()
+        if self._valid_before is None:
+            self._valid_before = valid
+            logger.info(f"Валидных тикеров: {len(valid)} из {len(self._symbols)}")
+            for symbol in sorted(set(self._symbols) - valid)[:LOGGED_SYMBOLS]:
+                logger.info(f"Отбраковка {symbol}: {self.reason(symbol)}")
+            return
+
+        dropped = sorted(self._valid_before - valid)
+        restored = sorted(valid - self._valid_before)
+        self._valid_before = valid
+
+        for symbol in dropped[:LOGGED_SYMBOLS]:
+            logger.info(f"Отбраковка {symbol}: {self.reason(symbol)}")
+        if len(dropped) > LOGGED_SYMBOLS:
+            logger.info(f"... и ещё {len(dropped) - LOGGED_SYMBOLS} тикеров отбраковано")
+        if restored:
+            logger.info(f"Снова валидны {len(restored)} тикеров: {', '.join(restored[:LOGGED_SYMBOLS])}")
@@ -0,0 +1,264 @@
+"""
+Векторная (NumPy) реализация функций analytic_utils с теми же сигнатурами и результатами.
+
+Свечи минут складываются в массив [минута, тикер, поле], часы получаются reshape в
+[час, минута, тикер, поле] и сворачиваются по оси минут; условия цен и объёмов считаются
+булевыми масками по всем тикерам сразу. Часовые записи возвращаются колонками
+HoursColumns, которые для остального кода выглядят как список HoursRecord.
+
+Реализация выбирается параметром ANALYTICS_ENGINE. Там, где вход не укладывается в массив
+(тикеры часов не совпадают), вызывается исходная функция analytic_utils.
+"""
+
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+from AnalyticsBot.logger import logger
+from AnalyticsBot.config import *
+
+from AnalyticsBot import analytic_utils
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.bot_types import HoursRecord
+from AnalyticsBot.bot_types import HoursColumns
+from AnalyticsBot.bot_types import Volume_10m
+
+# Индексы полей KlineColumns.values
+OPEN, CLOSE, HIGH, LOW, VOLUME, QUOTE_VOLUME = range(6)
+# Индексы полей HoursColumns.values
+HOUR_OPEN, HOUR_CLOSE, HOUR_HIGH, HOUR_LOW, HOUR_VOLUME = range(5)
+
+# check_volume_overlimit берёт из окна часовых объёмов ровно десять часов
+VOLUME_HOURS_KEYS = [f'total_volume_{i}' for i in range(1, 11)]
+
+def _minute_values(candles: Sequence[KlineRecord]) -> np.ndarray:
+    """Вещественные поля свечей минуты в порядке KlineColumns.values, [k, 8]."""
+    if isinstance(candles, KlineColumns):
+        return candles.values
+    return np.array([(c.open, c.close, c.high, c.low, c.volume, c.quote_assets_volume,
+                      c.taker_buy_base_volume, c.taker_buy_quote_volume) for c in candles],
+                    dtype=np.float64).reshape(len(candles), 8)
+
+def _symbols(candles: Sequence) -> list[str]:
+    if isinstance(candles, (KlineColumns, HoursColumns)):
+        return candles.symbols
+    return [c.symbol for c in candles]
+
+def _open_times(candles: Sequence[KlineRecord]) -> list[int]:
+    if isinstance(candles, KlineColumns):
+        return candles.open_time.tolist()
+    return [c.open_time for c in candles]
+
+def _hour_values(records: Sequence[HoursRecord]) -> np.ndarray:
+    """Поля часовых записей в порядке HoursColumns.values, [k, 5]."""
+    if isinstance(records, HoursColumns):
+        return records.values
+    return np.array([(r.open, r.close, r.high, r.low, r.total_volume) for r in records],
+                    dtype=np.float64).reshape(len(records), 5)
+
+def _sequential_sum(values: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Сумма по оси в порядке элементов, как в циклах analytic_utils.
+    np.sum складывает попарно, и младшие биты результата могут разойтись.
+    """
+    total = np.zeros(np.delete(values.shape, axis), dtype=np.float64)
+    for part in np.moveaxis(values, axis, 0):
+        total += part
+    return total
+
+def _aligned_symbols(columns: Sequence[Sequence]) -> Optional[list[str]]:
+    """Общий список тикеров, если он одинаков во всех элементах columns, иначе None."""
+    symbols = _symbols(columns[0])
+    for item in columns[1:]:
+        if _symbols(item) != symbols:
+            return None
+    return symbols
+
+def _volume_conditions(multiplied_volumes: np.ndarray, hour_volumes: np.ndarray) -> np.ndarray:
+    """
+    Маска analyze_ticker для строк [тикер, час]: все часовые объёмы положительны и каждый
+    меньше умноженного 10м объёма хотя бы в VOLUME_MULTIPLIER раз.
+    Сравнения записаны как отрицания провала, чтобы NaN вёл себя как в analyze_ticker.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = multiplied_volumes[:, None] / hour_volumes
+    failed = (hour_volumes <= 0) | (ratios < VOLUME_MULTIPLIER)
+    return ~failed.any(axis=1)
+
+def calculate_10m_volumes_slidedWindow(candle_dict: OrderedDict[int, List[KlineRecord]]) -> Optional[List[Volume_10m]]:
+    """Векторный аналог analytic_utils.calculate_10m_volumes_slidedWindow."""
+    if len(candle_dict) < 10:
+        return None
+
+    window_minutes = sorted(candle_dict.keys())[-10:]
+    window_klines = [candle_dict[m] for m in window_minutes]
+
+    # Тикеры сопоставляются по позиции в минуте, как в исходной функции
+    n_symbols = len(window_klines[0])
+    if any(len(minute_candles) != n_symbols for minute_candles in window_klines):
+        return None
+
+    # [минута, тикер] -> сумма по минутам
+    volumes = _sequential_sum(np.stack([_minute_values(c)[:, QUOTE_VOLUME] for c in window_klines]), axis=0)
+
+    symbols = _symbols(window_klines[0])
+    open_times = _open_times(window_klines[0])
+    close_times = _open_times(window_klines[-1])
+    return [
+        Volume_10m(ticker=symbol, volume=volume, open_time=open_time, close_time=close_time)
+        for symbol, volume, open_time, close_time in zip(symbols, volumes.tolist(), open_times, close_times)
+    ]
+
+def _reduce_hours(values: np.ndarray) -> np.ndarray:
+    """[час, минута, тикер, поле] -> [час, тикер, (open, close, high, low, total_volume)]."""
+    hours = np.empty(values.shape[:1] + values.shape[2:3] + (5,), dtype=np.float64)
+    hours[..., HOUR_OPEN] = values[:, 0, :, OPEN]
+    hours[..., HOUR_CLOSE] = values[:, -1, :, CLOSE]
+    # fmax/fmin с начальным значением пропускают NaN так же, как сравнения в исходном цикле
+    hours[..., HOUR_HIGH] = np.fmax.reduce(values[..., HIGH], axis=1, initial=-np.inf)
+    hours[..., HOUR_LOW] = np.fmin.reduce(values[..., LOW], axis=1, initial=np.inf)
+    hours[..., HOUR_VOLUME] = _sequential_sum(values[..., QUOTE_VOLUME], axis=1)
+    return hours
+
+def calculate_1h_records(candle_1m_records: OrderedDict[int, list[KlineRecord]]) -> Optional[OrderedDict[int, HoursColumns]]:
+    """
+    Векторный аналог analytic_utils.calculate_1h_records: часы – блоки по 60 минут,
+    заканчивающиеся последней минутой. Записи часа возвращаются колонками HoursColumns.
+    """
+    if not candle_1m_records:
+        return None
+
+    total_minutes = len(candle_1m_records)
+    if total_minutes < 60:
+        return None
+
+    valid_minutes_count = (total_minutes // 60) * 60
+    minutes_keys = list(candle_1m_records.keys())[-valid_minutes_count:]
+    minutes = [candle_1m_records[key] for key in minutes_keys]
+
+    # Час считается, только если во всех его минутах столько же свечей, сколько в первой
+    counts = np.fromiter((len(c) for c in minutes), dtype=np.int64, count=valid_minutes_count).reshape(-1, 60)
+    complete = (counts == counts[:, :1]).all(axis=1)
+
+    if counts[0, 0] > 0 and (counts == counts[0, 0]).all():
+        # Во всех минутах одинаковое количество свечей: все часы одним массивом
+        values = np.stack([_minute_values(c) for c in minutes]).reshape(-1, 60, int(counts[0, 0]), 8)
+        hours = _reduce_hours(values)
+    else:
+        hours = [_reduce_hours(np.stack([_minute_values(c) for c in minutes[h * 60:(h + 1) * 60]])[None])[0]
+                 if complete[h] else None for h in range(len(counts))]
+
+    result_records: OrderedDict[int, HoursColumns] = OrderedDict()
+    for hour_idx in np.flatnonzero(complete).tolist():
+        hour_values = hours[hour_idx]
+        keep = (hour_values[:, HOUR_HIGH] != -np.inf) & (hour_values[:, HOUR_LOW] != np.inf)
+        if not keep.any():
+            continue
+        symbols = _symbols(minutes[hour_idx * 60])
+        result_records[minutes_keys[hour_idx * 60]] = HoursColumns(
+            [s for s, k in zip(symbols, keep.tolist()) if k], hour_values[keep])
+
+    return result_records if result_records else None
+
+def calculate_volumes_slidedWindow(all_records: OrderedDict[int, List[HoursRecord]], num_hours: int) -> Optional[Dict[str, dict[str, float]]]:
+    """Векторный аналог analytic_utils.calculate_volumes_slidedWindow."""
+    if not all_records or len(all_records) < num_hours:
+        return analytic_utils.calculate_volumes_slidedWindow(all_records, num_hours)
+
+    hours = [all_records[key] for key in list(all_records.keys())[-num_hours:]]
+    symbols = _aligned_symbols(hours)
+    if symbols is None:
+        return analytic_utils.calculate_volumes_slidedWindow(all_records, num_hours)
+
+    # [тикер, час], самый старый час первый
+    volumes = np.stack([_hour_values(h)[:, HOUR_VOLUME] for h in hours], axis=1).tolist()
+    keys = [f'total_volume_{i}' for i in range(1, len(hours) + 1)]
+    volumes_by_symbol = {symbol: dict(zip(keys, row)) for symbol, row in zip(symbols, volumes)}
+
+    logger.info(f"Агрегировано {len(volumes_by_symbol)} тикеров за {len(hours)} периодов")
+    return volumes_by_symbol
+
+def calculate_prices_slidedWindow(hours_records: dict[int, list[HoursRecord]], num_hours: int) -> Optional[dict[str, float]]:
+    """Векторный аналог analytic_utils.calculate_prices_slidedWindow (максимум high по всем часам словаря)."""
+    if not hours_records:
+        return analytic_utils.calculate_prices_slidedWindow(hours_records, num_hours)
+
+    hours = list(hours_records.values())
+    symbols = _aligned_symbols(hours)
+    if symbols is None or not symbols:
+        return analytic_utils.calculate_prices_slidedWindow(hours_records, num_hours)
+
+    # [час, тикер] -> максимум по часам
+    max_highs = np.stack([_hour_values(h)[:, HOUR_HIGH] for h in hours]).max(axis=0)
+    logger.info(f"Обработано тикеров: {len(symbols)}")
+    return dict(zip(symbols, max_highs.tolist()))
+
+def check_price_overlimit(klines: List[KlineRecord], aggregated_highs: dict[str, float]) -> Optional[dict[str, float]]:
+    """Векторный аналог analytic_utils.check_price_overlimit."""
+    try:
+        symbols = _symbols(klines)
+        closes = _minute_values(klines)[:, CLOSE]
+        highs = np.array([aggregated_highs.get(s, np.nan) for s in symbols], dtype=np.float64)
+
+        # Для каждого тикера берётся первая свеча списка
+        first = np.zeros(len(symbols), dtype=bool)
+        if symbols:
+            first[np.unique(np.array(symbols), return_index=True)[1]] = True
+
+        # Тикер без максимума даёт NaN, а сравнение с NaN ложно
+        over = first & (closes > highs)
+        differences = (closes - highs).tolist()
+        return {symbols[i]: differences[i] for i in np.flatnonzero(over).tolist()}
+
+    except Exception as e:
+        logger.error(f"Ошибка при обработке данных: {e}")
+        return None
+
+def analyze_ticker(ticker: str, volume_10m_interval: Optional[float], volume_slided_window: List[float]) -> bool:
+    """Векторный аналог analytic_utils.analyze_ticker."""
+    if volume_10m_interval is None:
+        logger.error(f"❌ Нет данных volume_10m_interval")
+        return False
+
+    if len(volume_slided_window) == 0 or len(volume_slided_window) < HOURS_VOLUMES_SLIDED_WINDOW_PERIOD:
+        logger.error(f"❌ Недостаточно данных volume_slided_window")
+        return False
+
+    multiplied_volume = np.array([volume_10m_interval * VOLUME_LIMIT_MULTIPLIER], dtype=np.float64)
+    hour_volumes = np.asarray(volume_slided_window, dtype=np.float64)[None, :]
+    return bool(_volume_conditions(multiplied_volume, hour_volumes)[0])
+
+def check_volume_overlimit(klines: List[KlineRecord], volumes_10m: List[Volume_10m], volumes_10h: Dict[str, Dict[str, float]]) -> Optional[dict[str, float]]:
+    """Векторный аналог analytic_utils.check_volume_overlimit."""
+    try:
+        volumes_10m_dict = {item.ticker: item.volume for item in volumes_10m}
+
+        # Тикеры, у которых есть оба окна
+        tickers = [s for s in _symbols(klines)
+                   if volumes_10m_dict.get(s) is not None and volumes_10h.get(s) is not None]
+
+        results = {}
+        if tickers:
+            vol_10m = np.array([volumes_10m_dict[s] for s in tickers], dtype=np.float64)
+            # [тикер, час] от total_volume_1 до total_volume_10
+            hour_volumes = np.array([[volumes_10h[s][key] for key in VOLUME_HOURS_KEYS] for s in tickers],
+                                    dtype=np.float64)
+            passed = _volume_conditions(vol_10m * VOLUME_LIMIT_MULTIPLIER, hour_volumes)
+            # analyze_ticker требует не меньше HOURS_VOLUMES_SLIDED_WINDOW_PERIOD часов
+            passed &= len(VOLUME_HOURS_KEYS) >= HOURS_VOLUMES_SLIDED_WINDOW_PERIOD
+
+            for i in np.flatnonzero(passed).tolist():
+                results[tickers[i]] = volumes_10m_dict[tickers[i]]
+                logger.info(f"🚨 #{tickers[i]}: Alert! (10m volume = {volumes_10m_dict[tickers[i]]})")
+
+        logger.info(f"Обработано тикеров: {len(klines)}. Найдено сработавших: {len(results)}")
+        return results if results else None
+
+    except Exception as e:
+        logger.error(f"Ошибка при проверке объёмов: {e}")
+        return None
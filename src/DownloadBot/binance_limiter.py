@@ -1,9 +1,18 @@
 import asyncio
+import heapq
+import itertools
+import math
 import time
 
 from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator
+from typing import Mapping
+from typing import Optional
 
 from logger import logger
+from DownloadBot.config import *
 
 # ============== Rate Limiter для Binance API ==============
 
@@ -16,62 +25,407 @@ def get_kline_weight(limit: int) -> int:
         return 5
     else:
         return 10
-    
+
+# Заголовок Binance с весом, израсходованным за текущую минуту
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+# Статусы Binance при превышении лимитов: 429 – превышение, 418 – бан IP
+RATE_LIMIT_STATUSES = (418, 429)
+
+class RequestPriority(IntEnum):
+    """Классы запросов к Binance: меньшее значение обслуживается раньше."""
+    # Страница с последней завершённой минутой – её ждёт аналитика
+    LIVE = 0
+    # Недавний пропуск (не старше RECENT_GAP_MINUTES)
+    RECENT = 1
+    # Глубокая докачка истории
+    BACKFILL = 2
+
+class PrioritySemaphore:
+    """
+    Семафор с приоритетами: освободившееся место передаётся ожидающему с наименьшим
+    RequestPriority, при равном приоритете – в порядке поступления.
+    """
+
+    def __init__(self, value: int):
+        if value <= 0:
+            raise ValueError("value must be positive")
+        # Сколько мест всего и сколько занято
+        self._limit = value
+        self._in_flight = 0
+        # Куча (приоритет, порядковый_номер, future)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def in_flight(self) -> int:
+        """Количество занятых мест."""
+        return self._in_flight
+
+    def _drop_done(self) -> None:
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+
+    async def acquire(self, priority: int = RequestPriority.LIVE) -> None:
+        self._drop_done()
+        if self._in_flight < self._limit and not self._waiters:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Место уже было передано отменённому – отдаём его следующему
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Передаёт свободные места ожидающим по приоритету."""
+        while self._waiters and self._in_flight < self._limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int) -> AsyncIterator[None]:
+        """async with semaphore.slot(priority): ..."""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return None
+
+    async def __aexit__(self, *args):
+        self.release()
+        return False
+
+class AdaptiveConcurrency(PrioritySemaphore):
+    """
+    Семафор с приоритетами, количество мест (окно) в котором подбирается по AIMD,
+    как окно перегрузки TCP.
+
+    Каждый ответ в пределах нормы увеличивает окно на 1 / окно – в сумме на единицу
+    за «круг» из window запросов. Таймаут, 429/418, ответ 5xx или p95 задержки выше
+    latency_tolerance × базовой уменьшают окно в decrease_factor раз, но не чаще раза
+    за круг: ошибки запросов, отправленных до уменьшения, окно повторно не уменьшают.
+    p95 считается по пачкам из latency_samples ответов, базовая p95 – наименьшая из них,
+    медленно растущая, чтобы подстраиваться под смену сети.
+
+    По задержкам последних ответов вычисляется и порог дублирования запросов (hedge_delay).
+    """
+
+    # Рост базовой p95 за пачку ответов
+    BASELINE_DRIFT = 0.05
+
+    def __init__(self,
+                 initial: int = THREAD_POOL_SIZE,
+                 min_window: int = 1,
+                 max_window: int = ADAPTIVE_MAX_CONCURRENCY,
+                 decrease_factor: float = 0.5,
+                 latency_tolerance: float = ADAPTIVE_LATENCY_TOLERANCE,
+                 latency_samples: int = 20):
+        if not 1 <= min_window <= max_window:
+            raise ValueError("window bounds must satisfy 1 <= min_window <= max_window")
+        super().__init__(min(max(initial, min_window), max_window))
+        self.min_window = min_window
+        self.max_window = max_window
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.latency_samples = latency_samples
+
+        self._window = float(self._limit)
+        self._latencies: list[float] = []
+        self.baseline_p95: Optional[float] = None
+        self.last_p95: Optional[float] = None
+        # Счётчик завершённых запросов и номер, до которого окно повторно не уменьшается
+        self._completed = 0
+        self._hold_until = 0
+        # Сколько раз окно уменьшалось
+        self.decreases = 0
+
+        # Задержки последних ответов (скользящее окно) для порога дублирования запросов
+        self._recent: deque[float] = deque(maxlen=HEDGE_LATENCY_SAMPLES)
+        # Сколько дубликатов отправлено и сколько из них ответили первыми
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def window(self) -> float:
+        """Текущее окно параллельных запросов."""
+        return self._window
+
+    def _set_window(self, window: float) -> None:
+        self._window = min(max(window, float(self.min_window)), float(self.max_window))
+        self._limit = int(self._window)
+        self._wake()
+
+    def record_success(self, latency: float) -> None:
+        """Учитывает успешный ответ с задержкой latency секунд."""
+        self._completed += 1
+        self._latencies.append(latency)
+        self._recent.append(latency)
+        if len(self._latencies) >= self.latency_samples:
+            ordered = sorted(self._latencies)
+            p95 = ordered[math.ceil(0.95 * len(ordered)) - 1]
+            self._latencies.clear()
+            self.last_p95 = p95
+            if self.baseline_p95 is None:
+                self.baseline_p95 = p95
+            else:
+                self.baseline_p95 = min(self.baseline_p95 * (1 + self.BASELINE_DRIFT), p95)
+            if p95 > self.latency_tolerance * self.baseline_p95:
+                self._decrease(f"p95 задержки {p95 * 1000:.0f} мс при базовой {self.baseline_p95 * 1000:.0f} мс")
+                return
+        self._set_window(self._window + 1 / self._window)
+
+    def hedge_delay(self, quantile: float = HEDGE_QUANTILE) -> Optional[float]:
+        """
+        Сколько ждать ответа, прежде чем дублировать запрос: квантиль задержек последних ответов.
+        None, пока ответов меньше HEDGE_MIN_SAMPLES.
+        """
+        if len(self._recent) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)]
+
+    def record_overload(self, reason: str) -> None:
+        """Учитывает таймаут или отказ Binance из-за перегрузки (reason – для лога)."""
+        self._completed += 1
+        self._decrease(reason)
+
+    def _decrease(self, reason: str) -> None:
+        if self._completed < self._hold_until:
+            return
+        # Запросы, уже отправленные с прежним окном, не уменьшают его повторно
+        self._hold_until = self._completed + self._in_flight
+        old = self._window
+        self._set_window(self._window * self.decrease_factor)
+        self.decreases += 1
+        logger.info(f"Окно параллельных запросов Binance: {old:.1f} -> {self._window:.1f} ({reason})")
+
 class BinanceRateLimiter:
-    """Ограничитель запросов для Binance API"""
-    
+    """
+    Ограничитель запросов для Binance API.
+
+    Скользящее окно в 60 секунд с накопительными счётчиками веса и количества запросов.
+    Моменты освобождения веса лежат в куче, поэтому ожидающие просыпаются ровно тогда,
+    когда освобождается достаточно веса, а не по таймеру «самый старый запрос + 1 с».
+    Собственная оценка корректируется по заголовку X-MBX-USED-WEIGHT-1M,
+    а Retry-After при ответах 429/418 блокирует все запросы на указанное время.
+
+    Ожидающие обслуживаются по RequestPriority: пока ждёт запрос более высокого класса,
+    запросы низших классов не получают вес, даже если он для них есть.
+    """
+
+    WINDOW_SECONDS = 60.0
+
     def __init__(self, requests_per_minute: int, requests_weight_per_minute: int):
         """
         Args:
             requests_per_minute: Максимальное количество запросов в минуту (Binance: 1200)
+            requests_weight_per_minute: Максимальный вес запросов в минуту (Binance: 2400)
         """
         self.weight_limit = requests_weight_per_minute
         self.requests_limit = requests_per_minute
-        self.requests = deque()
-        self._lock = asyncio.Lock()
-        
-    async def wait_if_needed(self, weight: int = 1):
-        """Ожидает, если превышен лимит запросов"""
-        async with self._lock:
-            now = time.time()
-            
-            # Удаляем запросы старше 1 минуты
-            while self.requests and self.requests[0][0] < now - 60:
-                self.requests.popleft()
-            
-            # Текущий вес запросов
-            total_weight = sum(w for _, w in self.requests)
-            
-            # Если достигнут лимит, ждем
-            while total_weight + weight > self.weight_limit or len(self.requests) >= self.requests_limit:
-                # Ждём, пока освободится достаточно веса
-                # Для простоты ждём до истечения самого старого запроса
-
-                if not self.requests:
-                    # Очередь пуста, но лимит формально превышен (маловероятно) – просто ждём 1 сек
-                    await asyncio.sleep(1)
-                    now = time.time()
-                    continue
-
-                # Ждём, пока истечёт самый старый запрос
-                oldest = self.requests[0][0]
-                wait_time = 60 - (now - oldest) 
-
-                if wait_time > 0:
-                    # Много потоков спамят в консоль, когда стукаются об лимит.
-                    # Обычно первый поток стукается в лимитер и остальные его догоняют
-                    # У первого задержка в 40-55 секунд, а у остальных 0,0ХХ секунд (зависит от камня)
-                    if wait_time > 1:
-                        logger.warning(f"Достигнут лимит запросов Binance. Ожидание {wait_time:.2f} секунд...")
-                    await asyncio.sleep(wait_time + 1)
-                    
-                # После ожидания очищаем старые записи
-                now = time.time()
-                while self.requests and self.requests[0][0] <= now - 60:
-                    self.requests.popleft()
-                        
-                # Пересчитываем общий вес для следующей итерации цикла
-                total_weight = sum(w for _, w in self.requests)
-            
-            # Добавляем текущий запрос
-            self.requests.append((time.time(), weight))
\ No newline at end of file
+
+        # Куча (момент_освобождения, вес, количество_запросов)
+        self._releases: list[tuple[float, int, int]] = []
+        # Накопительные счётчики по окну
+        self._used_weight = 0
+        self._used_requests = 0
+        # До какого момента запросы запрещены (Retry-After)
+        self._blocked_until = 0.0
+
+        # Куча ожидающих (приоритет, порядковый_номер, вес, future)
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    # ---------- Учёт окна ----------
+
+    @staticmethod
+    def _now() -> float:
+        return time.monotonic()
+
+    def _expire(self, now: float) -> None:
+        """Освобождает вес запросов, вышедших из окна."""
+        while self._releases and self._releases[0][0] <= now:
+            _, weight, requests = heapq.heappop(self._releases)
+            self._used_weight -= weight
+            self._used_requests -= requests
+
+    def _fits(self, weight: int, now: float) -> bool:
+        if now < self._blocked_until:
+            return False
+        # Запрос тяжелее всего лимита пропускаем на пустом окне, иначе он не выполнится никогда
+        if self._used_weight == 0 and self._used_requests == 0:
+            return True
+        return (self._used_weight + weight <= self.weight_limit and
+                self._used_requests + 1 <= self.requests_limit)
+
+    def _reserve(self, weight: int, now: float) -> None:
+        heapq.heappush(self._releases, (now + self.WINDOW_SECONDS, weight, 1))
+        self._used_weight += weight
+        self._used_requests += 1
+
+    @property
+    def used_weight(self) -> int:
+        self._expire(self._now())
+        return self._used_weight
+
+    @property
+    def used_requests(self) -> int:
+        self._expire(self._now())
+        return self._used_requests
+
+    def weight_headroom(self) -> int:
+        """Сколько веса можно потратить прямо сейчас без ожидания."""
+        if self._now() < self._blocked_until:
+            return 0
+        return max(0, self.weight_limit - self.used_weight)
+
+    def requests_headroom(self) -> int:
+        """Сколько запросов можно отправить прямо сейчас без ожидания."""
+        if self._now() < self._blocked_until:
+            return 0
+        return max(0, self.requests_limit - self.used_requests)
+
+    # ---------- Ожидание ----------
+
+    def _drop_done(self) -> None:
+        while self._waiters and self._waiters[0][3].done():
+            heapq.heappop(self._waiters)
+
+    def try_acquire(self, weight: int = 1, priority: int = RequestPriority.LIVE) -> bool:
+        """
+        Резервирует вес без ожидания. False – вес не помещается в окно
+        или его уже ждут запросы того же или более высокого класса.
+        """
+        now = self._now()
+        self._expire(now)
+        self._drop_done()
+
+        if (not self._waiters or self._waiters[0][0] > priority) and self._fits(weight, now):
+            self._reserve(weight, now)
+            return True
+        return False
+
+    async def wait_if_needed(self, weight: int = 1, priority: int = RequestPriority.LIVE):
+        """Ожидает, если превышен лимит запросов или вес ждут запросы более высокого класса"""
+        # Быстрый путь: нет ожидающих того же или более высокого класса и вес помещается в окно
+        if self.try_acquire(weight, priority):
+            return
+        now = self._now()
+
+        if not self._waiters:
+            # Много корутин упираются в лимит одновременно – логируем только первую
+            wait_time = max(self._blocked_until, self._releases[0][0] if self._releases else now) - now
+            if wait_time > 1:
+                logger.warning(f"Достигнут лимит запросов Binance. Ожидание {wait_time:.2f} секунд...")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), weight, future))
+        self._schedule_wakeup()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Если вес уже был выделен, а ожидающий отменён – вес остаётся в окне (запрос мог уйти)
+            self._schedule_wakeup()
+            raise
+
+    def _wake_waiters(self) -> None:
+        """Пропускает ожидающих, чей вес помещается в окно (строго по приоритету, затем по очереди)."""
+        self._timer = None
+        now = self._now()
+        self._expire(now)
+
+        while self._waiters:
+            _, _, weight, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._fits(weight, now):
+                break
+            heapq.heappop(self._waiters)
+            self._reserve(weight, now)
+            future.set_result(None)
+
+        self._schedule_wakeup()
+
+    def _schedule_wakeup(self) -> None:
+        """
+        Ставит таймер на ближайший момент, когда ситуация может измениться:
+        на окончание блокировки Retry-After либо на ближайшее освобождение веса из кучи.
+        """
+        self._drop_done()
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._waiters:
+            return
+
+        now = self._now()
+        if now < self._blocked_until:
+            wake_at = self._blocked_until
+        elif self._fits(self._waiters[0][2], now):
+            wake_at = now
+        elif self._releases:
+            wake_at = self._releases[0][0]
+        else:
+            wake_at = now
+
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(0.0, wake_at - now), self._wake_waiters)
+
+    # ---------- Обратная связь от Binance ----------
+
+    def update_from_response(self, status: int, headers: Mapping[str, str]) -> None:
+        """
+        Корректирует состояние по ответу Binance.
+
+        X-MBX-USED-WEIGHT-1M: если Binance насчитал больше, чем мы (другие процессы на том же IP,
+        запросы без лимитера), недостающий вес добавляется в окно до конца текущей минуты Binance.
+        Retry-After при 429/418: все запросы блокируются на указанное количество секунд.
+        """
+        now = self._now()
+        self._expire(now)
+
+        used = headers.get(USED_WEIGHT_HEADER)
+        if used is not None:
+            try:
+                used_weight = int(used)
+            except ValueError:
+                used_weight = None
+            if used_weight is not None and used_weight > self._used_weight:
+                # Вес Binance обнуляется на границе минуты
+                wall = time.time()
+                release_at = now + (60.0 - wall % 60.0)
+                heapq.heappush(self._releases, (release_at, used_weight - self._used_weight, 0))
+                self._used_weight = used_weight
+
+        if status in RATE_LIMIT_STATUSES:
+            retry_after = headers.get("Retry-After")
+            try:
+                delay = float(retry_after) if retry_after is not None else self.WINDOW_SECONDS
+            except ValueError:
+                delay = self.WINDOW_SECONDS
+            self._blocked_until = max(self._blocked_until, now + delay)
+            logger.warning(f"Binance вернул HTTP {status}, запросы приостановлены на {delay:.0f} секунд")
+
+        if self._waiters:
+            self._schedule_wakeup()
@@ -0,0 +1,220 @@
+"""
+Потоковое получение минутных свечей через WebSocket Binance Futures.
+
+Тикеры делятся на шарды по STREAM_SYMBOLS_PER_CONNECTION штук, на каждый шард
+открывается отдельное соединение с combined stream вида
+    <BINANCE_STREAM_URL>?streams=btcusdt@kline_1m/ethusdt@kline_1m/...
+Закрытая свеча (k.x == true) сразу записывается в хранилище.
+"""
+
+import json
+import asyncio
+import aiohttp
+
+from typing import Optional
+
+from logger import logger
+from bot_types import KlineRecord
+from candle_storage import CandleStorage
+from candle_storage import MINUTE_MS
+from DownloadBot.config import *
+
+def build_stream_url(base_url: str, symbols: list[str]) -> str:
+    """Формирует адрес combined stream для списка тикеров."""
+    streams = "/".join(f"{symbol.lower()}@kline_1m" for symbol in symbols)
+    return f"{base_url}?streams={streams}"
+
+def parse_kline_message(raw: str | bytes) -> Optional[KlineRecord]:
+    """
+    Разбирает сообщение combined stream.
+
+    Формат (https://developers.binance.com/docs/derivatives/usds-margined-futures/websocket-market-streams/Kline-Candlestick-Streams):
+        {"stream": "btcusdt@kline_1m", "data": {"e": "kline", "s": "BTCUSDT", "k": {...}}}
+
+    Returns:
+        KlineRecord для закрытой свечи, None для незакрытой свечи или чужого сообщения.
+    """
+    message = json.loads(raw)
+    data = message.get('data', message)
+    if data.get('e') != 'kline':
+        return None
+
+    k = data['k']
+    if not k.get('x'):
+        return None
+
+    return KlineRecord(
+        symbol=k['s'],
+        open=float(k['o']),
+        close=float(k['c']),
+        high=float(k['h']),
+        low=float(k['l']),
+        volume=float(k['v']),
+        close_time=int(k['T']),
+        quote_assets_volume=float(k['q']),
+        taker_buy_base_volume=float(k['V']),
+        taker_buy_quote_volume=float(k['Q']),
+        num_of_trades=int(k['n']),
+        open_time=int(k['t'])
+    )
+
+class KlineStreamIngestor:
+    """
+    Держит WebSocket соединения со всеми шардами тикеров и пишет закрытые свечи в хранилище.
+
+    Для каждого тикера запоминается последняя закрытая минута, по ней основной цикл
+    понимает, каких свечей не хватает и что нужно докачать через REST.
+    """
+
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 storage: CandleStorage,
+                 base_url: str = BINANCE_STREAM_URL,
+                 symbols_per_connection: int = STREAM_SYMBOLS_PER_CONNECTION,
+                 reconnect_delay: float = 1.0):
+        if symbols_per_connection <= 0:
+            raise ValueError("symbols_per_connection must be positive")
+
+        self.session = session
+        self.storage = storage
+        self.base_url = base_url
+        self.symbols_per_connection = symbols_per_connection
+        self.reconnect_delay = reconnect_delay
+
+        self.symbols: list[str] = []
+        # Последняя закрытая минута по каждому тикеру
+        self.last_closed: dict[str, int] = {}
+        # Сколько тикеров закрыли минуту: <НОМЕР_МИНУТЫ, КОЛИЧЕСТВО>
+        self._closed_count: dict[int, int] = {}
+        # Минута, по которой получены свечи всех тикеров
+        self.complete_minute: Optional[int] = None
+        self.minute_complete = asyncio.Event()
+
+        self._tasks: list[asyncio.Task] = []
+
+    def shards(self) -> list[list[str]]:
+        """Разбивает тикеры на группы по symbols_per_connection."""
+        n = self.symbols_per_connection
+        return [self.symbols[i:i + n] for i in range(0, len(self.symbols), n)]
+
+    async def start(self, symbols: list[str]) -> None:
+        """Открывает соединения для всех шардов."""
+        self.symbols = list(symbols)
+        for shard_id, shard in enumerate(self.shards()):
+            self._tasks.append(asyncio.create_task(self._run_shard(shard_id, shard)))
+        logger.info(f"WebSocket: {len(self.symbols)} тикеров в {len(self._tasks)} соединениях")
+
+    async def stop(self) -> None:
+        """Закрывает все соединения."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def update_symbols(self, symbols: list[str]) -> None:
+        """Пересобирает шарды, если список тикеров изменился."""
+        if set(symbols) == set(self.symbols):
+            return
+        logger.info(f"WebSocket: список тикеров изменился ({len(self.symbols)} -> {len(symbols)}), переподключаемся")
+        await self.stop()
+        self.last_closed = {s: m for s, m in self.last_closed.items() if s in symbols}
+        await self.start(symbols)
+
+    async def _run_shard(self, shard_id: int, symbols: list[str]) -> None:
+        """Держит соединение шарда, переподключаясь при обрыве."""
+        url = build_stream_url(self.base_url, symbols)
+        while True:
+            try:
+                async with self.session.ws_connect(url, heartbeat=30) as ws:
+                    logger.info(f"WebSocket шард {shard_id}: подключено ({len(symbols)} тикеров)")
+                    async for msg in ws:
+                        if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                            self.handle_message(msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            logger.warning(f"WebSocket шард {shard_id}: ошибка {ws.exception()}")
+                            break
+                logger.warning(f"WebSocket шард {shard_id}: соединение закрыто, переподключение")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket шард {shard_id}: {type(e).__name__}: {e}")
+
+            await asyncio.sleep(self.reconnect_delay)
+
+    def handle_message(self, raw: str | bytes) -> Optional[KlineRecord]:
+        """Обрабатывает одно сообщение потока. Возвращает записанную свечу или None."""
+        try:
+            record = parse_kline_message(raw)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"WebSocket: некорректное сообщение ({e})")
+            return None
+
+        if record is None:
+            return None
+
+        if not self.storage.put_record(record):
+            return None
+
+        minute = record.open_time // MINUTE_MS
+        previous = self.last_closed.get(record.symbol)
+        if previous is None or minute > previous:
+            self.last_closed[record.symbol] = minute
+            self._on_symbol_closed(minute)
+
+        return record
+
+    def _on_symbol_closed(self, minute: int) -> None:
+        """Считает закрывшиеся тикеры и сигнализирует, когда минута собрана полностью."""
+        count = self._closed_count.get(minute, 0) + 1
+        self._closed_count[minute] = count
+
+        if count >= len(self.symbols) and (self.complete_minute is None or minute > self.complete_minute):
+            self.complete_minute = minute
+            self.minute_complete.set()
+            # Счётчики по более старым минутам больше не нужны
+            for old in [m for m in self._closed_count if m <= minute]:
+                del self._closed_count[old]
+
+    async def wait_minute_complete(self, timeout: float) -> bool:
+        """Ждёт, пока какая-либо минута соберётся целиком. True – дождались, False – таймаут."""
+        try:
+            await asyncio.wait_for(self.minute_complete.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.minute_complete.clear()
+        return True
+
+    def lagging_symbols(self, minute: int) -> dict[str, int]:
+        """
+        Тикеры, по которым из потока ещё не пришла свеча за `minute`.
+
+        Returns:
+            {тикер: количество недостающих минут}. Для тикеров, по которым из потока
+            ещё ничего не приходило, количество считается по хранилищу.
+        """
+        result: dict[str, int] = {}
+        for symbol in self.symbols:
+            last = self.last_closed.get(symbol)
+            if last is None:
+                last = self.storage.last_candle_minute(symbol)
+            if last is None:
+                last = minute - MAX_CACHED_CANDLES
+            if last < minute:
+                result[symbol] = min(minute - last, MAX_CACHED_CANDLES)
+        return result
+
+    def mark_repaired(self, symbols: list[str], minute: int) -> None:
+        """
+        Отмечает, что свечи тикеров по минуту `minute` включительно докачаны через REST.
+
+        Докачанные тикеры засчитываются в закрытие минуты: если тикер не приходит из потока,
+        минута собирается после докачки. Счётчики более старых минут уже не понадобятся –
+        они закрыты докачкой, даже если часть тикеров докачать не удалось.
+        """
+        for symbol in symbols:
+            if self.last_closed.get(symbol, minute - 1) < minute:
+                self.last_closed[symbol] = minute
+                self._on_symbol_closed(minute)
+        for old in [m for m in self._closed_count if m < minute]:
+            del self._closed_count[old]
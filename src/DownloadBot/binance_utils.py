@@ -1,21 +1,44 @@
-import requests
 import time
+import json
 import aiohttp
 import asyncio
 
+from contextlib import AbstractAsyncContextManager
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime
 
-from collections import OrderedDict
 from typing import List
+from typing import Mapping
 from typing import Optional
 
 from urllib.parse import urlencode
 
+import numpy as np
+
+# Быстрый разбор JSON, если установлен orjson (иначе – стандартный json)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 from logger import logger
-from bot_types import KlineRecord
+from candle_storage import CandleStorage
+from candle_storage import MINUTE_MS
+from candle_storage import N_FLOAT_FIELDS
 from DownloadBot.config import *
-from DownloadBot.binance_limiter import get_kline_weight
+from DownloadBot.binance_limiter import RATE_LIMIT_STATUSES
+from DownloadBot.binance_limiter import AdaptiveConcurrency
 from DownloadBot.binance_limiter import BinanceRateLimiter
+from DownloadBot.binance_limiter import PrioritySemaphore
+from DownloadBot.binance_limiter import RequestPriority
+from DownloadBot.kline_planner import KlinePage
+from DownloadBot.kline_planner import build_pages
+from DownloadBot.kline_planner import page_splits
+from DownloadBot.kline_planner import plan_weight
+from DownloadBot.kline_planner import plan_requests
+from DownloadBot.kline_planner import plan_kline_pages
 
 async def get_binance_server_time(session: aiohttp.ClientSession) -> Optional[int]:
     """
@@ -34,9 +57,8 @@ async def get_binance_server_time(session: aiohttp.ClientSession) -> Optional[in
         logger.error(f"Исключение при запросе времени Binance: {e}")
         return None
     
-async def get_trading_symbols(session: aiohttp.ClientSession) -> list[str]:
-    """Получение списка торгующихся тикеров"""
-    """Асинхронное получение списка торгующихся тикеров с повторными попытками"""
+async def fetch_exchange_info(session: aiohttp.ClientSession) -> Optional[bytes]:
+    """Асинхронное получение тела /fapi/v1/exchangeInfo с повторными попытками. None – не удалось."""
     url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
     max_retries = 3
     
@@ -45,16 +67,7 @@ async def get_trading_symbols(session: aiohttp.ClientSession) -> list[str]:
 
             async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
                 if response.status == 200:
-                    data = await response.json()
-                    symbols = []
-                    for symbol_info in data['symbols']:
-                        if (symbol_info['status'] == 'TRADING' and 
-                            symbol_info.get('contractType') == 'PERPETUAL'):
-                            symbol_name = symbol_info['symbol']
-                            if not symbol_name.startswith("USDC") and not symbol_name.endswith("USDC"):
-                                symbols.append(symbol_name)
-                    logger.info(f"✅ Получено {len(symbols)} тикеров через асинхронный запрос")
-                    return symbols
+                    return await response.read()
                 else:
                     logger.warning(f"HTTP {response.status} при получении списка тикеров, попытка {attempt+1}")
 
@@ -62,16 +75,221 @@ async def get_trading_symbols(session: aiohttp.ClientSession) -> list[str]:
             logger.warning(f"Ошибка при получении списка тикеров (попытка {attempt+1}): {e}")
             if attempt == max_retries - 1:
                 logger.error("Не удалось получить список тикеров после всех попыток")
-                return []
+                return None
             await asyncio.sleep(2 ** attempt)  # экспоненциальная задержка
 
-    return []
+    return None
+
+def parse_trading_symbols(body: bytes) -> list[str]:
+    """Торгующиеся бессрочные контракты из тела exchangeInfo (без пар с USDC)."""
+    data = _json_loads(body)
+    symbols = []
+    for symbol_info in data['symbols']:
+        if (symbol_info['status'] == 'TRADING' and 
+            symbol_info.get('contractType') == 'PERPETUAL'):
+            symbol_name = symbol_info['symbol']
+            if not symbol_name.startswith("USDC") and not symbol_name.endswith("USDC"):
+                symbols.append(symbol_name)
+    return symbols
+
+async def get_trading_symbols(session: aiohttp.ClientSession) -> list[str]:
+    """Получение списка торгующихся тикеров"""
+    """Асинхронное получение списка торгующихся тикеров с повторными попытками"""
+    body = await fetch_exchange_info(session)
+    if body is None:
+        return []
+    symbols = parse_trading_symbols(body)
+    logger.info(f"✅ Получено {len(symbols)} тикеров через асинхронный запрос")
+    return symbols
 
 # ============== Модифицированные функции с ограничением ==============
 
-async def fetch_klines_paginated(session: aiohttp.ClientSession, symbol: str, count: int, end_timestamp: int, limiter: BinanceRateLimiter, semaphore: asyncio.Semaphore, max_retries = 5) -> list[KlineRecord] | None:
+@dataclass
+class KlineSeries:
+    """Свечи одного тикера в колонках, минуты по возрастанию."""
+    # тикер
+    symbol: str
+    # номера минут (open_time // 60000), [n]
+    minutes: np.ndarray
+    # вещественные поля в порядке FLOAT_FIELDS хранилища, [n, N_FLOAT_FIELDS]
+    values: np.ndarray
+    # количество сделок, [n]
+    trades: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.minutes)
+
+def parse_klines_into(body: bytes, minutes: np.ndarray, values: np.ndarray, trades: np.ndarray) -> int:
+    """
+    Разбирает тело ответа /fapi/v1/klines прямо в колонки, без KlineRecord.
+
+    Структура свечи, согласно документации
+    https://developers.binance.com/docs/derivatives/usds-margined-futures/market-data/rest-api/Kline-Candlestick-Data
+        [open_time, open, high, low, close, volume, close_time, quote_volume, trades, taker_base, taker_quote, ignore]
+
+    Args:
+        body: тело ответа
+        minutes, values, trades: колонки, в начало которых записываются свечи
+
+    Returns:
+        количество записанных свечей (не больше длины колонок).
+    """
+    data = _json_loads(body)[:len(minutes)]
+    count = len(data)
+    if count == 0:
+        return 0
+    minutes[:count] = [kline[0] // MINUTE_MS for kline in data]
+    # Порядок полей хранилища: open, close, high, low, volume, quote, taker_base, taker_quote
+    values[:count] = [(kline[1], kline[4], kline[2], kline[3], kline[5], kline[7], kline[9], kline[10]) for kline in data]
+    trades[:count] = [kline[8] for kline in data]
+    return count
+
+def _request_slot(semaphore: asyncio.Semaphore | PrioritySemaphore | None, priority: int) -> AbstractAsyncContextManager:
+    """Контекст места в семафоре для запроса класса priority."""
+    if semaphore is None:
+        return nullcontext()
+    if isinstance(semaphore, PrioritySemaphore):
+        return semaphore.slot(priority)
+    return semaphore
+
+async def _exchange(session: aiohttp.ClientSession, url: str, params: dict, limiter: Optional[BinanceRateLimiter],
+                    semaphore: asyncio.Semaphore | PrioritySemaphore | None, priority: int,
+                    concurrency: Optional[AdaptiveConcurrency]) -> tuple[int, Optional[bytes]]:
+    """
+    Один HTTP обмен с Binance в месте семафора.
+
+    Returns:
+        (статус, тело ответа) – тело только для статуса 200.
+    """
+    async with _request_slot(semaphore, priority):
+        started = time.monotonic()
+        try:
+            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                if limiter:
+                    # Сверяем учёт веса с Binance и учитываем Retry-After
+                    limiter.update_from_response(response.status, response.headers)
+
+                if response.status == 200:
+                    body = await response.read()
+                    if concurrency:
+                        concurrency.record_success(time.monotonic() - started)
+                    return response.status, body
+                if concurrency and (response.status in RATE_LIMIT_STATUSES or response.status >= 500):
+                    concurrency.record_overload(f"HTTP {response.status}")
+                return response.status, None
+        except asyncio.TimeoutError:
+            if concurrency:
+                concurrency.record_overload("таймаут")
+            raise
+
+async def _hedged_exchange(session: aiohttp.ClientSession, url: str, params: dict, page: KlinePage,
+                           limiter: Optional[BinanceRateLimiter], semaphore: asyncio.Semaphore | PrioritySemaphore | None,
+                           priority: int) -> tuple[int, Optional[bytes]]:
+    """
+    _exchange с дублированием (HEDGE_REQUESTS): если ответа нет дольше порога
+    AdaptiveConcurrency.hedge_delay, тот же запрос уходит ещё раз. Основной запрос занимает
+    соединение пула, поэтому дубликат идёт по другому. Дубликат не ждёт ни места в окне,
+    ни веса: если вес не резервируется сразу (try_acquire), дублирования нет.
+    Побеждает первый ответ 200, второй запрос отменяется.
+    """
+    concurrency = semaphore if isinstance(semaphore, AdaptiveConcurrency) else None
+    delay = concurrency.hedge_delay() if HEDGE_REQUESTS and concurrency else None
+    if delay is None:
+        return await _exchange(session, url, params, limiter, semaphore, priority, concurrency)
+
+    primary = asyncio.ensure_future(_exchange(session, url, params, limiter, semaphore, priority, concurrency))
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or (limiter and not limiter.try_acquire(page.weight, priority)):
+            return await primary
+
+        concurrency.hedges += 1
+        logger.debug(f"Нет ответа для {page.symbol} за {delay * 1000:.0f} мс, дублируем запрос")
+        hedge = asyncio.ensure_future(_exchange(session, url, params, limiter, None, priority, concurrency))
+        tasks.append(hedge)
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result()[0] == 200:
+                    if task is hedge:
+                        concurrency.hedge_wins += 1
+                    return task.result()
+        # Ни один не вернул 200 – результат (или исключение) основного запроса
+        return primary.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def fetch_kline_page(session: aiohttp.ClientSession, page: KlinePage, limiter: BinanceRateLimiter,
+                           minutes: np.ndarray, values: np.ndarray, trades: np.ndarray,
+                           priority: int = RequestPriority.LIVE,
+                           semaphore: asyncio.Semaphore | PrioritySemaphore | None = None) -> int | None:
+    """
+    Выполняет один запрос страницы свечей и разбирает её в переданные колонки (см. parse_klines_into).
+    Большие ответы разбираются в пуле потоков, чтобы не останавливать цикл событий
+    с десятками параллельных запросов. Вес в лимитере и место в семафоре ожидаются с классом priority.
+
+    Место в семафоре занято только на время HTTP обмена: ожидание Retry-After после 429
+    и разбор ответа его не держат. AdaptiveConcurrency в качестве семафора получает
+    задержку ответа, таймауты, 429/418 и 5xx и задаёт порог дублирования запроса (HEDGE_REQUESTS).
+
+    Returns:
+        int: количество свечей страницы (0 – до начала истории тикера),
+        None при ошибке HTTP. Сетевые ошибки пробрасываются для повтора выше.
+    """
+    url = "https://fapi.binance.com/fapi/v1/klines"
+    params = {
+        'symbol': page.symbol,
+        'interval': '1m',
+        'limit': page.limit,
+        'endTime': page.end_time
+    }
+
+    while True:
+        if limiter:
+            # Ждем разрешения от rate limiter
+            await limiter.wait_if_needed(page.weight, priority)
+
+        # Формируем полный URL для логирования
+        full_url = f"{url}?{urlencode(params)}"
+        logger.debug(f"Запрос к Binance API: {full_url}")
+
+        status, body = await _hedged_exchange(session, url, params, page, limiter, semaphore, priority)
+
+        if status == 200:
+            if len(body) >= KLINE_PARSE_OFFLOAD_BYTES:
+                count = await asyncio.get_running_loop().run_in_executor(
+                    None, parse_klines_into, body, minutes, values, trades)
+            else:
+                count = parse_klines_into(body, minutes, values, trades)
+            logger.debug(f"🟢 ДАННЫЕ: Получено {count} свечей для {page.symbol} ({len(body)} байт)")
+            if not count:
+                # Пустой ответ – достигли начала истории
+                logger.warning(f"⚠️ Для {page.symbol} нет данных за период {datetime.fromtimestamp(page.end_time / 1000).strftime('%Y-%m-%d %H:%M:%S')}(пустой ответ).")
+            return count
+
+        if status in RATE_LIMIT_STATUSES:
+            # Лимитер заблокирован до Retry-After – повторяем ту же страницу
+            logger.warning(f"⚠️ HTTP {status} для {page.symbol}, страница будет запрошена повторно")
+            continue
+
+        logger.error(f"❌ Ошибка HTTP {status} для {page.symbol}")
+        await asyncio.sleep(1)
+        return None
+
+async def fetch_klines_paginated(session: aiohttp.ClientSession, symbol: str, count: int, end_timestamp: int, limiter: BinanceRateLimiter, semaphore: asyncio.Semaphore | PrioritySemaphore, max_retries = 5, pages: Optional[list[KlinePage]] = None, live_minute: Optional[int] = None) -> KlineSeries | None:
     """
-    Получает исторические свечи с пагинацией (максимум 1500 за запрос).
+    Получает исторические свечи постранично.
+
+    Страницы независимы (endTime каждой вычислен заранее), поэтому запрашиваются
+    параллельно в пределах семафора, начиная с самой свежей. Колонки под все страницы
+    выделяются заранее, каждая страница разбирается в свой участок.
+    Семафор и лимитер обслуживают страницу по её классу (KlinePage.priority);
+    AdaptiveConcurrency в качестве семафора получает задержки и ошибки запросов.
     
     Args:
         session: aiohttp ClientSession
@@ -79,154 +297,128 @@ async def fetch_klines_paginated(session: aiohttp.ClientSession, symbol: str, co
         count: общее количество требуемых минут
         end_timestamp: конечная метка времени в мс
         limiter: BinanceRateLimiter для контроля лимитов
+        pages: страницы из plan_kline_pages (по умолчанию – разбиение минимального веса)
+        live_minute: текущая минута для классов страниц (по умолчанию – минута end_timestamp)
     
     Returns:
-        List[KlineRecord]: список свечей
+        KlineSeries: свечи по возрастанию open_time
     """
-    # Автоповторы в случае ошибок
-    for attempt in range(max_retries):
-        try:
-            
-            async with semaphore:  # ← применяем семафор к каждому запросу!
-
-                if count <= 0:
-                    raise ValueError("count must be positive")
-                
-                all_candles: List[KlineRecord] = []
-                current_end = end_timestamp
-                max_per_request = MAX_CANDLES_PER_REQUEST  # Лимит Binance для одного запроса
-
-                while len(all_candles) < count:
-                    remaining = count - len(all_candles)
-                    request_count = min(remaining, max_per_request)
-
-                    if limiter:
-                        # Выясняем вес запроса
-                        request_weight: int = get_kline_weight(request_count)
-                        # Ждем разрешения от rate limiter
-                        await limiter.wait_if_needed(request_weight)
-
-                        url = "https://fapi.binance.com/fapi/v1/klines"
-                        params = {
-                            'symbol': symbol,
-                            'interval': '1m',
-                            'limit': request_count,
-                            'endTime': current_end
-                        }
-
-                        # Формируем полный URL для логирования
-                        full_url = f"{url}?{urlencode(params)}"
-                        logger.debug(f"Запрос к Binance API: {full_url}")    
-
-                        try:
-                            async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                                if response.status == 200:
-                                    data = await response.json()
-
-                                    response_size = len(str(data))
-                                    logger.debug(f"🟢 ДАННЫЕ: Получено {len(data)} свечей, размер ответа ~{response_size} байт")
-
-                                    if data and len(data) > 0:
-                                        for kline in data:
-                                            # Структура, согласно документации
-                                            # https://developers.binance.com/docs/derivatives/usds-margined-futures/market-data/rest-api/Kline-Candlestick-Data
-                                            candle = KlineRecord(
-                                                symbol=symbol,
-                                                open_time=kline[0],
-                                                open=float(kline[1]),
-                                                high=float(kline[2]),
-                                                low=float(kline[3]),
-                                                close=float(kline[4]),
-                                                volume=float(kline[5]),
-                                                close_time=int(kline[6]),
-                                                quote_assets_volume=float(kline[7]),
-                                                num_of_trades=kline[8],
-                                                taker_buy_base_volume=float(kline[9]),
-                                                taker_buy_quote_volume=float(kline[10])
-                                            )
-                                            all_candles.append(candle)
-                                        logger.debug(f"Загружено {len(all_candles)} свечей для {symbol}")
-
-                                        # Обновляем end_timestamp для следующего запроса
-                                        if data:
-                                            current_end = data[0][0] - 1   # <-- ИСПРАВЛЕНО
-                                    else:
-                                        # Пустой ответ – достигли начала истории
-                                        logger.warning(f"⚠️ Для {symbol} нет данных за период {datetime.fromtimestamp(current_end / 1000).strftime('%Y-%m-%d %H:%M:%S')}(пустой ответ).")
-                                        break
-
-                                else:
-                                    logger.error(f"❌ Ошибка HTTP {response.status} для {symbol}")
-                                    await asyncio.sleep(1)
-                                    break
-                                    
-                        except Exception as e:
-                            logger.error(f"❌ Ошибка для {symbol}: {type(e).__name__}: {e}")
-                            # при необходимости добавить traceback
-                            # logger.debug(traceback.format_exc())
-                            break
-
-                # Логируем первую и последнюю свечу полного диапазона (после пагинации)
-                if all_candles:
-                    first_kline = all_candles[0]
-                    last_kline = all_candles[-1]
-
-                    first_time = datetime.fromtimestamp(first_kline.open_time / 1000).strftime('%Y-%m-%d %H:%M:%S')
-                    last_time = datetime.fromtimestamp(last_kline.open_time / 1000).strftime('%Y-%m-%d %H:%M:%S')
-
-                    logger.debug(f"📊 ДИАПАЗОН: {symbol} с {first_time} по {last_time} ({len(all_candles)} свечей)")
-                else:
-                    logger.warning(f"⚠️ Не получено данных для {symbol}")
+    if count <= 0:
+        raise ValueError("count must be positive")
 
-                return all_candles
-            
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            if attempt == max_retries - 1:
-                logger.error(f"❌ Ошибка для {symbol} после {max_retries} попыток: {e}")
+    if pages is None:
+        pages = build_pages(symbol, page_splits(count)[0], end_timestamp)
+
+    # Страницы идут от самой свежей: самой старой достаётся начало колонок
+    total = sum(page.limit for page in pages)
+    minutes = np.empty(total, dtype=np.int64)
+    values = np.empty((total, N_FLOAT_FIELDS), dtype=np.float64)
+    trades = np.empty(total, dtype=np.int64)
+    offsets = np.cumsum([0] + [page.limit for page in reversed(pages)])[-2::-1].tolist()
+
+    if live_minute is None:
+        live_minute = end_timestamp // MINUTE_MS
+
+    async def fetch_page(page: KlinePage, offset: int) -> int | None:
+        part = slice(offset, offset + page.limit)
+        priority = page.priority(live_minute)
+        # Автоповторы в случае ошибок
+        for attempt in range(max_retries):
+            try:
+                # ← применяем семафор к каждому запросу (внутри, только на время HTTP обмена)!
+                return await fetch_kline_page(session, page, limiter, minutes[part], values[part], trades[part],
+                                              priority, semaphore)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == max_retries - 1:
+                    logger.error(f"❌ Ошибка для {symbol} после {max_retries} попыток: {e}")
+                    return None
+                wait = 2 ** attempt  # экспоненциальная задержка
+                logger.warning(f"⚠️ Попытка {attempt+1} для {symbol} не удалась ({e}), повтор через {wait} сек")
+                await asyncio.sleep(wait)
+
+            except Exception as e:
+                logger.error(f"❌ Ошибка для {symbol}: {type(e).__name__}: {e}")
                 return None
-            wait = 2 ** attempt  # экспоненциальная задержка
-            logger.warning(f"⚠️ Попытка {attempt+1} для {symbol} не удалась ({e}), повтор через {wait} сек")
-            await asyncio.sleep(wait)
+
+    results = await asyncio.gather(*(fetch_page(page, offset) for page, offset in zip(pages, offsets)))
+
+    if all(result is None for result in results):
+        return None
+
+    # Оставляем заполненные начала участков страниц
+    filled = np.zeros(total, dtype=bool)
+    for result, offset in zip(results, offsets):
+        if result:
+            filled[offset:offset + result] = True
+    series = KlineSeries(symbol, minutes[filled], values[filled], trades[filled])
+
+    # Логируем первую и последнюю свечу полного диапазона (после пагинации)
+    if len(series):
+        first_time = datetime.fromtimestamp(int(series.minutes[0]) * MINUTE_MS / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        last_time = datetime.fromtimestamp(int(series.minutes[-1]) * MINUTE_MS / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
+        logger.debug(f"📊 ДИАПАЗОН: {symbol} с {first_time} по {last_time} ({len(series)} свечей)")
+    else:
+        logger.warning(f"⚠️ Не получено данных для {symbol}")
+
+    return series
     
 async def fetch_klines_for_symbols(
     session: aiohttp.ClientSession,
     symbols: List[str],
     limiter: BinanceRateLimiter,
-    count: int,
+    count: int | Mapping[str, int],
     end_timestamp: int,
-    max_concurrent: int = THREAD_POOL_SIZE
-) -> OrderedDict[int, list[KlineRecord]]:
+    storage: CandleStorage,
+    max_concurrent: int = THREAD_POOL_SIZE,
+    live_minute: Optional[int] = None,
+    semaphore: Optional[AdaptiveConcurrency] = None
+) -> int:
     """
-    Загружает `count` минутных свечей для всех тикеров и возвращает их,
-    сгруппированными по абсолютному номеру минуты (open_time // 60000).
+    Загружает `count` минутных свечей для всех тикеров и записывает их в хранилище
+    по абсолютному номеру минуты (open_time // 60000).
+
+    Страницы всех тикеров конкурируют за семафор и лимитер по классам: страницы
+    с текущей минутой идут раньше недавних пропусков, те – раньше глубокой докачки.
     
     Args:
         session: aiohttp ClientSession
         symbols: список тикеров
-        count: количество минут (по умолчанию 1)
+        count: количество минут (одно на все тикеры или {тикер: количество})
         end_timestamp: конечная метка времени в мс. Если None → текущая завершённая минута - 1 сек.
-        max_concurrent: макс. параллельных запросов
+        storage: колоночное хранилище, в которое складываются свечи
+        max_concurrent: начальное окно параллельных запросов
+        live_minute: текущая минута для классов страниц (по умолчанию – минута end_timestamp)
+        semaphore: общее окно параллельных запросов нескольких загрузок (по умолчанию – своё,
+            начиная с max_concurrent). Окно подстраивается под задержки и ошибки Binance.
 
     Returns:
-        OrderedDict[int, list[KlineRecord]]:
-            ключ – номер минуты (open_time // 60000),
-            значение – список записей для всех тикеров за эту минуту.
-            Порядок ключей соответствует возрастанию минут (от старых к новым).
+        int: количество записанных в хранилище свечей.
     """
-    if count <= 0:
+    if isinstance(count, int) and count <= 0:
         raise ValueError("count must be positive")
 
-    semaphore = asyncio.Semaphore(min(max_concurrent, 50))
+    if semaphore is None:
+        semaphore = AdaptiveConcurrency(min(max_concurrent, ADAPTIVE_MAX_CONCURRENCY))
+
+    # План страниц с учётом текущего запаса лимитера
+    if limiter:
+        plan = plan_kline_pages(symbols, count, end_timestamp,
+                                limiter.weight_headroom(), limiter.requests_headroom())
+    else:
+        plan = plan_kline_pages(symbols, count, end_timestamp, BINANCE_API_WEIGHT_LIMIT)
+    logger.debug(f"План загрузки: {plan_requests(plan)} запросов, вес {plan_weight(plan)}")
 
     tasks = []
-    for symbol in symbols:
+    for symbol, pages in plan.items():
         task = asyncio.create_task(
-            fetch_klines_paginated(session, symbol, count, end_timestamp, limiter, semaphore)
+            fetch_klines_paginated(session, symbol, sum(page.limit for page in pages), end_timestamp, limiter, semaphore,
+                                   pages=pages, live_minute=live_minute)
         )
         tasks.append(task)
 
-    # Собираем результаты в словарь "минута -> список записей"
-    minute_to_records: dict[int, list[KlineRecord]] = {}
+    written = 0
 
     for task in asyncio.as_completed(tasks):
 
@@ -235,19 +427,11 @@ async def fetch_klines_for_symbols(
             if not result:
                 continue
 
-            # Добавляем каждую свечу в соответствующую минуту
-            for candle in result:
-                minute_key = candle.open_time // 60000
-                minute_to_records.setdefault(minute_key, []).append(candle)
+            # Раскладываем свечи тикера по минутам хранилища
+            written += storage.put_series(result.symbol, result.minutes, result.values, result.trades)
 
         except Exception as e:
             logger.error(f"Ошибка при загрузке данных: {e}")
-                
-
-    sorted_minutes = sorted(minute_to_records.keys())
-    result = OrderedDict((minute, minute_to_records[minute]) for minute in sorted_minutes)
 
-    #logger.info(f"Загружено {len(result)} минут по {len(symbols)} тикерам")
-    non_empty = sum(1 for recs in result.values() if recs)
-    #logger.info(f"Реально загружено {non_empty} минут (из {count})")
-    return result
+    #logger.info(f"Загружено {written} свечей по {len(symbols)} тикерам")
+    return written
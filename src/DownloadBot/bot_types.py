@@ -1,4 +1,10 @@
+from collections.abc import Collection
+from collections.abc import Iterator
+from collections.abc import Sequence
 from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
 
 @dataclass
 class KlineRecord:
@@ -26,3 +32,67 @@ class KlineRecord:
     num_of_trades: int
     # Open time - время открытия свечи
     open_time: int
+
+class KlineColumns(Sequence[KlineRecord]):
+    """
+    Свечи одной минуты в колонках NumPy – так их отдаёт разбор ответов сервера скачивания.
+
+    Для совместимости ведёт себя как список KlineRecord (только чтение): записи создаются
+    при первом обращении и запоминаются. Код, которому нужны числа, читает колонки напрямую
+    и не создаёт ни одного объекта на свечу.
+    """
+
+    def __init__(self, symbols: list[str], values: np.ndarray, trades: np.ndarray,
+                 open_time: np.ndarray, close_time: np.ndarray):
+        # Тикеры
+        self.symbols = symbols
+        # Вещественные поля в порядке RECORD_FORMAT: open, close, high, low, volume,
+        # quote_assets_volume, taker_buy_base_volume, taker_buy_quote_volume, [k, 8]
+        self.values = values
+        # Количество сделок, [k]
+        self.trades = trades
+        # Время открытия и закрытия свечей, [k]
+        self.open_time = open_time
+        self.close_time = close_time
+        self._records: Optional[list[KlineRecord]] = None
+
+    @property
+    def records(self) -> list[KlineRecord]:
+        if self._records is None:
+            self._records = [KlineRecord(
+                                 symbol=symbol,
+                                 open=row[0],
+                                 close=row[1],
+                                 high=row[2],
+                                 low=row[3],
+                                 volume=row[4],
+                                 close_time=close_time,
+                                 quote_assets_volume=row[5],
+                                 taker_buy_base_volume=row[6],
+                                 taker_buy_quote_volume=row[7],
+                                 num_of_trades=num_of_trades,
+                                 open_time=open_time
+                             ) for symbol, row, num_of_trades, open_time, close_time in zip(
+                                 self.symbols, self.values.tolist(), self.trades.tolist(),
+                                 self.open_time.tolist(), self.close_time.tolist())]
+        return self._records
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __iter__(self) -> Iterator[KlineRecord]:
+        return iter(self.records)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence):
+            return self.records == list(other)
+        return NotImplemented
+
+    def select(self, symbols: Collection[str]) -> "KlineColumns":
+        """Свечи только указанных тикеров (без создания KlineRecord)."""
+        mask = np.fromiter((s in symbols for s in self.symbols), dtype=bool, count=len(self.symbols))
+        return KlineColumns([s for s, keep in zip(self.symbols, mask) if keep], self.values[mask],
+                            self.trades[mask], self.open_time[mask], self.close_time[mask])
@@ -1,7 +1,11 @@
 import struct
 import zlib
-from typing import List, Tuple
+from typing import List, Tuple, Sequence, Optional
+
+import numpy as np
+
 from bot_types import KlineRecord
+from bot_types import KlineColumns
 
 class KlineRecordSerializer:
     """
@@ -16,6 +20,55 @@ class KlineRecordSerializer:
     """
     RECORD_FORMAT = '!16s8d2qI'  # 'q' для signed long long, 'I' для unsigned int
     RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+    # Запись с номером тикера из таблицы SymbolTable вместо имени: 2 + 8*8 + 2*8 + 4 = 86 байт
+    ID_RECORD_FORMAT = '!H8d2qI'
+    ID_RECORD_SIZE = struct.calcsize(ID_RECORD_FORMAT)
+    # Тот же формат в виде структурного типа NumPy (big-endian, без выравнивания)
+    RECORD_DTYPE = np.dtype([
+        ('symbol', 'S16'),
+        ('values', '>f8', (8,)),
+        ('close_time', '>i8'),
+        ('open_time', '>i8'),
+        ('num_of_trades', '>u4'),
+    ])
+    ID_RECORD_DTYPE = np.dtype([
+        ('symbol_id', '>u2'),
+        ('values', '>f8', (8,)),
+        ('close_time', '>i8'),
+        ('open_time', '>i8'),
+        ('num_of_trades', '>u4'),
+    ])
+
+    @staticmethod
+    def serialize_columns(symbols: np.ndarray, values: np.ndarray, trades: np.ndarray, open_time: int, close_time: int) -> bytes:
+        """
+        Сериализует свечи одной минуты прямо из массивов хранилища, без KlineRecord.
+        Результат побайтно совпадает с serialize_records.
+
+        Args:
+            symbols: тикеры в UTF-8, массив 'S16', [k]
+            values: вещественные поля в порядке RECORD_FORMAT, [k, 8]
+            trades: количество сделок, [k]
+            open_time, close_time: общие для всех свечей минуты
+        """
+        rows = np.empty(len(symbols), dtype=KlineRecordSerializer.RECORD_DTYPE)
+        rows['symbol'] = symbols
+        rows['values'] = values
+        rows['close_time'] = close_time
+        rows['open_time'] = open_time
+        rows['num_of_trades'] = trades
+        return rows.tobytes()
+
+    @staticmethod
+    def serialize_id_columns(symbol_ids: np.ndarray, values: np.ndarray, trades: np.ndarray, open_time: int, close_time: int) -> bytes:
+        """То же, что serialize_columns, но в формате ID_RECORD_FORMAT: номера тикеров вместо имён."""
+        rows = np.empty(len(symbol_ids), dtype=KlineRecordSerializer.ID_RECORD_DTYPE)
+        rows['symbol_id'] = symbol_ids
+        rows['values'] = values
+        rows['close_time'] = close_time
+        rows['open_time'] = open_time
+        rows['num_of_trades'] = trades
+        return rows.tobytes()
 
     @staticmethod
     def serialize_records(records: List[KlineRecord]) -> bytes:
@@ -42,42 +95,52 @@ class KlineRecordSerializer:
             data.extend(packed)
         return bytes(data)
 
+    @staticmethod
+    def deserialize_array(data: bytes) -> np.ndarray:
+        """
+        Представляет блок записей структурным массивом RECORD_DTYPE без копирования
+        (неполная запись в конце отбрасывается).
+        """
+        return np.frombuffer(data, dtype=KlineRecordSerializer.RECORD_DTYPE,
+                             count=len(data) // KlineRecordSerializer.RECORD_SIZE)
+
+    @staticmethod
+    def deserialize_id_array(data: bytes) -> np.ndarray:
+        """То же, что deserialize_array, для записей с номерами тикеров (ID_RECORD_DTYPE)."""
+        return np.frombuffer(data, dtype=KlineRecordSerializer.ID_RECORD_DTYPE,
+                             count=len(data) // KlineRecordSerializer.ID_RECORD_SIZE)
+
+    @staticmethod
+    def columns_from_array(rows: np.ndarray, symbols: Optional[Sequence[str]] = None) -> KlineColumns:
+        """
+        Колонки свечей из структурного массива deserialize_array / deserialize_id_array.
+        Имена тикеров декодируются один раз на блок; для записей с номерами symbols – тикеры
+        по номерам из таблицы той же версии, что и в запросе.
+        """
+        if symbols is None:
+            names = [name.decode('utf-8') for name in rows['symbol'].tolist()]
+        else:
+            names = [symbols[i] for i in rows['symbol_id'].tolist()]
+        return KlineColumns(names, rows['values'].astype(np.float64), rows['num_of_trades'].astype(np.int64),
+                            rows['open_time'].astype(np.int64), rows['close_time'].astype(np.int64))
+
+    @staticmethod
+    def columns_from_codec(symbols: Sequence[str], values: np.ndarray, trades: np.ndarray,
+                           open_time: int, close_time: int) -> KlineColumns:
+        """Колонки свечей из блока kline_codec.decode_columns: время у всех свечей минуты общее."""
+        count = len(symbols)
+        return KlineColumns(list(symbols), values, trades,
+                            np.full(count, open_time, dtype=np.int64), np.full(count, close_time, dtype=np.int64))
+
     @staticmethod
     def deserialize_records(data: bytes) -> List[KlineRecord]:
         """Десериализует бинарный блок в список записей."""
-        records = []
-        offset = 0
-        while offset + KlineRecordSerializer.RECORD_SIZE <= len(data):
-            record_data = data[offset:offset + KlineRecordSerializer.RECORD_SIZE]
-            (symbol_bytes,
-             open_,
-             close_,
-             high_,
-             low_,
-             volume_,
-             quote_assets_volume_,
-             taker_buy_base_volume_,
-             taker_buy_quote_volume_,
-             close_time_,
-             open_time_,
-             num_of_trades_) = struct.unpack(
-                KlineRecordSerializer.RECORD_FORMAT, record_data
-            )
-            symbol = symbol_bytes.decode('utf-8').rstrip('\x00')
-            record = KlineRecord(
-                symbol=symbol,
-                open=open_,
-                close=close_,
-                high=high_,
-                low=low_,
-                volume=volume_,
-                close_time=close_time_,
-                quote_assets_volume=quote_assets_volume_,
-                taker_buy_base_volume=taker_buy_base_volume_,
-                taker_buy_quote_volume=taker_buy_quote_volume_,
-                num_of_trades=num_of_trades_,
-                open_time=open_time_
-            )
-            records.append(record)
-            offset += KlineRecordSerializer.RECORD_SIZE
-        return records
\ No newline at end of file
+        return KlineRecordSerializer.columns_from_array(KlineRecordSerializer.deserialize_array(data)).records
+
+    @staticmethod
+    def deserialize_id_records(data: bytes, symbols: Sequence[str]) -> List[KlineRecord]:
+        """
+        Десериализует блок записей с номерами тикеров (ID_RECORD_FORMAT).
+        symbols – тикеры по номерам из таблицы той же версии, что и в запросе.
+        """
+        return KlineRecordSerializer.columns_from_array(KlineRecordSerializer.deserialize_id_array(data), symbols).records
@@ -0,0 +1,311 @@
+"""
+Дисковый архив минутных свечей.
+
+Каждое поле свечи хранится в отдельном append-only файле: одна строка файла – одна
+минута, ARCHIVE_MAX_SYMBOLS столбцов (по столбцу на тикер). Рядом лежит index.json
+с первой минутой, количеством минут и списком тикеров по столбцам.
+
+При старте файлы отображаются в память (np.memmap) и копируются в CandleStorage,
+поэтому после перезапуска достаточно докачать только минуты после последней в архиве.
+"""
+
+import os
+import json
+
+from typing import Optional
+
+import numpy as np
+
+from logger import logger
+from candle_storage import CandleStorage
+from candle_storage import FLOAT_FIELDS
+from candle_storage import N_FLOAT_FIELDS
+from DownloadBot.config import *
+
+# Служебные (не вещественные) колонки архива
+TRADES_FIELD = 'num_of_trades'
+PRESENT_FIELD = 'present'
+
+class CandleArchive:
+    """Append-only архив свечей с колонками в отдельных файлах и индексом."""
+
+    INDEX_FILE = "index.json"
+    INDEX_VERSION = 1
+
+    def __init__(self, path: str, max_symbols: int = ARCHIVE_MAX_SYMBOLS):
+        self.path = path
+        self.max_symbols = max_symbols
+        self.first_minute: Optional[int] = None
+        self.count: int = 0
+        self.symbols: list[str] = []
+        self._columns: dict[str, int] = {}
+
+        os.makedirs(self.path, exist_ok=True)
+        self._load_index()
+
+    # ---------- Файлы ----------
+
+    @staticmethod
+    def _dtype(field: str) -> np.dtype:
+        if field == TRADES_FIELD:
+            return np.dtype(np.int64)
+        if field == PRESENT_FIELD:
+            return np.dtype(np.bool_)
+        return np.dtype(np.float64)
+
+    @staticmethod
+    def _fields() -> tuple[str, ...]:
+        return FLOAT_FIELDS + (TRADES_FIELD, PRESENT_FIELD)
+
+    def _file(self, field: str) -> str:
+        return os.path.join(self.path, f"{field}.bin")
+
+    def _row_bytes(self, field: str) -> int:
+        return self.max_symbols * self._dtype(field).itemsize
+
+    def _map(self, field: str, mode: str = 'r') -> np.memmap:
+        return np.memmap(self._file(field), dtype=self._dtype(field), mode=mode,
+                         shape=(self.count, self.max_symbols))
+
+    @property
+    def last_minute(self) -> Optional[int]:
+        if self.first_minute is None or self.count == 0:
+            return None
+        return self.first_minute + self.count - 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ---------- Индекс ----------
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            self._reset()
+            return
+
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != self.INDEX_VERSION:
+                raise ValueError(f"неподдерживаемая версия {index.get('version')}")
+            self.first_minute = index['first_minute']
+            self.count = index['count']
+            self.max_symbols = index['max_symbols']
+            self.symbols = list(index['symbols'])
+            self._columns = {symbol: i for i, symbol in enumerate(self.symbols)}
+        except Exception as e:
+            logger.error(f"Индекс архива {index_path} повреждён ({e}), архив будет создан заново")
+            self._reset()
+            return
+
+        # Данные пишутся раньше индекса: обрезаем хвост, не попавший в индекс после сбоя
+        for field in self._fields():
+            expected = self.count * self._row_bytes(field)
+            path = self._file(field)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < expected:
+                logger.error(f"Файл архива {path} короче индекса, архив будет создан заново")
+                self._reset()
+                return
+            if size > expected:
+                with open(path, 'r+b') as f:
+                    f.truncate(expected)
+
+    def _save_index(self) -> None:
+        index = {
+            'version': self.INDEX_VERSION,
+            'first_minute': self.first_minute,
+            'count': self.count,
+            'max_symbols': self.max_symbols,
+            'symbols': self.symbols,
+        }
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+    def _reset(self) -> None:
+        self.first_minute = None
+        self.count = 0
+        self.symbols = []
+        self._columns = {}
+        for field in self._fields():
+            with open(self._file(field), 'wb'):
+                pass
+        self._save_index()
+
+    # ---------- Столбцы ----------
+
+    def _archive_columns(self, storage: CandleStorage) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Сопоставляет столбцы хранилища столбцам архива, добавляя в архив новые тикеры.
+
+        Returns:
+            (storage_columns, archive_columns) одинаковой длины.
+        """
+        for symbol in storage.symbols:
+            if symbol not in self._columns:
+                if len(self.symbols) >= self.max_symbols:
+                    self._widen(max(self.max_symbols * 2, len(self.symbols) + 1))
+                self._columns[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+
+        storage_columns = np.arange(storage.symbols_count, dtype=np.int64)
+        archive_columns = np.array([self._columns[s] for s in storage.symbols], dtype=np.int64)
+        return storage_columns, archive_columns
+
+    def _widen(self, new_max_symbols: int) -> None:
+        """Переписывает файлы с более широкой строкой (редкая операция при росте числа тикеров)."""
+        logger.info(f"Расширяем архив с {self.max_symbols} до {new_max_symbols} столбцов")
+        for field in self._fields():
+            old = self._map(field) if self.count else None
+            data = np.zeros((self.count, new_max_symbols), dtype=self._dtype(field))
+            if old is not None:
+                data[:, :self.max_symbols] = old
+                del old
+            tmp_path = self._file(field) + ".tmp"
+            data.tofile(tmp_path)
+            os.replace(tmp_path, self._file(field))
+        self.max_symbols = new_max_symbols
+        self._save_index()
+
+    # ---------- Запись ----------
+
+    def _rows_from_storage(self, storage: CandleStorage, minutes: range) -> dict[str, np.ndarray]:
+        """Собирает строки архива за указанные минуты из хранилища."""
+        storage_columns, archive_columns = self._archive_columns(storage)
+        rows = {field: np.zeros((len(minutes), self.max_symbols), dtype=self._dtype(field))
+                for field in self._fields()}
+
+        for i, minute in enumerate(minutes):
+            arrays = storage.minute_arrays(minute)
+            if arrays is None:
+                continue
+            values, trades, present = arrays
+            for f, field in enumerate(FLOAT_FIELDS):
+                rows[field][i, archive_columns] = values[storage_columns, f]
+            rows[TRADES_FIELD][i, archive_columns] = trades[storage_columns]
+            rows[PRESENT_FIELD][i, archive_columns] = present[storage_columns]
+        return rows
+
+    def append_from(self, storage: CandleStorage, until_minute: Optional[int] = None) -> int:
+        """
+        Дописывает в архив минуты хранилища, которых в нём ещё нет.
+
+        Args:
+            storage: хранилище свечей
+            until_minute: последняя минута для записи (по умолчанию – последняя минута хранилища)
+
+        Returns:
+            количество дописанных минут.
+        """
+        if not storage:
+            return 0
+
+        end = storage.last_minute if until_minute is None else min(until_minute, storage.last_minute)
+
+        if self.last_minute is None or storage.first_minute > self.last_minute + 1:
+            # Архив пуст или между архивом и хранилищем разрыв – начинаем архив заново
+            if self.count:
+                logger.warning("Между архивом и хранилищем разрыв, архив начинается заново")
+                self._reset()
+            start = storage.first_minute
+            self.first_minute = start
+        else:
+            start = self.last_minute + 1
+
+        if end < start:
+            return 0
+
+        minutes = range(start, end + 1)
+        rows = self._rows_from_storage(storage, minutes)
+        for field, data in rows.items():
+            with open(self._file(field), 'ab') as f:
+                f.write(data.tobytes())
+        self.count += len(minutes)
+        self._save_index()
+        return len(minutes)
+
+    def rewrite_minutes(self, storage: CandleStorage, minutes: list[int]) -> int:
+        """Перезаписывает на месте уже заархивированные минуты (например, после докачки пропусков)."""
+        minutes = [m for m in minutes if self.last_minute is not None and self.first_minute <= m <= self.last_minute]
+        if not minutes:
+            return 0
+
+        symbols_before = len(self.symbols)
+        width_before = self.max_symbols
+        rewritten = 0
+        for minute in minutes:
+            # Минуты, которых уже нет в хранилище, не затираем пустой строкой
+            if storage.minute_arrays(minute) is None:
+                continue
+            rewritten += 1
+            rows = self._rows_from_storage(storage, range(minute, minute + 1))
+            for field, data in rows.items():
+                mapped = self._map(field, mode='r+')
+                mapped[minute - self.first_minute] = data[0]
+                mapped.flush()
+                del mapped
+
+        if len(self.symbols) != symbols_before or self.max_symbols != width_before:
+            self._save_index()
+        return rewritten
+
+    def compact(self, keep_minutes: int) -> None:
+        """Оставляет в архиве только последние keep_minutes минут (переписывая файлы)."""
+        if self.count <= keep_minutes:
+            return
+
+        drop = self.count - keep_minutes
+        for field in self._fields():
+            mapped = self._map(field)
+            tail = np.array(mapped[drop:])
+            del mapped
+            tmp_path = self._file(field) + ".tmp"
+            tail.tofile(tmp_path)
+            os.replace(tmp_path, self._file(field))
+
+        self.first_minute += drop
+        self.count = keep_minutes
+        self._save_index()
+        logger.info(f"Архив сжат до {keep_minutes} минут")
+
+    # ---------- Чтение ----------
+
+    def load_into(self, storage: CandleStorage) -> int:
+        """
+        Копирует в хранилище последние minutes архива (не больше capacity хранилища).
+
+        Returns:
+            количество загруженных минут.
+        """
+        if self.count == 0:
+            return 0
+
+        n = min(self.count, storage.capacity)
+        offset = self.count - n
+
+        maps = {field: self._map(field) for field in self._fields()}
+        present_all = maps[PRESENT_FIELD]
+
+        # Столбцы хранилища для всех тикеров архива
+        storage_columns = np.array([storage.ensure_column(s) for s in self.symbols], dtype=np.int64)
+        width = len(self.symbols)
+
+        loaded = 0
+        for i in range(offset, self.count):
+            present = np.asarray(present_all[i, :width])
+            if not present.any():
+                continue
+            archive_columns = np.flatnonzero(present)
+            values = np.empty((archive_columns.size, N_FLOAT_FIELDS), dtype=np.float64)
+            for f, field in enumerate(FLOAT_FIELDS):
+                values[:, f] = maps[field][i, archive_columns]
+            trades = maps[TRADES_FIELD][i, archive_columns]
+            if storage.put_minute(self.first_minute + i, storage_columns[archive_columns], values, trades):
+                loaded += 1
+
+        del maps, present_all
+        return loaded
@@ -0,0 +1,435 @@
+"""
+Колоночное хранилище минутных свечей.
+
+Вместо словаря <НОМЕР_МИНУТЫ List<KlineRecord>> свечи хранятся в массивах NumPy
+фиксированной формы: минуты × тикеры × поля. Минута с номером N лежит в слоте
+N % capacity кольцевого буфера, поэтому вытеснение старых минут – это сдвиг
+указателя, а не сортировка и удаление ключей.
+"""
+
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+
+from bot_types import KlineRecord
+
+# Вещественные поля свечи в порядке хранения (совпадает с порядком в KlineRecordSerializer)
+FLOAT_FIELDS: tuple[str, ...] = (
+    'open',
+    'close',
+    'high',
+    'low',
+    'volume',
+    'quote_assets_volume',
+    'taker_buy_base_volume',
+    'taker_buy_quote_volume',
+)
+
+FIELD_OPEN = 0
+FIELD_CLOSE = 1
+FIELD_HIGH = 2
+FIELD_LOW = 3
+FIELD_VOLUME = 4
+FIELD_QUOTE_VOLUME = 5
+FIELD_TAKER_BASE_VOLUME = 6
+FIELD_TAKER_QUOTE_VOLUME = 7
+
+N_FLOAT_FIELDS = len(FLOAT_FIELDS)
+
+# Длительность минуты в миллисекундах. close_time свечи Binance = open_time + 59999
+MINUTE_MS = 60000
+
+# На сколько столбцов расширять массивы, когда тикеров становится больше, чем столбцов.
+# Удвоение при ~550 тикерах Binance дало бы 1024 столбца и вдвое больше памяти, чем нужно
+SYMBOLS_GROWTH_STEP = 64
+
+class CandleStorage:
+    """
+    Кольцевой буфер минутных свечей всех тикеров.
+
+    Хранит непрерывный диапазон минут [first_minute, last_minute] длиной не больше capacity.
+    Каждому тикеру при первом появлении выдаётся собственный столбец, который больше
+    никогда не меняется (стабильное отображение symbol -> column).
+
+    open_time и close_time не хранятся: они однозначно следуют из номера минуты.
+
+    Ячейка (минута × тикер) занимает 73 байта: 8 полей float64, int64 сделок и bool наличия.
+    При 2880 минутах и 576 столбцах (~550 тикеров, рост по SYMBOLS_GROWTH_STEP) это ~116 МБ.
+    """
+
+    def __init__(self, capacity: int, symbols_capacity: int = 512):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = capacity
+
+        # минуты × тикеры × поля
+        self._values = np.zeros((capacity, symbols_capacity, N_FLOAT_FIELDS), dtype=np.float64)
+        # количество сделок: минуты × тикеры
+        self._trades = np.zeros((capacity, symbols_capacity), dtype=np.int64)
+        # признак наличия свечи: минуты × тикеры
+        self._present = np.zeros((capacity, symbols_capacity), dtype=np.bool_)
+        # номер минуты, записанной в слот (-1 – слот пуст)
+        self._slot_minutes = np.full(capacity, -1, dtype=np.int64)
+        # счётчик изменений слота: по нему кеши понимают, что минуту нужно пересобрать
+        self._slot_revisions = np.zeros(capacity, dtype=np.int64)
+
+        self._symbols: list[str] = []
+        self._columns: dict[str, int] = {}
+
+        self._first_minute: Optional[int] = None
+        self._last_minute: Optional[int] = None
+
+    # ---------- Тикеры ----------
+
+    @property
+    def symbols(self) -> list[str]:
+        """Тикеры в порядке столбцов."""
+        return list(self._symbols)
+
+    @property
+    def symbols_count(self) -> int:
+        return len(self._symbols)
+
+    def column_of(self, symbol: str) -> Optional[int]:
+        """Возвращает столбец тикера или None, если тикер ещё не встречался."""
+        return self._columns.get(symbol)
+
+    def ensure_column(self, symbol: str) -> int:
+        """Возвращает столбец тикера, при необходимости выделяя новый."""
+        column = self._columns.get(symbol)
+        if column is not None:
+            return column
+
+        column = len(self._symbols)
+        if column >= self._present.shape[1]:
+            self._grow_symbols(max(self._present.shape[1] + SYMBOLS_GROWTH_STEP, column + 1))
+
+        self._symbols.append(symbol)
+        self._columns[symbol] = column
+        return column
+
+    def _grow_symbols(self, new_capacity: int) -> None:
+        """Расширяет массивы по оси тикеров. Существующие столбцы сохраняют свои номера."""
+        extra = new_capacity - self._present.shape[1]
+        self._values = np.concatenate(
+            (self._values, np.zeros((self.capacity, extra, N_FLOAT_FIELDS), dtype=np.float64)), axis=1)
+        self._trades = np.concatenate(
+            (self._trades, np.zeros((self.capacity, extra), dtype=np.int64)), axis=1)
+        self._present = np.concatenate(
+            (self._present, np.zeros((self.capacity, extra), dtype=np.bool_)), axis=1)
+
+    # ---------- Минуты ----------
+
+    @property
+    def first_minute(self) -> Optional[int]:
+        """Самая старая минута в хранилище (None, если хранилище пусто)."""
+        return self._first_minute
+
+    @property
+    def last_minute(self) -> Optional[int]:
+        """Самая свежая минута в хранилище (None, если хранилище пусто)."""
+        return self._last_minute
+
+    def __len__(self) -> int:
+        if self._last_minute is None:
+            return 0
+        return self._last_minute - self._first_minute + 1
+
+    def __bool__(self) -> bool:
+        return self._last_minute is not None
+
+    def minutes(self) -> range:
+        """Номера минут хранилища по возрастанию."""
+        if self._last_minute is None:
+            return range(0)
+        return range(self._first_minute, self._last_minute + 1)
+
+    def _slot(self, minute: int) -> Optional[int]:
+        """Слот, в котором лежит минута, или None, если минуты нет в хранилище."""
+        if self._last_minute is None or minute < self._first_minute or minute > self._last_minute:
+            return None
+        slot = minute % self.capacity
+        if self._slot_minutes[slot] != minute:
+            return None
+        return slot
+
+    def _reset_slots(self, first: int, last: int) -> None:
+        """Очищает слоты под минуты [first, last] (не более capacity штук)."""
+        minutes = np.arange(max(first, last - self.capacity + 1), last + 1, dtype=np.int64)
+        slots = minutes % self.capacity
+        self._present[slots] = False
+        self._slot_minutes[slots] = minutes
+        self._slot_revisions[slots] += 1
+
+    def _acquire_slot(self, minute: int) -> Optional[int]:
+        """
+        Возвращает слот для записи минуты, сдвигая границы хранилища.
+        Минуты старше окна capacity не принимаются (None).
+        """
+        if self._last_minute is None:
+            self._reset_slots(minute, minute)
+            self._first_minute = minute
+            self._last_minute = minute
+            return minute % self.capacity
+
+        if minute > self._last_minute:
+            # Сдвигаем голову: слоты новых минут затирают самые старые
+            self._reset_slots(self._last_minute + 1, minute)
+            self._last_minute = minute
+            self._first_minute = max(self._first_minute, minute - self.capacity + 1)
+        elif minute < self._first_minute:
+            if minute <= self._last_minute - self.capacity:
+                return None
+            # Дозапись истории назад, в пределах окна
+            self._reset_slots(minute, self._first_minute - 1)
+            self._first_minute = minute
+
+        return minute % self.capacity
+
+    def evict_before(self, minute: int) -> None:
+        """Забывает все минуты старше `minute`. Выполняется за O(1): слоты очищаются при переиспользовании."""
+        if self._last_minute is None or minute <= self._first_minute:
+            return
+        if minute > self._last_minute:
+            self._first_minute = None
+            self._last_minute = None
+            return
+        self._first_minute = minute
+
+    # ---------- Запись ----------
+
+    def put(self, symbol: str, minute: int, values: Iterable[float], num_of_trades: int) -> bool:
+        """
+        Записывает одну свечу.
+
+        Args:
+            symbol: тикер
+            minute: номер минуты (open_time // 60000)
+            values: вещественные поля в порядке FLOAT_FIELDS
+            num_of_trades: количество сделок
+
+        Returns:
+            True, если свеча записана; False, если минута старше окна хранилища.
+        """
+        column = self.ensure_column(symbol)
+        slot = self._acquire_slot(minute)
+        if slot is None:
+            return False
+        self._values[slot, column] = values
+        self._trades[slot, column] = num_of_trades
+        self._present[slot, column] = True
+        self._slot_revisions[slot] += 1
+        return True
+
+    def put_record(self, record: KlineRecord) -> bool:
+        """Записывает KlineRecord в хранилище."""
+        return self.put(
+            record.symbol,
+            record.open_time // MINUTE_MS,
+            (record.open,
+             record.close,
+             record.high,
+             record.low,
+             record.volume,
+             record.quote_assets_volume,
+             record.taker_buy_base_volume,
+             record.taker_buy_quote_volume),
+            record.num_of_trades
+        )
+
+    def put_records(self, records: Iterable[KlineRecord]) -> int:
+        """Записывает набор свечей. Возвращает количество принятых записей."""
+        written = 0
+        for record in records:
+            if self.put_record(record):
+                written += 1
+        return written
+
+    def put_minute(self, minute: int, columns: np.ndarray, values: np.ndarray, trades: np.ndarray) -> bool:
+        """
+        Записывает пачку свечей одной минуты.
+
+        Args:
+            minute: номер минуты
+            columns: столбцы тикеров, [k]
+            values: вещественные поля, [k, N_FLOAT_FIELDS]
+            trades: количество сделок, [k]
+
+        Returns:
+            True, если минута записана; False, если она старше окна хранилища.
+        """
+        slot = self._acquire_slot(minute)
+        if slot is None:
+            return False
+        self._values[slot, columns] = values
+        self._trades[slot, columns] = trades
+        self._present[slot, columns] = True
+        self._slot_revisions[slot] += 1
+        return True
+
+    def put_series(self, symbol: str, minutes: np.ndarray, values: np.ndarray, trades: np.ndarray) -> int:
+        """
+        Записывает пачку свечей одного тикера за разные минуты.
+
+        Args:
+            symbol: тикер
+            minutes: номера минут, [n]
+            values: вещественные поля в порядке FLOAT_FIELDS, [n, N_FLOAT_FIELDS]
+            trades: количество сделок, [n]
+
+        Returns:
+            количество записанных свечей (минуты старше окна хранилища отбрасываются).
+        """
+        if len(minutes) == 0:
+            return 0
+        column = self.ensure_column(symbol)
+        # Сначала сдвигаем голову к самой свежей минуте, затем дописываем историю в пределах окна
+        self._acquire_slot(int(minutes.max()))
+        keep = minutes > self._last_minute - self.capacity
+        minutes = minutes[keep]
+        if minutes.size == 0:
+            return 0
+        self._acquire_slot(int(minutes.min()))
+
+        slots = minutes % self.capacity
+        self._values[slots, column] = values[keep]
+        self._trades[slots, column] = trades[keep]
+        self._present[slots, column] = True
+        self._slot_revisions[np.unique(slots)] += 1
+        return int(minutes.size)
+
+    # ---------- Чтение ----------
+
+    def has_minute(self, minute: int) -> bool:
+        """True, если за минуту есть хотя бы одна свеча."""
+        slot = self._slot(minute)
+        return slot is not None and bool(self._present[slot, :len(self._symbols)].any())
+
+    def has_candle(self, symbol: str, minute: int) -> bool:
+        """True, если свеча тикера за минуту есть в хранилище."""
+        column = self._columns.get(symbol)
+        slot = self._slot(minute)
+        return column is not None and slot is not None and bool(self._present[slot, column])
+
+    def last_candle_minute(self, symbol: str) -> Optional[int]:
+        """Самая свежая минута, за которую в хранилище есть свеча тикера (None, если таких нет)."""
+        column = self._columns.get(symbol)
+        if column is None or self._last_minute is None:
+            return None
+        minutes = np.arange(self._last_minute, self._first_minute - 1, -1, dtype=np.int64)
+        slots = minutes % self.capacity
+        filled = (self._slot_minutes[slots] == minutes) & self._present[slots, column]
+        hits = np.flatnonzero(filled)
+        return int(minutes[hits[0]]) if hits.size else None
+
+    def minute_revisions(self, minutes: range) -> np.ndarray:
+        """
+        Счётчики изменений для диапазона минут (-1 для минут вне хранилища).
+        Счётчик минуты меняется при каждой записи в неё.
+        """
+        result = np.full(len(minutes), -1, dtype=np.int64)
+        if self._last_minute is None or len(minutes) == 0:
+            return result
+        numbers = np.arange(minutes.start, minutes.stop, dtype=np.int64)
+        slots = numbers % self.capacity
+        valid = ((numbers >= self._first_minute) & (numbers <= self._last_minute) &
+                 (self._slot_minutes[slots] == numbers))
+        result[valid] = self._slot_revisions[slots[valid]]
+        return result
+
+    def minute_arrays(self, minute: int) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Возвращает представления (values, trades, present) для минуты без копирования.
+        Формы: [symbols, N_FLOAT_FIELDS], [symbols], [symbols]. None, если минуты нет.
+        """
+        slot = self._slot(minute)
+        if slot is None:
+            return None
+        n = len(self._symbols)
+        return self._values[slot, :n], self._trades[slot, :n], self._present[slot, :n]
+
+    def get_minute(self, minute: int) -> list[KlineRecord]:
+        """Собирает список KlineRecord за минуту (в порядке столбцов)."""
+        arrays = self.minute_arrays(minute)
+        if arrays is None:
+            return []
+        values, trades, present = arrays
+
+        open_time = minute * MINUTE_MS
+        close_time = open_time + MINUTE_MS - 1
+
+        records: list[KlineRecord] = []
+        for column in np.flatnonzero(present):
+            row = values[column].tolist()
+            records.append(KlineRecord(
+                symbol=self._symbols[column],
+                open=row[FIELD_OPEN],
+                close=row[FIELD_CLOSE],
+                high=row[FIELD_HIGH],
+                low=row[FIELD_LOW],
+                volume=row[FIELD_VOLUME],
+                close_time=close_time,
+                quote_assets_volume=row[FIELD_QUOTE_VOLUME],
+                taker_buy_base_volume=row[FIELD_TAKER_BASE_VOLUME],
+                taker_buy_quote_volume=row[FIELD_TAKER_QUOTE_VOLUME],
+                num_of_trades=int(trades[column]),
+                open_time=open_time
+            ))
+        return records
+
+    def missing_minutes(self) -> list[int]:
+        """Минуты внутри диапазона хранилища, за которые нет ни одной свечи."""
+        if self._last_minute is None:
+            return []
+        minutes = np.arange(self._first_minute, self._last_minute + 1, dtype=np.int64)
+        slots = minutes % self.capacity
+        filled = (self._slot_minutes[slots] == minutes) & self._present[slots, :len(self._symbols)].any(axis=1)
+        return minutes[~filled].tolist()
+
+    def missing_ranges(self, symbols: Iterable[str], until_minute: Optional[int] = None) -> dict[str, list[tuple[int, int]]]:
+        """
+        Пропуски по каждому тикеру – непрерывные диапазоны минут [start, end] внутри хранилища
+        (до until_minute включительно), за которые нет свечи тикера. Считаются по признаку
+        наличия свечи (минута × тикер) сразу для всех тикеров.
+
+        Args:
+            symbols: тикеры; тикер без столбца пропускает весь диапазон
+            until_minute: последняя проверяемая минута (по умолчанию last_minute)
+
+        Returns:
+            {тикер: диапазоны по возрастанию} только для тикеров с пропусками.
+        """
+        if self._last_minute is None:
+            return {}
+        last = self._last_minute if until_minute is None else min(until_minute, self._last_minute)
+        if last < self._first_minute:
+            return {}
+
+        symbols = list(symbols)
+        known = [symbol for symbol in symbols if symbol in self._columns]
+        columns = np.array([self._columns[symbol] for symbol in known], dtype=np.int64)
+
+        minutes = np.arange(self._first_minute, last + 1, dtype=np.int64)
+        slots = minutes % self.capacity
+        valid = self._slot_minutes[slots] == minutes
+        # тикеры × минуты, с пустой минутой по краям: переходы 0 -> 1 – начала пропусков, 1 -> 0 – концы
+        holes = np.zeros((len(known), minutes.size + 2), dtype=np.int8)
+        holes[:, 1:-1] = ~(self._present[np.ix_(slots, columns)] & valid[:, None]).T
+        edges = np.diff(holes, axis=1)
+        starts = np.argwhere(edges == 1)
+        ends = np.argwhere(edges == -1)
+
+        result: dict[str, list[tuple[int, int]]] = {}
+        for (row, start), (_, end) in zip(starts.tolist(), ends.tolist()):
+            result.setdefault(known[row], []).append((self._first_minute + start, self._first_minute + end - 1))
+        for symbol in symbols:
+            if symbol not in self._columns:
+                result[symbol] = [(self._first_minute, last)]
+        return result
+
+    def memory_bytes(self) -> int:
+        """Объём памяти, занятый массивами хранилища."""
+        return (self._values.nbytes + self._trades.nbytes + self._present.nbytes +
+                self._slot_minutes.nbytes + self._slot_revisions.nbytes)
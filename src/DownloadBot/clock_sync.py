@@ -0,0 +1,186 @@
+"""
+Синхронизация часов с Binance.
+
+Смещение считается по схеме NTP: запрос /fapi/v1/time уходит в момент t0, ответ приходит в t1,
+serverTime сопоставляется с серединой (t0 + t1) / 2, и ошибка оценки не больше половины RTT.
+Из серии из CLOCK_SYNC_PROBES запросов остаётся образец с наименьшим RTT (остальные искажены
+очередями). По последним CLOCK_SYNC_SAMPLES таким образцам, без образцов с RTT намного больше
+лучшего, методом наименьших квадратов оцениваются смещение и дрейф локальных часов.
+Между синхронизациями, которые идут раз в CLOCK_SYNC_INTERVAL_SECONDS в фоне, смещение
+продолжается по дрейфу – циклу загрузки больше не нужен HTTP запрос, чтобы узнать время.
+"""
+
+import time
+import asyncio
+import aiohttp
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+from typing import Optional
+
+from logger import logger
+from binance_utils import get_binance_server_time
+from DownloadBot.config import *
+
+@dataclass(frozen=True)
+class ClockSample:
+    """Один замер времени Binance."""
+    # локальное время середины запроса, мс
+    local_ms: float
+    # смещение Binance - локальное время в середине запроса, мс
+    offset_ms: float
+    # время запроса туда и обратно, мс
+    rtt_ms: float
+
+class ClockSync:
+    """
+    Оценка смещения (Binance - локальное время) с учётом RTT и дрейфа.
+
+    Пока нет ни одного замера, смещение равно 0. Скачок смещения больше CLOCK_SYNC_STEP_MS
+    относительно прогноза (например, перевели системные часы) сбрасывает историю замеров.
+    """
+
+    def __init__(self,
+                 on_update: Optional[Callable[[int], None]] = None,
+                 interval: float = CLOCK_SYNC_INTERVAL_SECONDS,
+                 probes: int = CLOCK_SYNC_PROBES,
+                 samples: int = CLOCK_SYNC_SAMPLES,
+                 max_drift_ppm: float = CLOCK_SYNC_MAX_DRIFT_PPM,
+                 step_ms: float = CLOCK_SYNC_STEP_MS,
+                 clock: Callable[[], float] = time.time):
+        if probes <= 0:
+            raise ValueError("probes must be positive")
+
+        # Вызывается с новым смещением (мс) после каждой синхронизации
+        self.on_update = on_update
+        self.interval = interval
+        self.probes = probes
+        self.max_drift_ppm = max_drift_ppm
+        self.step_ms = step_ms
+        self._clock = clock
+
+        self._samples: deque[ClockSample] = deque(maxlen=samples)
+        # Оценка: смещение в момент _ref_ms и дрейф (мс смещения на мс локального времени)
+        self._ref_ms: float = 0.0
+        self._ref_offset: float = 0.0
+        self._drift: float = 0.0
+
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def synced(self) -> bool:
+        """Есть хотя бы один замер."""
+        return bool(self._samples)
+
+    @property
+    def drift_ppm(self) -> float:
+        """Дрейф локальных часов относительно Binance, миллионных долей."""
+        return self._drift * 1e6
+
+    @property
+    def best_rtt_ms(self) -> Optional[float]:
+        """Наименьший RTT среди учитываемых замеров."""
+        return min(s.rtt_ms for s in self._samples) if self._samples else None
+
+    def local_ms(self) -> float:
+        return self._clock() * 1000
+
+    def offset_at(self, local_ms: float) -> float:
+        """Смещение (Binance - локальное) в локальный момент local_ms, мс."""
+        return self._ref_offset + self._drift * (local_ms - self._ref_ms)
+
+    def offset_ms(self) -> int:
+        """Текущее смещение (Binance - локальное), мс."""
+        return round(self.offset_at(self.local_ms()))
+
+    def now_ms(self) -> int:
+        """Текущее время Binance, мс."""
+        local_ms = self.local_ms()
+        return int(local_ms + self.offset_at(local_ms))
+
+    def add_sample(self, sent_ms: float, server_ms: float, received_ms: float) -> ClockSample:
+        """
+        Учитывает замер: запрос отправлен в sent_ms, ответ с serverTime = server_ms получен
+        в received_ms (локальное время, мс). Возвращает замер.
+        """
+        local_ms = (sent_ms + received_ms) / 2
+        sample = ClockSample(local_ms, server_ms - local_ms, received_ms - sent_ms)
+
+        if self._samples and abs(sample.offset_ms - self.offset_at(local_ms)) > self.step_ms + sample.rtt_ms / 2:
+            logger.info(f"Коррекция времени: смещение изменено с {self.offset_at(local_ms):.0f} мс "
+                        f"на {sample.offset_ms:.0f} мс")
+            self._samples.clear()
+        self._samples.append(sample)
+        self._estimate()
+        return sample
+
+    def _estimate(self) -> None:
+        """Смещение и дрейф по замерам с RTT не больше двух лучших (с запасом на точность serverTime)."""
+        best_rtt = min(s.rtt_ms for s in self._samples)
+        used = [s for s in self._samples if s.rtt_ms <= 2 * best_rtt + 1]
+
+        n = len(used)
+        mean_t = sum(s.local_ms for s in used) / n
+        mean_o = sum(s.offset_ms for s in used) / n
+        var_t = sum((s.local_ms - mean_t) ** 2 for s in used)
+        drift = 0.0
+        # Дрейф оценивается по замерам, разнесённым хотя бы на минуту
+        if n >= 3 and var_t > 0 and max(s.local_ms for s in used) - min(s.local_ms for s in used) >= 60_000:
+            drift = sum((s.local_ms - mean_t) * (s.offset_ms - mean_o) for s in used) / var_t
+            limit = self.max_drift_ppm / 1e6
+            drift = max(-limit, min(limit, drift))
+
+        self._ref_ms = mean_t
+        self._ref_offset = mean_o
+        self._drift = drift
+
+    async def sync_once(self, session: aiohttp.ClientSession) -> Optional[ClockSample]:
+        """
+        Серия из probes запросов времени; учитывается замер с наименьшим RTT.
+        None – Binance не ответил ни разу, оценка не изменилась.
+        """
+        best: Optional[tuple[float, float, float]] = None
+        for _ in range(self.probes):
+            sent_ms = self.local_ms()
+            server_ms = await get_binance_server_time(session)
+            received_ms = self.local_ms()
+            if server_ms is None:
+                continue
+            if best is None or received_ms - sent_ms < best[2] - best[0]:
+                best = (sent_ms, server_ms, received_ms)
+
+        if best is None:
+            logger.warning("Не удалось получить время Binance, смещение не обновлено")
+            return None
+
+        sample = self.add_sample(*best)
+        logger.debug(f"Синхронизация времени: смещение {self.offset_ms()} мс, RTT {sample.rtt_ms:.1f} мс, "
+                     f"дрейф {self.drift_ppm:.1f} ppm по {len(self._samples)} замерам")
+        if self.on_update is not None:
+            self.on_update(self.offset_ms())
+        return sample
+
+    async def run(self, session: aiohttp.ClientSession) -> None:
+        """Синхронизирует часы раз в interval секунд (пока замеров нет – каждые 5 секунд)."""
+        while True:
+            await asyncio.sleep(self.interval if self.synced else 5)
+            try:
+                await self.sync_once(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации времени: {type(e).__name__}: {e}")
+
+    def start(self, session: aiohttp.ClientSession) -> None:
+        """Запускает фоновую синхронизацию."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(session))
+
+    async def stop(self) -> None:
+        """Останавливает фоновую синхронизацию."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
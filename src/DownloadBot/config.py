@@ -7,8 +7,89 @@ MAX_CANDLES_PER_REQUEST: int = 1500
 BINANCE_API_REQUEST_LIMIT: int = 800 
 # Binance API limit wight per minute = 2400
 BINANCE_API_WEIGHT_LIMIT: int = 2000
-# Количество потоков, участвующих в запросе сервера
+# Количество потоков, участвующих в запросе сервера (начальное окно AdaptiveConcurrency)
 THREAD_POOL_SIZE: int = 12 # 30
+# Наибольшее окно параллельных запросов к Binance
+ADAPTIVE_MAX_CONCURRENCY: int = 50
+# Во сколько раз p95 задержки может превысить базовую, прежде чем окно запросов уменьшится
+ADAPTIVE_LATENCY_TOLERANCE: float = 2.0
+# Страницы, заканчивающиеся не раньше чем за столько минут до текущей, запрашиваются
+# как недавний пропуск (RequestPriority.RECENT), более старые – как докачка истории
+RECENT_GAP_MINUTES: int = 60
+# Сколько последних минут догоняющей загрузки скачивается и публикуется до докачки остальных
+# (до 100 минут страница стоит вес 1, как и одна минута)
+LIVE_FETCH_MINUTES: int = 100
+# Дублировать запрос свечей, если ответа нет дольше квантиля HEDGE_QUANTILE задержек последних ответов
+# (дубликат уходит по другому соединению пула и только если на него есть вес без ожидания)
+HEDGE_REQUESTS: bool = False
+HEDGE_QUANTILE: float = 0.9
+# Сколько последних ответов учитывать в пороге дублирования и сколько нужно, чтобы порог появился
+HEDGE_LATENCY_SAMPLES: int = 200
+HEDGE_MIN_SAMPLES: int = 20
+# Через сколько секунд после начала обновления публиковать минуту без опоздавших тикеров
+# (они отмечаются ожидающими и дописываются следующей публикацией). 0 – ждать все тикеры
+PARTIAL_PUBLISH_SECONDS: float = 0
+# Сколько секунд список тикеров (exchangeInfo) используется без повторного запроса
+SYMBOLS_TTL_SECONDS: int = 15 * 60
+# Синхронизация часов с Binance: раз в сколько секунд, сколько запросов времени в серии
+# (учитывается самый быстрый) и по скольким последним сериям оцениваются смещение и дрейф
+CLOCK_SYNC_INTERVAL_SECONDS: int = 300
+CLOCK_SYNC_PROBES: int = 5
+CLOCK_SYNC_SAMPLES: int = 12
+# Наибольший допустимый дрейф локальных часов (миллионных долей) и скачок смещения (мс),
+# после которого история замеров сбрасывается
+CLOCK_SYNC_MAX_DRIFT_PPM: float = 500
+CLOCK_SYNC_STEP_MS: float = 500
+# Ответы Binance длиннее этого размера разбираются в пуле потоков, а не в цикле событий (байт)
+KLINE_PARSE_OFFLOAD_BYTES: int = 64 * 1024
 # UDP IP, PORT
 DOWNLOADER_UDP_IP: str = "127.0.0.1"
 DOWNLOADER_UDP_PORT: int = 58001
+# Режим получения свечей: "rest" – опрос REST API каждую минуту,
+# "stream" – WebSocket потоки <symbol>@kline_1m, REST только для докачки пропусков
+INGESTION_MODE: str = "rest"
+# Адрес combined streams Binance Futures
+BINANCE_STREAM_URL: str = "wss://fstream.binance.com/stream"
+# Количество тикеров на одно WebSocket соединение (Binance: до 200 потоков)
+STREAM_SYMBOLS_PER_CONNECTION: int = 200
+# Сколько ждать закрытую свечу из WebSocket, прежде чем докачать её через REST (мс)
+STREAM_REPAIR_DELAY_MS: int = 5000
+# Каталог дискового архива свечей, относительный путь – от каталога src/DownloadBot (пустая строка – архив отключён)
+ARCHIVE_PATH: str = "data/market_data/candles"
+# Количество столбцов (тикеров) в строке архива
+ARCHIVE_MAX_SYMBOLS: int = 768
+# Каталог тёплого уровня: сжатые дневные сегменты свечей старше окна хранилища,
+# относительный путь – от каталога src/DownloadBot (пустая строка – отключён)
+WARM_STORE_PATH: str = "data/market_data/warm"
+# Сколько суток хранить в тёплом уровне
+WARM_RETENTION_DAYS: int = 30
+# Через сколько минут после окончания суток записывать их сегмент (успевают докачаться пропуски)
+WARM_SEAL_DELAY_MINUTES: int = 60
+# Сколько распакованных сегментов держать в памяти для запросов диапазонов
+WARM_SEGMENTS_CACHED: int = 2
+# Размер данных в одном фрагменте ответа на запрос диапазона (байт). Вместе с заголовками
+# датаграмма должна помещаться в MTU 1500, иначе IP фрагментирует её и потеря любой части теряет весь фрагмент
+RANGE_FRAGMENT_SIZE: int = 1400
+# Наибольшее количество минут в одном потоке диапазона (остальное клиент запрашивает следующими запросами)
+RANGE_MAX_MINUTES: int = 1440
+# Сколько первых фрагментов отправлять в ответ на запрос диапазона без списка фрагментов:
+# остальные клиент запрашивает явно, поэтому короткий (в том числе поддельный) запрос не вызывает большой ответ
+RANGE_FIRST_BURST_FRAGMENTS: int = 4
+# Максимум фрагментов, отправляемых в ответ на один перезапрос диапазона
+RANGE_FRAGMENTS_PER_REPLY: int = 64
+# Сколько собранных потоков диапазонов хранить для перезапросов фрагментов
+RANGE_STREAMS_CACHED: int = 8
+# Время жизни подписки на рассылку минут (сек): клиент должен продлевать подписку чаще
+SUBSCRIPTION_TTL_SECONDS: int = 120
+# Наибольшее количество подписчиков на рассылку минут (новые подписки сверх лимита получают BUSY)
+SUBSCRIPTION_MAX_SUBSCRIBERS: int = 32
+# Сколько минут рассылать за одно обновление (более старые клиенты докачивают запросом диапазона)
+PUSH_MAX_MINUTES: int = 10
+# Как часто искать и докачивать пропуски отдельных тикеров в хранилище (сек)
+GAP_REPAIR_INTERVAL_SECONDS: int = 20
+# Вес, который докачка пропусков оставляет в лимитере для основного цикла
+GAP_REPAIR_WEIGHT_RESERVE: int = 600
+# Сколько раз пытаться докачать один пропуск, прежде чем считать, что у Binance этих свечей нет
+GAP_REPAIR_MAX_ATTEMPTS: int = 3
+# Количество одновременных запросов докачки пропусков
+GAP_REPAIR_CONCURRENCY: int = 2
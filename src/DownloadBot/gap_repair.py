@@ -0,0 +1,216 @@
+"""
+Точечная докачка пропусков хранилища.
+
+check_space сравнивает с текущим временем только последнюю минуту хранилища, а
+fetch_klines_paginated при ошибке HTTP сохраняет то, что успело прийти. Поэтому у отдельного
+тикера могут не хватать минут внутри окна. GapRepairer периодически находит такие пропуски
+по признаку наличия свечи (минута × тикер), склеивает соседние в диапазоны и докачивает
+их REST запросами с низким приоритетом: запрос уходит, только пока у лимитера остаётся
+GAP_REPAIR_WEIGHT_RESERVE веса для основного цикла, и ждёт вес в классе RECENT или BACKFILL
+в зависимости от удалённости пропуска от последней опубликованной минуты.
+"""
+
+import asyncio
+import aiohttp
+
+from typing import Callable
+from typing import Optional
+
+from logger import logger
+from candle_storage import CandleStorage
+from candle_storage import MINUTE_MS
+from binance_utils import fetch_klines_paginated
+from DownloadBot.config import *
+from DownloadBot.binance_limiter import BinanceRateLimiter
+from DownloadBot.binance_limiter import PrioritySemaphore
+from DownloadBot.kline_planner import build_pages
+from DownloadBot.kline_planner import page_splits
+
+def coalesce_ranges(ranges: list[tuple[int, int]],
+                    max_per_request: int = MAX_CANDLES_PER_REQUEST) -> list[tuple[int, int]]:
+    """
+    Склеивает соседние пропуски тикера, если один запрос через промежуток между ними
+    не тяжелее и не длиннее отдельных запросов. Свечи промежутка при этом просто перезаписываются.
+
+    Args:
+        ranges: диапазоны минут [start, end] по возрастанию
+
+    Returns:
+        склеенные диапазоны по возрастанию.
+    """
+    result: list[tuple[int, int]] = []
+    for start, end in ranges:
+        if result:
+            prev_start, prev_end = result[-1]
+            merged = page_splits(end - prev_start + 1, max_per_request)[0]
+            before = page_splits(prev_end - prev_start + 1, max_per_request)[0]
+            after = page_splits(end - start + 1, max_per_request)[0]
+            if merged.weight <= before.weight + after.weight and merged.requests <= before.requests + after.requests:
+                result[-1] = (prev_start, end)
+                continue
+        result.append((start, end))
+    return result
+
+class GapRepairer:
+    """
+    Фоновая докачка пропущенных (тикер, минута) в хранилище.
+
+    Пропуск, который не удалось закрыть за max_attempts попыток (например, минуты до листинга
+    тикера), больше не запрашивается. Попытки учитываются по (тикер, последняя минута пропуска):
+    начало пропуска сдвигается вместе с окном хранилища, а конец – нет.
+    """
+
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 storage: CandleStorage,
+                 limiter: Optional[BinanceRateLimiter],
+                 on_repaired: Optional[Callable[[int], None]] = None,
+                 interval: float = GAP_REPAIR_INTERVAL_SECONDS,
+                 weight_reserve: int = GAP_REPAIR_WEIGHT_RESERVE,
+                 max_attempts: int = GAP_REPAIR_MAX_ATTEMPTS,
+                 concurrency: int = GAP_REPAIR_CONCURRENCY,
+                 idle_delay: float = 1.0):
+        if concurrency <= 0:
+            raise ValueError("concurrency must be positive")
+
+        self.session = session
+        self.storage = storage
+        self.limiter = limiter
+        # Вызывается с количеством докачанных свечей, чтобы опубликовать исправленные минуты
+        self.on_repaired = on_repaired
+        self.interval = interval
+        self.weight_reserve = weight_reserve
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+        self.idle_delay = idle_delay
+
+        self.symbols: list[str] = []
+        # Попытки докачки: <(ТИКЕР, ПОСЛЕДНЯЯ_МИНУТА_ПРОПУСКА), КОЛИЧЕСТВО>
+        self._attempts: dict[tuple[str, int], int] = {}
+        # Всего докачано свечей
+        self.repaired_total = 0
+        # Минуты, в которые с последнего take_repaired_minutes записывались докачанные свечи
+        self._repaired_minutes: set[int] = set()
+
+        self._task: Optional[asyncio.Task] = None
+
+    def update_symbols(self, symbols: list[str]) -> None:
+        """Тикеры, пропуски которых нужно докачивать (делистинговые больше не запрашиваются)."""
+        self.symbols = list(symbols)
+
+    def plan(self, until_minute: Optional[int] = None) -> dict[str, list[tuple[int, int]]]:
+        """
+        Диапазоны для докачки: {тикер: склеенные пропуски}, без исчерпавших попытки.
+        """
+        first_minute = self.storage.first_minute
+        # Пропуски, вытесненные из окна хранилища, забываем
+        self._attempts = {key: n for key, n in self._attempts.items()
+                          if first_minute is not None and key[1] >= first_minute}
+
+        plan: dict[str, list[tuple[int, int]]] = {}
+        for symbol, ranges in self.storage.missing_ranges(self.symbols, until_minute).items():
+            ranges = [(start, end) for start, end in coalesce_ranges(ranges)
+                      if self._attempts.get((symbol, end), 0) < self.max_attempts]
+            if ranges:
+                plan[symbol] = ranges
+        return plan
+
+    async def _wait_for_headroom(self, weight: int, requests: int) -> None:
+        """Ждёт, пока запрос помещается в лимитер с запасом для основного цикла."""
+        if self.limiter is None:
+            return
+        while (self.limiter.weight_headroom() < weight + self.weight_reserve or
+               self.limiter.requests_headroom() < requests):
+            await asyncio.sleep(self.idle_delay)
+
+    async def _repair_range(self, symbol: str, start: int, end: int, live_minute: int, semaphore: PrioritySemaphore) -> int:
+        """Докачивает один диапазон тикера. Возвращает количество записанных свечей."""
+        count = end - start + 1
+        end_timestamp = (end + 1) * MINUTE_MS - 1
+        split = page_splits(count)[0]
+        pages = build_pages(symbol, split, end_timestamp)
+        key = (symbol, end)
+        self._attempts[key] = self._attempts.get(key, 0) + 1
+
+        # Свежие пропуски докачиваются раньше старых
+        async with semaphore.slot(pages[0].priority(live_minute)):
+            await self._wait_for_headroom(split.weight, split.requests)
+            # Страницы одного диапазона идут по очереди – докачка не должна занимать лимит пачкой
+            series = await fetch_klines_paginated(self.session, symbol, count, end_timestamp, self.limiter,
+                                                  asyncio.Semaphore(1), pages=pages, live_minute=live_minute)
+
+        if not series:
+            return 0
+        if len(series) == count:
+            del self._attempts[key]
+        written = self.storage.put_series(series.symbol, series.minutes, series.values, series.trades)
+        if written:
+            self._repaired_minutes.update(int(m) for m in series.minutes if self.storage.has_candle(symbol, int(m)))
+        return written
+
+    def take_repaired_minutes(self) -> list[int]:
+        """Забирает (и очищает) отсортированный список минут, исправленных докачкой."""
+        minutes = sorted(self._repaired_minutes)
+        self._repaired_minutes.clear()
+        return minutes
+
+    async def repair_once(self, until_minute: Optional[int] = None) -> int:
+        """
+        Находит и докачивает пропуски до until_minute включительно
+        (классы запросов считаются от until_minute, по умолчанию – от last_minute хранилища).
+
+        Returns:
+            количество записанных в хранилище свечей.
+        """
+        plan = self.plan(until_minute)
+        if not plan:
+            return 0
+
+        ranges = [(symbol, start, end) for symbol, symbol_ranges in plan.items() for start, end in symbol_ranges]
+        logger.info(f"Докачка пропусков: {len(ranges)} диапазонов, "
+                    f"{sum(end - start + 1 for _, start, end in ranges)} минут по {len(plan)} тикерам")
+
+        live_minute = until_minute if until_minute is not None else self.storage.last_minute
+        semaphore = PrioritySemaphore(self.concurrency)
+        results = await asyncio.gather(*(self._repair_range(symbol, start, end, live_minute, semaphore)
+                                         for symbol, start, end in ranges), return_exceptions=True)
+        written = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"Ошибка докачки пропуска: {type(result).__name__}: {result}")
+            else:
+                written += result
+
+        self.repaired_total += written
+        if written:
+            logger.info(f"✅ Докачано {written} пропущенных свечей")
+        return written
+
+    async def run(self, until_minute: Callable[[], Optional[int]]) -> None:
+        """Раз в interval секунд докачивает пропуски до минуты until_minute() (последней опубликованной)."""
+        while True:
+            await asyncio.sleep(self.interval)
+            minute = until_minute()
+            if minute is None:
+                continue
+            try:
+                written = await self.repair_once(minute)
+                if written and self.on_repaired is not None:
+                    self.on_repaired(written)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка докачки пропусков: {type(e).__name__}: {e}")
+
+    def start(self, until_minute: Callable[[], Optional[int]]) -> None:
+        """Запускает фоновую задачу докачки."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(until_minute))
+
+    async def stop(self) -> None:
+        """Останавливает фоновую задачу докачки."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
@@ -0,0 +1,276 @@
+"""
+Колоночный кодек свечей одной минуты (версия payload PayloadVersion.COLUMNAR).
+
+Строковый формат (KlineRecordSerializer + zlib) хранит каждую свечу целиком: имя тикера,
+восемь double, open_time/close_time и сделки – и полагается на то, что zlib найдёт повторы.
+Колоночный формат пользуется структурой данных:
+    - open_time/close_time не передаются: они следуют из номера минуты;
+    - тикеры – номерами таблицы SymbolTable (или именами, если таблицы у запроса нет);
+    - цены и объёмы Binance – десятичные числа с ограниченным количеством знаков, поэтому
+      колонка по возможности передаётся целыми числами в масштабе 10^scale: open – как есть,
+      close/high/low – разностью с open, taker-объёмы – разностью с полным объёмом;
+      все целые – zigzag + varint;
+    - если колонку нельзя без потерь представить в десятичном масштабе, она сжимается
+      XOR с опорным значением, как в Gorilla, но с точностью до байта: управляющий байт
+      (ведущие нулевые байты << 4 | хвостовые нулевые байты) и значащие байты между ними;
+    - количество сделок – varint.
+
+Все преобразования векторные (NumPy), без цикла по свечам.
+
+Масштаб выбирается для каждой свечи отдельно: у BTCUSDT и у монеты с ценой 0.00001234
+разное количество знаков после запятой.
+
+Формат блока:
+    count (H), flags (B)
+    тикеры: count × H (флаг SYMBOL_IDS) либо count × (длина B + UTF-8)
+    масштабы: по 4 бита на свечу для каждой группы FIELD_GROUPS (XOR_SCALE – строка сжата XOR)
+    varint: num_of_trades, затем по группам для строк с масштабом – опора и разности с опорой
+    XOR: по группам для строк без масштаба – опора, затем остальные поля (управляющие байты + значащие байты)
+Порядок полей values – как в RECORD_FORMAT: open, close, high, low, volume, quote_assets_volume,
+taker_buy_base_volume, taker_buy_quote_volume.
+"""
+
+import struct
+
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+
+# Флаги блока
+SYMBOL_IDS = 0x01
+# Масштаб строки, которую пришлось сжать XOR
+XOR_SCALE = 0x0F
+# Максимальное количество десятичных знаков при поиске масштаба
+MAX_SCALE = 12
+
+BLOCK_HEADER_FORMAT = '!HB'
+BLOCK_HEADER_SIZE = struct.calcsize(BLOCK_HEADER_FORMAT)
+
+# Индексы полей values (RECORD_FORMAT)
+OPEN, CLOSE, HIGH, LOW, VOLUME, QUOTE_VOLUME, TAKER_BASE, TAKER_QUOTE = range(8)
+# Группы колонок с общим масштабом: (поле-опора, поля-разности с опорой)
+FIELD_GROUPS = ((OPEN, (CLOSE, HIGH, LOW)),
+                (VOLUME, (TAKER_BASE,)),
+                (QUOTE_VOLUME, (TAKER_QUOTE,)))
+
+# Целые в масштабе должны точно представляться double, чтобы деление давало то же число
+_EXACT_LIMIT = float(2 ** 53)
+_SCALE_FACTORS = 10.0 ** np.arange(MAX_SCALE + 1)
+_VARINT_SHIFTS = np.arange(10, dtype=np.uint64) * np.uint64(7)
+_BYTE_COLUMNS = np.arange(8)
+
+# ---------- varint ----------
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+def _encode_varints(values: np.ndarray) -> bytes:
+    """LEB128: по 7 бит на байт, старший бит – «будет продолжение»."""
+    values = values.astype(np.uint64)
+    if values.size == 0:
+        return b''
+    # Сдвигов не больше, чем нужно самому длинному значению
+    width = max(1, (int(values.max()).bit_length() + 6) // 7)
+    shifts = _VARINT_SHIFTS[:width]
+    groups = ((values[:, None] >> shifts) & np.uint64(0x7F)).astype(np.uint8)
+    lengths = 1 + np.count_nonzero(values[:, None] >> shifts[1:], axis=1)
+    columns = np.arange(width)
+    groups[columns < (lengths - 1)[:, None]] |= 0x80
+    return groups[columns < lengths[:, None]].tobytes()
+
+def _decode_varints(buf: np.ndarray, pos: int, count: int) -> tuple[np.ndarray, int]:
+    """Читает count значений varint с позиции pos. Возвращает (значения uint64, новая позиция)."""
+    if count == 0:
+        return np.empty(0, dtype=np.uint64), pos
+    ends = np.flatnonzero(buf[pos:pos + 10 * count] < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Блок varint обрезан")
+    consumed = int(ends[-1]) + 1
+    starts = np.empty(count, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    digits = buf[pos:pos + consumed].astype(np.uint64) & np.uint64(0x7F)
+    index = np.arange(consumed) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat(digits << (index.astype(np.uint64) * np.uint64(7)), starts)
+    return values, pos + consumed
+
+# ---------- XOR ----------
+
+def _encode_xor(values: np.ndarray, reference: Optional[np.ndarray]) -> bytes:
+    bits = values.astype(np.float64).view(np.uint64)
+    if reference is not None:
+        bits = bits ^ reference.astype(np.float64).view(np.uint64)
+    matrix = bits.astype('>u8').view(np.uint8).reshape(-1, 8)
+    nonzero = matrix != 0
+    any_nonzero = nonzero.any(axis=1)
+    lead = np.where(any_nonzero, nonzero.argmax(axis=1), 8)
+    trail = np.where(any_nonzero, nonzero[:, ::-1].argmax(axis=1), 0)
+    control = ((lead << 4) | trail).astype(np.uint8)
+    kept = (_BYTE_COLUMNS >= lead[:, None]) & (_BYTE_COLUMNS < (8 - trail)[:, None])
+    return control.tobytes() + matrix[kept].tobytes()
+
+def _decode_xor(buf: np.ndarray, pos: int, count: int, reference: Optional[np.ndarray]) -> tuple[np.ndarray, int]:
+    control = buf[pos:pos + count]
+    if len(control) < count:
+        raise ValueError("Блок XOR обрезан")
+    pos += count
+    lead = (control >> 4).astype(np.int64)
+    trail = (control & 0x0F).astype(np.int64)
+    kept = (_BYTE_COLUMNS >= lead[:, None]) & (_BYTE_COLUMNS < (8 - trail)[:, None])
+    size = int(np.count_nonzero(kept))
+    if pos + size > len(buf):
+        raise ValueError("Блок XOR обрезан")
+    matrix = np.zeros((count, 8), dtype=np.uint8)
+    matrix[kept] = buf[pos:pos + size]
+    bits = matrix.view('>u8').reshape(count).astype(np.uint64)
+    if reference is not None:
+        bits ^= reference.view(np.uint64)
+    return bits.view(np.float64), pos + size
+
+# ---------- Десятичный масштаб ----------
+
+def decimal_scales(values: np.ndarray) -> np.ndarray:
+    """
+    Для каждой строки values [k, m] и каждой группы FIELD_GROUPS – минимальное количество
+    десятичных знаков, при котором все поля группы без потерь восстанавливаются как целое / 10^scale.
+    XOR_SCALE – такого масштаба нет (до MAX_SCALE знаков).
+
+    Returns:
+        масштабы [len(FIELD_GROUPS), k]
+    """
+    # Все масштабы сразу: [k, 8, MAX_SCALE + 1]
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = np.rint(values[:, :, None] * _SCALE_FACTORS)
+        exact = (scaled / _SCALE_FACTORS == values[:, :, None]) & (np.abs(scaled) < _EXACT_LIMIT)
+    scales = np.empty((len(FIELD_GROUPS), len(values)), dtype=np.uint8)
+    for g, (base, derived) in enumerate(FIELD_GROUPS):
+        ok = exact[:, (base,) + derived].all(axis=1)
+        scales[g] = np.where(ok.any(axis=1), ok.argmax(axis=1), XOR_SCALE)
+    return scales
+
+def _pack_nibbles(values: np.ndarray) -> bytes:
+    padded = np.zeros(len(values) + len(values) % 2, dtype=np.uint8)
+    padded[:len(values)] = values
+    return ((padded[0::2] << 4) | padded[1::2]).tobytes()
+
+def _unpack_nibbles(buf: np.ndarray, pos: int, count: int) -> tuple[np.ndarray, int]:
+    size = (count + 1) // 2
+    if pos + size > len(buf):
+        raise ValueError("Колонка масштабов обрезана")
+    packed = buf[pos:pos + size]
+    values = np.empty(2 * size, dtype=np.uint8)
+    values[0::2] = packed >> 4
+    values[1::2] = packed & 0x0F
+    return values[:count], pos + size
+
+# ---------- Блок ----------
+
+def encode_columns(values: np.ndarray, trades: np.ndarray,
+                   symbol_ids: Optional[np.ndarray] = None,
+                   symbols: Optional[Sequence[bytes]] = None) -> bytes:
+    """
+    Кодирует свечи одной минуты.
+
+    Args:
+        values: вещественные поля в порядке RECORD_FORMAT, [k, 8]
+        trades: количество сделок, [k]
+        symbol_ids: номера тикеров по таблице SymbolTable, [k]
+        symbols: имена тикеров в UTF-8 (если номеров нет), [k]
+    """
+    count = len(trades)
+    values = np.asarray(values, dtype=np.float64).reshape(count, 8)
+    flags = SYMBOL_IDS if symbol_ids is not None else 0
+
+    parts = [struct.pack(BLOCK_HEADER_FORMAT, count, flags)]
+    if symbol_ids is not None:
+        parts.append(np.asarray(symbol_ids, dtype='>u2').tobytes())
+    else:
+        parts.append(b''.join(bytes((len(name),)) + name for name in (bytes(s).rstrip(b'\x00') for s in symbols)))
+
+    scales = decimal_scales(values)
+    parts.append(_pack_nibbles(scales.reshape(-1)))
+
+    # Все целые колонки – одним блоком varint: сделки, затем по группам опора и разности с ней
+    integers = [np.asarray(trades, dtype=np.int64).astype(np.uint64)]
+    xor_parts = []
+    for (base, derived), group_scales in zip(FIELD_GROUPS, scales):
+        group = values[:, (base,) + derived]
+        scaled_rows = group_scales != XOR_SCALE
+        factor = 10.0 ** group_scales[scaled_rows]
+        ints = np.rint(group[scaled_rows] * factor[:, None]).astype(np.int64)
+        integers.append(_zigzag(ints[:, 0]))
+        for i in range(1, len(derived) + 1):
+            integers.append(_zigzag(ints[:, i] - ints[:, 0]))
+
+        # Строки без десятичного масштаба: XOR опоры с нулём, остальных полей – с опорой
+        xor_rows = group[~scaled_rows]
+        xor_parts.append(_encode_xor(xor_rows[:, 0], None))
+        for i in range(1, len(derived) + 1):
+            xor_parts.append(_encode_xor(xor_rows[:, i], xor_rows[:, 0]))
+
+    parts.append(_encode_varints(np.concatenate(integers)))
+    return b''.join(parts + xor_parts)
+
+def decode_columns(data: bytes) -> tuple[Optional[np.ndarray], Optional[list[str]], np.ndarray, np.ndarray]:
+    """
+    Раскодирует блок encode_columns.
+
+    Returns:
+        (номера тикеров или None, имена тикеров или None, values [k, 8], trades [k])
+
+    Raises:
+        ValueError: блок повреждён или обрезан
+    """
+    if len(data) < BLOCK_HEADER_SIZE:
+        raise ValueError("Блок короче заголовка")
+    count, flags = struct.unpack(BLOCK_HEADER_FORMAT, data[:BLOCK_HEADER_SIZE])
+    buf = np.frombuffer(data, dtype=np.uint8)
+    pos = BLOCK_HEADER_SIZE
+
+    symbol_ids = None
+    symbols = None
+    if flags & SYMBOL_IDS:
+        if pos + 2 * count > len(data):
+            raise ValueError("Колонка тикеров обрезана")
+        symbol_ids = np.frombuffer(data, dtype='>u2', count=count, offset=pos).astype(np.int64)
+        pos += 2 * count
+    else:
+        symbols = []
+        for _ in range(count):
+            if pos >= len(data):
+                raise ValueError("Колонка тикеров обрезана")
+            length = data[pos]
+            symbols.append(data[pos + 1:pos + 1 + length].decode('utf-8'))
+            pos += 1 + length
+
+    scales, pos = _unpack_nibbles(buf, pos, len(FIELD_GROUPS) * count)
+    scales = scales.reshape(len(FIELD_GROUPS), count)
+    scaled_masks = scales != XOR_SCALE
+    scaled_counts = np.count_nonzero(scaled_masks, axis=1)
+
+    total = count + sum(int(n) * (1 + len(derived)) for n, (_, derived) in zip(scaled_counts, FIELD_GROUPS))
+    integers, pos = _decode_varints(buf, pos, total)
+    trades = integers[:count].view(np.int64)
+    offset = count
+
+    values = np.empty((count, 8), dtype=np.float64)
+    for (base, derived), group_scales, scaled_rows, n in zip(FIELD_GROUPS, scales, scaled_masks, scaled_counts):
+        factor = 10.0 ** group_scales[scaled_rows]
+        base_ints = _unzigzag(integers[offset:offset + n])
+        offset += n
+        values[scaled_rows, base] = base_ints / factor
+        for field in derived:
+            values[scaled_rows, field] = (base_ints + _unzigzag(integers[offset:offset + n])) / factor
+            offset += n
+
+        xor_count = count - int(n)
+        xor_base, pos = _decode_xor(buf, pos, xor_count, None)
+        values[~scaled_rows, base] = xor_base
+        for field in derived:
+            values[~scaled_rows, field], pos = _decode_xor(buf, pos, xor_count, xor_base)
+    return symbol_ids, symbols, values, trades
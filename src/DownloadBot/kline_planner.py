@@ -0,0 +1,230 @@
+"""
+Планировщик постраничной загрузки свечей.
+
+Вес запроса klines зависит от limit ступенчато (см. get_kline_weight), поэтому
+«всегда по MAX_CANDLES_PER_REQUEST» не оптимально: 2880 минут страницами по 1500
+стоят 10 + 10 = 20, а страницами по 1000 – 5 + 5 + 5 = 15.
+
+Для каждого количества минут строится Парето-фронт вариантов разбиения
+(вес, количество запросов). Затем по всем тикерам выбирается комбинация, которая
+быстрее всего проходит через лимиты веса и количества запросов Binance с учётом
+текущего запаса лимитера.
+
+Страницы независимы: endTime каждой вычисляется заранее, поэтому их можно
+запрашивать параллельно, начиная с самой свежей. Класс запроса страницы
+(RequestPriority) определяется её удалённостью от текущей минуты.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Mapping
+from typing import Optional
+
+from DownloadBot.config import *
+from DownloadBot.binance_limiter import RequestPriority
+from DownloadBot.binance_limiter import get_kline_weight
+
+MINUTE_MS = 60000
+
+@dataclass(frozen=True)
+class KlinePage:
+    """Один запрос /fapi/v1/klines."""
+    symbol: str
+    limit: int
+    end_time: int
+
+    @property
+    def weight(self) -> int:
+        return get_kline_weight(self.limit)
+
+    def priority(self, live_minute: int) -> RequestPriority:
+        """
+        Класс запроса страницы: LIVE – страница содержит минуту live_minute,
+        RECENT – заканчивается не раньше RECENT_GAP_MINUTES до неё, иначе BACKFILL.
+        """
+        end_minute = self.end_time // MINUTE_MS
+        if end_minute >= live_minute:
+            return RequestPriority.LIVE
+        if end_minute >= live_minute - RECENT_GAP_MINUTES:
+            return RequestPriority.RECENT
+        return RequestPriority.BACKFILL
+
+@dataclass(frozen=True)
+class PageSplit:
+    """Разбиение `count` минут на страницы: размеры страниц от самой свежей к самой старой."""
+    weight: int
+    sizes: tuple[int, ...]
+
+    @property
+    def requests(self) -> int:
+        return len(self.sizes)
+
+def _page_tiers(max_per_request: int) -> list[tuple[int, int]]:
+    """Максимальные размеры страниц для каждой ступени веса: [(limit, weight), ...]."""
+    tiers: dict[int, int] = {}
+    for limit in (100, 500, 1000, 1500):
+        if limit <= max_per_request:
+            tiers[get_kline_weight(limit)] = limit
+    tiers[get_kline_weight(max_per_request)] = max_per_request
+    return sorted((limit, weight) for weight, limit in tiers.items())
+
+@lru_cache(maxsize=256)
+def page_splits(count: int, max_per_request: int = MAX_CANDLES_PER_REQUEST) -> tuple[PageSplit, ...]:
+    """
+    Парето-оптимальные разбиения `count` минут на страницы по (вес, количество запросов).
+
+    Returns:
+        варианты, упорядоченные по возрастанию веса (и убыванию количества запросов).
+        Первый вариант – минимальный вес, последний – минимум запросов.
+    """
+    if count <= 0:
+        return (PageSplit(0, ()),)
+
+    tiers = _page_tiers(max_per_request)
+
+    # Сколько страниц каждой ступени достаточно, чтобы покрыть count. Перебор полный,
+    # но ступеней не больше четырёх, а количество страниц мало.
+    bounds = [(count + limit - 1) // limit for limit, _ in tiers]
+    candidates: dict[int, PageSplit] = {}
+
+    def walk(i: int, covered: int, pages: list[tuple[int, int]]) -> None:
+        if covered >= count:
+            split = _make_split(count, pages)
+            best = candidates.get(split.requests)
+            if best is None or split.weight < best.weight:
+                candidates[split.requests] = split
+            return
+        if i == len(tiers):
+            return
+        limit = tiers[i][0]
+        for n in range(bounds[i] + 1):
+            walk(i + 1, covered + n * limit, pages + [(limit, n)] if n else pages)
+            if covered + n * limit >= count:
+                break
+
+    walk(0, 0, [])
+
+    front: list[PageSplit] = []
+    for requests in sorted(candidates):
+        split = candidates[requests]
+        # Вариант с большим числом запросов нужен, только если он строго легче
+        if not front or split.weight < front[-1].weight:
+            front.append(split)
+    front.reverse()
+    return tuple(front)
+
+def _make_split(count: int, pages: list[tuple[int, int]]) -> PageSplit:
+    """Раскладывает минуты по выбранным страницам: крупные страницы – самые свежие, последняя усечена."""
+    sizes: list[int] = []
+    remaining = count
+    for limit, n in sorted(pages, reverse=True):
+        for _ in range(n):
+            if remaining <= 0:
+                break
+            size = min(limit, remaining)
+            sizes.append(size)
+            remaining -= size
+    # Усечённая последняя страница может попасть в более дешёвую ступень
+    weight = sum(get_kline_weight(size) for size in sizes)
+    return PageSplit(weight, tuple(sizes))
+
+def build_pages(symbol: str, split: PageSplit, end_timestamp: int) -> list[KlinePage]:
+    """Вычисляет endTime каждой страницы. Первая страница заканчивается на end_timestamp."""
+    pages: list[KlinePage] = []
+    end_minute = end_timestamp // MINUTE_MS
+    offset = 0
+    for size in split.sizes:
+        end_time = end_timestamp if offset == 0 else (end_minute - offset + 1) * MINUTE_MS - 1
+        pages.append(KlinePage(symbol, size, end_time))
+        offset += size
+    return pages
+
+def plan_kline_pages(symbols: list[str],
+                     count: int | Mapping[str, int],
+                     end_timestamp: int,
+                     weight_headroom: int,
+                     requests_headroom: Optional[int] = None,
+                     weight_limit: int = BINANCE_API_WEIGHT_LIMIT,
+                     requests_limit: int = BINANCE_API_REQUEST_LIMIT,
+                     max_per_request: int = MAX_CANDLES_PER_REQUEST) -> dict[str, list[KlinePage]]:
+    """
+    Строит план запросов для всех тикеров.
+
+    Время выполнения плана оценивается как max(вес сверх запаса / лимит веса,
+    запросы сверх запаса / лимит запросов) минут. Сначала каждому тикеру назначается
+    разбиение минимального веса, затем тикеры по одному переводятся на варианты с меньшим
+    числом запросов, пока это уменьшает оценку времени (или, если план целиком помещается
+    в запас, – количество запросов).
+
+    Args:
+        symbols: тикеры
+        count: количество минут (одно на все тикеры или по каждому тикеру)
+        end_timestamp: конечная метка времени в мс
+        weight_headroom: вес, который можно потратить без ожидания (BinanceRateLimiter.weight_headroom)
+        requests_headroom: запросы без ожидания (BinanceRateLimiter.requests_headroom), по умолчанию requests_limit
+        weight_limit: лимит веса в минуту
+        requests_limit: лимит запросов в минуту
+        max_per_request: максимальный limit одного запроса
+
+    Returns:
+        {тикер: страницы от самой свежей к самой старой}
+    """
+    if requests_headroom is None:
+        requests_headroom = requests_limit
+
+    counts = {symbol: (count if isinstance(count, int) else count.get(symbol, 0)) for symbol in symbols}
+
+    # Тикеры с одинаковым количеством минут и выбранным вариантом неразличимы,
+    # поэтому перебираем группы <(КОЛИЧЕСТВО_МИНУТ, ВАРИАНТ), [ТИКЕРЫ]>
+    groups: dict[tuple[int, int], list[str]] = {}
+    for symbol, n in counts.items():
+        if n > 0:
+            groups.setdefault((n, 0), []).append(symbol)
+
+    weight = sum(page_splits(n, max_per_request)[0].weight * len(s) for (n, _), s in groups.items())
+    requests = sum(page_splits(n, max_per_request)[0].requests * len(s) for (n, _), s in groups.items())
+
+    def cost(w: int, r: int) -> tuple[float, int]:
+        minutes = max(0.0, (w - weight_headroom) / weight_limit, (r - requests_headroom) / requests_limit)
+        return minutes, r
+
+    current = cost(weight, requests)
+    while True:
+        best_key = None
+        best_cost = current
+        for key, group in groups.items():
+            if not group:
+                continue
+            n, index = key
+            front = page_splits(n, max_per_request)
+            if index + 1 >= len(front):
+                continue
+            candidate = cost(weight + front[index + 1].weight - front[index].weight,
+                             requests + front[index + 1].requests - front[index].requests)
+            if candidate < best_cost:
+                best_key, best_cost = key, candidate
+        if best_key is None:
+            break
+
+        n, index = best_key
+        front = page_splits(n, max_per_request)
+        weight += front[index + 1].weight - front[index].weight
+        requests += front[index + 1].requests - front[index].requests
+        groups.setdefault((n, index + 1), []).append(groups[best_key].pop())
+        current = best_cost
+
+    plan: dict[str, list[KlinePage]] = {}
+    for (n, index), group in groups.items():
+        split = page_splits(n, max_per_request)[index]
+        for symbol in group:
+            plan[symbol] = build_pages(symbol, split, end_timestamp)
+    # Сохраняем порядок тикеров
+    return {symbol: plan[symbol] for symbol in symbols if symbol in plan}
+
+def plan_weight(plan: Mapping[str, list[KlinePage]]) -> int:
+    """Суммарный вес плана."""
+    return sum(page.weight for pages in plan.values() for page in pages)
+
+def plan_requests(plan: Mapping[str, list[KlinePage]]) -> int:
+    """Суммарное количество запросов плана."""
+    return sum(len(pages) for pages in plan.values())
@@ -1,8 +1,8 @@
 # main.py
 """
 Главный модуль бота.
-Сохраняет в памяти последние 24 часа (1440 минут) свечей всех доступных тикеров и
-каждую минуту скачивает новые данные.
+Сохраняет в памяти последние MAX_CACHED_CANDLES минут свечей всех доступных тикеров
+(колоночное хранилище CandleStorage) и каждую минуту скачивает новые данные.
 """
 
 import socket
@@ -10,8 +10,9 @@ import sys
 import time
 import aiohttp
 import asyncio
-from collections import OrderedDict
 
+from typing import Callable
+from typing import Optional
 
 from datetime import datetime
 from pathlib import Path
@@ -21,118 +22,157 @@ download_bot_src_path = Path(__file__).resolve().parent
 sys.path.append(str(src_path))
 sys.path.append(str(download_bot_src_path))
 
-from binance_utils import get_binance_server_time
-from binance_utils import get_trading_symbols
 from binance_utils import fetch_klines_for_symbols
 from DownloadBot.binance_limiter import BinanceRateLimiter
-
-from bot_types import KlineRecord
+from DownloadBot.binance_limiter import AdaptiveConcurrency
+from DownloadBot.kline_planner import plan_weight
+from DownloadBot.kline_planner import plan_requests
+from DownloadBot.kline_planner import plan_kline_pages
+from binance_stream import KlineStreamIngestor
+from gap_repair import GapRepairer
+from symbol_universe import SymbolUniverse
+from clock_sync import ClockSync
+
+from candle_storage import CandleStorage
+from candle_archive import CandleArchive
+from warm_store import WarmStore
 
 from logger import *
 from config import *
 from udp_server import UDPMarketDataServer
 
-# Список всех отметок за MINUTE_CANDLES_LIMIT минут 
-#                   <НОМЕР_МИНУТЫ List<МИНУТНАЯ_ЗАПИСЬ>>
-global_data: OrderedDict[int, list[KlineRecord]] = OrderedDict()
+# Все отметки за MAX_CACHED_CANDLES минут: кольцевой буфер минуты × тикеры × поля
+global_data: CandleStorage = CandleStorage(MAX_CACHED_CANDLES)
+
+# Дисковый архив свечей (None – архив отключён)
+archive: Optional[CandleArchive] = None
+
+# Тёплый уровень: дневные сегменты старше окна хранилища (None – отключён)
+warm: Optional[WarmStore] = None
 
-# Глобальное смещение (серверное время - локальное время), миллисекунды
-time_offset_ms: int = 0
+# Окно параллельных запросов к Binance: общее для всех загрузок, подстраивается под задержки и ошибки
+concurrency: AdaptiveConcurrency = AdaptiveConcurrency(THREAD_POOL_SIZE)
+
+# Часы Binance: смещение и дрейф локального времени, синхронизируются в фоне
+clock: ClockSync = ClockSync()
 
 def _format_ts(ts_ms: int) -> str:
     """Преобразует timestamp в миллисекундах в строку ГГГГ-ММ-ДД ЧЧ:ММ:СС"""
     return datetime.fromtimestamp(ts_ms / 1000).strftime('%Y-%m-%d %H:%M:%S')
 
-async def update_time_offset(session: aiohttp.ClientSession) -> None:
-    """Обновляет смещение времени между локальной машиной и Binance."""
-    global time_offset_ms
-    server_time = await get_binance_server_time(session)
-    if server_time is not None:
-        local_time = int(time.time() * 1000)
-        new_offset = server_time - local_time
-        if abs(new_offset - time_offset_ms) > 500:  # логируем только значительные изменения
-            logger.info(f"Коррекция времени: смещение изменено с {time_offset_ms} мс на {new_offset} мс")
-        time_offset_ms = new_offset
-    else:
-        logger.warning("Не удалось получить время Binance, смещение не обновлено")
-
 def get_adjusted_now_ms() -> int:
-    """Возвращает текущее время в миллисекундах с учётом смещения с Binance."""
-    return int(time.time() * 1000) + time_offset_ms
+    """Возвращает текущее время в миллисекундах с учётом смещения и дрейфа относительно Binance."""
+    return clock.now_ms()
 
-def is_storage_consistent(candle_dict: dict[int, list[KlineRecord]]) -> bool:
+def is_storage_consistent(storage: CandleStorage) -> bool:
     """
-    Проверяет корректность словаря минутных свечей.
+    Проверяет, что в хранилище нет пустых минут.
 
-    Условия:
-      1. Для каждого KlineRecord поле open_time должно совпадать с ключом (номером минуты),
-         под которым запись хранится.
-      2. Ключи словаря (номера минут) должны образовывать непрерывную
-         возрастающую последовательность без пропусков и повторов.
+    open_time каждой свечи определяется слотом хранилища, поэтому проверять
+    соответствие ключу больше не нужно – достаточно непрерывности диапазона.
 
     Args:
-        candle_dict: словарь вида {номер_минуты: список[CandleRecord]}
+        storage: колоночное хранилище минутных свечей
 
     Returns:
-        True, если обе проверки пройдены успешно, иначе False.
+        True, если за каждую минуту диапазона есть свечи, иначе False.
     """
-    # Пустой словарь считаем корректным (или можно изменить логику при необходимости)
-    if not candle_dict:
+    # Пустое хранилище считаем корректным
+    if not storage:
         return True
 
-    # 1. Проверка непрерывности ключей
-    keys = list(candle_dict.keys())
-    for i in range(1, len(keys)):
-        if keys[i] != keys[i-1] + 1:
-            print(f"Ошибка: разрыв в последовательности минут между {_format_ts(keys[i-1] * 60000)} и {_format_ts(keys[i] * 60000)}")
-            return False
-
-    # 2. Проверка совпадения open_time с ключом
-    for minute, records in candle_dict.items():
-        for record in records:
-            if record.open_time != minute * 60000:
-                print(f"Ошибка: запись {record} имеет open_time={_format_ts(record.open_time)}, "
-                      f"не совпадающий с ключом {_format_ts(minute * 60000)} ")
-                return False
+    missing = storage.missing_minutes()
+    if missing:
+        print(f"Ошибка: в хранилище нет данных за {len(missing)} минут, первая пропущенная {_format_ts(missing[0] * 60000)}")
+        return False
 
     return True
 
-async def fetch_candles(session: aiohttp.ClientSession, symbols: list[str], limiter: BinanceRateLimiter, count: int = 1440) -> None:
+async def fetch_candles(session: aiohttp.ClientSession, symbols: list[str], limiter: BinanceRateLimiter, count: int = 1440,
+                        on_live: Optional[Callable[[list[str]], None]] = None) -> None:
     """
     Получаем последние `count` минут (по умолчанию 24 часа) и сохраняем их в глобальном хранилище.
+
+    При догоняющей загрузке (count > LIVE_FETCH_MINUTES) последние LIVE_FETCH_MINUTES минут всех тикеров
+    запрашиваются отдельно и с высшим приоритетом; как только они записаны, вызывается on_live([])
+    (публикация свежей минуты), а более старые страницы докачиваются в общем окне запросов и лимитере.
+    Если последние минуты собираются дольше PARTIAL_PUBLISH_SECONDS, on_live вызывается раньше
+    со списком тикеров, чьей свечи за последнюю минуту ещё нет.
     """
     # Текущий момент
     now_timestamp = get_adjusted_now_ms()
     # Последняя завершенная минута
     end_timestamp = now_timestamp - (now_timestamp % 60000) - 1
-
-    # Запрос к Binance: все тикеры за указанное количество минут до `end_timestamp`
-    period_data: OrderedDict[int, list[KlineRecord]] = await fetch_klines_for_symbols(session, symbols, limiter, count, end_timestamp)
-    logger.debug(f"fetch вернул {len(period_data)} отметок")
+    live_minute = end_timestamp // 60000
 
     logger.debug(f"До сохранения там {len(global_data)} отметок")
-    # Сохраняем свечи по абсолютному номеру минуты
-    for minute_key, records in period_data.items():
-        # Если минута уже существует, добавляем записи (предполагаем, что дубликатов нет)
-        if minute_key in global_data:   
-            global_data[minute_key].extend(records)
-        else:
-            global_data[minute_key] = records
+    # Запрос к Binance: все тикеры за указанное количество минут до `end_timestamp`.
+    # Свечи сразу раскладываются по абсолютному номеру минуты в хранилище.
+    if on_live is None:
+        written = await fetch_klines_for_symbols(session, symbols, limiter, count, end_timestamp, global_data,
+                                                 semaphore=concurrency)
+    else:
+        live_count = min(count, LIVE_FETCH_MINUTES)
+        backfill = None
+        if count > live_count:
+            backfill = asyncio.create_task(fetch_klines_for_symbols(
+                session, symbols, limiter, count - live_count, end_timestamp - live_count * 60000,
+                global_data, live_minute=live_minute, semaphore=concurrency))
+        live = asyncio.create_task(fetch_klines_for_symbols(session, symbols, limiter, live_count, end_timestamp,
+                                                            global_data, live_minute=live_minute, semaphore=concurrency))
+        try:
+            if PARTIAL_PUBLISH_SECONDS > 0:
+                done, _ = await asyncio.wait({live}, timeout=PARTIAL_PUBLISH_SECONDS)
+                if not done:
+                    # Опоздавшие тикеры не задерживают минуту остальных
+                    pending = [symbol for symbol in symbols if not global_data.has_candle(symbol, live_minute)]
+                    on_live(pending)
+            written = await live
+            if backfill is not None:
+                logger.info(f"Последние {live_count} минут получены, публикуем до окончания докачки")
+                on_live([])
+                written += await backfill
+        finally:
+            live.cancel()
+            if backfill is not None:
+                backfill.cancel()
+    logger.debug(f"fetch записал {written} свечей")
     logger.debug(f"После сохранения в global_data {len(global_data)} минут")
 
 def cleanup_storage(storage_imit: int):
-    # Убираем старые данные – оставляем только последние 1440 минут
+    # Убираем старые данные – оставляем только последние storage_imit минут.
+    # Сдвиг границы кольцевого буфера, без сортировки и удаления ключей.
+    if not global_data:
+        return
+
     if len(global_data) > storage_imit:
-        sorted_keys = sorted(global_data.keys())
-        for key in sorted_keys[:len(global_data) - storage_imit]:
-            del global_data[key]
+        global_data.evict_before(global_data.last_minute - storage_imit + 1)
 
     if (is_storage_consistent(global_data)):
         logger.info(f"✅ Хранилище консистентно. Период хранения с"
-                    f" {_format_ts(list(global_data.keys())[0] * 60000)} по {_format_ts(list(global_data.keys())[-1] * 60000)}")
+                    f" {_format_ts(global_data.first_minute * 60000)} по {_format_ts(global_data.last_minute * 60000)}")
     else:
         logger.error(f"❌ Хранилище неконсистентно. Период хранения с"
-                     f" {_format_ts(list(global_data.keys())[0] * 60000)} по {_format_ts(list(global_data.keys())[-1] * 60000)}")
+                     f" {_format_ts(global_data.first_minute * 60000)} по {_format_ts(global_data.last_minute * 60000)}")
+
+def archive_storage(until_minute: Optional[int] = None) -> None:
+    """Дописывает в дисковый архив новые минуты хранилища и записывает закончившиеся сутки в тёплый уровень."""
+    if warm is not None:
+        try:
+            warm.seal_from(global_data, until_minute)
+        except OSError as e:
+            logger.error(f"Ошибка записи тёплого уровня: {e}")
+    if archive is None:
+        return
+    try:
+        appended = archive.append_from(global_data, until_minute)
+        if appended:
+            logger.debug(f"В архив дописано {appended} минут")
+        # Архив растёт append-only, поэтому изредка сжимаем его до окна хранилища
+        if len(archive) > 2 * MAX_CACHED_CANDLES:
+            archive.compact(MAX_CACHED_CANDLES)
+    except OSError as e:
+        logger.error(f"Ошибка записи архива свечей: {e}")
 
 def check_space(now_ms: int) -> int:
     """
@@ -151,7 +191,7 @@ def check_space(now_ms: int) -> int:
 
     # Последняя завершенная минута
     last_completed_minute = (now_ms - (now_ms % 60000) - 1) // 60000
-    last_stored_minute = max(global_data.keys())
+    last_stored_minute = global_data.last_minute
 
     if last_stored_minute >= last_completed_minute:
         return 0
@@ -171,7 +211,8 @@ def create_session():
     timeout = aiohttp.ClientTimeout(total=30, connect=15)
     return aiohttp.ClientSession(connector=connector, timeout=timeout)
 
-async def main_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession, server: UDPMarketDataServer):
+async def main_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession, server: UDPMarketDataServer, repairer: GapRepairer,
+                    universe: SymbolUniverse):
     """
     Main loop: update last candles and fetch new minute candles every minute.
     """
@@ -179,11 +220,8 @@ async def main_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession,
     symbols: list[str] = []
 
     while True:
-        await update_time_offset(session) 
         tick_start_time = time.time()
         now_ms = get_adjusted_now_ms()
-        server.set_busy(True)
-        server.set_time_offset(time_offset_ms)
         missing = check_space(now_ms)
 
         try:
@@ -192,25 +230,31 @@ async def main_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession,
                 logger.info(f"Доступно минут для скачивания: {missing}. Догоняем...")
 
                 # ==================================================================== # 
-                logger.info(f"Обновляем список тикеров")
-                symbols = await get_trading_symbols(session)
+                # exchangeInfo скачивается раз в SYMBOLS_TTL_SECONDS, изменения списка
+                # публикуются сервером через on_change
+                symbols = await universe.get()
                 if not symbols:
                     logger.error("Не удалось получить список тикеров")
                     continue
-                logger.info(f"✅ Получено {len(symbols)} тикеров")
+                repairer.update_symbols(symbols)
                 # ==================================================================== # 
 
-                server.update_symbols(symbols)
+                def publish_live(pending: list[str]):
+                    # Архив дописывается только после докачки: он растёт append-only
+                    server.update_data(global_data, pending_symbols=pending)
 
+                # Клиенты продолжают получать опубликованный срез, пока следующий собирается рядом
                 await fetch_candles(
                     session = session, 
                     symbols = symbols, 
                     limiter = limiter,  
-                    count = missing
+                    count = missing,
+                    on_live = publish_live
                 )
 
                 cleanup_storage(MAX_CACHED_CANDLES)
                 server.update_data(global_data)
+                archive_storage()
         
         except Exception as e:
             logger.error(f"Ошибка обработки цикла: {e}")
@@ -220,63 +264,178 @@ async def main_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession,
         elapsed = time.time() - tick_start_time
         wait_time = max(0, 5 - elapsed)  # минимум 0 секунд
 
-        server.set_busy(False)         # <- освобождаем
-
         if missing != 0:
-            logger.info(f"✅ Updated {len(global_data)} / {len(symbols)} tickers for {elapsed:.2f} seconds")
+            logger.info(f"✅ Updated {len(global_data)} / {len(symbols)} tickers for {elapsed:.2f} seconds, "
+                        f"окно параллельных запросов {concurrency.window:.1f}")
 
         await asyncio.sleep(wait_time)
 
 
+async def stream_loop(limiter: BinanceRateLimiter, session: aiohttp.ClientSession, server: UDPMarketDataServer, ingestor: KlineStreamIngestor, repairer: GapRepairer,
+                      universe: SymbolUniverse):
+    """
+    Цикл потокового режима: свечи приходят по WebSocket, REST используется только
+    для докачки тикеров, по которым поток не прислал закрытую свечу.
+    """
+
+    published_minute = global_data.last_minute
+    symbols_minute = published_minute
+
+    while True:
+        # Просыпаемся сразу, как только минута собрана по всем тикерам
+        await ingestor.wait_minute_complete(timeout=5)
+
+        now_ms = get_adjusted_now_ms()
+        last_completed_minute = (now_ms - (now_ms % 60000) - 1) // 60000
+
+        try:
+
+            if symbols_minute != last_completed_minute:
+                # ==================================================================== # 
+                symbols = await universe.get()
+                if symbols:
+                    await ingestor.update_symbols(symbols)
+                    repairer.update_symbols(symbols)
+                    symbols_minute = last_completed_minute
+                else:
+                    logger.error("Не удалось получить список тикеров")
+                # ==================================================================== # 
+
+            ready_minute = ingestor.complete_minute
+
+            # Даём потоку STREAM_REPAIR_DELAY_MS на доставку закрытых свечей, дальше докачиваем через REST
+            if ready_minute != last_completed_minute and now_ms % 60000 >= STREAM_REPAIR_DELAY_MS:
+                lagging = ingestor.lagging_symbols(last_completed_minute)
+                if lagging:
+                    logger.warning(f"WebSocket не прислал минуту по {len(lagging)} тикерам, докачиваем через REST")
+                    end_timestamp = (last_completed_minute + 1) * 60000 - 1
+                    await fetch_klines_for_symbols(session, list(lagging), limiter, lagging, end_timestamp, global_data,
+                                                   semaphore=concurrency)
+                    repaired = [s for s in lagging if global_data.has_candle(s, last_completed_minute)]
+                    ingestor.mark_repaired(repaired, last_completed_minute)
+                ready_minute = last_completed_minute
+
+            if ready_minute is not None and ready_minute != published_minute:
+                cleanup_storage(MAX_CACHED_CANDLES)
+                server.update_data(global_data, published_minute=ready_minute)
+                archive_storage(ready_minute)
+                published_minute = ready_minute
+                logger.info(f"✅ Опубликована минута {_format_ts(ready_minute * 60000)}")
+
+        except Exception as e:
+            logger.error(f"Ошибка обработки цикла: {e}")
+
+
 async def main():
     """
     Main entry point.
     """
 
+    global archive, warm
+
     server = UDPMarketDataServer(host=DOWNLOADER_UDP_IP, port=DOWNLOADER_UDP_PORT)
     limiter = BinanceRateLimiter(BINANCE_API_REQUEST_LIMIT, BINANCE_API_WEIGHT_LIMIT)
 
+    if WARM_STORE_PATH:
+        # Относительный путь отсчитывается от каталога DownloadBot, а не от текущего каталога
+        warm = WarmStore(str(download_bot_src_path / WARM_STORE_PATH))
+        server.warm = warm
+        if warm.days:
+            logger.info(f"Тёплый уровень: {len(warm.days)} суток, {warm.disk_bytes() / 1024 / 1024:.1f} МБ")
+
+    if ARCHIVE_PATH:
+        # Относительный путь отсчитывается от каталога DownloadBot, а не от текущего каталога
+        archive = CandleArchive(str(download_bot_src_path / ARCHIVE_PATH))
+        load_start_time = time.time()
+        loaded = archive.load_into(global_data)
+        if loaded:
+            logger.info(f"✅ Из архива загружено {loaded} минут за {time.time() - load_start_time:.2f} секунд. "
+                        f"Период с {_format_ts(global_data.first_minute * 60000)} по {_format_ts(global_data.last_minute * 60000)}")
+
     try:
 
         async with create_session() as session:
-            await update_time_offset(session)
-            server.set_time_offset(time_offset_ms)
+            # Первая синхронизация до расчёта минут, дальше – в фоне
+            clock.on_update = server.set_time_offset
+            await clock.sync_once(session)
+            clock.start(session)
 
+            # Список тикеров с TTL: листинги и делистинги сразу уходят серверу
+            universe = SymbolUniverse(session, on_change=lambda diff: server.update_symbols(list(diff.symbols), diff))
             logger.info(f"Обновляем список тикеров")
-            symbols = await get_trading_symbols(session)
+            symbols = await universe.get()
             if not symbols:
                 logger.error("Не удалось получить список тикеров")
                 return
             logger.info(f"✅ Получено {len(symbols)} тикеров seconds")
-            server.update_symbols(symbols)
             
             # Берём только первые 10 тикеров (для дебага)
             symbols = symbols# [:50]
             
-            # Скачиваем архивные свечи перед запуском        
-            total_requests = len(symbols) * ((MAX_CACHED_CANDLES + MAX_CANDLES_PER_REQUEST - 1) // MAX_CANDLES_PER_REQUEST)
-            # Оценка по весу (средний вес 10)
-            estimated_min_by_weight = (10 * total_requests) / BINANCE_API_WEIGHT_LIMIT
+            # Скачиваем только минуты после последней минуты архива
+            count = min(check_space(get_adjusted_now_ms()), MAX_CACHED_CANDLES)
+
+            # План страниц на пустом лимитере: количество запросов и их суммарный вес
+            plan = plan_kline_pages(symbols, count, get_adjusted_now_ms(), limiter.weight_headroom(), limiter.requests_headroom())
+            total_requests = plan_requests(plan)
+            # Оценка по весу
+            estimated_min_by_weight = plan_weight(plan) / BINANCE_API_WEIGHT_LIMIT
             # Оценка по количеству запросов
             estimated_min_by_count = total_requests / BINANCE_API_REQUEST_LIMIT
             # Берём максимум как пессимистичную оценку
             estimated_minutes = max(estimated_min_by_weight, estimated_min_by_count)
 
-            logger.info(f"Скачиваем {MAX_CACHED_CANDLES} минутных отметок по каждому тикеру. .")
-            logger.info(f"Всего {MAX_CACHED_CANDLES * len(symbols)} свечей. Понадобится {total_requests} запросов.")
-            logger.info(f"Ориентировочно это займет {estimated_minutes * 60} секунд при соблюдении лимитов Binance.")
-            await fetch_candles(
-                session = session, 
-                symbols = symbols, 
-                limiter = limiter, 
-                count = MAX_CACHED_CANDLES
-            )
-
-            logger.info(f"✅ Updated {len(global_data)} tickers!")
+            if count > 0:
+                logger.info(f"Скачиваем {count} минутных отметок по каждому тикеру. .")
+                logger.info(f"Всего {count * len(symbols)} свечей. Понадобится {total_requests} запросов.")
+                logger.info(f"Ориентировочно это займет {estimated_minutes * 60} секунд при соблюдении лимитов Binance.")
+                await fetch_candles(
+                    session = session, 
+                    symbols = symbols, 
+                    limiter = limiter, 
+                    count = count
+                )
+            cleanup_storage(MAX_CACHED_CANDLES)
+            archive_storage()
+
+            logger.info(f"✅ Updated {len(global_data)} minutes for {global_data.symbols_count} tickers!")
+            logger.info(f"Хранилище занимает {global_data.memory_bytes() / 1024 / 1024:.1f} МБ")
+            server.update_data(global_data)
             await server.start()
             logger.info("UDP сервер запущен")
 
-            await main_loop(limiter, session, server)
+            # Пропуски отдельных тикеров докачиваются в фоне и публикуются без новых минут
+            def publish_repaired(written: int):
+                # Ожидающие тикеры, чьи свечи уже пришли, из списка убираются
+                pending = [symbol for symbol in server.pending_symbols
+                           if not global_data.has_candle(symbol, server.published_minute)]
+                server.update_data(global_data, published_minute=server.published_minute, pending_symbols=pending)
+                # Исправленные минуты, уже попавшие в архив, перезаписываются на диске
+                if archive is not None:
+                    try:
+                        rewritten = archive.rewrite_minutes(global_data, repairer.take_repaired_minutes())
+                        if rewritten:
+                            logger.debug(f"В архиве перезаписано {rewritten} исправленных минут")
+                    except OSError as e:
+                        logger.error(f"Ошибка записи архива свечей: {e}")
+
+            repairer = GapRepairer(session, global_data, limiter, on_repaired=publish_repaired)
+            repairer.update_symbols(symbols)
+            repairer.start(lambda: server.published_minute)
+
+            try:
+                if INGESTION_MODE == "stream":
+                    ingestor = KlineStreamIngestor(session, global_data)
+                    await ingestor.start(symbols)
+                    try:
+                        await stream_loop(limiter, session, server, ingestor, repairer, universe)
+                    finally:
+                        await ingestor.stop()
+                else:
+                    await main_loop(limiter, session, server, repairer, universe)
+            finally:
+                await repairer.stop()
+                await clock.stop()
 
     except KeyboardInterrupt:
 
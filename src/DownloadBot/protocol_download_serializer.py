@@ -2,10 +2,14 @@ import struct
 import zlib
 
 from typing import Optional
+from typing import Sequence
+
+import numpy as np
 
 from bot_types import *
 from protocol_download import *
 from bot_types_serializer import *
+from kline_codec import decode_columns
 
 class ProtocolSerializer:
     """Класс для бинарной сериализации сообщений"""
@@ -15,13 +19,25 @@ class ProtocolSerializer:
     HEADER_FORMAT = '!BII'
     HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 
+    # Заголовок фрагмента диапазона внутри payload
+    RANGE_FRAGMENT_FORMAT = '!IIIIHHI'
+    RANGE_FRAGMENT_SIZE = struct.calcsize(RANGE_FRAGMENT_FORMAT)
+
     @staticmethod
     def _build_header(packet_type: PacketType, packet_number: int, data_length: int) -> bytes:
         return struct.pack(ProtocolSerializer.HEADER_FORMAT,
                            packet_type.value, packet_number, data_length)
 
     @staticmethod
-    def _parse_header(data: bytes) -> Optional[tuple[PacketType, int, int]]:
+    def _version_suffix(payload_version: int) -> bytes:
+        """
+        Версия кодирования payload передаётся необязательным байтом после данных пакета (вне длины
+        из заголовка): старые клиенты и серверы его не отправляют и игнорируют. Нет байта – ROWS.
+        """
+        return b'' if payload_version == PayloadVersion.ROWS else struct.pack('!B', payload_version)
+
+    @staticmethod
+    def _parse_header(data: bytes) -> Optional[tuple[PacketType, int, int, int]]:
         if len(data) < ProtocolSerializer.HEADER_SIZE:
             return None
         ptype_val, pnum, dlen = struct.unpack(ProtocolSerializer.HEADER_FORMAT,
@@ -30,30 +46,53 @@ class ProtocolSerializer:
             ptype = PacketType(ptype_val)
         except ValueError:
             return None
-        return ptype, pnum, dlen
+        end = ProtocolSerializer.HEADER_SIZE + dlen
+        version = data[end] if len(data) > end else PayloadVersion.ROWS
+        return ptype, version, pnum, dlen
 
     # ---------- Сериализация запросов/ответов ----------
     @staticmethod
-    def serialize_kline_request(req: KlineRequest, packet_number: int) -> bytes:
-        """Формирует пакет KLINES_REQUEST."""
+    def serialize_kline_request(req: KlineRequest, packet_number: int, payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """Формирует пакет KLINES_REQUEST. payload_version – старшая версия кодирования, которую понимает клиент."""
         # Данные: minute_number (I)
         data = struct.pack('!I', req.minute_number)
         header = ProtocolSerializer._build_header(PacketType.KLINES_REQUEST,
                                                   packet_number, len(data))
-        return header + data
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
 
     @staticmethod
     def serialize_kline_response(resp: KlineResponse, packet_number: int) -> bytes:
         """Формирует пакет KLINES_RESPONSE."""
         # Сериализуем records через KlineRecordSerializer
         records_data = KlineRecordSerializer.serialize_records(resp.records)
-        compressed = zlib.compress(records_data, level=6)
+        return ProtocolSerializer.serialize_kline_response_data(resp.minute_number, resp.status,
+                                                                records_data, packet_number)
+
+    @staticmethod
+    def serialize_kline_response_data(minute_number: int, status: int, records_data: bytes, packet_number: int,
+                                      packet_type: PacketType = PacketType.KLINES_RESPONSE,
+                                      payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """
+        Формирует пакет KLINES_RESPONSE из уже сериализованных записей.
+        KLINES_SUBSET_RESPONSE имеет тот же формат, но записи в нём с номерами тикеров (ID_RECORD_FORMAT).
+
+        records_data – записи в версии payload_version: для ROWS – строки KlineRecordSerializer
+        (сжимаются zlib), для COLUMNAR – готовый блок kline_codec.encode_columns.
+        """
+        if payload_version == PayloadVersion.COLUMNAR:
+            compressed = records_data
+        else:
+            compressed = zlib.compress(records_data, level=6)
         # Формат: minute_number (I), status (I), compressed_len (I), compressed_data
-        data = struct.pack('!II', resp.minute_number, resp.status) + \
+        data = struct.pack('!II', minute_number, status) + \
                struct.pack('!I', len(compressed)) + compressed
-        header = ProtocolSerializer._build_header(PacketType.KLINES_RESPONSE,
-                                                  packet_number, len(data))
-        return header + data
+        header = ProtocolSerializer._build_header(packet_type, packet_number, len(data))
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
+
+    @staticmethod
+    def patch_packet_number(packet: bytes, packet_number: int) -> bytes:
+        """Возвращает копию готового пакета с другим номером пакета (байты 1..4 заголовка)."""
+        return packet[:1] + struct.pack('!I', packet_number) + packet[5:]
 
     @staticmethod
     def serialize_symbols_request(req: SymbolsRequest, packet_number: int) -> bytes:
@@ -92,18 +131,127 @@ class ProtocolSerializer:
                                                   packet_number, len(data))
         return header + data
     
+    @staticmethod
+    def serialize_kline_range_request(req: KlinesRangeRequest, packet_number: int, payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """Формирует пакет KLINES_RANGE_REQUEST."""
+        # Формат: start_minute (I), count (I), table_version (I), длина маски (H), маска тикеров,
+        #         количество фрагментов (H), номера фрагментов (H каждый)
+        data = struct.pack('!IIIH', req.start_minute, req.count, req.table_version, len(req.symbol_bitmap))
+        data += req.symbol_bitmap
+        data += struct.pack(f'!H{len(req.fragments)}H', len(req.fragments), *req.fragments)
+        header = ProtocolSerializer._build_header(PacketType.KLINES_RANGE_REQUEST,
+                                                  packet_number, len(data))
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
+
+    @staticmethod
+    def serialize_kline_range_fragment(fragment: KlinesRangeFragment, packet_number: int) -> bytes:
+        """Формирует пакет KLINES_RANGE_RESPONSE (один фрагмент потока)."""
+        # Формат: start_minute (I), count (I), status (I), stream_crc (I),
+        #         fragment_index (H), fragment_count (H), data_len (I), data
+        data = struct.pack(ProtocolSerializer.RANGE_FRAGMENT_FORMAT,
+                           fragment.start_minute, fragment.count, fragment.status, fragment.stream_crc,
+                           fragment.fragment_index, fragment.fragment_count, len(fragment.data)) + fragment.data
+        header = ProtocolSerializer._build_header(PacketType.KLINES_RANGE_RESPONSE,
+                                                  packet_number, len(data))
+        return header + data + ProtocolSerializer._version_suffix(fragment.payload_version)
+
+    @staticmethod
+    def split_kline_range_stream(stream: bytes, fragment_size: int) -> list[bytes]:
+        """
+        Делит поток диапазона на фрагменты по fragment_size байт.
+        Поток – это подряд идущие payload ответов KLINES_RESPONSE (или KLINES_SUBSET_RESPONSE,
+        если в запросе есть маска тикеров) по каждой найденной минуте.
+        """
+        if not stream:
+            return [b'']
+        return [stream[i:i + fragment_size] for i in range(0, len(stream), fragment_size)]
+
+    @staticmethod
+    def serialize_subscribe_request(req: SubscribeRequest, packet_number: int, payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """Формирует пакет SUBSCRIBE_REQUEST. Рассылка придёт в версии кодирования payload_version."""
+        # Формат: token (I)
+        data = struct.pack('!I', req.token)
+        header = ProtocolSerializer._build_header(PacketType.SUBSCRIBE_REQUEST,
+                                                  packet_number, len(data))
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
+
+    @staticmethod
+    def serialize_subscribe_response(resp: SubscribeResponse, packet_number: int) -> bytes:
+        """Формирует пакет SUBSCRIBE_RESPONSE."""
+        data = struct.pack('!IIIII', resp.status, resp.sequence, resp.published_minute, resp.ttl_seconds, resp.token)
+        header = ProtocolSerializer._build_header(PacketType.SUBSCRIBE_RESPONSE,
+                                                  packet_number, len(data))
+        return header + data
+
+    @staticmethod
+    def serialize_unsubscribe_request(req: UnsubscribeRequest, packet_number: int) -> bytes:
+        """Формирует пакет UNSUBSCRIBE_REQUEST."""
+        # Формат: token (I)
+        data = struct.pack('!I', req.token)
+        header = ProtocolSerializer._build_header(PacketType.UNSUBSCRIBE_REQUEST,
+                                                  packet_number, len(data))
+        return header + data
+
+    @staticmethod
+    def serialize_unsubscribe_response(resp: UnsubscribeResponse, packet_number: int) -> bytes:
+        """Формирует пакет UNSUBSCRIBE_RESPONSE."""
+        data = struct.pack('!I', resp.status)
+        header = ProtocolSerializer._build_header(PacketType.UNSUBSCRIBE_RESPONSE,
+                                                  packet_number, len(data))
+        return header + data
+
+    @staticmethod
+    def serialize_symbol_table_request(req: SymbolTableRequest, packet_number: int) -> bytes:
+        """Формирует пакет SYMBOL_TABLE_REQUEST (без данных)."""
+        return ProtocolSerializer._build_header(PacketType.SYMBOL_TABLE_REQUEST, packet_number, 0)
+
+    @staticmethod
+    def serialize_symbol_table_response(resp: SymbolTableResponse, packet_number: int) -> bytes:
+        """Формирует пакет SYMBOL_TABLE_RESPONSE."""
+        # Формат: status (I), version (I), количество тикеров (H), тикеры по номерам (16 байт UTF-8 каждый)
+        data = struct.pack('!IIH', resp.status, resp.table.version, len(resp.table.symbols))
+        data += b''.join(s.encode('utf-8')[:16].ljust(16, b'\x00') for s in resp.table.symbols)
+        header = ProtocolSerializer._build_header(PacketType.SYMBOL_TABLE_RESPONSE,
+                                                  packet_number, len(data))
+        return header + data
+
+    @staticmethod
+    def serialize_kline_subset_request(req: KlinesSubsetRequest, packet_number: int, payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """Формирует пакет KLINES_SUBSET_REQUEST."""
+        # Формат: minute_number (I), table_version (I), длина маски (H), маска тикеров
+        data = struct.pack('!IIH', req.minute_number, req.table_version, len(req.symbol_bitmap)) + req.symbol_bitmap
+        header = ProtocolSerializer._build_header(PacketType.KLINES_SUBSET_REQUEST,
+                                                  packet_number, len(data))
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
+
+    @staticmethod
+    def serialize_klines_push_data(sequence: int, kline_payload: bytes, payload_version: int = PayloadVersion.ROWS) -> bytes:
+        """
+        Формирует пакет KLINES_PUSH из готового payload ответа KLINES_RESPONSE версии payload_version.
+        Номер пакета совпадает с sequence.
+        """
+        data = struct.pack('!I', sequence) + kline_payload
+        header = ProtocolSerializer._build_header(PacketType.KLINES_PUSH, sequence, len(data))
+        return header + data + ProtocolSerializer._version_suffix(payload_version)
+
+    @staticmethod
+    def packet_payload(packet: bytes) -> bytes:
+        """Данные готового пакета без заголовка и байта версии."""
+        _, _, _, dlen = ProtocolSerializer._parse_header(packet)
+        return packet[ProtocolSerializer.HEADER_SIZE:ProtocolSerializer.HEADER_SIZE + dlen]
+
     # ---------- Десериализация ----------
     @staticmethod
-    def deserialize_packet(data: bytes) -> Optional[tuple[PacketType, int, bytes]]:
-        """Разбирает заголовок и возвращает (тип, номер_пакета, payload)."""
+    def deserialize_packet(data: bytes) -> Optional[tuple[PacketType, int, int, bytes]]:
+        """Разбирает заголовок и возвращает (тип, версия_кодирования, номер_пакета, payload)."""
         parsed = ProtocolSerializer._parse_header(data)
         if not parsed:
             return None
-        ptype, pnum, dlen = parsed
+        ptype, version, pnum, dlen = parsed
         if len(data) < ProtocolSerializer.HEADER_SIZE + dlen:
             return None
         payload = data[ProtocolSerializer.HEADER_SIZE:ProtocolSerializer.HEADER_SIZE + dlen]
-        return ptype, pnum, payload
+        return ptype, version, pnum, payload
 
     @staticmethod
     def deserialize_kline_request(payload: bytes) -> Optional[KlineRequest]:
@@ -113,8 +261,15 @@ class ProtocolSerializer:
         return KlineRequest(minute_number=minute_number)
 
     @staticmethod
-    def deserialize_kline_response(payload: bytes) -> Optional[KlineResponse]:
-        # Формат: minute (I), status (I), compressed_len (I), compressed_data
+    def deserialize_kline_response(payload: bytes, symbols: Optional[Sequence[str]] = None,
+                                   payload_version: int = PayloadVersion.ROWS) -> Optional[KlineResponse]:
+        """
+        Разбирает payload KLINES_RESPONSE. Если передана таблица тикеров (symbols) – payload
+        KLINES_SUBSET_RESPONSE: записи содержат номера тикеров, а не имена.
+        payload_version – версия кодирования из заголовка пакета.
+        Записи возвращаются колонками KlineColumns: KlineRecord создаются, только если к ним обратиться.
+        """
+        # Формат: minute (I), status (I), data_len (I), data (zlib записей либо колоночный блок)
         if len(payload) < 12:
             return None
         minute, status, comp_len = struct.unpack('!III', payload[:12])
@@ -122,8 +277,22 @@ class ProtocolSerializer:
             return None
         compressed = payload[12:12+comp_len]
         try:
-            records_data = zlib.decompress(compressed)
-            records = KlineRecordSerializer.deserialize_records(records_data)
+            if payload_version == PayloadVersion.COLUMNAR:
+                symbol_ids, names, values, trades = decode_columns(compressed) if compressed else \
+                    (None, [], np.empty((0, 8)), np.empty(0, dtype=np.int64))
+                if symbol_ids is not None:
+                    names = [symbols[i] for i in symbol_ids.tolist()]
+                # open_time/close_time следуют из номера минуты
+                open_time = minute * 60000
+                records = KlineRecordSerializer.columns_from_codec(names, values, trades, open_time, open_time + 59999)
+            else:
+                # Записи читаются прямо из распакованного буфера, без копирования по записи
+                records_data = zlib.decompress(compressed)
+                if symbols is None:
+                    rows = KlineRecordSerializer.deserialize_array(records_data)
+                else:
+                    rows = KlineRecordSerializer.deserialize_id_array(records_data)
+                records = KlineRecordSerializer.columns_from_array(rows, symbols)
         except Exception:
             return None
         return KlineResponse(minute_number=minute, status=status, records=records)
@@ -168,6 +337,111 @@ class ProtocolSerializer:
             return None
         status, server_time = struct.unpack('!iq', payload[:12])
         return TimeResponse(status=status, server_time_ms=server_time)
+
+    @staticmethod
+    def deserialize_kline_range_request(payload: bytes) -> Optional[KlinesRangeRequest]:
+        if len(payload) < 14:
+            return None
+        start_minute, count, table_version, bitmap_len = struct.unpack('!IIIH', payload[:14])
+        pos = 14 + bitmap_len
+        symbol_bitmap = payload[14:pos]
+        if pos + 2 > len(payload):
+            return None
+        num_fragments = struct.unpack('!H', payload[pos:pos+2])[0]
+        pos += 2
+        if pos + 2 * num_fragments > len(payload):
+            return None
+        fragments = list(struct.unpack(f'!{num_fragments}H', payload[pos:pos + 2 * num_fragments]))
+        return KlinesRangeRequest(start_minute=start_minute, count=count, table_version=table_version,
+                                  symbol_bitmap=symbol_bitmap, fragments=fragments)
+
+    @staticmethod
+    def deserialize_kline_range_fragment(payload: bytes, payload_version: int = PayloadVersion.ROWS) -> Optional[KlinesRangeFragment]:
+        size = ProtocolSerializer.RANGE_FRAGMENT_SIZE
+        if len(payload) < size:
+            return None
+        (start_minute, count, status, stream_crc,
+         fragment_index, fragment_count, data_len) = struct.unpack(ProtocolSerializer.RANGE_FRAGMENT_FORMAT, payload[:size])
+        if len(payload) < size + data_len:
+            return None
+        return KlinesRangeFragment(start_minute=start_minute, count=count, status=status, stream_crc=stream_crc,
+                                   fragment_index=fragment_index, fragment_count=fragment_count,
+                                   data=payload[size:size + data_len], payload_version=payload_version)
+
+    @staticmethod
+    def deserialize_kline_range_stream(stream: bytes, symbols: Optional[Sequence[str]] = None,
+                                       payload_version: int = PayloadVersion.ROWS) -> Optional[list[KlineResponse]]:
+        """Разбирает собранный поток диапазона на ответы по минутам (symbols, payload_version – см. deserialize_kline_response)."""
+        responses = []
+        pos = 0
+        while pos < len(stream):
+            if pos + 12 > len(stream):
+                return None
+            comp_len = struct.unpack('!I', stream[pos + 8:pos + 12])[0]
+            response = ProtocolSerializer.deserialize_kline_response(stream[pos:pos + 12 + comp_len], symbols, payload_version)
+            if response is None:
+                return None
+            responses.append(response)
+            pos += 12 + comp_len
+        return responses
+
+    @staticmethod
+    def deserialize_subscribe_response(payload: bytes) -> Optional[SubscribeResponse]:
+        if len(payload) < 16:
+            return None
+        status, sequence, published_minute, ttl_seconds = struct.unpack('!IIII', payload[:16])
+        # Сервер без подтверждения подписки токен не передаёт
+        token = struct.unpack('!I', payload[16:20])[0] if len(payload) >= 20 else 0
+        return SubscribeResponse(status=status, sequence=sequence, published_minute=published_minute,
+                                 ttl_seconds=ttl_seconds, token=token)
+
+    @staticmethod
+    def deserialize_subscribe_request(payload: bytes) -> Optional[SubscribeRequest]:
+        # Клиенты без подтверждения подписки отправляют запрос без данных
+        token = struct.unpack('!I', payload[:4])[0] if len(payload) >= 4 else 0
+        return SubscribeRequest(token=token)
+
+    @staticmethod
+    def deserialize_unsubscribe_request(payload: bytes) -> Optional[UnsubscribeRequest]:
+        token = struct.unpack('!I', payload[:4])[0] if len(payload) >= 4 else 0
+        return UnsubscribeRequest(token=token)
+
+    @staticmethod
+    def deserialize_unsubscribe_response(payload: bytes) -> Optional[UnsubscribeResponse]:
+        if len(payload) < 4:
+            return None
+        return UnsubscribeResponse(status=struct.unpack('!I', payload[:4])[0])
+
+    @staticmethod
+    def deserialize_symbol_table_response(payload: bytes) -> Optional[SymbolTableResponse]:
+        if len(payload) < 10:
+            return None
+        status, version, num_symbols = struct.unpack('!IIH', payload[:10])
+        if len(payload) < 10 + 16 * num_symbols:
+            return None
+        symbols = [payload[pos:pos + 16].rstrip(b'\x00').decode('utf-8')
+                   for pos in range(10, 10 + 16 * num_symbols, 16)]
+        return SymbolTableResponse(status=status, table=SymbolTable(version=version, symbols=tuple(symbols)))
+
+    @staticmethod
+    def deserialize_kline_subset_request(payload: bytes) -> Optional[KlinesSubsetRequest]:
+        if len(payload) < 10:
+            return None
+        minute_number, table_version, bitmap_len = struct.unpack('!IIH', payload[:10])
+        if len(payload) < 10 + bitmap_len:
+            return None
+        return KlinesSubsetRequest(minute_number=minute_number, table_version=table_version,
+                                   symbol_bitmap=payload[10:10 + bitmap_len])
+
+    @staticmethod
+    def deserialize_klines_push(payload: bytes, payload_version: int = PayloadVersion.ROWS) -> Optional[KlinesPush]:
+        if len(payload) < 4:
+            return None
+        sequence = struct.unpack('!I', payload[:4])[0]
+        kline = ProtocolSerializer.deserialize_kline_response(payload[4:], payload_version=payload_version)
+        if kline is None:
+            return None
+        return KlinesPush(sequence=sequence, kline=kline)
     
 
 
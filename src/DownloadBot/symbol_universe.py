@@ -0,0 +1,118 @@
+"""
+Кеш списка тикеров Binance.
+
+/fapi/v1/exchangeInfo – JSON в несколько мегабайт, а список тикеров нужен циклу каждую минуту.
+SymbolUniverse отдаёт список из памяти в течение SYMBOLS_TTL_SECONDS и только потом скачивает
+exchangeInfo заново. Тело ответа сравнивается с предыдущим по хешу (без меняющегося при каждом
+запросе serverTime), поэтому неизменившийся ответ даже не разбирается. Изменение списка
+рассылается подписчикам как SymbolDiff: какие тикеры листингованы и какие делистингованы.
+"""
+
+import re
+import time
+import asyncio
+import hashlib
+import aiohttp
+
+from dataclasses import dataclass
+from typing import Callable
+from typing import Optional
+
+from logger import logger
+from binance_utils import fetch_exchange_info
+from binance_utils import parse_trading_symbols
+from DownloadBot.config import *
+
+# Время сервера в теле exchangeInfo: единственное поле, меняющееся при каждом запросе
+_SERVER_TIME = re.compile(rb'"serverTime"\s*:\s*\d+')
+
+def exchange_info_digest(body: bytes) -> str:
+    """Хеш тела exchangeInfo без serverTime."""
+    return hashlib.blake2b(_SERVER_TIME.sub(b'', body, count=1), digest_size=16).hexdigest()
+
+@dataclass(frozen=True)
+class SymbolDiff:
+    """Изменение списка тикеров."""
+    # новый список тикеров (в порядке exchangeInfo)
+    symbols: tuple[str, ...]
+    # появившиеся тикеры
+    listed: tuple[str, ...]
+    # пропавшие тикеры (делистинг или остановка торгов)
+    delisted: tuple[str, ...]
+
+    @classmethod
+    def between(cls, old: list[str], new: list[str]) -> "SymbolDiff":
+        old_set, new_set = set(old), set(new)
+        return cls(tuple(new),
+                   tuple(s for s in new if s not in old_set),
+                   tuple(s for s in old if s not in new_set))
+
+class SymbolUniverse:
+    """
+    Список торгующихся тикеров с TTL.
+
+    Пока список свежее ttl секунд, get() не обращается к Binance. Если exchangeInfo получить
+    не удалось, get() отдаёт прежний список и повторяет запрос при следующем вызове.
+    on_change вызывается с SymbolDiff при каждом изменении списка, в том числе при первой загрузке.
+    """
+
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 ttl: float = SYMBOLS_TTL_SECONDS,
+                 on_change: Optional[Callable[[SymbolDiff], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.session = session
+        self.ttl = ttl
+        self.on_change = on_change
+        self._clock = clock
+
+        self.symbols: list[str] = []
+        # Хеш последнего разобранного exchangeInfo
+        self.digest: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        # Одновременные вызовы get() ждут одного запроса
+        self._lock = asyncio.Lock()
+
+        # Сколько раз exchangeInfo скачан и сколько раз разобран
+        self.downloads = 0
+        self.parses = 0
+
+    def is_fresh(self) -> bool:
+        """Список получен не раньше ttl секунд назад."""
+        return self._fetched_at is not None and self._clock() - self._fetched_at < self.ttl
+
+    async def get(self, force: bool = False) -> list[str]:
+        """
+        Текущий список тикеров. force – скачать exchangeInfo, даже если список свежий.
+        Пустой список – тикеры ни разу не удалось получить.
+        """
+        async with self._lock:
+            if not force and self.is_fresh():
+                return self.symbols
+
+            body = await fetch_exchange_info(self.session)
+            if body is None:
+                if self.symbols:
+                    logger.warning(f"Список тикеров не обновлён, используем прежний ({len(self.symbols)} тикеров)")
+                return self.symbols
+            self.downloads += 1
+            self._fetched_at = self._clock()
+
+            digest = exchange_info_digest(body)
+            if digest == self.digest:
+                logger.debug("exchangeInfo не изменился")
+                return self.symbols
+
+            # Разбор нескольких мегабайт JSON не должен останавливать цикл событий
+            symbols = await asyncio.get_running_loop().run_in_executor(None, parse_trading_symbols, body)
+            self.parses += 1
+            self.digest = digest
+
+            diff = SymbolDiff.between(self.symbols, symbols)
+            self.symbols = symbols
+            if diff.listed or diff.delisted:
+                logger.info(f"Список тикеров изменился: {len(symbols)} тикеров, "
+                            f"листинг {len(diff.listed)}, делистинг {len(diff.delisted)}")
+                if self.on_change is not None:
+                    self.on_change(diff)
+            return self.symbols
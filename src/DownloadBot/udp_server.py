@@ -1,23 +1,287 @@
 import asyncio
+import hashlib
+import secrets
+import struct
 import time 
+import zlib
+
 from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from types import MappingProxyType
+from typing import Iterable
+from typing import Mapping
+
+import numpy as np
 
 from config import *
 from logger import *
+from candle_storage import CandleStorage
+from candle_storage import MINUTE_MS
+from symbol_universe import SymbolDiff
+from warm_store import WarmStore
+from bot_types_serializer import KlineRecordSerializer
+from kline_codec import encode_columns
+from kline_codec import decode_columns
 from DownloadBot.protocol_download_serializer import *
 from DownloadBot.protocol_download import *
 
+def encode_minute_packets(minute: int, symbols: np.ndarray, values: np.ndarray, trades: np.ndarray) -> tuple[bytes, ...]:
+    """
+    Пакеты KLINES_RESPONSE с номером 0 по версиям payload для свечей минуты
+    (symbols – тикеры в UTF-8, values и trades – по тем же тикерам).
+    """
+    open_time = minute * MINUTE_MS
+    records_data = KlineRecordSerializer.serialize_columns(symbols, values, trades, open_time, open_time + MINUTE_MS - 1)
+    columnar_data = encode_columns(values, trades, symbols=symbols)
+    return (
+        ProtocolSerializer.serialize_kline_response_data(minute, ServerResponseStatus.OK, records_data, 0),
+        ProtocolSerializer.serialize_kline_response_data(minute, ServerResponseStatus.OK, columnar_data, 0,
+                                                         payload_version=PayloadVersion.COLUMNAR),
+    )
+
+def encode_subset_packet(minute: int, symbol_ids: np.ndarray, values: np.ndarray, trades: np.ndarray,
+                         payload_version: int = PayloadVersion.ROWS) -> bytes:
+    """Пакет KLINES_SUBSET_RESPONSE с номером 0 для свечей минуты с номерами тикеров symbol_ids."""
+    if payload_version == PayloadVersion.COLUMNAR:
+        records_data = encode_columns(values, trades, symbol_ids=symbol_ids) if symbol_ids.size else b''
+    else:
+        open_time = minute * MINUTE_MS
+        records_data = KlineRecordSerializer.serialize_id_columns(
+            symbol_ids, values, trades, open_time, open_time + MINUTE_MS - 1)
+    return ProtocolSerializer.serialize_kline_response_data(
+        minute, ServerResponseStatus.OK, records_data, 0, PacketType.KLINES_SUBSET_RESPONSE, payload_version)
+
+class MinuteResponseCache:
+    """
+    Готовые пакеты KLINES_RESPONSE по минутам: <НОМЕР_МИНУТЫ, (пакет по версиям PayloadVersion)>.
+
+    Закрытая минута не меняется, поэтому она сериализуется и сжимается один раз –
+    при публикации через update_data – сразу во всех версиях payload. На запрос остаётся
+    выбрать версию клиента и подставить номер пакета.
+    Минута пересобирается, только если хранилище сообщило о записи в неё (счётчик изменений).
+    """
+
+    def __init__(self):
+        self._packets: dict[int, tuple[bytes, ...]] = {}
+        self._revisions: dict[int, int] = {}
+        # Тикеры в UTF-8 по столбцам хранилища
+        self._symbol_bytes = np.empty(0, dtype='S16')
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    def get(self, minute: int, payload_version: int = PayloadVersion.ROWS) -> Optional[bytes]:
+        packets = self._packets.get(minute)
+        return packets[payload_version] if packets is not None else None
+
+    def payload(self, minute: int, payload_version: int = PayloadVersion.ROWS) -> Optional[bytes]:
+        """payload ответа KLINES_RESPONSE версии payload_version (без заголовка пакета)."""
+        packet = self.get(minute, payload_version)
+        return ProtocolSerializer.packet_payload(packet) if packet is not None else None
+
+    def packets_copy(self) -> dict[int, tuple[bytes, ...]]:
+        """Копия словаря готовых пакетов для среза (сами bytes не копируются)."""
+        return dict(self._packets)
+
+    def revisions_copy(self) -> dict[int, int]:
+        """Счётчики изменений хранилища, по которым собраны пакеты (для среза)."""
+        return {minute: self._revisions[minute] for minute in self._packets}
+
+    def memory_bytes(self) -> int:
+        return sum(len(packet) for packets in self._packets.values() for packet in packets)
+
+    def evict_before(self, minute: int) -> None:
+        """Забывает минуты старше `minute` (вслед за cleanup_storage)."""
+        for old in [m for m in self._packets if m < minute]:
+            del self._packets[old]
+            del self._revisions[old]
+
+    def sync(self, storage: CandleStorage, published_minute: Optional[int]) -> int:
+        """
+        Приводит кеш в соответствие с хранилищем: удаляет вытесненные минуты
+        и сериализует новые или изменившиеся минуты до published_minute включительно.
+
+        Returns:
+            количество пересобранных минут.
+        """
+        if not storage or published_minute is None:
+            self._packets.clear()
+            self._revisions.clear()
+            return 0
+
+        self.evict_before(storage.first_minute)
+        for newer in [m for m in self._packets if m > published_minute]:
+            del self._packets[newer]
+            del self._revisions[newer]
+
+        if len(self._symbol_bytes) != storage.symbols_count:
+            self._symbol_bytes = np.array([s.encode('utf-8')[:16] for s in storage.symbols], dtype='S16')
+
+        minutes = range(storage.first_minute, min(published_minute, storage.last_minute) + 1)
+        revisions = storage.minute_revisions(minutes)
+        encoded = 0
+        for minute, revision in zip(minutes, revisions.tolist()):
+            if revision < 0 or self._revisions.get(minute) == revision:
+                continue
+            packet = self._encode(storage, minute)
+            if packet is None:
+                self._packets.pop(minute, None)
+            else:
+                self._packets[minute] = packet
+            self._revisions[minute] = revision
+            encoded += 1
+        return encoded
+
+    def _encode(self, storage: CandleStorage, minute: int) -> Optional[tuple[bytes, ...]]:
+        """Пакеты KLINES_RESPONSE с номером 0 по версиям payload или None, если свечей за минуту нет."""
+        arrays = storage.minute_arrays(minute)
+        if arrays is None:
+            return None
+        values, trades, present = arrays
+        columns = np.flatnonzero(present)
+        if columns.size == 0:
+            return None
+
+        return encode_minute_packets(minute, self._symbol_bytes[columns], values[columns], trades[columns])
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    Опубликованный срез данных сервера: готовые ответы по минутам, список тикеров, смещение времени.
+
+    Срез не изменяется после создания. Загрузчик собирает следующий срез рядом и подменяет
+    текущий одним присваиванием UDPMarketDataServer.snapshot, поэтому обработчики запросов
+    никогда не ждут обновления и не видят его промежуточного состояния. Запросы с маской
+    тикеров читают живое хранилище только для минут, не изменившихся с публикации среза.
+    """
+    # последняя минута, отдаваемая клиентам
+    published_minute: int
+    # готовые пакеты KLINES_RESPONSE по минутам и версиям payload (номер пакета 0)
+    packets: Mapping[int, tuple[bytes, ...]]
+    # торгуемые тикеры
+    symbols: tuple[str, ...]
+    # смещение времени относительно Binance
+    time_offset_ms: int
+    # таблица номеров тикеров: номер тикера – столбец хранилища
+    symbol_table: SymbolTable
+    # живое хранилище для запросов с маской тикеров. Оно меняется после публикации среза
+    # (сдвиг кольца, докачка пропусков, опоздавшие тикеры), поэтому минута читается из него,
+    # только если её счётчик изменений совпадает с revisions, иначе – из пакета среза
+    storage: CandleStorage
+    # тёплый уровень: минуты раньше окна хранилища (None – только хранилище). Записанные
+    # сегменты не меняются, поэтому срез может читать их, пока загрузчик пишет новые
+    warm: Optional[WarmStore] = field(default=None, compare=False, repr=False)
+    # тикеры, свечи которых за published_minute ещё не получены (PARTIAL_PUBLISH_SECONDS):
+    # минута опубликована без них, они появятся в следующем срезе
+    pending_symbols: frozenset[str] = frozenset()
+    # собранные потоки диапазонов для перезапросов фрагментов:
+    # <(start_minute, count, тикеры, версия payload), (stream_crc, фрагменты)>. Производные от среза данные, живут вместе с ним
+    range_streams: OrderedDict = field(default_factory=OrderedDict, compare=False, repr=False)
+    # счётчики изменений хранилища, по которым собраны packets: <НОМЕР_МИНУТЫ, СЧЁТЧИК>
+    revisions: Mapping[int, int] = field(default_factory=dict, compare=False, repr=False)
+
+    def _is_warm(self, minute: int) -> bool:
+        """Минута старше окна хранилища и может быть в тёплом уровне."""
+        return (self.warm is not None and minute <= self.published_minute and
+                (not self.storage or minute < self.storage.first_minute))
+
+    def packet(self, minute: int, payload_version: int = PayloadVersion.ROWS) -> Optional[bytes]:
+        """
+        Пакет KLINES_RESPONSE версии payload_version с номером 0: готовый из горячего уровня
+        или собранный из сегмента тёплого. None – свечей за минуту нет.
+        """
+        packets = self.packets.get(minute)
+        if packets is not None:
+            return packets[payload_version]
+        if not self._is_warm(minute):
+            return None
+        arrays = self.warm.minute_arrays(minute)
+        if arrays is None:
+            return None
+        symbols, values, trades, _ = arrays
+        return encode_minute_packets(minute, symbols, values, trades)[payload_version]
+
+    def payload(self, minute: int, payload_version: int = PayloadVersion.ROWS) -> Optional[bytes]:
+        """payload ответа KLINES_RESPONSE версии payload_version (без заголовка пакета)."""
+        packet = self.packet(minute, payload_version)
+        return ProtocolSerializer.packet_payload(packet) if packet is not None else None
+
+    def bitmap_columns(self, symbol_bitmap: bytes) -> np.ndarray:
+        """Столбцы хранилища по битовой маске номеров тикеров (номера вне таблицы отбрасываются)."""
+        bits = np.unpackbits(np.frombuffer(symbol_bitmap, dtype=np.uint8), bitorder='little')
+        return np.flatnonzero(bits[:len(self.symbol_table.symbols)])
+
+    def subset_packet(self, minute: int, columns: np.ndarray,
+                      payload_version: int = PayloadVersion.ROWS) -> Optional[bytes]:
+        """
+        Пакет KLINES_SUBSET_RESPONSE с номером 0 по указанным столбцам (без кеширования).
+        None – минута не опубликована. Если ни одного нужного тикера за минуту нет – ответ без записей.
+        """
+        if minute not in self.packets:
+            return self._warm_subset_packet(minute, columns, payload_version) if self._is_warm(minute) else None
+
+        revision = self.revisions.get(minute)
+        minutes = range(minute, minute + 1)
+        if revision is not None and self.storage.minute_revisions(minutes)[0] == revision:
+            values, trades, present = self.storage.minute_arrays(minute)
+            columns = columns[present[columns]]
+            values, trades = values[columns], trades[columns]
+            # Минута не изменилась и за время копирования – данные совпадают с пакетом среза
+            if self.storage.minute_revisions(minutes)[0] == revision:
+                return encode_subset_packet(minute, columns, values, trades, payload_version)
+        return self._packet_subset_packet(minute, columns, payload_version)
+
+    def _packet_subset_packet(self, minute: int, columns: np.ndarray, payload_version: int) -> bytes:
+        """subset_packet из колоночного пакета среза – когда минута в хранилище уже изменилась."""
+        packet = self.packets[minute][PayloadVersion.COLUMNAR]
+        data = ProtocolSerializer.packet_payload(packet)
+        block_length = struct.unpack('!I', data[8:12])[0]
+        _, names, values, trades = decode_columns(data[12:12 + block_length])
+        ids = np.array([self.symbol_table.ids.get(name, -1) for name in names], dtype=np.int64)
+        # Номера тикеров по возрастанию, как в ответах из хранилища
+        selected = np.flatnonzero(np.isin(ids, columns))
+        selected = selected[np.argsort(ids[selected], kind='stable')]
+        return encode_subset_packet(minute, ids[selected], values[selected], trades[selected], payload_version)
+
+    def _warm_subset_packet(self, minute: int, columns: np.ndarray, payload_version: int) -> Optional[bytes]:
+        """subset_packet для минуты тёплого уровня: тикеры сегмента сопоставляются столбцам хранилища."""
+        arrays = self.warm.minute_arrays(minute)
+        if arrays is None:
+            return None
+        _, values, trades, segment = arrays
+        row = minute - segment.first_minute
+        storage_columns = segment.storage_columns(self.storage)[np.flatnonzero(segment.present[row])]
+        # Номера тикеров по возрастанию, как в ответах горячего уровня
+        selected = np.flatnonzero(np.isin(storage_columns, columns))
+        selected = selected[np.argsort(storage_columns[selected], kind='stable')]
+        return encode_subset_packet(minute, storage_columns[selected], values[selected], trades[selected], payload_version)
+
 class UDPMarketDataServer:
     
     def __init__(self, host: str = DOWNLOADER_UDP_IP, port: int = DOWNLOADER_UDP_PORT):
         self.host = host
         self.port = port
-        self.global_data: OrderedDict[int, list[KlineRecord]] = OrderedDict()
+        self.global_data: CandleStorage = CandleStorage(MAX_CACHED_CANDLES)
         self.symbols: List[str] = []                    # ← храним список символов
         self.serializer = ProtocolSerializer()
         self.transport = None
-        self.is_busy = False   # флаг занятости
         self.time_offset_ms: int = 0   # смещение относительно Binance
+        self.published_minute: Optional[int] = None   # последняя минута, отдаваемая клиентам
+        self.response_cache = MinuteResponseCache()   # готовые ответы по минутам
+        # Текущий опубликованный срез. None – данных ещё нет (холодный старт), клиенты получают BUSY
+        self.snapshot: Optional[MarketSnapshot] = None
+        self.symbol_table = SymbolTable.build([])      # таблица номеров тикеров (столбцов хранилища)
+        # Подписчики на рассылку минут: <АДРЕС, МОМЕНТ_ИСТЕЧЕНИЯ_ПОДПИСКИ (time.monotonic)>
+        self.subscribers: dict[tuple, float] = {}
+        # Версия payload рассылки для каждого подписчика: <АДРЕС, PayloadVersion>
+        self.subscriber_versions: dict[tuple, int] = {}
+        # Ключ токенов подписки: токен выводится из адреса, поэтому неподтверждённые подписки не хранятся
+        self._subscription_key = secrets.token_bytes(16)
+        self.push_sequence: int = 0                    # номер последней рассылки
+        self.last_pushed_minute: Optional[int] = None  # последняя разосланная минута
+        self.pending_symbols: frozenset[str] = frozenset()  # тикеры без свечи за published_minute
+        self.warm: Optional[WarmStore] = None             # тёплый уровень для минут раньше окна хранилища
         
     async def start(self):
         loop = asyncio.get_running_loop()
@@ -37,22 +301,192 @@ class UDPMarketDataServer:
             
     def set_time_offset(self, offset_ms: int) -> None:
         """Устанавливает смещение времени (Binance - локальное) в миллисекундах."""
+        if offset_ms == self.time_offset_ms:
+            return
         self.time_offset_ms = offset_ms
+        self._publish()
 
     def get_adjusted_now_ms(self) -> int:
         """Возвращает текущее время с учётом смещения."""
         return int(time.time() * 1000) + self.time_offset_ms
+
+    def _publish(self) -> None:
+        """Собирает новый срез из текущего состояния и подменяет опубликованный."""
+        if self.published_minute is None:
+            return
+        # Столбцы хранилища только добавляются, поэтому таблица меняется лишь с их количеством
+        if len(self.symbol_table.symbols) != self.global_data.symbols_count:
+            self.symbol_table = SymbolTable.build(self.global_data.symbols)
+            logger.info(f"Таблица тикеров: {len(self.symbol_table.symbols)} тикеров, версия {self.symbol_table.version:08x}")
+        snapshot = MarketSnapshot(
+            published_minute=self.published_minute,
+            packets=MappingProxyType(self.response_cache.packets_copy()),
+            revisions=MappingProxyType(self.response_cache.revisions_copy()),
+            symbols=tuple(self.symbols),
+            time_offset_ms=self.time_offset_ms,
+            symbol_table=self.symbol_table,
+            storage=self.global_data,
+            warm=self.warm,
+            pending_symbols=self.pending_symbols
+        )
+        # Единственная точка подмены: обработчики читают self.snapshot один раз на запрос
+        self.snapshot = snapshot
     
-    def update_data(self, new_data: OrderedDict[int, list[KlineRecord]]):
-        """Обновление данных (вызывается при поступлении новых данных)"""
+    def update_data(self, new_data: CandleStorage, published_minute: Optional[int] = None,
+                    pending_symbols: Iterable[str] = ()):
+        """
+        Обновление данных (вызывается при поступлении новых данных).
+        published_minute – последняя полностью собранная минута; более свежие минуты
+        (например, частично полученные из WebSocket) клиентам не отдаются.
+        pending_symbols – тикеры, без которых минута публикуется досрочно (PARTIAL_PUBLISH_SECONDS).
+        """
         self.global_data = new_data
+        self.published_minute = published_minute if published_minute is not None else new_data.last_minute
+        self.pending_symbols = frozenset(pending_symbols)
+        if self.pending_symbols:
+            logger.info(f"Минута {self.published_minute} опубликована без {len(self.pending_symbols)} тикеров, "
+                        f"ожидаются: {', '.join(sorted(self.pending_symbols)[:10])}")
 
-    def update_symbols(self, new_symbols: List[str]):
-        self.symbols = new_symbols
-        
-    def set_busy(self, busy: bool):
-        """Установка флага занятости сервера"""
-        self.is_busy = busy
+        # Сериализуем и сжимаем новые минуты один раз, а не на каждый запрос
+        start_time = time.time()
+        encoded = self.response_cache.sync(self.global_data, self.published_minute)
+        if encoded:
+            logger.debug(f"Кеш ответов: собрано {encoded} минут за {time.time() - start_time:.3f} с, "
+                         f"всего {len(self.response_cache)} минут, {self.response_cache.memory_bytes() / 1024 / 1024:.1f} МБ")
+
+        self._publish()
+
+        # Рассылаем подписчикам минуты, опубликованные с прошлого обновления
+        self.push_new_minutes()
+
+    def subscription_token(self, addr) -> int:
+        """
+        Токен подписки адреса: клиент получает его в ответе и повторяет в запросах подписки.
+        Ответ уходит на адрес из запроса, поэтому подтвердить подписку может только его владелец.
+        """
+        digest = hashlib.blake2s(f"{addr[0]}:{addr[1]}".encode(), key=self._subscription_key, digest_size=4).digest()
+        return struct.unpack('!I', digest)[0] or 1
+
+    def subscribe(self, addr, payload_version: int = PayloadVersion.ROWS) -> bool:
+        """
+        Добавляет или продлевает подписку адреса на рассылку минут в версии payload_version.
+        False – достигнут лимит подписчиков SUBSCRIPTION_MAX_SUBSCRIBERS.
+        """
+        if addr not in self.subscribers:
+            self._expire_subscribers()
+            if len(self.subscribers) >= SUBSCRIPTION_MAX_SUBSCRIBERS:
+                logger.warning(f"Подписка {addr} отклонена: уже {len(self.subscribers)} подписчиков")
+                return False
+            logger.info(f"Новый подписчик {addr}")
+        self.subscribers[addr] = time.monotonic() + SUBSCRIPTION_TTL_SECONDS
+        self.subscriber_versions[addr] = payload_version
+        return True
+
+    def unsubscribe(self, addr) -> None:
+        self.subscriber_versions.pop(addr, None)
+        if self.subscribers.pop(addr, None) is not None:
+            logger.info(f"Подписчик {addr} отписался")
+
+    def _expire_subscribers(self) -> None:
+        now = time.monotonic()
+        for addr in [a for a, expires_at in self.subscribers.items() if expires_at <= now]:
+            del self.subscribers[addr]
+            self.subscriber_versions.pop(addr, None)
+            logger.info(f"Подписка {addr} истекла")
+
+    def push_new_minutes(self) -> int:
+        """
+        Рассылает подписчикам минуты после last_pushed_minute до published_minute включительно.
+        Каждая минута получает следующий номер рассылки; если минут накопилось больше
+        PUSH_MAX_MINUTES, старые пропускаются с увеличением номера, и клиенты видят разрыв.
+
+        Returns:
+            количество разосланных минут.
+        """
+        if self.published_minute is None:
+            return 0
+        if self.last_pushed_minute is None or self.transport is None:
+            # До старта сервера рассылать некому: клиенты получат историю запросом диапазона
+            self.last_pushed_minute = self.published_minute
+            return 0
+        if self.published_minute <= self.last_pushed_minute:
+            return 0
+
+        self._expire_subscribers()
+
+        first = self.last_pushed_minute + 1
+        skipped = max(0, self.published_minute - first + 1 - PUSH_MAX_MINUTES)
+        self.push_sequence += skipped
+
+        pushed = 0
+        for minute in range(first + skipped, self.published_minute + 1):
+            packets = {}
+            for version in PayloadVersion:
+                payload = self.response_cache.payload(minute, version)
+                if payload is not None:
+                    packets[version] = self.serializer.serialize_klines_push_data(
+                        self.push_sequence + 1, payload, version)
+            if not packets:
+                continue
+            self.push_sequence += 1
+            for addr in self.subscribers:
+                self.transport.sendto(packets[self.subscriber_versions.get(addr, PayloadVersion.ROWS)], addr)
+            pushed += 1
+
+        self.last_pushed_minute = self.published_minute
+        if pushed and self.subscribers:
+            logger.debug(f"Разослано {pushed} минут {len(self.subscribers)} подписчикам, sequence={self.push_sequence}")
+        return pushed
+
+    def get_range_stream(self, snapshot: MarketSnapshot, start_minute: int, count: int, symbol_bitmap: bytes,
+                         payload_version: int = PayloadVersion.ROWS) -> tuple[int, list[bytes]]:
+        """
+        Возвращает (stream_crc, фрагменты) потока для диапазона минут среза в версии payload_version.
+        Поток собирается из готовых ответов среза и запоминается вместе со срезом,
+        чтобы перезапрошенные фрагменты совпадали с уже полученными клиентом.
+        """
+        key = (start_minute, count, symbol_bitmap, payload_version)
+        cached = snapshot.range_streams.get(key)
+        if cached is not None:
+            snapshot.range_streams.move_to_end(key)
+            return cached
+
+        columns = snapshot.bitmap_columns(symbol_bitmap) if symbol_bitmap else None
+
+        # Неопубликованные минуты не отдаём. С тёплым уровнем диапазон может уходить на недели назад,
+        # поэтому один поток ограничен RANGE_MAX_MINUTES минутами – клиент запрашивает диапазон частями
+        last = min(start_minute + min(count, RANGE_MAX_MINUTES), snapshot.published_minute + 1)
+        parts = []
+        for minute in range(start_minute, last):
+            if columns is None:
+                payload = snapshot.payload(minute, payload_version)
+            else:
+                packet = snapshot.subset_packet(minute, columns, payload_version)
+                payload = ProtocolSerializer.packet_payload(packet) if packet is not None else None
+            if payload is not None:
+                parts.append(payload)
+
+        stream = b''.join(parts)
+        result = (zlib.crc32(stream), ProtocolSerializer.split_kline_range_stream(stream, RANGE_FRAGMENT_SIZE))
+        snapshot.range_streams[key] = result
+        while len(snapshot.range_streams) > RANGE_STREAMS_CACHED:
+            snapshot.range_streams.popitem(last=False)
+        return result
+
+    def update_symbols(self, new_symbols: List[str], diff: Optional[SymbolDiff] = None):
+        """
+        Публикует новый список тикеров. diff – листинги и делистинги относительно прежнего списка
+        (SymbolUniverse), только для журнала: столбцы хранилища делистингованных тикеров остаются.
+        """
+        if new_symbols == self.symbols:
+            return
+        if diff is not None:
+            if diff.listed:
+                logger.info(f"Листинг: {', '.join(diff.listed[:20])}")
+            if diff.delisted:
+                logger.info(f"Делистинг: {', '.join(diff.delisted[:20])}")
+        self.symbols = list(new_symbols)
+        self._publish()
 
 class UDPServerProtocol(asyncio.DatagramProtocol):
     def __init__(self, server: UDPMarketDataServer):
@@ -74,15 +508,27 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
             if not parsed:
                 logger.error(f"Неверный формат пакета от {addr}")
                 return
-            ptype, packet_number, payload = parsed
+            ptype, version, packet_number, payload = parsed
+            # Версия payload в запросе – самая новая, которую понимает клиент
+            version = PayloadVersion(min(version, PAYLOAD_VERSION))
 
             # Обработка в зависимости от типа
             if ptype == PacketType.KLINES_REQUEST:
-                self._handle_kline_request(packet_number, payload, addr)
+                self._handle_kline_request(packet_number, payload, addr, version)
             elif ptype == PacketType.SYMBOLS_REQUEST:
                 self._handle_symbols_request(packet_number, payload, addr)
             elif ptype == PacketType.TIME_REQUEST:
                 self._handle_time_request(packet_number, payload, addr)
+            elif ptype == PacketType.KLINES_RANGE_REQUEST:
+                self._handle_kline_range_request(packet_number, payload, addr, version)
+            elif ptype == PacketType.SUBSCRIBE_REQUEST:
+                self._handle_subscribe_request(packet_number, payload, addr, version)
+            elif ptype == PacketType.UNSUBSCRIBE_REQUEST:
+                self._handle_unsubscribe_request(packet_number, payload, addr)
+            elif ptype == PacketType.SYMBOL_TABLE_REQUEST:
+                self._handle_symbol_table_request(packet_number, payload, addr)
+            elif ptype == PacketType.KLINES_SUBSET_REQUEST:
+                self._handle_kline_subset_request(packet_number, payload, addr, version)
             else:
                 logger.warning(f"Неизвестный тип пакета {ptype} от {addr}")
 
@@ -97,8 +543,10 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
 
         logger.debug(f"Time запрос от {addr}: packet={packet_number}, client_ts={req.client_timestamp_ms}")
 
-        # Проверка занятости
-        if self.server.is_busy:
+        # Срез читаем один раз: обновление подменяет его целиком, а не меняет на месте
+        snapshot = self.server.snapshot
+        # Занят сервер только до первой публикации данных
+        if snapshot is None:
             resp = TimeResponse(
                 status=ServerResponseStatus.BUSY,
                 server_time_ms=0
@@ -108,13 +556,13 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
             return
         
         # Формируем ответ: всегда успех (0), серверное время
-        server_time = self.server.get_adjusted_now_ms()
+        server_time = int(time.time() * 1000) + snapshot.time_offset_ms
         resp = TimeResponse(status=0, server_time_ms=server_time)
         response_data = self.server.serializer.serialize_time_response(resp, packet_number)
         self._send_response(response_data, addr)
         logger.debug(f"Отправлен Time ответ для {addr}: server_time={server_time}")
 
-    def _handle_kline_request(self, packet_number: int, payload: bytes, addr):
+    def _handle_kline_request(self, packet_number: int, payload: bytes, addr, version: PayloadVersion = PayloadVersion.ROWS):
         # Десериализуем запрос на свечи
         req = self.server.serializer.deserialize_kline_request(payload)
         if req is None:
@@ -123,8 +571,8 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
 
         logger.debug(f"Kline запрос от {addr}: packet={packet_number}, minute={req.minute_number}")
 
-        # Проверка занятости
-        if self.server.is_busy:
+        snapshot = self.server.snapshot
+        if snapshot is None:
             resp = KlineResponse(
                 minute_number=req.minute_number,
                 status=ServerResponseStatus.BUSY,
@@ -134,21 +582,131 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
             self._send_response(response_data, addr)
             return
 
-        # Поиск минуты
-        records = self.server.global_data.get(req.minute_number, [])
-        if not records:
-            status = ServerResponseStatus.NOT_FOUND
-        else:
-            status = ServerResponseStatus.OK
+        # Готовый ответ из среза (неопубликованных минут в нём нет) или из тёплого уровня
+        cached = snapshot.packet(req.minute_number, version)
+        if cached is not None:
+            self._send_response(self.server.serializer.patch_packet_number(cached, packet_number), addr)
+            logger.debug(f"Отправлен Kline ответ из кеша для {addr}: minute={req.minute_number}")
+            return
 
         resp = KlineResponse(
             minute_number=req.minute_number,
-            status=status,
-            records=records
+            status=ServerResponseStatus.NOT_FOUND,
+            records=[]
         )
         response_data = self.server.serializer.serialize_kline_response(resp, packet_number)
         self._send_response(response_data, addr)
-        logger.debug(f"Отправлен Kline ответ для {addr}: minute={req.minute_number}, records={len(records)}")
+        logger.debug(f"Отправлен Kline ответ для {addr}: minute={req.minute_number}, нет данных")
+
+    def _handle_kline_range_request(self, packet_number: int, payload: bytes, addr, version: PayloadVersion = PayloadVersion.ROWS):
+        req = self.server.serializer.deserialize_kline_range_request(payload)
+        if req is None:
+            logger.error(f"Некорректный KLINES_RANGE_REQUEST от {addr}")
+            return
+
+        logger.debug(f"Range запрос от {addr}: packet={packet_number}, start={req.start_minute}, "
+                     f"count={req.count}, bitmap={len(req.symbol_bitmap)}, fragments={len(req.fragments)}")
+
+        snapshot = self.server.snapshot
+        if snapshot is None:
+            fragment = KlinesRangeFragment(req.start_minute, req.count, ServerResponseStatus.BUSY, 0, 0, 1, b'')
+            self._send_response(self.server.serializer.serialize_kline_range_fragment(fragment, packet_number), addr)
+            return
+
+        # Маска построена по другой таблице – номера тикеров могли сместиться
+        if req.symbol_bitmap and req.table_version != snapshot.symbol_table.version:
+            fragment = KlinesRangeFragment(req.start_minute, req.count, ServerResponseStatus.TABLE_CHANGED, 0, 0, 1, b'')
+            self._send_response(self.server.serializer.serialize_kline_range_fragment(fragment, packet_number), addr)
+            return
+
+        stream_crc, fragments = self.server.get_range_stream(snapshot, req.start_minute, req.count,
+                                                             req.symbol_bitmap, version)
+
+        # Без списка – несколько первых фрагментов потока, со списком – только перезапрошенные
+        if req.fragments:
+            indices = [i for i in req.fragments if i < len(fragments)][:RANGE_FRAGMENTS_PER_REPLY]
+        else:
+            indices = range(min(len(fragments), RANGE_FIRST_BURST_FRAGMENTS))
+
+        status = ServerResponseStatus.OK if fragments[0] else ServerResponseStatus.NOT_FOUND
+        for index in indices:
+            fragment = KlinesRangeFragment(req.start_minute, req.count, status, stream_crc,
+                                           index, len(fragments), fragments[index], version)
+            self._send_response(self.server.serializer.serialize_kline_range_fragment(fragment, packet_number), addr)
+        logger.debug(f"Отправлено {len(indices)} из {len(fragments)} фрагментов для {addr}")
+
+    def _handle_symbol_table_request(self, packet_number: int, payload: bytes, addr):
+        logger.debug(f"Symbol table запрос от {addr}: packet={packet_number}")
+        snapshot = self.server.snapshot
+        if snapshot is None:
+            resp = SymbolTableResponse(status=ServerResponseStatus.BUSY, table=SymbolTable.build([]))
+        else:
+            resp = SymbolTableResponse(status=ServerResponseStatus.OK, table=snapshot.symbol_table)
+        self._send_response(self.server.serializer.serialize_symbol_table_response(resp, packet_number), addr)
+
+    def _handle_kline_subset_request(self, packet_number: int, payload: bytes, addr, version: PayloadVersion = PayloadVersion.ROWS):
+        req = self.server.serializer.deserialize_kline_subset_request(payload)
+        if req is None:
+            logger.error(f"Некорректный KLINES_SUBSET_REQUEST от {addr}")
+            return
+
+        logger.debug(f"Kline subset запрос от {addr}: packet={packet_number}, minute={req.minute_number}")
+
+        snapshot = self.server.snapshot
+        if snapshot is None:
+            status = ServerResponseStatus.BUSY
+        elif req.table_version != snapshot.symbol_table.version:
+            status = ServerResponseStatus.TABLE_CHANGED
+        else:
+            packet = snapshot.subset_packet(req.minute_number, snapshot.bitmap_columns(req.symbol_bitmap), version)
+            if packet is not None:
+                self._send_response(self.server.serializer.patch_packet_number(packet, packet_number), addr)
+                return
+            status = ServerResponseStatus.NOT_FOUND
+
+        response_data = self.server.serializer.serialize_kline_response_data(
+            req.minute_number, status, b'', packet_number, PacketType.KLINES_SUBSET_RESPONSE)
+        self._send_response(response_data, addr)
+
+    def _handle_subscribe_request(self, packet_number: int, payload: bytes, addr, version: PayloadVersion = PayloadVersion.ROWS):
+        req = self.server.serializer.deserialize_subscribe_request(payload)
+        if req is None:
+            logger.error(f"Некорректный SUBSCRIBE_REQUEST от {addr}")
+            return
+
+        # Без токена адреса подписка не включается: ответ с токеном уходит по адресу из запроса,
+        # и рассылка начнётся, только если клиент с этого адреса его повторит
+        token = self.server.subscription_token(addr)
+        if req.token != token:
+            status = ServerResponseStatus.CONFIRM_SUBSCRIPTION
+        elif self.server.subscribe(addr, version):
+            status = ServerResponseStatus.OK
+        else:
+            status = ServerResponseStatus.BUSY
+
+        resp = SubscribeResponse(
+            status=status,
+            sequence=self.server.push_sequence,
+            published_minute=self.server.published_minute or 0,
+            ttl_seconds=SUBSCRIPTION_TTL_SECONDS,
+            token=token
+        )
+        self._send_response(self.server.serializer.serialize_subscribe_response(resp, packet_number), addr)
+
+    def _handle_unsubscribe_request(self, packet_number: int, payload: bytes, addr):
+        req = self.server.serializer.deserialize_unsubscribe_request(payload)
+        if req is None:
+            logger.error(f"Некорректный UNSUBSCRIBE_REQUEST от {addr}")
+            return
+
+        # Чужую подписку поддельным запросом не снять
+        if req.token == self.server.subscription_token(addr):
+            self.server.unsubscribe(addr)
+            status = ServerResponseStatus.OK
+        else:
+            status = ServerResponseStatus.NOT_FOUND
+        resp = UnsubscribeResponse(status=status)
+        self._send_response(self.server.serializer.serialize_unsubscribe_response(resp, packet_number), addr)
 
     def _handle_symbols_request(self, packet_number: int, payload: bytes, addr):
         # Десериализуем запрос (пустой)
@@ -161,8 +719,8 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
 
         logger.info(f"Symbols запрос от {addr}: packet={packet_number}")
 
-        # Проверка занятости
-        if self.server.is_busy:
+        snapshot = self.server.snapshot
+        if snapshot is None:
             resp = SymbolsResponse(
                 status=ServerResponseStatus.BUSY,
                 symbols=[]
@@ -173,8 +731,8 @@ class UDPServerProtocol(asyncio.DatagramProtocol):
         
         # Формируем ответ
         resp = SymbolsResponse(
-            status=0 if not self.server.is_busy else 1,   # 1 - сервер занят (можно расширить)
-            symbols=self.server.symbols if not self.server.is_busy else []
+            status=ServerResponseStatus.OK,
+            symbols=list(snapshot.symbols)
         )
         response_data = self.server.serializer.serialize_symbols_response(resp, packet_number)
         self._send_response(response_data, addr)
@@ -0,0 +1,310 @@
+"""
+Тёплый уровень хранения свечей: сжатые дневные сегменты на диске.
+
+Горячий уровень – CandleStorage в памяти – держит только MAX_CACHED_CANDLES минут. Каждые
+закончившиеся сутки (по UTC) записываются отдельным сегментом: файл .npz, в котором каждое
+поле – массив тикеры × минуты (столбцы тикеров подряд, поэтому цены соседних минут лежат
+рядом и хорошо сжимаются). Сегмент пишется один раз и больше не меняется; index.json
+хранит для номера суток файл и границы минут, так что минута находит свой сегмент за O(1).
+
+Сутки запечатываются не сразу, а через WARM_SEAL_DELAY_MINUTES после окончания, чтобы
+докачанные пропуски успели попасть в сегмент, но пока все минуты суток ещё в горячем окне.
+read_range и срезы UDP сервера берут минуту из горячего уровня, если она там есть, иначе – из тёплого.
+"""
+
+import os
+import json
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+
+from logger import logger
+from candle_storage import CandleStorage
+from candle_storage import FLOAT_FIELDS
+from candle_storage import N_FLOAT_FIELDS
+from DownloadBot.config import *
+
+# Минут в сутках: номер сегмента = минута // MINUTES_PER_DAY
+MINUTES_PER_DAY = 1440
+
+@dataclass
+class WarmSegment:
+    """Распакованный сегмент: свечи одних суток по минутам."""
+    # первая минута сегмента
+    first_minute: int
+    # тикеры по столбцам сегмента в UTF-8, 'S16' (как в ответах сервера)
+    symbols: np.ndarray
+    # минуты × тикеры × поля
+    values: np.ndarray
+    # минуты × тикеры
+    trades: np.ndarray
+    # минуты × тикеры
+    present: np.ndarray
+    # столбцы хранилища для тикеров сегмента (-1 – тикера в хранилище нет): <КОЛИЧЕСТВО_СТОЛБЦОВ, СТОЛБЦЫ>
+    _storage_columns: Optional[tuple[int, np.ndarray]] = field(default=None, repr=False)
+
+    @property
+    def last_minute(self) -> int:
+        return self.first_minute + len(self.present) - 1
+
+    def storage_columns(self, storage: CandleStorage) -> np.ndarray:
+        """Столбцы хранилища для тикеров сегмента. Столбцы хранилища только добавляются, поэтому кешируются по их количеству."""
+        if self._storage_columns is None or self._storage_columns[0] != storage.symbols_count:
+            columns = [storage.column_of(s.decode('utf-8')) for s in self.symbols.tolist()]
+            self._storage_columns = (storage.symbols_count,
+                                     np.array([-1 if c is None else c for c in columns], dtype=np.int64))
+        return self._storage_columns[1]
+
+class WarmStore:
+    """Дневные сегменты свечей на диске с индексом <НОМЕР_СУТОК, СЕГМЕНТ>."""
+
+    INDEX_FILE = "index.json"
+    INDEX_VERSION = 1
+
+    def __init__(self, path: str,
+                 retention_days: int = WARM_RETENTION_DAYS,
+                 seal_delay: int = WARM_SEAL_DELAY_MINUTES,
+                 cached_segments: int = WARM_SEGMENTS_CACHED):
+        self.path = path
+        self.retention_days = retention_days
+        self.seal_delay = seal_delay
+        self.cached_segments = cached_segments
+        # <НОМЕР_СУТОК, {file, first_minute, last_minute, symbols, bytes}>
+        self._segments: dict[int, dict] = {}
+        # Распакованные сегменты, последний использованный – в конце
+        self._cache: OrderedDict[int, WarmSegment] = OrderedDict()
+
+        os.makedirs(self.path, exist_ok=True)
+        self._load_index()
+
+    # ---------- Индекс ----------
+
+    def _load_index(self) -> None:
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != self.INDEX_VERSION:
+                raise ValueError(f"неподдерживаемая версия {index.get('version')}")
+            segments = {int(day): entry for day, entry in index['segments'].items()}
+        except Exception as e:
+            logger.error(f"Индекс тёплого уровня {index_path} повреждён ({e}), сегменты будут записаны заново")
+            return
+
+        # Сегмент пишется раньше индекса, но файл мог пропасть вручную
+        self._segments = {day: entry for day, entry in segments.items()
+                          if os.path.exists(os.path.join(self.path, entry['file']))}
+
+    def _save_index(self) -> None:
+        index = {
+            'version': self.INDEX_VERSION,
+            'segments': {str(day): entry for day, entry in sorted(self._segments.items())},
+        }
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+    @property
+    def days(self) -> list[int]:
+        """Номера суток записанных сегментов по возрастанию."""
+        return sorted(self._segments)
+
+    @property
+    def first_minute(self) -> Optional[int]:
+        return min((e['first_minute'] for e in self._segments.values()), default=None)
+
+    @property
+    def last_minute(self) -> Optional[int]:
+        return max((e['last_minute'] for e in self._segments.values()), default=None)
+
+    def disk_bytes(self) -> int:
+        return sum(e['bytes'] for e in self._segments.values())
+
+    def segment_day(self, minute: int) -> Optional[int]:
+        """Сутки сегмента, в котором лежит минута, или None."""
+        day = minute // MINUTES_PER_DAY
+        entry = self._segments.get(day)
+        if entry is None or not entry['first_minute'] <= minute <= entry['last_minute']:
+            return None
+        return day
+
+    # ---------- Запись ----------
+
+    def seal_from(self, storage: CandleStorage, until_minute: Optional[int] = None) -> int:
+        """
+        Записывает сегменты суток, закончившихся не позже чем за seal_delay минут до until_minute
+        (по умолчанию – последней минуты хранилища) и ещё не записанных. Минуты суток,
+        уже вытесненные из хранилища, в сегмент не попадают.
+
+        Returns:
+            количество записанных сегментов.
+        """
+        if not storage:
+            return 0
+        until = storage.last_minute if until_minute is None else min(until_minute, storage.last_minute)
+        # Задержка не должна выпускать начало суток из горячего окна
+        delay = max(0, min(self.seal_delay, storage.capacity - MINUTES_PER_DAY))
+
+        sealed = 0
+        for day in range(storage.first_minute // MINUTES_PER_DAY, (until - delay + 1) // MINUTES_PER_DAY):
+            if day in self._segments:
+                continue
+            if self._write_segment(storage, day):
+                sealed += 1
+
+        if sealed:
+            self._prune(until // MINUTES_PER_DAY - self.retention_days)
+            self._save_index()
+        return sealed
+
+    def _write_segment(self, storage: CandleStorage, day: int) -> bool:
+        first = max(day * MINUTES_PER_DAY, storage.first_minute)
+        last = (day + 1) * MINUTES_PER_DAY - 1
+        minutes = range(first, last + 1)
+
+        n_symbols = storage.symbols_count
+        values = np.zeros((len(minutes), n_symbols, N_FLOAT_FIELDS), dtype=np.float64)
+        trades = np.zeros((len(minutes), n_symbols), dtype=np.int64)
+        present = np.zeros((len(minutes), n_symbols), dtype=np.bool_)
+        for i, minute in enumerate(minutes):
+            arrays = storage.minute_arrays(minute)
+            if arrays is not None:
+                values[i], trades[i], present[i] = arrays
+
+        # Тикеры без единой свечи за сутки в сегмент не пишутся
+        columns = np.flatnonzero(present.any(axis=0))
+        if columns.size == 0:
+            return False
+        names = storage.symbols
+        symbols = np.array([names[c].encode('utf-8')[:16] for c in columns.tolist()], dtype='S16')
+
+        # Столбцы тикеров: массивы тикеры × минуты
+        arrays = {name: np.ascontiguousarray(values[:, columns, f].T) for f, name in enumerate(FLOAT_FIELDS)}
+        arrays['num_of_trades'] = np.ascontiguousarray(trades[:, columns].T)
+        arrays['present'] = np.ascontiguousarray(present[:, columns].T)
+
+        file_name = f"{day}.npz"
+        path = os.path.join(self.path, file_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, symbols=symbols, first_minute=np.int64(first), **arrays)
+        os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        self._segments[day] = {'file': file_name, 'first_minute': first, 'last_minute': last,
+                               'symbols': int(columns.size), 'bytes': size}
+        self._cache.pop(day, None)
+        logger.info(f"Тёплый уровень: сутки {day} записаны, {columns.size} тикеров, {size / 1024 / 1024:.1f} МБ")
+        return True
+
+    def _prune(self, first_day: int) -> None:
+        """Удаляет сегменты суток раньше first_day."""
+        for day in [d for d in self._segments if d < first_day]:
+            entry = self._segments.pop(day)
+            self._cache.pop(day, None)
+            try:
+                os.remove(os.path.join(self.path, entry['file']))
+            except OSError as e:
+                logger.error(f"Не удалось удалить сегмент {entry['file']}: {e}")
+
+    # ---------- Чтение ----------
+
+    def segment(self, day: int) -> Optional[WarmSegment]:
+        """Распакованный сегмент суток (последние cached_segments держатся в памяти)."""
+        cached = self._cache.get(day)
+        if cached is not None:
+            self._cache.move_to_end(day)
+            return cached
+        entry = self._segments.get(day)
+        if entry is None:
+            return None
+
+        try:
+            with np.load(os.path.join(self.path, entry['file'])) as data:
+                n_minutes = data['present'].shape[1]
+                values = np.empty((n_minutes, len(data['symbols']), N_FLOAT_FIELDS), dtype=np.float64)
+                for f, name in enumerate(FLOAT_FIELDS):
+                    values[:, :, f] = data[name].T
+                segment = WarmSegment(int(data['first_minute']), data['symbols'], values,
+                                      np.ascontiguousarray(data['num_of_trades'].T),
+                                      np.ascontiguousarray(data['present'].T))
+        except Exception as e:
+            logger.error(f"Сегмент {entry['file']} не читается ({e})")
+            return None
+
+        self._cache[day] = segment
+        while len(self._cache) > self.cached_segments:
+            self._cache.popitem(last=False)
+        return segment
+
+    def minute_arrays(self, minute: int) -> Optional[tuple[np.ndarray, np.ndarray, np.ndarray, WarmSegment]]:
+        """
+        Свечи минуты из тёплого уровня: (symbols, values, trades, segment) только по тикерам,
+        у которых свеча есть. symbols – тикеры в UTF-8, segment – для сопоставления со столбцами хранилища.
+        None – минуты нет.
+        """
+        day = self.segment_day(minute)
+        if day is None:
+            return None
+        segment = self.segment(day)
+        if segment is None or not segment.first_minute <= minute <= segment.last_minute:
+            return None
+        row = minute - segment.first_minute
+        columns = np.flatnonzero(segment.present[row])
+        if columns.size == 0:
+            return None
+        return segment.symbols[columns], segment.values[row, columns], segment.trades[row, columns], segment
+
+def read_range(storage: CandleStorage, warm: Optional[WarmStore], start_minute: int, end_minute: int,
+               symbols: Iterable[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Свечи тикеров за минуты [start_minute, end_minute] из обоих уровней: минута берётся
+    из хранилища, если она в его окне, иначе – из тёплого сегмента.
+
+    Returns:
+        (values, trades, present) формы [минуты, тикеры, N_FLOAT_FIELDS], [минуты, тикеры], [минуты, тикеры]
+        в порядке symbols.
+    """
+    symbols = list(symbols)
+    n_minutes = max(0, end_minute - start_minute + 1)
+    values = np.zeros((n_minutes, len(symbols), N_FLOAT_FIELDS), dtype=np.float64)
+    trades = np.zeros((n_minutes, len(symbols)), dtype=np.int64)
+    present = np.zeros((n_minutes, len(symbols)), dtype=np.bool_)
+
+    storage_columns = np.array([-1 if storage.column_of(s) is None else storage.column_of(s) for s in symbols],
+                               dtype=np.int64)
+    hot = storage_columns >= 0
+    wanted = {s.encode('utf-8'): i for i, s in enumerate(symbols)}
+    hot_first = storage.first_minute if storage else None
+
+    for i, minute in enumerate(range(start_minute, start_minute + n_minutes)):
+        if hot_first is not None and minute >= hot_first:
+            arrays = storage.minute_arrays(minute)
+            if arrays is not None:
+                minute_values, minute_trades, minute_present = arrays
+                values[i, hot] = minute_values[storage_columns[hot]]
+                trades[i, hot] = minute_trades[storage_columns[hot]]
+                present[i, hot] = minute_present[storage_columns[hot]]
+            continue
+        if warm is None:
+            continue
+        arrays = warm.minute_arrays(minute)
+        if arrays is None:
+            continue
+        warm_symbols, warm_values, warm_trades, _ = arrays
+        for j, symbol in enumerate(warm_symbols.tolist()):
+            k = wanted.get(symbol)
+            if k is not None:
+                values[i, k] = warm_values[j]
+                trades[i, k] = warm_trades[j]
+                present[i, k] = True
+    return values, trades, present
@@ -0,0 +1,128 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+analytics_bot_src_path = src_path / "AnalyticsBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(analytics_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"analytics_bot_src_path = {analytics_bot_src_path}")
+
+from collections import OrderedDict
+
+import AnalyticsBot.main as main
+import AnalyticsBot.storage_utils as storage_utils
+
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.validity_tracker import ValidityTracker
+
+BASE_MINUTE = 1700000000000 // 60000
+# Часов хватает и окну объёмов, и окну цен
+MINUTES = 60 * max(main.HOURS_VOLUMES_SLIDED_WINDOW_PERIOD, main.HOURS_PRICES_SLIDED_WINDOW_PERIOD)
+
+def candle(symbol: str, minute: int, volume: float = 100.0) -> KlineRecord:
+    return KlineRecord(
+        symbol=symbol,
+        open=10.0,
+        close=10.5,
+        high=11.0,
+        low=9.0,
+        volume=volume / 10,
+        close_time=(minute + 1) * 60000 - 1,
+        quote_assets_volume=volume,
+        taker_buy_base_volume=0.0,
+        taker_buy_quote_volume=0.0,
+        num_of_trades=1,
+        open_time=minute * 60000
+    )
+
+def market(delisted_at: int, listed_at: int) -> OrderedDict:
+    storage = OrderedDict()
+    for i in range(MINUTES):
+        minute = BASE_MINUTE + i
+        candles = [candle("BTCUSDT", minute, 100.0 + i % 10), candle("ETHUSDT", minute, 50.0)]
+        if i < delisted_at:
+            candles.append(candle("OLDUSDT", minute))
+        if i >= listed_at:
+            candles.append(candle("NEWUSDT", minute))
+        storage[minute] = candles
+    return storage
+
+def run_tick(storage: OrderedDict) -> dict:
+    """analyzeTick без накопительных окон; возвращает, что получил шаг 10м объёмов и дошёл ли тик до шага 8."""
+    seen = {"volumes_10m": None, "price_check": False}
+    original_10m = main.calculate_10m_volumes_slidedWindow
+    original_price = main.check_price_overlimit
+
+    def spy_10m(candle_dict):
+        seen["volumes_10m"] = original_10m(candle_dict)
+        return seen["volumes_10m"]
+
+    def spy_price(klines, max_highs):
+        seen["price_check"] = True
+        return original_price(klines, max_highs)
+
+    original_incremental = main.INCREMENTAL_ANALYTICS
+    original_tracker = main.tracker
+    main.INCREMENTAL_ANALYTICS = False
+    main.tracker = ValidityTracker()
+    main.calculate_10m_volumes_slidedWindow = spy_10m
+    main.check_price_overlimit = spy_price
+    storage_utils.candle_1m_records.clear()
+    try:
+        storage_utils.save_klines_to_ram(storage)
+        main.analyzeTick((BASE_MINUTE + MINUTES) * 60000)
+    finally:
+        main.INCREMENTAL_ANALYTICS = original_incremental
+        main.tracker = original_tracker
+        main.calculate_10m_volumes_slidedWindow = original_10m
+        main.check_price_overlimit = original_price
+        storage_utils.candle_1m_records.clear()
+    return seen
+
+def test_delisting_inside_10m_window():
+    """Тест 1: делистинг в последние 10 минут не пропускает тик полного пересчёта"""
+    seen = run_tick(market(delisted_at=MINUTES - 4, listed_at=MINUTES))
+    assert seen["volumes_10m"] is not None
+    volumes = {v.ticker: v.volume for v in seen["volumes_10m"]}
+    assert volumes == {"BTCUSDT": sum(100.0 + i % 10 for i in range(MINUTES - 10, MINUTES)), "ETHUSDT": 500.0}, volumes
+    assert seen["price_check"]
+
+def test_listing_and_delisting_mid_window():
+    """Тест 2: тикеры, залистенные и делистнутые внутри окна хранилища, не попадают в 10м объёмы"""
+    seen = run_tick(market(delisted_at=MINUTES // 2, listed_at=MINUTES - 30))
+    assert seen["volumes_10m"] is not None
+    assert sorted(v.ticker for v in seen["volumes_10m"]) == ["BTCUSDT", "ETHUSDT"]
+    assert seen["price_check"]
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_delisting_inside_10m_window,
+        test_listing_and_delisting_mid_window,
+    ]
+
+    print("Запуск тестов для тика аналитики без накопительных окон...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
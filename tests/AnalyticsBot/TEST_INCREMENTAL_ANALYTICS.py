@@ -0,0 +1,203 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+analytics_bot_src_path = src_path / "AnalyticsBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(analytics_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"analytics_bot_src_path = {analytics_bot_src_path}")
+
+import math
+import random
+
+from collections import OrderedDict
+
+import numpy as np
+
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.analytic_utils import calculate_10m_volumes_slidedWindow
+from AnalyticsBot.analytic_utils import calculate_1h_records
+from AnalyticsBot.analytic_utils import calculate_volumes_slidedWindow
+from AnalyticsBot.analytic_utils import calculate_prices_slidedWindow
+from AnalyticsBot.incremental_analytics import IncrementalAnalytics
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "XRPUSDT", "SOLUSDT", "ADAUSDT", "BNBUSDT"]
+
+def candle(symbol: str, minute: int, rng: random.Random) -> KlineRecord:
+    price = rng.uniform(1.0, 1000.0)
+    # Объёмы разного порядка: на вычитаниях копится ошибка округления
+    volume = rng.choice([rng.uniform(0, 1e-3), rng.uniform(1e3, 1e9)])
+    return KlineRecord(
+        symbol=symbol,
+        open=price,
+        close=price * rng.uniform(0.99, 1.01),
+        high=price * rng.uniform(1.01, 1.05),
+        low=price * rng.uniform(0.95, 0.99),
+        volume=volume / price,
+        close_time=(minute + 1) * 60000 - 1,
+        quote_assets_volume=volume,
+        taker_buy_base_volume=0.0,
+        taker_buy_quote_volume=0.0,
+        num_of_trades=1,
+        open_time=minute * 60000
+    )
+
+def make_minutes(count: int, symbols: list[str], seed: int = 1) -> OrderedDict:
+    rng = random.Random(seed)
+    return OrderedDict((BASE_MINUTE + i, [candle(s, BASE_MINUTE + i, rng) for s in symbols]) for i in range(count))
+
+def last_items(d: OrderedDict, count: int) -> OrderedDict:
+    return OrderedDict(list(d.items())[-count:])
+
+def assert_close(a: float, b: float, what: str):
+    assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6), f"{what}: {a} != {b}"
+
+def compare_with_full(engine: IncrementalAnalytics, storage: OrderedDict, symbols: list[str]):
+    """Окна движка совпадают с полным пересчётом функциями analytic_utils."""
+    expected_10m = calculate_10m_volumes_slidedWindow(storage)
+    actual_10m = engine.volumes_10m(symbols)
+    assert [v.ticker for v in actual_10m] == [v.ticker for v in expected_10m]
+    for a, e in zip(actual_10m, expected_10m):
+        assert (a.open_time, a.close_time) == (e.open_time, e.close_time)
+        assert_close(a.volume, e.volume, f"10м объём {a.ticker}")
+
+    hours = calculate_1h_records(storage)
+    expected_volumes = calculate_volumes_slidedWindow(last_items(hours, engine.volume_hours), engine.volume_hours)
+    actual_volumes = engine.volumes_slided_window(symbols)
+    assert actual_volumes.keys() == expected_volumes.keys()
+    for symbol, volumes in expected_volumes.items():
+        assert actual_volumes[symbol].keys() == volumes.keys()
+        for key, value in volumes.items():
+            assert_close(actual_volumes[symbol][key], value, f"{key} {symbol}")
+
+    expected_highs = calculate_prices_slidedWindow(last_items(hours, engine.price_hours), engine.price_hours)
+    assert engine.max_highs(symbols) == expected_highs
+
+def test_matches_full_recalculation():
+    """Тест 1: при поминутном добавлении окна совпадают с полным пересчётом, в том числе после свёрток буфера"""
+    minutes = make_minutes(2000, SYMBOLS)
+    engine = IncrementalAnalytics(volume_hours=10, price_hours=12)
+    storage = OrderedDict()
+
+    for i, (minute, candles) in enumerate(minutes.items()):
+        storage[minute] = candles
+        added = engine.sync(storage)
+        assert added == 1 or i == 0
+        if i + 1 < 720:
+            assert engine.max_highs(SYMBOLS) is None
+        if i + 1 >= 720 and i % 149 == 0 or i + 1 == len(minutes):
+            compare_with_full(engine, storage, SYMBOLS)
+
+def test_columns_and_new_listing():
+    """Тест 2: минуты в колонках NumPy и листинг нового тикера: в объёмы он попадает только с полным окном"""
+    minutes = make_minutes(800, SYMBOLS, seed=2)
+    rng = random.Random(3)
+    engine = IncrementalAnalytics(volume_hours=2, price_hours=3, symbols_capacity=2)
+    storage = OrderedDict()
+
+    for i, (minute, candles) in enumerate(minutes.items()):
+        if i >= 500:
+            candles = candles + [candle("NEWUSDT", minute, rng)]
+        storage[minute] = KlineColumns(
+            [c.symbol for c in candles],
+            np.array([[c.open, c.close, c.high, c.low, c.volume, c.quote_assets_volume,
+                       c.taker_buy_base_volume, c.taker_buy_quote_volume] for c in candles]),
+            np.array([c.num_of_trades for c in candles]),
+            np.array([c.open_time for c in candles]),
+            np.array([c.close_time for c in candles]))
+        engine.sync(storage)
+
+        if i == 520:
+            assert "NEWUSDT" in {v.ticker for v in engine.volumes_10m(["NEWUSDT"])}
+            assert "NEWUSDT" not in engine.volumes_slided_window(["NEWUSDT"])
+            assert "NEWUSDT" in engine.max_highs(["NEWUSDT"])
+
+    assert engine.symbols == SYMBOLS + ["NEWUSDT"]
+    assert "NEWUSDT" in engine.volumes_slided_window(["NEWUSDT"])
+    # Полный пересчёт идёт по хранилищу после валидации, где тикера без полной истории нет
+    validated = OrderedDict((m, [r for r in c if r.symbol in SYMBOLS]) for m, c in storage.items())
+    compare_with_full(engine, validated, SYMBOLS)
+
+def test_rebuild_and_eviction():
+    """Тест 3: первый вызов строит окна по хранилищу, вытеснение старых минут не мешает, разрыв – перестройка"""
+    minutes = make_minutes(1500, SYMBOLS[:3], seed=4)
+    keys = list(minutes.keys())
+    storage = OrderedDict((m, minutes[m]) for m in keys[:1000])
+    engine = IncrementalAnalytics(volume_hours=10, price_hours=12)
+
+    assert engine.sync(storage) == engine.capacity - 1
+    compare_with_full(engine, storage, SYMBOLS[:3])
+
+    # Хранилище держит 900 минут: новые дописываются, старые вытесняются
+    for minute in keys[1000:1300]:
+        storage[minute] = minutes[minute]
+        storage.popitem(last=False)
+        assert engine.sync(storage) == 1
+    compare_with_full(engine, storage, SYMBOLS[:3])
+
+    # Разрыв: минуты после пропуска учитываются перестройкой по хранилищу
+    for minute in keys[1310:1320]:
+        storage[minute] = minutes[minute]
+    assert engine.sync(storage) == engine.capacity - 1
+    assert engine.last_minute == keys[1319]
+    assert len(engine.volumes_10m(SYMBOLS[:3])) == 3
+    assert engine.volumes_slided_window(SYMBOLS[:3]) == {}
+
+def test_push_gap_and_duplicates():
+    """Тест 4: пропущенная минута считается пустой, повтор минуты отбрасывается"""
+    minutes = make_minutes(40, SYMBOLS[:2], seed=5)
+    keys = list(minutes.keys())
+    engine = IncrementalAnalytics(volume_hours=1, price_hours=1)
+
+    for minute in keys[:20]:
+        assert engine.push(minute, minutes[minute])
+    assert not engine.push(keys[19], minutes[keys[19]])
+    assert engine.push(keys[22], minutes[keys[22]])
+    assert engine.minutes == 23
+    assert engine.volumes_10m(SYMBOLS[:2]) == []
+
+    for minute in keys[23:]:
+        engine.push(minute, minutes[minute])
+    expected = calculate_10m_volumes_slidedWindow(last_items(minutes, 10))
+    actual = engine.volumes_10m(SYMBOLS[:2])
+    assert len(actual) == 2
+    for a, e in zip(actual, expected):
+        assert a.ticker == e.ticker
+        assert_close(a.volume, e.volume, a.ticker)
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_matches_full_recalculation,
+        test_columns_and_new_listing,
+        test_rebuild_and_eviction,
+        test_push_gap_and_duplicates,
+    ]
+
+    print("Запуск тестов для инкрементального расчёта скользящих окон...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
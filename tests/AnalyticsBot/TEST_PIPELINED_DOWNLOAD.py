@@ -0,0 +1,203 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+import time
+
+from datetime import datetime
+
+import numpy as np
+
+import AnalyticsBot.udp_client as udp_client
+import AnalyticsBot.downloader as downloader
+
+from AnalyticsBot.protocol_download import KlinesRangeResponse
+from AnalyticsBot.protocol_download import ServerResponseStatus
+from candle_storage import CandleStorage
+from udp_server import UDPMarketDataServer
+from udp_server import UDPServerProtocol
+from DownloadBot.protocol_download import PacketType
+from DownloadBot.protocol_download_serializer import ProtocolSerializer
+
+# Клиент по умолчанию слушает адрес сервера сигналов – в тесте всё на localhost
+udp_client.ALERT_SERVER_IP = "127.0.0.1"
+# Маленькие куски диапазона, чтобы запросов было несколько
+downloader.RANGE_REQUEST_MINUTES = 20
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = [f"SYM{i}USDT" for i in range(50)]
+
+def make_storage(minutes: int) -> CandleStorage:
+    storage = CandleStorage(capacity=minutes)
+    rng = np.random.default_rng(1)
+    columns = np.array([storage.ensure_column(s) for s in SYMBOLS])
+    for minute in range(BASE_MINUTE, BASE_MINUTE + minutes):
+        storage.put_minute(minute, columns, rng.random((len(SYMBOLS), 8)) * 100, rng.integers(0, 1000, len(SYMBOLS)))
+    return storage
+
+async def _download(storage: CandleStorage, timeout: float = 5.0, window: int = 4):
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    port = server.transport.get_extra_info('sockname')[1]
+    end_time = datetime.fromtimestamp((BASE_MINUTE + len(storage)) * 60)
+    try:
+        started = time.monotonic()
+        result = await downloader.download_candles(SYMBOLS[:10], len(storage), end_time, ("127.0.0.1", port),
+                                                   timeout=timeout, window=window)
+        return result, time.monotonic() - started
+    finally:
+        server.stop()
+
+def assert_same_as_storage(result, storage: CandleStorage):
+    assert list(result.keys()) == list(range(BASE_MINUTE, BASE_MINUTE + len(storage)))
+    for minute, records in result.items():
+        expected = {r.symbol: r for r in storage.get_minute(minute)}
+        assert sorted(r.symbol for r in records) == sorted(SYMBOLS[:10])
+        assert all(r.close == expected[r.symbol].close for r in records)
+
+def test_window_of_requests_in_flight():
+    """Тест 1: одновременно идут window запросов, все минуты собираются по порядку"""
+    storage = make_storage(200)
+    state = {"in_flight": 0, "max_in_flight": 0, "calls": 0}
+    original = udp_client.UDPClient.request_klines_range
+
+    async def slow_request(self, *args, **kwargs):
+        state["in_flight"] += 1
+        state["calls"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(0.05)
+            return await original(self, *args, **kwargs)
+        finally:
+            state["in_flight"] -= 1
+
+    udp_client.UDPClient.request_klines_range = slow_request
+    try:
+        result, _ = asyncio.run(_download(storage, window=4))
+    finally:
+        udp_client.UDPClient.request_klines_range = original
+
+    assert state["calls"] == 10
+    assert state["max_in_flight"] == 4
+    assert_same_as_storage(result, storage)
+
+def test_lost_requests_are_retransmitted():
+    """Тест 2: потерянный запрос повторяется через RTO, а не через общий таймаут"""
+    storage = make_storage(60)
+    seen = {}
+    original = UDPServerProtocol.datagram_received
+
+    def lossy_receive(self, data: bytes, addr):
+        # Теряется первая отправка каждого первого запроса куска (без списка фрагментов);
+        # перезапросы остальных фрагментов доходят
+        if data[0] == PacketType.KLINES_RANGE_REQUEST:
+            _, _, _, payload = ProtocolSerializer.deserialize_packet(data)
+            if not ProtocolSerializer.deserialize_kline_range_request(payload).fragments:
+                seen[data] = seen.get(data, 0) + 1
+                if seen[data] == 1:
+                    return
+        original(self, data, addr)
+
+    UDPServerProtocol.datagram_received = lossy_receive
+    try:
+        result, elapsed = asyncio.run(_download(storage, timeout=5.0))
+    finally:
+        UDPServerProtocol.datagram_received = original
+
+    assert len(seen) == 3 and all(count >= 2 for count in seen.values()), seen
+    assert elapsed < 5.0, elapsed
+    assert_same_as_storage(result, storage)
+
+def test_busy_chunk_does_not_stall_others():
+    """Тест 3: BUSY задерживает только свой кусок, остальные скачиваются без ожидания"""
+    storage = make_storage(100)
+    completed = []
+    busy = {"sent": False}
+    original = udp_client.UDPClient.request_klines_range
+    original_delay = downloader.BUSY_RETRY_DELAY
+    downloader.BUSY_RETRY_DELAY = 0.3
+
+    async def busy_once(self, start_minute, count, *args, **kwargs):
+        if start_minute == BASE_MINUTE and not busy["sent"]:
+            busy["sent"] = True
+            return KlinesRangeResponse(status=ServerResponseStatus.BUSY, minutes=[])
+        response = await original(self, start_minute, count, *args, **kwargs)
+        completed.append(start_minute)
+        return response
+
+    udp_client.UDPClient.request_klines_range = busy_once
+    try:
+        result, elapsed = asyncio.run(_download(storage, window=2))
+    finally:
+        udp_client.UDPClient.request_klines_range = original
+        downloader.BUSY_RETRY_DELAY = original_delay
+
+    assert busy["sent"]
+    assert completed[-1] == BASE_MINUTE, completed
+    assert sorted(completed) == [BASE_MINUTE + 20 * i for i in range(5)]
+    assert elapsed < 2.0, elapsed
+    assert_same_as_storage(result, storage)
+
+def test_rtt_estimator():
+    """Тест 4: RTO по RFC 6298 – первый замер, сглаживание, удвоение при повторе и границы"""
+    rtt = udp_client.RttEstimator(initial=1.0, min_rto=0.2, max_rto=8.0)
+    assert rtt.rto == 1.0
+
+    rtt.sample(0.1)
+    assert abs(rtt.srtt - 0.1) < 1e-12 and abs(rtt.rttvar - 0.05) < 1e-12
+    assert abs(rtt.rto - 0.3) < 1e-12
+
+    rtt.backoff()
+    assert abs(rtt.rto - 0.6) < 1e-12
+    for _ in range(10):
+        rtt.backoff()
+    assert rtt.rto == 8.0
+
+    # Стабильные быстрые ответы: RTO сходится к нижней границе
+    for _ in range(100):
+        rtt.sample(0.01)
+    assert rtt.rto == 0.2
+    rtt.sample(30.0)
+    assert rtt.rto == 8.0
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_window_of_requests_in_flight,
+        test_lost_requests_are_retransmitted,
+        test_busy_chunk_does_not_stall_others,
+        test_rtt_estimator,
+    ]
+
+    print("Запуск тестов для конвейерного скачивания минут...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,168 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+analytics_bot_src_path = src_path / "AnalyticsBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(analytics_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"analytics_bot_src_path = {analytics_bot_src_path}")
+
+import random
+
+from collections import OrderedDict
+
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.analytic_utils import validate_ticker
+from AnalyticsBot.validity_tracker import ValidityTracker
+
+BASE_MINUTE = 1700000000000 // 60000
+WINDOW = 120
+
+def candle(symbol: str, minute: int, volume: float = 100.0, high: float = 11.0) -> KlineRecord:
+    return KlineRecord(
+        symbol=symbol,
+        open=10.0,
+        close=10.5,
+        high=high,
+        low=9.0,
+        volume=volume / 10,
+        close_time=(minute + 1) * 60000 - 1,
+        quote_assets_volume=volume,
+        taker_buy_base_volume=0.0,
+        taker_buy_quote_volume=0.0,
+        num_of_trades=1,
+        open_time=minute * 60000
+    )
+
+def market_minute(i: int, rng: random.Random) -> list[KlineRecord]:
+    """Свечи минуты i: нормальные тикеры и тикеры с разными дефектами."""
+    minute = BASE_MINUTE + i
+    candles = [candle("BTCUSDT", minute), candle("ETHUSDT", minute)]
+    if i >= 150:
+        candles.append(candle("NEWUSDT", minute))                           # листинг
+    if i < 200:
+        candles.append(candle("OLDUSDT", minute))                           # делистинг
+    if i % 97 != 5:
+        candles.append(candle("GAPUSDT", minute))                           # пропуски
+    candles.append(candle("DEADUSDT", minute, volume=0.0))                  # нулевые объёмы
+    candles.append(candle("HALFUSDT", minute, volume=0.0 if rng.random() < 0.5 else 5.0))
+    candles.append(candle("BADUSDT", minute, high=8.0 if i == 60 else 11.0))  # high < low
+    return candles
+
+def valid_by_rescan(storage: OrderedDict) -> set[str]:
+    return {c.symbol for candles in validate_ticker(storage).values() for c in candles}
+
+def test_matches_validate_ticker():
+    """Тест 1: на скользящем хранилище набор валидных тикеров совпадает с полным пересчётом"""
+    rng = random.Random(1)
+    tracker = ValidityTracker(window=WINDOW)
+    storage = OrderedDict()
+    checked = set()
+
+    for i in range(420):
+        storage[BASE_MINUTE + i] = market_minute(i, rng)
+        if len(storage) > WINDOW:
+            storage.popitem(last=False)
+        tracker.sync(storage)
+
+        if i % 7 == 0 or i in (59, 60, 61, 179, 180, 181):
+            expected = valid_by_rescan(storage)
+            assert tracker.valid_symbols() == expected, (i, tracker.valid_symbols() ^ expected)
+            assert all(tracker.is_valid(s) == (s in expected) for s in tracker.symbols)
+            if i >= WINDOW:
+                checked |= expected
+
+    assert {"BTCUSDT", "ETHUSDT", "NEWUSDT", "BADUSDT"} <= checked
+    assert "DEADUSDT" not in checked and "GAPUSDT" not in checked
+    assert tracker.filter(storage) == validate_ticker(storage)
+
+def test_bad_minute_ages_out():
+    """Тест 2: тикер с некорректной свечой снова валиден, когда она уходит из окна"""
+    tracker = ValidityTracker(window=WINDOW)
+    for i in range(WINDOW * 2):
+        minute = BASE_MINUTE + i
+        tracker.push(minute, [candle("BTCUSDT", minute), candle("BADUSDT", minute, high=8.0 if i == 10 else 11.0)])
+        if i < 10:
+            assert tracker.is_valid("BADUSDT")
+        elif i < 10 + WINDOW:
+            assert not tracker.is_valid("BADUSDT")
+            assert "некорректные свечи" in tracker.reason("BADUSDT")
+        else:
+            assert tracker.is_valid("BADUSDT") and tracker.reason("BADUSDT") is None
+    assert tracker.is_valid("BTCUSDT")
+    assert tracker.reason("NONEUSDT") == "тикер не встречался"
+
+def test_gaps():
+    """Тест 3: пропущенные минуты видны в missing_minutes и уходят из окна вместе с ними"""
+    tracker = ValidityTracker(window=WINDOW)
+    storage = OrderedDict()
+    for i in list(range(50)) + list(range(53, 60)):
+        storage[BASE_MINUTE + i] = [candle("BTCUSDT", BASE_MINUTE + i)]
+    tracker.sync(storage)
+    assert tracker.missing_minutes == 3 and tracker.minutes == 60
+    assert not tracker.is_valid("BTCUSDT")
+
+    for i in range(60, 60 + WINDOW):
+        storage[BASE_MINUTE + i] = [candle("BTCUSDT", BASE_MINUTE + i)]
+        assert tracker.sync(storage) == 1
+    assert tracker.missing_minutes == 0
+    assert tracker.is_valid("BTCUSDT")
+
+    # Разрыв длиннее окна: проверка начинается заново
+    far = BASE_MINUTE + 60 + WINDOW * 3
+    tracker.push(far, [candle("BTCUSDT", far)])
+    assert tracker.minutes == 1 and tracker.missing_minutes == 0 and tracker.is_valid("BTCUSDT")
+
+def test_columns_and_selection():
+    """Тест 4: минуты в колонках, свеча с чужим open_time отбраковывается, select оставляет валидные"""
+    tracker = ValidityTracker(window=WINDOW, symbols_capacity=1)
+    for i in range(30):
+        minute = BASE_MINUTE + i
+        candles = [candle("BTCUSDT", minute), candle("ETHUSDT", minute), candle("XRPUSDT", minute)]
+        if i == 20:
+            candles[2] = candle("XRPUSDT", minute - 1)
+        tracker.push(minute, KlineColumns.from_records(candles))
+
+    assert tracker.symbols == ["BTCUSDT", "ETHUSDT", "XRPUSDT"]
+    assert tracker.valid_symbols() == {"BTCUSDT", "ETHUSDT"}
+    minute = BASE_MINUTE + 29
+    last = KlineColumns.from_records([candle("BTCUSDT", minute), candle("ETHUSDT", minute), candle("XRPUSDT", minute)])
+    selected = tracker.select(last)
+    assert isinstance(selected, KlineColumns) and selected.symbols == ["BTCUSDT", "ETHUSDT"]
+    assert [c.symbol for c in tracker.select(list(last))] == ["BTCUSDT", "ETHUSDT"]
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_matches_validate_ticker,
+        test_bad_minute_ages_out,
+        test_gaps,
+        test_columns_and_selection,
+    ]
+
+    print("Запуск тестов для инкрементальной проверки тикеров...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,194 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+analytics_bot_src_path = src_path / "AnalyticsBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(analytics_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"analytics_bot_src_path = {analytics_bot_src_path}")
+
+import random
+
+from collections import OrderedDict
+
+import numpy as np
+
+from AnalyticsBot import analytic_utils
+from AnalyticsBot import vector_analytics
+from AnalyticsBot.bot_types import HoursColumns
+from AnalyticsBot.bot_types import KlineColumns
+from AnalyticsBot.bot_types import KlineRecord
+from AnalyticsBot.bot_types import Volume_10m
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "XRPUSDT", "SOLUSDT", "ADAUSDT"]
+
+def candle(symbol: str, minute: int, rng: random.Random) -> KlineRecord:
+    price = rng.uniform(1.0, 1000.0)
+    volume = rng.choice([0.0, rng.uniform(0, 1e-3), rng.uniform(1e3, 1e9)])
+    return KlineRecord(
+        symbol=symbol,
+        open=price,
+        close=price * rng.uniform(0.99, 1.01),
+        high=price * rng.uniform(1.01, 1.05),
+        low=price * rng.uniform(0.95, 0.99),
+        volume=volume / price,
+        close_time=(minute + 1) * 60000 - 1,
+        quote_assets_volume=volume,
+        taker_buy_base_volume=0.0,
+        taker_buy_quote_volume=0.0,
+        num_of_trades=1,
+        open_time=minute * 60000
+    )
+
+def make_minutes(count: int, seed: int) -> OrderedDict:
+    rng = random.Random(seed)
+    return OrderedDict((BASE_MINUTE + i, [candle(s, BASE_MINUTE + i, rng) for s in SYMBOLS]) for i in range(count))
+
+def to_columns(candles: list[KlineRecord]) -> KlineColumns:
+    return KlineColumns(
+        [c.symbol for c in candles],
+        np.array([[c.open, c.close, c.high, c.low, c.volume, c.quote_assets_volume,
+                   c.taker_buy_base_volume, c.taker_buy_quote_volume] for c in candles]).reshape(len(candles), 8),
+        np.array([c.num_of_trades for c in candles], dtype=np.int64),
+        np.array([c.open_time for c in candles], dtype=np.int64),
+        np.array([c.close_time for c in candles], dtype=np.int64))
+
+def assert_same_hours(actual, expected):
+    assert (actual is None) == (expected is None)
+    if expected is None:
+        return
+    assert list(actual.keys()) == list(expected.keys())
+    for key in expected:
+        assert isinstance(actual[key], HoursColumns)
+        assert actual[key] == expected[key], key
+
+def test_10m_volumes():
+    """Тест 1: 10м объёмы совпадают с исходной функцией для списков и колонок, несогласованные минуты – None"""
+    minutes = make_minutes(25, seed=1)
+    as_columns = OrderedDict((m, to_columns(c)) for m, c in minutes.items())
+    expected = analytic_utils.calculate_10m_volumes_slidedWindow(minutes)
+    assert vector_analytics.calculate_10m_volumes_slidedWindow(minutes) == expected
+    assert vector_analytics.calculate_10m_volumes_slidedWindow(as_columns) == expected
+
+    assert vector_analytics.calculate_10m_volumes_slidedWindow(OrderedDict(list(minutes.items())[:9])) is None
+    minutes[BASE_MINUTE + 20] = minutes[BASE_MINUTE + 20][:-1]
+    assert analytic_utils.calculate_10m_volumes_slidedWindow(minutes) is None
+    assert vector_analytics.calculate_10m_volumes_slidedWindow(minutes) is None
+
+def test_1h_records():
+    """Тест 2: часовые записи совпадают побитово, в том числе когда час с пропущенной свечой отбрасывается"""
+    minutes = make_minutes(60 * 5 + 17, seed=2)
+    as_columns = OrderedDict((m, to_columns(c)) for m, c in minutes.items())
+    expected = analytic_utils.calculate_1h_records(minutes)
+    assert len(expected) == 5
+    assert_same_hours(vector_analytics.calculate_1h_records(minutes), expected)
+    assert_same_hours(vector_analytics.calculate_1h_records(as_columns), expected)
+
+    # Во втором часу (считая от начала окна) одна минута без последнего тикера
+    broken_minute = BASE_MINUTE + 17 + 60 + 30
+    minutes[broken_minute] = minutes[broken_minute][:-1]
+    expected = analytic_utils.calculate_1h_records(minutes)
+    assert len(expected) == 4
+    assert_same_hours(vector_analytics.calculate_1h_records(minutes), expected)
+
+    assert vector_analytics.calculate_1h_records(OrderedDict(list(minutes.items())[:59])) is None
+    assert vector_analytics.calculate_1h_records(OrderedDict()) is None
+
+def test_hour_windows():
+    """Тест 3: окна часовых объёмов и цен совпадают для колонок, списков и часов с разными тикерами"""
+    minutes = make_minutes(60 * 14, seed=3)
+    hours_python = analytic_utils.calculate_1h_records(minutes)
+    hours_numpy = vector_analytics.calculate_1h_records(minutes)
+
+    for num_hours in (10, 12):
+        window_python = OrderedDict(list(hours_python.items())[-num_hours:])
+        window_numpy = OrderedDict(list(hours_numpy.items())[-num_hours:])
+        assert vector_analytics.calculate_volumes_slidedWindow(window_numpy, 10) == \
+               analytic_utils.calculate_volumes_slidedWindow(window_python, 10)
+        assert vector_analytics.calculate_volumes_slidedWindow(window_python, 10) == \
+               analytic_utils.calculate_volumes_slidedWindow(window_python, 10)
+        assert vector_analytics.calculate_prices_slidedWindow(window_numpy, num_hours) == \
+               analytic_utils.calculate_prices_slidedWindow(window_python, num_hours)
+
+    # Тикеры часов не совпадают: результат тот же, что у исходной функции
+    uneven = OrderedDict(list(hours_python.items())[-12:])
+    first_key = next(iter(uneven))
+    uneven[first_key] = uneven[first_key][1:]
+    assert vector_analytics.calculate_volumes_slidedWindow(uneven, 12) == \
+           analytic_utils.calculate_volumes_slidedWindow(uneven, 12)
+    assert vector_analytics.calculate_prices_slidedWindow(uneven, 12) == \
+           analytic_utils.calculate_prices_slidedWindow(uneven, 12)
+    assert vector_analytics.calculate_volumes_slidedWindow(uneven, 13) is None
+    assert vector_analytics.calculate_prices_slidedWindow({}, 12) == {}
+
+def test_overlimit_checks():
+    """Тест 4: проверки превышения цен и объёмов и analyze_ticker совпадают на случайных данных"""
+    rng = random.Random(4)
+    for _ in range(200):
+        symbols = [f"T{i}USDT" for i in range(rng.randint(0, 8))]
+        klines = [candle(s, BASE_MINUTE, rng) for s in symbols]
+        if klines and rng.random() < 0.3:
+            # Повтор тикера: учитывается первая свеча
+            klines.append(candle(klines[0].symbol, BASE_MINUTE, rng))
+
+        highs = {k.symbol: k.close * rng.uniform(0.98, 1.02) for k in klines if rng.random() < 0.8}
+        assert vector_analytics.check_price_overlimit(klines, highs) == analytic_utils.check_price_overlimit(klines, highs)
+        assert vector_analytics.check_price_overlimit(to_columns(klines), highs) == \
+               analytic_utils.check_price_overlimit(klines, highs)
+
+        volumes_10m = [Volume_10m(ticker=s, volume=rng.uniform(0, 100), open_time=0, close_time=0)
+                       for s in symbols if rng.random() < 0.9]
+        volumes_10h = {}
+        for s in symbols:
+            if rng.random() < 0.9:
+                hours = [rng.choice([rng.uniform(1, 120), rng.uniform(0.5, 2.0), 0.0, -1.0, float('nan')])
+                         if rng.random() < 0.2 else rng.uniform(1, 120) for _ in range(10)]
+                volumes_10h[s] = {f'total_volume_{i}': v for i, v in enumerate(hours, 1)}
+                assert vector_analytics.analyze_ticker(s, 50.0, hours) == analytic_utils.analyze_ticker(s, 50.0, hours)
+
+        assert vector_analytics.check_volume_overlimit(klines, volumes_10m, volumes_10h) == \
+               analytic_utils.check_volume_overlimit(klines, volumes_10m, volumes_10h)
+
+    assert vector_analytics.analyze_ticker("X", None, [1.0] * 10) is False
+    assert vector_analytics.analyze_ticker("X", 1.0, [1.0] * 9) is False
+    # Нет часа в окне объёмов – ошибка, как у исходной функции
+    broken = {"T0USDT": {f'total_volume_{i}': 1.0 for i in range(1, 10)}}
+    klines = [candle("T0USDT", BASE_MINUTE, rng)]
+    volumes_10m = [Volume_10m(ticker="T0USDT", volume=1.0, open_time=0, close_time=0)]
+    assert vector_analytics.check_volume_overlimit(klines, volumes_10m, broken) is None
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_10m_volumes,
+        test_1h_records,
+        test_hour_windows,
+        test_overlimit_checks,
+    ]
+
+    print("Запуск тестов для векторной реализации аналитики...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
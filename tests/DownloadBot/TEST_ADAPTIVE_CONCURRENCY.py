@@ -0,0 +1,137 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+from candle_storage import CandleStorage
+from binance_utils import fetch_klines_for_symbols
+from DownloadBot.binance_limiter import AdaptiveConcurrency
+from fake_binance import FakeSession
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def test_additive_increase():
+    """Тест 1: ответы в пределах нормы увеличивают окно примерно на единицу за круг"""
+    window = AdaptiveConcurrency(initial=4, max_window=10)
+    for _ in range(4):
+        window.record_success(0.05)
+    assert 4.9 < window.window < 5.1, window.window
+    for _ in range(200):
+        window.record_success(0.05)
+    assert window.window == 10
+    assert window.decreases == 0
+
+def test_decrease_once_per_round():
+    """Тест 2: ошибки запросов одного круга уменьшают окно один раз"""
+    async def run():
+        window = AdaptiveConcurrency(initial=8)
+        for _ in range(8):
+            await window.acquire()
+        # Все восемь запросов отправлены с окном 8 и получили 429
+        for _ in range(8):
+            window.record_overload("HTTP 429")
+            window.release()
+        assert window.window == 4, window.window
+        assert window.decreases == 1
+        # Запрос, отправленный уже с новым окном, снова уменьшает его
+        await window.acquire()
+        window.record_overload("таймаут")
+        window.release()
+        assert window.window == 2, window.window
+        for _ in range(10):
+            window.record_overload("таймаут")
+        assert window.window == 1
+
+    asyncio.run(run())
+
+def test_latency_decrease():
+    """Тест 3: рост p95 задержки выше допустимого уменьшает окно"""
+    window = AdaptiveConcurrency(initial=10, latency_samples=20)
+    for _ in range(20):
+        window.record_success(0.1)
+    assert window.baseline_p95 == 0.1
+    before = window.window
+    for _ in range(18):
+        window.record_success(0.1)
+    # Две медленные из двадцати – это p95
+    window.record_success(0.5)
+    window.record_success(0.5)
+    assert window.last_p95 == 0.5
+    assert window.window < before / 1.5, window.window
+    assert window.decreases == 1
+
+class OverloadedSession(FakeSession):
+    """Сервер с ограниченной пропускной способностью: задержки растут с очередью, сверх reject_above – 429."""
+    def __init__(self, capacity: int, reject_above: int):
+        super().__init__()
+        self.capacity = capacity
+        self.reject_above = reject_above
+        self.rejected = 0
+
+    def respond(self, url, params):
+        if self.in_flight > self.reject_above:
+            self.rejected += 1
+            return 429, 0.0
+        # Очередь на стороне сервера: сверх capacity запросов задержка растёт линейно
+        return 200, 0.002 * max(1.0, self.in_flight / self.capacity)
+
+def test_window_converges_under_overload():
+    """Тест 4: окно, начатое с 50, уходит от 429 и задержек к пропускной способности сервера"""
+    symbols = [f"SYM{i}USDT" for i in range(300)]
+    session = OverloadedSession(capacity=8, reject_above=16)
+    window = AdaptiveConcurrency(initial=50)
+    storage = CandleStorage(capacity=10)
+
+    async def run():
+        return await fetch_klines_for_symbols(session, symbols, None, 5, (BASE_MINUTE + 1) * 60000 - 1,
+                                              storage, semaphore=window)
+
+    written = asyncio.run(run())
+    print(f"   окно {window.window:.1f}, уменьшений {window.decreases}, отказов 429: {session.rejected}, "
+          f"p95 {window.last_p95 * 1000:.1f} мс")
+    assert written == 5 * len(symbols)
+    assert window.decreases > 0
+    # Окно колеблется пилой вокруг порога отказов, а не остаётся на 50
+    assert window.window < 25, window.window
+    assert session.rejected < len(symbols) // 5
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_additive_increase,
+        test_decrease_once_per_round,
+        test_latency_decrease,
+        test_window_converges_under_overload,
+    ]
+
+    print("Запуск тестов для адаптивного окна запросов к Binance...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,183 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import os
+import json
+import tempfile
+
+from candle_storage import CandleStorage
+from candle_archive import CandleArchive
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "XRPUSDT"]
+
+def candle(symbol_id: int, minute: int) -> tuple[list[float], int]:
+    price = 100.0 * (symbol_id + 1) + (minute % 1000) / 8
+    return [price, price + 0.5, price + 1.0, price - 1.0, 10.0, 10.0 * price, 4.0, 4.0 * price], symbol_id * 1000 + minute % 1000
+
+def fill(storage: CandleStorage, symbols: list[str], start: int, stop: int, skip: tuple = ()) -> None:
+    """Свечи тикеров за минуты [start, stop), кроме (тикер, минута) из skip."""
+    for minute in range(start, stop):
+        for symbol in symbols:
+            if (symbol, minute) in skip:
+                continue
+            values, trades = candle(SYMBOLS.index(symbol), minute)
+            storage.put(symbol, minute, values, trades)
+
+def assert_same_minutes(storage: CandleStorage, expected: CandleStorage, minutes) -> None:
+    for minute in minutes:
+        got = {r.symbol: r for r in storage.get_minute(minute)}
+        want = {r.symbol: r for r in expected.get_minute(minute)}
+        assert got.keys() == want.keys(), (minute, got.keys(), want.keys())
+        for symbol, record in want.items():
+            assert got[symbol] == record, (minute, symbol)
+
+def test_append_and_reload():
+    """Тест 1: минуты дописываются только один раз и после перезапуска загружаются в хранилище"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=100)
+        fill(storage, SYMBOLS, BASE_MINUTE, BASE_MINUTE + 40, skip={("ETHUSDT", BASE_MINUTE + 7)})
+        archive = CandleArchive(path, max_symbols=4)
+        assert archive.append_from(storage, until_minute=BASE_MINUTE + 29) == 30
+        assert archive.append_from(storage) == 10
+        assert archive.append_from(storage) == 0
+        assert (archive.first_minute, archive.last_minute) == (BASE_MINUTE, BASE_MINUTE + 39)
+
+        reopened = CandleArchive(path)
+        assert len(reopened) == 40 and reopened.symbols == SYMBOLS
+        restored = CandleStorage(capacity=100)
+        assert reopened.load_into(restored) == 40
+        assert not restored.has_candle("ETHUSDT", BASE_MINUTE + 7)
+        assert_same_minutes(restored, storage, range(BASE_MINUTE, BASE_MINUTE + 40))
+
+def test_new_symbols_widen_archive():
+    """Тест 2: новые тикеры расширяют строку архива, старые минуты сохраняются"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=100)
+        fill(storage, SYMBOLS[:1], BASE_MINUTE, BASE_MINUTE + 10)
+        archive = CandleArchive(path, max_symbols=1)
+        archive.append_from(storage)
+        fill(storage, SYMBOLS, BASE_MINUTE + 10, BASE_MINUTE + 20)
+        assert archive.append_from(storage) == 10
+        assert archive.max_symbols >= len(SYMBOLS)
+
+        restored = CandleStorage(capacity=100)
+        assert CandleArchive(path).load_into(restored) == 20
+        assert_same_minutes(restored, storage, range(BASE_MINUTE, BASE_MINUTE + 20))
+
+def test_compact_keeps_tail():
+    """Тест 3: сжатие оставляет последние минуты, дозапись продолжается после них"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=100)
+        fill(storage, SYMBOLS, BASE_MINUTE, BASE_MINUTE + 50)
+        archive = CandleArchive(path, max_symbols=4)
+        archive.append_from(storage)
+        archive.compact(20)
+        assert (archive.first_minute, len(archive)) == (BASE_MINUTE + 30, 20)
+        for field in archive._fields():
+            assert os.path.getsize(archive._file(field)) == 20 * archive._row_bytes(field)
+
+        fill(storage, SYMBOLS, BASE_MINUTE + 50, BASE_MINUTE + 55)
+        assert archive.append_from(storage) == 5
+
+        restored = CandleStorage(capacity=100)
+        assert CandleArchive(path).load_into(restored) == 25
+        assert restored.first_minute == BASE_MINUTE + 30
+        assert_same_minutes(restored, storage, range(BASE_MINUTE + 30, BASE_MINUTE + 55))
+
+def test_rewrite_repaired_minutes():
+    """Тест 4: докачанные свечи перезаписываются на месте, минуты вне архива и хранилища не трогаются"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=100)
+        hole = {("XRPUSDT", BASE_MINUTE + 3), ("XRPUSDT", BASE_MINUTE + 4)}
+        fill(storage, SYMBOLS, BASE_MINUTE, BASE_MINUTE + 10, skip=hole)
+        archive = CandleArchive(path, max_symbols=4)
+        archive.append_from(storage)
+
+        fill(storage, ["XRPUSDT"], BASE_MINUTE + 3, BASE_MINUTE + 5)
+        assert archive.rewrite_minutes(storage, [BASE_MINUTE + 3, BASE_MINUTE + 4, BASE_MINUTE + 50]) == 2
+        # Минуты, которой нет в хранилище, перезапись не обнуляет
+        empty = CandleStorage(capacity=100)
+        empty.ensure_column("BTCUSDT")
+        assert archive.rewrite_minutes(empty, [BASE_MINUTE + 5]) == 0
+
+        restored = CandleStorage(capacity=100)
+        assert CandleArchive(path).load_into(restored) == 10
+        assert restored.has_candle("XRPUSDT", BASE_MINUTE + 3)
+        assert_same_minutes(restored, storage, range(BASE_MINUTE, BASE_MINUTE + 10))
+
+def test_truncated_files_recovery():
+    """Тест 5: хвост данных, не попавший в индекс, обрезается; файл короче индекса – архив создаётся заново"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=100)
+        fill(storage, SYMBOLS, BASE_MINUTE, BASE_MINUTE + 20)
+        archive = CandleArchive(path, max_symbols=4)
+        archive.append_from(storage)
+
+        # Сбой между записью данных и индекса: в файлах лишняя половина строки
+        for field in archive._fields():
+            with open(archive._file(field), 'ab') as f:
+                f.write(b'\x01' * (archive._row_bytes(field) // 2))
+        reopened = CandleArchive(path)
+        assert len(reopened) == 20
+        for field in reopened._fields():
+            assert os.path.getsize(reopened._file(field)) == 20 * reopened._row_bytes(field)
+        restored = CandleStorage(capacity=100)
+        assert reopened.load_into(restored) == 20
+        assert_same_minutes(restored, storage, range(BASE_MINUTE, BASE_MINUTE + 20))
+
+        # Файл обрезан посреди данных – доверять архиву нельзя
+        with open(reopened._file('close'), 'r+b') as f:
+            f.truncate(5 * reopened._row_bytes('close'))
+        broken = CandleArchive(path)
+        assert len(broken) == 0 and broken.last_minute is None
+        assert broken.append_from(storage) == 20
+
+        # Повреждённый индекс – тоже начинаем заново
+        with open(os.path.join(path, CandleArchive.INDEX_FILE), 'w', encoding='utf-8') as f:
+            f.write("{not json")
+        assert len(CandleArchive(path)) == 0
+        with open(os.path.join(path, CandleArchive.INDEX_FILE), 'r', encoding='utf-8') as f:
+            assert json.load(f)['count'] == 0
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_append_and_reload,
+        test_new_symbols_widen_archive,
+        test_compact_keeps_tail,
+        test_rewrite_repaired_minutes,
+        test_truncated_files_recovery,
+    ]
+
+    print("Запуск тестов для дискового архива свечей...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,169 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import numpy as np
+
+from candle_storage import CandleStorage
+from candle_storage import SYMBOLS_GROWTH_STEP
+from candle_storage import MINUTE_MS
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def candle(symbol_id: int, minute: int) -> list[float]:
+    price = 100.0 * (symbol_id + 1) + (minute % 1000) / 8
+    return [price, price + 0.5, price + 1.0, price - 1.0, 10.0, 10.0 * price, 4.0, 4.0 * price]
+
+def test_ring_wrap_and_eviction():
+    """Тест 1: новые минуты вытесняют самые старые, запись старше окна отклоняется, evict_before сдвигает хвост"""
+    storage = CandleStorage(capacity=10)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 25):
+        assert storage.put("AAA", minute, candle(0, minute), minute % 100)
+
+    assert (storage.first_minute, storage.last_minute, len(storage)) == (BASE_MINUTE + 15, BASE_MINUTE + 24, 10)
+    assert not storage.has_minute(BASE_MINUTE + 14)
+    assert storage.get_minute(BASE_MINUTE + 14) == []
+    record = storage.get_minute(BASE_MINUTE + 20)[0]
+    assert record.close == candle(0, BASE_MINUTE + 20)[1] and record.num_of_trades == (BASE_MINUTE + 20) % 100
+    assert record.open_time == (BASE_MINUTE + 20) * MINUTE_MS
+    assert record.close_time == record.open_time + MINUTE_MS - 1
+
+    # Старше окна – не принимается, в пределах окна назад – принимается
+    assert not storage.put("AAA", BASE_MINUTE + 14, candle(0, 0), 1)
+    storage.evict_before(BASE_MINUTE + 20)
+    assert (storage.first_minute, len(storage)) == (BASE_MINUTE + 20, 5)
+    assert storage.put("AAA", BASE_MINUTE + 17, candle(0, BASE_MINUTE + 17), 1)
+    assert storage.first_minute == BASE_MINUTE + 17
+    # Слоты между дописанной минутой и хвостом очищены, а не показывают вытесненные данные
+    assert not storage.has_minute(BASE_MINUTE + 18) and storage.missing_minutes() == [BASE_MINUTE + 18, BASE_MINUTE + 19]
+
+    # Скачок вперёд больше окна очищает всё
+    storage.put("AAA", BASE_MINUTE + 100, candle(0, BASE_MINUTE + 100), 1)
+    assert (storage.first_minute, storage.last_minute) == (BASE_MINUTE + 91, BASE_MINUTE + 100)
+    assert storage.missing_minutes() == list(range(BASE_MINUTE + 91, BASE_MINUTE + 100))
+    storage.evict_before(BASE_MINUTE + 101)
+    assert not storage and len(storage) == 0
+
+def test_symbol_growth():
+    """Тест 2: столбцы растут шагом SYMBOLS_GROWTH_STEP, номера столбцов и данные сохраняются"""
+    storage = CandleStorage(capacity=4, symbols_capacity=2)
+    storage.put("AAA", BASE_MINUTE, candle(0, BASE_MINUTE), 1)
+    storage.put("BBB", BASE_MINUTE, candle(1, BASE_MINUTE), 2)
+    bytes_before = storage.memory_bytes()
+    storage.put("CCC", BASE_MINUTE, candle(2, BASE_MINUTE), 3)
+
+    assert storage.symbols == ["AAA", "BBB", "CCC"]
+    assert [storage.column_of(s) for s in ("AAA", "BBB", "CCC", "DDD")] == [0, 1, 2, None]
+    assert storage._present.shape[1] == 2 + SYMBOLS_GROWTH_STEP
+    assert storage.memory_bytes() > bytes_before
+    records = {r.symbol: r for r in storage.get_minute(BASE_MINUTE)}
+    assert [records[s].num_of_trades for s in ("AAA", "BBB", "CCC")] == [1, 2, 3]
+    assert records["AAA"].close == candle(0, BASE_MINUTE)[1]
+
+    # Следующие тикеры помещаются в уже выделенные столбцы
+    for i in range(SYMBOLS_GROWTH_STEP - 1):
+        storage.ensure_column(f"NEW{i}")
+    assert storage._present.shape[1] == 2 + SYMBOLS_GROWTH_STEP
+
+def test_put_series():
+    """Тест 3: серия свечей одного тикера сдвигает голову и отбрасывает минуты старше окна"""
+    storage = CandleStorage(capacity=10)
+    storage.put("AAA", BASE_MINUTE + 5, candle(0, BASE_MINUTE + 5), 1)
+
+    minutes = np.arange(BASE_MINUTE, BASE_MINUTE + 20, dtype=np.int64)
+    values = np.array([candle(1, m) for m in minutes])
+    trades = minutes % 100
+    assert storage.put_series("BBB", minutes, values, trades) == 10
+    assert (storage.first_minute, storage.last_minute) == (BASE_MINUTE + 10, BASE_MINUTE + 19)
+    assert not storage.has_candle("AAA", BASE_MINUTE + 5)
+    for minute in range(BASE_MINUTE + 10, BASE_MINUTE + 20):
+        record = storage.get_minute(minute)[0]
+        assert (record.symbol, record.close, record.num_of_trades) == ("BBB", candle(1, minute)[1], minute % 100)
+
+    # Серия целиком старше окна ничего не пишет
+    old = np.arange(BASE_MINUTE, BASE_MINUTE + 5, dtype=np.int64)
+    assert storage.put_series("BBB", old, values[:5], trades[:5]) == 0
+    assert storage.put_series("BBB", old[:0], values[:0], trades[:0]) == 0
+
+def test_missing_ranges():
+    """Тест 4: пропуски по тикерам с учётом очищенных слотов и until_minute"""
+    b = BASE_MINUTE
+    storage = CandleStorage(capacity=30)
+    columns = np.array([storage.ensure_column(s) for s in ("AAA", "BBB")])
+    for minute in range(b, b + 20):
+        if minute in (b + 8, b + 9):
+            continue  # минут нет совсем
+        keep = [0] if minute in (b + 3, b + 15) else [0, 1]
+        storage.put_minute(minute, columns[keep], np.array([candle(i, minute) for i in keep]), np.array(keep))
+
+    holes = storage.missing_ranges(["AAA", "BBB", "CCC"])
+    assert holes["AAA"] == [(b + 8, b + 9)]
+    assert holes["BBB"] == [(b + 3, b + 3), (b + 8, b + 9), (b + 15, b + 15)]
+    assert holes["CCC"] == [(b, b + 19)]
+    assert storage.missing_ranges(["BBB"], b + 8) == {"BBB": [(b + 3, b + 3), (b + 8, b + 8)]}
+    assert storage.missing_ranges(["AAA"], b - 1) == {}
+    assert storage.missing_minutes() == [b + 8, b + 9]
+    assert storage.last_candle_minute("BBB") == b + 19
+    assert storage.last_candle_minute("CCC") is None
+
+def test_minute_revisions():
+    """Тест 5: счётчик минуты меняется при каждой записи в неё, минуты вне хранилища – -1"""
+    storage = CandleStorage(capacity=5)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 3):
+        storage.put("AAA", minute, candle(0, minute), 1)
+    minutes = range(BASE_MINUTE - 1, BASE_MINUTE + 4)
+    before = storage.minute_revisions(minutes)
+    assert before[0] == -1 and before[-1] == -1 and (before[1:4] >= 0).all()
+
+    storage.put("BBB", BASE_MINUTE + 1, candle(1, BASE_MINUTE + 1), 2)
+    after = storage.minute_revisions(minutes)
+    assert after[2] != before[2]
+    assert after[1] == before[1] and after[3] == before[3]
+
+    # Слот переиспользован другой минутой – старая минута больше не в хранилище
+    for minute in range(BASE_MINUTE + 3, BASE_MINUTE + 6):
+        storage.put("AAA", minute, candle(0, minute), 1)
+    wrapped = storage.minute_revisions(range(BASE_MINUTE, BASE_MINUTE + 6))
+    assert wrapped[0] == -1 and (wrapped[1:] >= 0).all()
+    assert storage.minute_revisions(range(0)).size == 0
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_ring_wrap_and_eviction,
+        test_symbol_growth,
+        test_put_series,
+        test_missing_ranges,
+        test_minute_revisions,
+    ]
+
+    print("Запуск тестов для колоночного хранилища свечей...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,158 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+from clock_sync import ClockSync
+from fake_binance import FakeSession
+
+class FakeClock:
+    """Локальные часы в секундах, двигаются только вручную."""
+    def __init__(self, now: float = 1700000000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class BinanceTimeSession(FakeSession):
+    """
+    /fapi/v1/time: Binance опережает локальные часы на offset_ms и уходит вперёд на drift_ppm.
+    delays – задержки (туда, обратно) каждого запроса в секундах.
+    """
+    def __init__(self, clock: FakeClock, offset_ms: float, drift_ppm: float = 0.0):
+        super().__init__()
+        self.clock = clock
+        self.offset_ms = offset_ms
+        self.drift_ppm = drift_ppm
+        self.start_ms = clock.now * 1000
+        self.delays: list[tuple[float, float]] = []
+        self._down = 0.0
+
+    def true_offset(self) -> float:
+        return self.offset_ms + (self.clock.now * 1000 - self.start_ms) * self.drift_ppm / 1e6
+
+    def binance_ms(self) -> float:
+        return self.clock.now * 1000 + self.true_offset()
+
+    def respond(self, url, params):
+        # Запрос идёт до Binance up секунд, ответ обратно – down секунд
+        up, self._down = self.delays.pop(0)
+        self.clock.now += up
+        return 200, 0.0
+
+    def body(self, url, params):
+        data = {"serverTime": round(self.binance_ms())}
+        self.clock.now += self._down
+        return data
+
+def test_midpoint_and_min_rtt():
+    """Тест 1: смещение берётся по середине самого быстрого запроса серии, асимметричные медленные отбрасываются"""
+    clock = FakeClock()
+    session = BinanceTimeSession(clock, offset_ms=1234)
+    sync = ClockSync(clock=clock, probes=4)
+    updates = []
+    sync.on_update = updates.append
+    # Медленные запросы с очередью на обратном пути дают ошибку до сотен мс, самый быстрый – не больше 5 мс
+    session.delays = [(0.010, 0.400), (0.005, 0.005), (0.020, 0.300), (0.001, 0.150)]
+
+    sample = asyncio.run(sync.sync_once(session))
+    assert abs(sample.rtt_ms - 10) < 0.01, sample.rtt_ms
+    assert abs(sync.offset_ms() - 1234) <= 1, sync.offset_ms()
+    assert updates == [sync.offset_ms()]
+    assert abs(sync.now_ms() - session.binance_ms()) <= 1
+
+def test_rtt_filter():
+    """Тест 2: замер с RTT намного больше лучшего не сдвигает оценку"""
+    clock = FakeClock()
+    sync = ClockSync(clock=clock)
+    t = clock.now * 1000
+    sync.add_sample(t, t + 100 + 5, t + 10)
+    # RTT 800 мс, ответ задержан на обратном пути: середина ошибается на 350 мс
+    t += 60_000
+    sync.add_sample(t, t + 100 + 50 + 400, t + 800)
+    assert abs(sync.offset_at(t) - 100) < 1, sync.offset_at(t)
+
+def test_drift_estimation():
+    """Тест 3: дрейф часов оценивается по сериям и продолжает смещение между синхронизациями"""
+    clock = FakeClock()
+    session = BinanceTimeSession(clock, offset_ms=-500, drift_ppm=100)
+    sync = ClockSync(clock=clock, probes=2)
+
+    async def run():
+        for _ in range(6):
+            session.delays = [(0.030, 0.030), (0.004, 0.004)]
+            await sync.sync_once(session)
+            clock.now += 300
+
+    asyncio.run(run())
+    assert 80 < sync.drift_ppm < 120, sync.drift_ppm
+    # Через 20 минут без синхронизации ошибка меньше 2 мс, без учёта дрейфа была бы 120 мс
+    clock.now += 1200
+    assert abs(sync.now_ms() - session.binance_ms()) < 2, sync.now_ms() - session.binance_ms()
+
+def test_step_resets_history():
+    """Тест 4: скачок системных часов сбрасывает историю, а Binance без ответа не меняет оценку"""
+    clock = FakeClock()
+    session = BinanceTimeSession(clock, offset_ms=50)
+    sync = ClockSync(clock=clock, probes=1)
+
+    async def run():
+        for _ in range(3):
+            session.delays = [(0.005, 0.005)]
+            await sync.sync_once(session)
+            clock.now += 300
+        # Системные часы перевели на 10 секунд назад
+        clock.now -= 10
+        session.offset_ms += 10_000
+        session.delays = [(0.005, 0.005)]
+        await sync.sync_once(session)
+        assert abs(sync.offset_ms() - session.true_offset()) <= 1, sync.offset_ms()
+        assert sync.drift_ppm == 0
+
+        session.get = lambda url, timeout: (_ for _ in ()).throw(OSError("нет сети"))
+        before = sync.offset_ms()
+        assert await sync.sync_once(session) is None
+        assert sync.offset_ms() == before
+
+    asyncio.run(run())
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_midpoint_and_min_rtt,
+        test_rtt_filter,
+        test_drift_estimation,
+        test_step_resets_history,
+    ]
+
+    print("Запуск тестов для синхронизации часов с Binance...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
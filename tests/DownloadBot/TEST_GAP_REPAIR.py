@@ -0,0 +1,167 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+import numpy as np
+
+from candle_storage import CandleStorage
+from gap_repair import GapRepairer
+from gap_repair import coalesce_ranges
+from DownloadBot.binance_limiter import BinanceRateLimiter
+from fake_binance import FakeSession
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def make_kline(symbol_id: int, minute: int) -> list:
+    price = f"{symbol_id * 1000 + minute % 1000}.5"
+    return [minute * 60000, price, price, price, price, "1.0", minute * 60000 + 59999,
+            "10.0", symbol_id + 1, "0.5", "5.0", "0"]
+
+def values_of(kline: list) -> list[float]:
+    return [float(kline[i]) for i in (1, 4, 2, 3, 5, 7, 9, 10)]
+
+def fill(storage: CandleStorage, symbol: str, symbol_id: int, minutes) -> None:
+    for minute in minutes:
+        kline = make_kline(symbol_id, minute)
+        storage.put(symbol, minute, values_of(kline), kline[8])
+
+class HistorySession(FakeSession):
+    """Отвечает свечами тикеров за минуты history_start..., как /fapi/v1/klines."""
+    def __init__(self, history_start: dict[str, int]):
+        super().__init__()
+        self.history_start = history_start
+
+    def body(self, url, params):
+        symbol = params['symbol']
+        end_minute = params['endTime'] // 60000
+        first = max(end_minute - params['limit'] + 1, self.history_start[symbol])
+        symbol_id = list(self.history_start).index(symbol)
+        return [make_kline(symbol_id, minute) for minute in range(first, end_minute + 1)]
+
+def test_missing_ranges():
+    """Тест 1: пропуски каждого тикера находятся диапазонами, в том числе у краёв и у незнакомых тикеров"""
+    storage = CandleStorage(capacity=100)
+    fill(storage, "AAA", 0, range(BASE_MINUTE, BASE_MINUTE + 50))
+    fill(storage, "BBB", 1, [m for m in range(BASE_MINUTE + 5, BASE_MINUTE + 50)
+                             if not (10 <= m - BASE_MINUTE <= 12 or m - BASE_MINUTE in (20, 49))])
+
+    holes = storage.missing_ranges(["AAA", "BBB", "CCC"])
+    assert "AAA" not in holes
+    b = BASE_MINUTE
+    assert holes["BBB"] == [(b, b + 4), (b + 10, b + 12), (b + 20, b + 20), (b + 49, b + 49)]
+    assert holes["CCC"] == [(b, b + 49)]
+    # До until_minute включительно
+    assert storage.missing_ranges(["BBB"], b + 15) == {"BBB": [(b, b + 4), (b + 10, b + 12)]}
+    assert CandleStorage(capacity=10).missing_ranges(["AAA"]) == {}
+
+def test_coalesce_ranges():
+    """Тест 2: соседние пропуски склеиваются, пока один запрос не тяжелее отдельных"""
+    # 1 + 1 минута через промежуток в 50: один запрос весом 1 вместо двух
+    assert coalesce_ranges([(0, 0), (51, 51)]) == [(0, 51)]
+    # Через 900 минут склейка дала бы вес 5 вместо 1 + 1
+    assert coalesce_ranges([(0, 0), (900, 900)]) == [(0, 0), (900, 900)]
+    assert coalesce_ranges([(0, 9), (20, 29), (2000, 2000)]) == [(0, 29), (2000, 2000)]
+    assert coalesce_ranges([]) == []
+
+def test_repair_fills_holes_and_gives_up():
+    """Тест 3: докачка закрывает пропуски одним запросом на тикер, минуты до листинга не перезапрашиваются бесконечно"""
+    b = BASE_MINUTE
+    storage = CandleStorage(capacity=200)
+    fill(storage, "AAA", 0, [m for m in range(b, b + 120) if m not in (b + 30, b + 31, b + 70)])
+    # NEW листингован в b + 60: минуты до этого у Binance отсутствуют
+    fill(storage, "NEW", 1, range(b + 60, b + 120))
+
+    session = HistorySession({"AAA": b - 1000, "NEW": b + 60})
+    repaired = []
+    repairer = GapRepairer(session, storage, BinanceRateLimiter(800, 2000), on_repaired=repaired.append,
+                           weight_reserve=0, max_attempts=2)
+    repairer.update_symbols(["AAA", "NEW"])
+
+    async def run():
+        written = await repairer.repair_once(b + 119)
+        assert written == 41, written
+        # AAA – один запрос через промежуток, NEW – один запрос, ответ без нужных минут
+        assert sorted(r['symbol'] for r in session.requests) == ["AAA", "NEW"]
+        assert not storage.missing_ranges(["AAA"])
+        for minute in (b + 30, b + 31, b + 70):
+            assert storage.get_minute(minute)[0].close == values_of(make_kline(0, minute))[1]
+        # Склеенный диапазон AAA перезаписан целиком – эти минуты нужно обновить в архиве
+        assert repairer.take_repaired_minutes() == list(range(b + 30, b + 71))
+        assert repairer.take_repaired_minutes() == []
+
+        await repairer.repair_once(b + 119)
+        assert len(session.requests) == 3
+        # Попытки исчерпаны – пропуск до листинга больше не запрашивается
+        assert repairer.plan(b + 119) == {}
+        assert await repairer.repair_once(b + 119) == 0
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+    assert storage.missing_ranges(["NEW"]) == {"NEW": [(b, b + 59)]}
+
+def test_repair_waits_for_headroom():
+    """Тест 4: докачка не тратит вес, зарезервированный для основного цикла"""
+    b = BASE_MINUTE
+    storage = CandleStorage(capacity=50)
+    fill(storage, "AAA", 0, [m for m in range(b, b + 40) if m != b + 20])
+    limiter = BinanceRateLimiter(800, 100)
+    session = HistorySession({"AAA": b - 1000})
+    repairer = GapRepairer(session, storage, limiter, weight_reserve=50, idle_delay=0.01)
+    repairer.update_symbols(["AAA"])
+
+    async def run():
+        for _ in range(60):
+            await limiter.wait_if_needed(1)
+        task = asyncio.create_task(repairer.repair_once(b + 39))
+        await asyncio.sleep(0.1)
+        # Запас 40 < 1 + 50 – запрос ждёт
+        assert not session.requests and not task.done()
+        limiter._releases = []
+        limiter._used_weight = 0
+        limiter._used_requests = 0
+        assert await asyncio.wait_for(task, 2) == 1
+
+    asyncio.run(run())
+    assert np.array_equal(storage.minute_arrays(b + 20)[2], [True])
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_missing_ranges,
+        test_coalesce_ranges,
+        test_repair_fills_holes_and_gives_up,
+        test_repair_waits_for_headroom,
+    ]
+
+    print("Запуск тестов для докачки пропусков хранилища...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,174 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+import binance_utils
+
+from candle_storage import CandleStorage
+from binance_utils import fetch_klines_for_symbols
+from DownloadBot.binance_limiter import AdaptiveConcurrency
+from DownloadBot.binance_limiter import BinanceRateLimiter
+from DownloadBot.binance_limiter import RequestPriority
+from DownloadBot.udp_server import UDPMarketDataServer
+from fake_binance import FakeSession
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def warm_window(samples: int = 50, latency: float = 0.05) -> AdaptiveConcurrency:
+    window = AdaptiveConcurrency(initial=4)
+    for _ in range(samples):
+        window.record_success(latency)
+    return window
+
+class StuckSession(FakeSession):
+    """Первый запрос тикера из stuck зависает на stuck_delay секунд, остальные отвечают сразу."""
+    def __init__(self, stuck: set[str], stuck_delay: float = 5.0):
+        super().__init__(delay=0.001)
+        self.stuck = set(stuck)
+        self.stuck_delay = stuck_delay
+
+    @property
+    def symbols(self) -> list[str]:
+        """Тикеры запросов по порядку."""
+        return [request['symbol'] for request in self.requests]
+
+    def respond(self, url, params):
+        symbol = params['symbol']
+        first = self.symbols.count(symbol) == 1
+        return 200, self.stuck_delay if symbol in self.stuck and first else self.delay
+
+def test_hedge_delay_quantile():
+    """Тест 1: порог дублирования – квантиль задержек последних ответов, пока их мало – нет порога"""
+    window = AdaptiveConcurrency(initial=4)
+    for i in range(19):
+        window.record_success(0.001 * (i + 1))
+    assert window.hedge_delay() is None
+    window.record_success(0.020)
+    assert abs(window.hedge_delay(0.9) - 0.018) < 1e-9, window.hedge_delay(0.9)
+    assert window.hedge_delay(1.0) == 0.020
+
+def test_try_acquire():
+    """Тест 2: вес для дубликата берётся только без ожидания и не в обход более важных запросов"""
+    async def run():
+        limiter = BinanceRateLimiter(800, 10)
+        assert limiter.try_acquire(8)
+        assert not limiter.try_acquire(3)
+        assert limiter.try_acquire(2)
+        assert not limiter.try_acquire(1)
+
+        limiter = BinanceRateLimiter(800, 10)
+        await limiter.wait_if_needed(9)
+        waiter = asyncio.create_task(limiter.wait_if_needed(5, RequestPriority.LIVE))
+        await asyncio.sleep(0)
+        # Вес 1 есть, но его ждёт запрос класса LIVE
+        assert not limiter.try_acquire(1, RequestPriority.RECENT)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+    asyncio.run(run())
+
+def test_hedge_wins_over_stuck_request():
+    """Тест 3: зависший запрос дублируется, побеждает дубликат, зависший отменяется"""
+    symbols = ["AAAUSDT", "BBBUSDT", "CCCUSDT"]
+    session = StuckSession({"BBBUSDT"})
+    window = warm_window()
+    storage = CandleStorage(capacity=10)
+    binance_utils.HEDGE_REQUESTS = True
+
+    async def run():
+        return await asyncio.wait_for(fetch_klines_for_symbols(
+            session, symbols, BinanceRateLimiter(800, 2400), 5, (BASE_MINUTE + 1) * 60000 - 1,
+            storage, semaphore=window), 2)
+
+    try:
+        written = asyncio.run(run())
+    finally:
+        binance_utils.HEDGE_REQUESTS = False
+    assert written == 5 * len(symbols), written
+    assert session.symbols.count("BBBUSDT") == 2, session.symbols
+    assert window.hedges == 1 and window.hedge_wins == 1, (window.hedges, window.hedge_wins)
+    assert session.cancelled == 1
+    assert window.in_flight == 0
+
+def test_no_hedge_without_weight():
+    """Тест 4: без свободного веса дубликат не отправляется, основной запрос дожидается ответа"""
+    session = StuckSession({"AAAUSDT"}, stuck_delay=0.05)
+    window = warm_window()
+    storage = CandleStorage(capacity=10)
+    binance_utils.HEDGE_REQUESTS = True
+
+    async def run():
+        limiter = BinanceRateLimiter(800, 3)
+        await limiter.wait_if_needed(2)
+        return await asyncio.wait_for(fetch_klines_for_symbols(
+            session, ["AAAUSDT"], limiter, 5, (BASE_MINUTE + 1) * 60000 - 1, storage, semaphore=window), 2)
+
+    try:
+        written = asyncio.run(run())
+    finally:
+        binance_utils.HEDGE_REQUESTS = False
+    assert written == 5
+    assert session.symbols == ["AAAUSDT"]
+    assert window.hedges == 0 and session.cancelled == 0
+
+def test_pending_symbols_in_snapshot():
+    """Тест 5: минута публикуется без опоздавших тикеров, следующая публикация их дописывает"""
+    storage = CandleStorage(capacity=10)
+    values = [1.0, 1.5, 2.0, 0.5, 10.0, 15.0, 5.0, 7.5]
+    storage.put("AAAUSDT", BASE_MINUTE, values, 7)
+    storage.put("BBBUSDT", BASE_MINUTE - 1, values, 7)
+    server = UDPMarketDataServer()
+    server.update_data(storage, pending_symbols=["BBBUSDT"])
+    first = server.snapshot
+    assert first.published_minute == BASE_MINUTE
+    assert first.pending_symbols == frozenset({"BBBUSDT"})
+    assert int(first.storage.minute_arrays(BASE_MINUTE)[2].sum()) == 1
+
+    storage.put("BBBUSDT", BASE_MINUTE, values, 7)
+    server.update_data(storage)
+    assert server.snapshot is not first
+    assert server.snapshot.pending_symbols == frozenset()
+    assert len(server.snapshot.payload(BASE_MINUTE)) > len(first.payload(BASE_MINUTE))
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_hedge_delay_quantile,
+        test_try_acquire,
+        test_hedge_wins_over_stuck_request,
+        test_no_hedge_without_weight,
+        test_pending_symbols_in_snapshot,
+    ]
+
+    print("Запуск тестов для дублирования запросов и досрочной публикации минуты...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,234 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+import socket
+import struct
+import time
+import zlib
+
+from dataclasses import astuple
+
+import numpy as np
+
+import AnalyticsBot.udp_client as udp_client
+
+from candle_storage import CandleStorage
+from bot_types_serializer import KlineRecordSerializer
+from kline_codec import encode_columns
+from kline_codec import decode_columns
+from udp_server import UDPMarketDataServer
+from DownloadBot.protocol_download import KlineRequest
+from DownloadBot.protocol_download import PacketType
+from DownloadBot.protocol_download import PayloadVersion
+from DownloadBot.protocol_download_serializer import ProtocolSerializer
+
+# Клиент по умолчанию слушает адрес сервера сигналов – в тесте всё на localhost
+udp_client.ALERT_SERVER_IP = "127.0.0.1"
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def _round(values: np.ndarray, digits: np.ndarray) -> np.ndarray:
+    return np.array([round(float(v), int(d)) for v, d in zip(values, digits)])
+
+def make_minute(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Минута, похожая на Binance Futures: цены от 0.0001 до 50000 с ~5 значащими цифрами,
+    объёмы с шагом лота, quote-объёмы с 7 знаками, сделки по Пуассону.
+    """
+    rng = np.random.default_rng(seed)
+    magnitude = 10 ** rng.uniform(-4, 4.7, count)
+    price_digits = np.clip(5 - np.floor(np.log10(magnitude)), 0, 8)
+    lot_digits = np.clip(3 - np.floor(np.log10(magnitude)), 0, 3)
+
+    open_ = _round(magnitude, price_digits)
+    close = _round(open_ * (1 + rng.normal(0, 0.001, count)), price_digits)
+    high = _round(np.maximum(open_, close) * (1 + abs(rng.normal(0, 0.0005, count))), price_digits)
+    low = _round(np.minimum(open_, close) * (1 - abs(rng.normal(0, 0.0005, count))), price_digits)
+    volume = _round(rng.gamma(1, 1e5 / magnitude, count), lot_digits)
+    quote = _round(volume * open_, np.full(count, 7))
+    taker_base = _round(volume * rng.uniform(0.3, 0.7, count), lot_digits)
+    taker_quote = _round(taker_base * open_, np.full(count, 7))
+
+    values = np.stack([open_, close, high, low, volume, quote, taker_base, taker_quote], axis=1)
+    return values, rng.poisson(300, count)
+
+def test_decimal_columns_roundtrip():
+    """Тест 1: десятичные цены и объёмы восстанавливаются точно, тикеры – номерами"""
+    values, trades = make_minute(550)
+    ids = np.arange(550) * 3
+    symbol_ids, symbols, decoded, decoded_trades = decode_columns(encode_columns(values, trades, symbol_ids=ids))
+    assert symbols is None
+    assert np.array_equal(symbol_ids, ids)
+    assert np.array_equal(decoded, values)
+    assert np.array_equal(decoded_trades, trades)
+
+def test_xor_fallback_roundtrip():
+    """Тест 2: значения без десятичного представления (и особые) сжимаются XOR без потерь"""
+    values, trades = make_minute(100, seed=1)
+    values[::2] *= 1 + 1e-13
+    values[1, 0] = 0.1 + 0.2
+    values[3, 4] = 0.0
+    values[5, 5] = 1e300
+    symbols = np.array([f"SYM{i}USDT".encode() for i in range(100)], dtype='S16')
+    symbol_ids, names, decoded, decoded_trades = decode_columns(encode_columns(values, trades, symbols=symbols))
+    assert symbol_ids is None
+    assert names == [f"SYM{i}USDT" for i in range(100)]
+    assert np.array_equal(decoded.view(np.uint64), values.view(np.uint64))
+    assert np.array_equal(decoded_trades, trades)
+
+def test_corrupted_block_is_rejected():
+    """Тест 3: обрезанный блок – ValueError, а не мусорные свечи"""
+    values, trades = make_minute(50, seed=2)
+    data = encode_columns(values, trades, symbol_ids=np.arange(50))
+    for cut in (1, 20, len(data) // 2, len(data) - 1):
+        try:
+            decode_columns(data[:cut])
+        except ValueError:
+            continue
+        raise AssertionError(f"Блок, обрезанный до {cut} байт, разобран")
+
+async def _request_in_versions(storage: CandleStorage, minute: int):
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    port = server.transport.get_extra_info('sockname')[1]
+    try:
+        results = []
+        for version in PayloadVersion:
+            async with udp_client.UDPClient(payload_version=version) as client:
+                single = await client.request_klines(minute, ("127.0.0.1", port), timeout=5.0)
+                ranged = await client.request_klines_range(minute, 1, ("127.0.0.1", port), timeout=5.0)
+                results.append((single, ranged))
+        return results
+    finally:
+        server.stop()
+
+def test_payload_version_negotiation():
+    """Тест 4: клиенты строкового и колоночного формата получают одинаковые свечи"""
+    values, trades = make_minute(300, seed=3)
+    storage = CandleStorage(capacity=4)
+    columns = np.array([storage.ensure_column(f"SYM{i}USDT") for i in range(300)])
+    storage.put_minute(BASE_MINUTE, columns, values, trades)
+
+    (rows_single, rows_range), (columnar_single, columnar_range) = asyncio.run(_request_in_versions(storage, BASE_MINUTE))
+    # KlineRecord у ботов – разные классы, сравниваем поля
+    expected = [astuple(r) for r in storage.get_minute(BASE_MINUTE)]
+    assert [astuple(r) for r in rows_single.records] == expected
+    assert [astuple(r) for r in columnar_single.records] == expected
+    assert [astuple(r) for r in rows_range.minutes[0].records] == expected
+    assert [astuple(r) for r in columnar_range.minutes[0].records] == expected
+
+def test_size_and_speed_against_zlib_rows():
+    """Тест 5: колоночный формат меньше строк + zlib; выводит размеры и время кодирования"""
+    values, trades = make_minute(550, seed=4)
+    names = np.array([f"SYM{i}USDT".encode() for i in range(550)], dtype='S16')
+    ids = np.arange(550)
+    rows = KlineRecordSerializer.serialize_columns(names, values, trades, 0, 59999)
+    compressed = zlib.compress(rows, level=6)
+    columnar = encode_columns(values, trades, symbol_ids=ids)
+    columnar_names = encode_columns(values, trades, symbols=names)
+
+    def timed(func, repeat: int = 50) -> float:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def encode_rows():
+        return zlib.compress(KlineRecordSerializer.serialize_columns(names, values, trades, 0, 59999), level=6)
+
+    print(f"   строки: {len(rows)} байт, строки + zlib: {len(compressed)} байт, "
+          f"колонки: {len(columnar)} байт (с именами {len(columnar_names)}), "
+          f"в {len(compressed) / len(columnar):.2f} раза меньше zlib")
+    print(f"   кодирование: строки + zlib {timed(encode_rows):.2f} мс, "
+          f"колонки {timed(lambda: encode_columns(values, trades, symbol_ids=ids)):.2f} мс")
+    print(f"   разбор: строки + zlib {timed(lambda: KlineRecordSerializer.deserialize_records(zlib.decompress(compressed)), 10):.2f} мс, "
+          f"колонки {timed(lambda: decode_columns(columnar)):.2f} мс")
+    assert len(columnar) < len(compressed)
+    assert len(columnar_names) < len(compressed)
+
+async def _old_client_request(storage: CandleStorage, request: bytes) -> bytes:
+    """Отправляет готовый пакет с обычного UDP сокета (как клиент без поддержки версий) и ждёт ответ."""
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    port = server.transport.get_extra_info('sockname')[1]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    try:
+        sock.connect(("127.0.0.1", port))
+        loop = asyncio.get_running_loop()
+        await loop.sock_sendall(sock, request)
+        return await asyncio.wait_for(loop.sock_recv(sock, 65536), 5.0)
+    finally:
+        sock.close()
+        server.stop()
+
+def test_old_header_clients():
+    """Тест 6: заголовок остался 9-байтным – клиенты без байта версии получают прежний ответ строками + zlib"""
+    # Запрос строкового формата побайтно совпадает с прежним форматом, колоночный – плюс байт версии
+    rows_request = ProtocolSerializer.serialize_kline_request(KlineRequest(BASE_MINUTE), 7)
+    assert rows_request == struct.pack('!BII', PacketType.KLINES_REQUEST, 7, 4) + struct.pack('!I', BASE_MINUTE)
+    columnar_request = ProtocolSerializer.serialize_kline_request(KlineRequest(BASE_MINUTE), 7, PayloadVersion.COLUMNAR)
+    assert columnar_request == rows_request + bytes([PayloadVersion.COLUMNAR])
+    assert ProtocolSerializer.deserialize_packet(rows_request)[1] == PayloadVersion.ROWS
+    assert ProtocolSerializer.deserialize_packet(columnar_request)[1] == PayloadVersion.COLUMNAR
+    assert ProtocolSerializer.deserialize_packet(columnar_request)[3] == rows_request[9:]
+
+    values, trades = make_minute(50, seed=5)
+    storage = CandleStorage(capacity=4)
+    columns = np.array([storage.ensure_column(f"SYM{i}USDT") for i in range(50)])
+    storage.put_minute(BASE_MINUTE, columns, values, trades)
+
+    # Ответ разбирается прежним кодом: заголовок !BII, ровно длина данных, записи строками под zlib
+    response = asyncio.run(_old_client_request(storage, rows_request))
+    ptype, pnum, dlen = struct.unpack('!BII', response[:9])
+    assert (ptype, pnum, len(response)) == (PacketType.KLINES_RESPONSE, 7, 9 + dlen)
+    minute, status, comp_len = struct.unpack('!III', response[9:21])
+    assert (minute, status) == (BASE_MINUTE, 0)
+    records = KlineRecordSerializer.deserialize_records(zlib.decompress(response[21:21 + comp_len]))
+    assert [astuple(r) for r in records] == [astuple(r) for r in storage.get_minute(BASE_MINUTE)]
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_decimal_columns_roundtrip,
+        test_xor_fallback_roundtrip,
+        test_corrupted_block_is_rejected,
+        test_payload_version_negotiation,
+        test_size_and_speed_against_zlib_rows,
+        test_old_header_clients,
+    ]
+
+    print("Запуск тестов для колоночного кодека свечей...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,138 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import json
+import asyncio
+
+import numpy as np
+
+import binance_utils
+
+from candle_storage import CandleStorage
+from candle_storage import N_FLOAT_FIELDS
+from binance_utils import fetch_klines_paginated
+from binance_utils import parse_klines_into
+from fake_binance import FakeSession
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def make_klines(first_minute: int, count: int, seed: int = 0) -> list[list]:
+    """Свечи в формате ответа /fapi/v1/klines: цены и объёмы – строками."""
+    rng = np.random.default_rng(seed)
+    klines = []
+    for minute in range(first_minute, first_minute + count):
+        prices = [f"{p:.{rng.integers(0, 8)}f}" for p in rng.uniform(0.0001, 60000, 4)]
+        klines.append([minute * 60000, *prices, f"{rng.uniform(0, 1e6):.3f}", minute * 60000 + 59999,
+                       f"{rng.uniform(0, 1e9):.7f}", int(rng.integers(0, 10000)),
+                       f"{rng.uniform(0, 1e5):.3f}", f"{rng.uniform(0, 1e8):.7f}", "0"])
+    return klines
+
+def expected_values(kline: list) -> list[float]:
+    return [float(kline[i]) for i in (1, 4, 2, 3, 5, 7, 9, 10)]
+
+def test_parse_into_columns():
+    """Тест 1: разбор в колонки совпадает с float() по каждому полю, с orjson и без него"""
+    klines = make_klines(BASE_MINUTE, 300)
+    body = json.dumps(klines).encode()
+    original = binance_utils._json_loads
+    try:
+        for loads in (original, json.loads):
+            binance_utils._json_loads = loads
+            minutes = np.empty(400, dtype=np.int64)
+            values = np.empty((400, N_FLOAT_FIELDS))
+            trades = np.empty(400, dtype=np.int64)
+            assert parse_klines_into(body, minutes, values, trades) == 300
+            assert minutes[:300].tolist() == list(range(BASE_MINUTE, BASE_MINUTE + 300))
+            assert values[:300].tolist() == [expected_values(k) for k in klines]
+            assert trades[:300].tolist() == [k[8] for k in klines]
+    finally:
+        binance_utils._json_loads = original
+    assert parse_klines_into(b'[]', minutes, values, trades) == 0
+
+def test_put_series_matches_put():
+    """Тест 2: пакетная запись тикера совпадает с поштучной и отбрасывает минуты старше окна"""
+    klines = make_klines(BASE_MINUTE, 150, seed=1)
+    minutes = np.array([k[0] // 60000 for k in klines])
+    values = np.array([expected_values(k) for k in klines])
+    trades = np.array([k[8] for k in klines])
+
+    single = CandleStorage(capacity=100)
+    single.put("BTCUSDT", BASE_MINUTE + 200, values[0], 1)
+    for minute, row, count in zip(minutes, values, trades):
+        single.put("ETHUSDT", int(minute), row, int(count))
+
+    batch = CandleStorage(capacity=100)
+    batch.put("BTCUSDT", BASE_MINUTE + 200, values[0], 1)
+    assert batch.put_series("ETHUSDT", minutes, values, trades) == 49
+
+    assert batch.minutes() == single.minutes()
+    for minute in batch.minutes():
+        assert batch.get_minute(minute) == single.get_minute(minute)
+
+class HistorySession(FakeSession):
+    """Отвечает свечами из klines по параметрам endTime и limit, как /fapi/v1/klines."""
+    def __init__(self, klines: list[list]):
+        super().__init__()
+        self.klines = klines
+
+    def body(self, url, params):
+        end_minute = params['endTime'] // 60000
+        return [k for k in self.klines if end_minute - params['limit'] < k[0] // 60000 <= end_minute]
+
+def test_paginated_fetch_into_series():
+    """Тест 3: страницы разбираются в общие колонки по возрастанию минут, большие – в пуле потоков"""
+    # История тикера начинается позже запрошенного диапазона: самая старая страница неполная
+    klines = make_klines(BASE_MINUTE + 1000, 2000, seed=2)
+    end_timestamp = (BASE_MINUTE + 3000) * 60000 - 1
+    original = binance_utils.KLINE_PARSE_OFFLOAD_BYTES
+    binance_utils.KLINE_PARSE_OFFLOAD_BYTES = 1024
+    try:
+        series = asyncio.run(fetch_klines_paginated(HistorySession(klines), "BTCUSDT", 2880, end_timestamp,
+                                                    None, asyncio.Semaphore(4)))
+    finally:
+        binance_utils.KLINE_PARSE_OFFLOAD_BYTES = original
+
+    assert series.symbol == "BTCUSDT"
+    assert series.minutes.tolist() == list(range(BASE_MINUTE + 1000, BASE_MINUTE + 3000))
+    assert series.values.tolist() == [expected_values(k) for k in klines]
+    assert series.trades.tolist() == [k[8] for k in klines]
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_parse_into_columns,
+        test_put_series_matches_put,
+        test_paginated_fetch_into_series,
+    ]
+
+    print("Запуск тестов для разбора ответов Binance в колонки...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
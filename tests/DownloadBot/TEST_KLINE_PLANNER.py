@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+from DownloadBot.binance_limiter import get_kline_weight
+from DownloadBot.kline_planner import page_splits
+from DownloadBot.kline_planner import plan_weight
+from DownloadBot.kline_planner import plan_requests
+from DownloadBot.kline_planner import plan_kline_pages
+
+END_TIMESTAMP = 1700000000000 - 1
+
+def test_min_weight_split():
+    """Тест 1: 2880 минут обходятся дешевле, чем две страницы по 1500 (вес 20)"""
+    splits = page_splits(2880)
+    cheapest = splits[0]
+    assert sum(cheapest.sizes) == 2880
+    assert cheapest.weight < 15, f"Ожидался вес меньше 15, получено {cheapest.weight}"
+    assert cheapest.weight == sum(get_kline_weight(size) for size in cheapest.sizes)
+    # Фронт: вес растёт, количество запросов падает
+    for a, b in zip(splits, splits[1:]):
+        assert a.weight < b.weight and a.requests > b.requests
+
+def test_pages_are_contiguous():
+    """Тест 2: страницы покрывают минуты подряд, без пропусков и пересечений"""
+    plan = plan_kline_pages(["BTCUSDT"], 2880, END_TIMESTAMP, weight_headroom=0)
+    pages = plan["BTCUSDT"]
+    expected_end_minute = END_TIMESTAMP // 60000
+    for page in pages:
+        assert page.end_time // 60000 == expected_end_minute
+        expected_end_minute -= page.limit
+    assert (END_TIMESTAMP // 60000) - expected_end_minute == 2880
+
+def test_headroom_reduces_requests():
+    """Тест 3: при большом запасе веса план использует меньше запросов"""
+    symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    tight = plan_kline_pages(symbols, 2880, END_TIMESTAMP, weight_headroom=0)
+    loose = plan_kline_pages(symbols, 2880, END_TIMESTAMP, weight_headroom=2000)
+    assert plan_weight(tight) < plan_weight(loose)
+    assert plan_requests(tight) > plan_requests(loose)
+
+def test_per_symbol_counts():
+    """Тест 4: разное количество минут по тикерам, тикеры без недостающих минут пропускаются"""
+    plan = plan_kline_pages(["BTCUSDT", "ETHUSDT", "SOLUSDT"], {"BTCUSDT": 3, "ETHUSDT": 1440}, END_TIMESTAMP, weight_headroom=100)
+    assert list(plan) == ["BTCUSDT", "ETHUSDT"]
+    assert sum(page.limit for page in plan["BTCUSDT"]) == 3
+    assert sum(page.limit for page in plan["ETHUSDT"]) == 1440
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_min_weight_split,
+        test_pages_are_contiguous,
+        test_headroom_reduces_requests,
+        test_per_symbol_counts,
+    ]
+
+    print("Запуск тестов для планировщика страниц...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,229 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import json
+import asyncio
+import aiohttp
+
+from aiohttp import web
+
+from candle_storage import CandleStorage
+from binance_stream import KlineStreamIngestor
+from binance_stream import parse_kline_message
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def make_frame(symbol: str, minute: int, closed: bool, close_price: float = 101.0) -> str:
+    """Кадр combined stream в формате Binance Futures (записан с fstream.binance.com)."""
+    open_time = minute * 60000
+    return json.dumps({
+        "stream": f"{symbol.lower()}@kline_1m",
+        "data": {
+            "e": "kline",
+            "E": open_time + 60000,
+            "s": symbol,
+            "k": {
+                "t": open_time,
+                "T": open_time + 59999,
+                "s": symbol,
+                "i": "1m",
+                "f": 100,
+                "L": 200,
+                "o": "100.00",
+                "c": f"{close_price:.2f}",
+                "h": "102.50",
+                "l": "99.50",
+                "v": "12.345",
+                "n": 42,
+                "x": closed,
+                "q": "1250.75",
+                "V": "6.1",
+                "Q": "620.3",
+                "B": "0"
+            }
+        }
+    })
+
+class ReplayServer:
+    """Локальная замена fstream.binance.com: на каждое соединение проигрывает записанные кадры."""
+
+    def __init__(self, frames: list[str]):
+        self.frames = frames
+        self.connections: list[list[str]] = []
+        self.runner = None
+        self.url = None
+
+    async def handler(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = request.query.get("streams", "").split("/")
+        self.connections.append(streams)
+        for frame in self.frames:
+            stream = json.loads(frame)["stream"]
+            if stream in streams:
+                await ws.send_str(frame)
+        # Держим соединение открытым, пока клиент не закроет его
+        async for _ in ws:
+            pass
+        return ws
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/stream", self.handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/stream"
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.runner.cleanup()
+
+async def _replay(frames: list[str], symbols: list[str], symbols_per_connection: int, timeout: float = 5.0, storage: CandleStorage = None):
+    storage = storage if storage is not None else CandleStorage(capacity=60)
+    async with ReplayServer(frames) as server:
+        async with aiohttp.ClientSession() as session:
+            ingestor = KlineStreamIngestor(session, storage, base_url=server.url,
+                                           symbols_per_connection=symbols_per_connection)
+            await ingestor.start(symbols)
+            completed = await ingestor.wait_minute_complete(timeout=timeout)
+            await ingestor.stop()
+    return storage, ingestor, server, completed
+
+def test_parse_closed_and_open_candles():
+    """Тест 1: незакрытая свеча игнорируется, закрытая разбирается полностью"""
+    assert parse_kline_message(make_frame("BTCUSDT", BASE_MINUTE, closed=False)) is None
+
+    record = parse_kline_message(make_frame("BTCUSDT", BASE_MINUTE, closed=True))
+    assert record is not None
+    assert record.symbol == "BTCUSDT"
+    assert record.open_time == BASE_MINUTE * 60000
+    assert record.close_time == BASE_MINUTE * 60000 + 59999
+    assert record.close == 101.0
+    assert record.quote_assets_volume == 1250.75
+    assert record.num_of_trades == 42
+
+def test_replay_writes_closed_candles():
+    """Тест 2: из проигранного потока в хранилище попадают только закрытые свечи"""
+    symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    frames = []
+    for symbol in symbols:
+        frames.append(make_frame(symbol, BASE_MINUTE, closed=False, close_price=100.5))
+        frames.append(make_frame(symbol, BASE_MINUTE, closed=True))
+        frames.append(make_frame(symbol, BASE_MINUTE + 1, closed=False))
+
+    storage, ingestor, _, completed = asyncio.run(_replay(frames, symbols, symbols_per_connection=200))
+
+    assert completed, "Минута не собралась по всем тикерам"
+    assert ingestor.complete_minute == BASE_MINUTE
+    assert storage.last_minute == BASE_MINUTE, "Незакрытая свеча следующей минуты попала в хранилище"
+    records = storage.get_minute(BASE_MINUTE)
+    assert sorted(r.symbol for r in records) == sorted(symbols)
+    assert all(r.close == 101.0 for r in records), "В хранилище попала незакрытая цена"
+    assert ingestor.lagging_symbols(BASE_MINUTE) == {}
+
+def test_symbols_are_sharded():
+    """Тест 3: тикеры распределяются по соединениям по symbols_per_connection штук"""
+    symbols = [f"SYM{i}USDT" for i in range(5)]
+    frames = [make_frame(symbol, BASE_MINUTE, closed=True) for symbol in symbols]
+
+    storage, _, server, completed = asyncio.run(_replay(frames, symbols, symbols_per_connection=2))
+
+    assert completed
+    assert len(server.connections) == 3, f"Ожидалось 3 соединения, получено {len(server.connections)}"
+    assert sorted(len(c) for c in server.connections) == [1, 2, 2]
+    assert storage.has_minute(BASE_MINUTE)
+    assert len(storage.get_minute(BASE_MINUTE)) == 5
+
+def test_lagging_symbols_after_partial_minute():
+    """Тест 4: тикеры без закрытой свечи попадают в список на докачку через REST"""
+    symbols = ["BTCUSDT", "ETHUSDT"]
+    frames = [make_frame("BTCUSDT", BASE_MINUTE, closed=True)]
+
+    # Предыдущая минута уже скачана через REST
+    storage = CandleStorage(capacity=60)
+    for symbol in symbols:
+        storage.put(symbol, BASE_MINUTE - 1, [100.0] * 8, 10)
+
+    storage, ingestor, _, completed = asyncio.run(
+        _replay(frames, symbols, symbols_per_connection=200, timeout=1.0, storage=storage))
+
+    assert not completed, "Минута не должна считаться собранной"
+    assert ingestor.lagging_symbols(BASE_MINUTE) == {"ETHUSDT": 1}
+    assert storage.has_candle("BTCUSDT", BASE_MINUTE)
+    assert not storage.has_candle("ETHUSDT", BASE_MINUTE)
+
+def test_repaired_symbols_complete_minute():
+    """Тест 5: тикер, который не приходит из потока, докачивается REST и минута собирается, счётчики не копятся"""
+    symbols = ["BTCUSDT", "ETHUSDT", "DEADUSDT"]
+    frames = [make_frame(symbol, minute, closed=True)
+              for minute in range(BASE_MINUTE, BASE_MINUTE + 3) for symbol in symbols[:2]]
+
+    storage, ingestor, _, completed = asyncio.run(
+        _replay(frames, symbols, symbols_per_connection=200, timeout=1.0))
+    assert not completed and ingestor.complete_minute is None
+    assert list(ingestor.lagging_symbols(BASE_MINUTE + 2)) == ["DEADUSDT"]
+    assert sorted(ingestor._closed_count) == [BASE_MINUTE, BASE_MINUTE + 1, BASE_MINUTE + 2]
+
+    # Докачка последней минуты закрывает её и освобождает счётчики более старых
+    ingestor.mark_repaired(["DEADUSDT"], BASE_MINUTE + 2)
+    assert ingestor.complete_minute == BASE_MINUTE + 2
+    assert ingestor.minute_complete.is_set()
+    assert ingestor._closed_count == {}
+
+    # Докачка не удалась: минута не собрана, но счётчик не остаётся навсегда
+    ingestor.handle_message(make_frame("BTCUSDT", BASE_MINUTE + 3, closed=True))
+    ingestor.handle_message(make_frame("BTCUSDT", BASE_MINUTE + 4, closed=True))
+    ingestor.mark_repaired([], BASE_MINUTE + 4)
+    assert list(ingestor._closed_count) == [BASE_MINUTE + 4]
+    assert ingestor.complete_minute == BASE_MINUTE + 2
+
+    # Свеча из потока после докачки той же минуты не засчитывается второй раз
+    ingestor.mark_repaired(["DEADUSDT", "ETHUSDT"], BASE_MINUTE + 4)
+    assert ingestor.complete_minute == BASE_MINUTE + 4
+    ingestor.handle_message(make_frame("ETHUSDT", BASE_MINUTE + 4, closed=True))
+    assert ingestor._closed_count == {}
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_parse_closed_and_open_candles,
+        test_replay_writes_closed_candles,
+        test_symbols_are_sharded,
+        test_lagging_symbols_after_partial_minute,
+        test_repaired_symbols_complete_minute,
+    ]
+
+    print("Запуск тестов для KlineStreamIngestor...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,302 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+from datetime import datetime
+
+import AnalyticsBot.udp_client as udp_client
+import AnalyticsBot.downloader as downloader
+import udp_server
+
+from candle_storage import CandleStorage
+from udp_server import UDPMarketDataServer
+from AnalyticsBot.protocol_download import ServerResponseStatus
+from AnalyticsBot.kline_push import KlinePushSubscription
+from AnalyticsBot.downloader import download_candles
+from AnalyticsBot.downloader import request_server_time_diff
+
+# Клиент по умолчанию слушает адрес сервера сигналов – в тесте всё на localhost
+udp_client.ALERT_SERVER_IP = "127.0.0.1"
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+
+def put_minute(storage: CandleStorage, minute: int) -> None:
+    for i, symbol in enumerate(SYMBOLS):
+        price = 100.0 + i + (minute - BASE_MINUTE)
+        storage.put(symbol, minute, [price, price + 1, price + 2, price - 1, 10.0, 1000.0, 5.0, 500.0], 42)
+
+async def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+async def _scenario():
+    storage = CandleStorage(capacity=60)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 5):
+        put_minute(storage, minute)
+
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    port = server.transport.get_extra_info('sockname')[1]
+
+    try:
+        async with udp_client.UDPClient() as client:
+            subscription = KlinePushSubscription(client, ("127.0.0.1", port))
+            subscription.set_symbols(["BTCUSDT", "ETHUSDT"])
+            subscription.start_from(BASE_MINUTE + 4)
+            task = asyncio.create_task(subscription.run())
+            try:
+                assert await _wait_for(lambda: server.subscribers), "Клиент не подписался"
+
+                # Новая минута рассылается сразу после публикации
+                put_minute(storage, BASE_MINUTE + 5)
+                server.update_data(storage)
+                first = await subscription.wait_minutes(5.0)
+
+                # Рассылка минуты BASE+6 теряется (подписчиков на момент рассылки нет), затем рассылается BASE+7
+                subscribers = dict(server.subscribers)
+                server.subscribers.clear()
+                put_minute(storage, BASE_MINUTE + 6)
+                server.update_data(storage)
+                server.subscribers.update(subscribers)
+                put_minute(storage, BASE_MINUTE + 7)
+                server.update_data(storage)
+
+                second = await subscription.wait_minutes(5.0)
+                if len(second) < 2:
+                    second.update(await subscription.wait_minutes(5.0))
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    finally:
+        server.stop()
+    return first, second
+
+def test_push_and_gap_repair():
+    """Тест 1: новая минута приходит рассылкой, пропущенная – докачивается запросом диапазона"""
+    first, second = asyncio.run(_scenario())
+
+    assert list(first) == [BASE_MINUTE + 5], f"Получены минуты {list(first)}"
+    assert sorted(r.symbol for r in first[BASE_MINUTE + 5]) == ["BTCUSDT", "ETHUSDT"], "Фильтр тикеров не применён"
+
+    assert list(second) == [BASE_MINUTE + 6, BASE_MINUTE + 7], f"Получены минуты {list(second)}"
+    assert all(len(records) == 2 for records in second.values())
+
+async def _shared_client_scenario():
+    storage = CandleStorage(capacity=60)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 5):
+        put_minute(storage, minute)
+
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    addr = ("127.0.0.1", server.transport.get_extra_info('sockname')[1])
+
+    try:
+        async with udp_client.UDPClient() as client:
+            subscription = KlinePushSubscription(client, addr)
+            subscription.start_from(BASE_MINUTE + 4)
+            task = asyncio.create_task(subscription.run())
+            try:
+                assert await _wait_for(lambda: server.subscribers), "Клиент не подписался"
+                subscribers = set(server.subscribers)
+
+                # Запросы через тот же клиент, пока подписка активна
+                diff = await request_server_time_diff(client, addr)
+                history = await download_candles(SYMBOLS, 5, datetime.fromtimestamp((BASE_MINUTE + 5) * 60), addr, client=client)
+
+                put_minute(storage, BASE_MINUTE + 5)
+                server.update_data(storage)
+                pushed = await subscription.wait_minutes(5.0)
+                empty = await subscription.wait_minutes(0.1)
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            unsubscribed = await _wait_for(lambda: not server.subscribers, 2.0)
+    finally:
+        server.stop()
+    return subscribers, diff, history, pushed, empty, unsubscribed
+
+def test_subscription_on_shared_client():
+    """Тест 2: подписка в цикле событий вызывающего делит клиент и сокет с запросами и отписывается при отмене"""
+    subscribers, diff, history, pushed, empty, unsubscribed = asyncio.run(_shared_client_scenario())
+
+    assert len(subscribers) == 1
+    assert diff is not None
+    assert list(history) == list(range(BASE_MINUTE, BASE_MINUTE + 5))
+    assert list(pushed) == [BASE_MINUTE + 5], f"Получены минуты {list(pushed)}"
+    assert len(pushed[BASE_MINUTE + 5]) == len(SYMBOLS)
+    assert empty == {}
+    assert unsubscribed, "Подписка не снята после отмены"
+
+async def _handshake_scenario():
+    storage = CandleStorage(capacity=60)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 5):
+        put_minute(storage, minute)
+
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    addr = ("127.0.0.1", server.transport.get_extra_info('sockname')[1])
+    result = {}
+    original_limit = udp_server.SUBSCRIPTION_MAX_SUBSCRIBERS
+    udp_server.SUBSCRIPTION_MAX_SUBSCRIBERS = 1
+    try:
+        async with udp_client.UDPClient() as client, udp_client.UDPClient() as other:
+            pushes = []
+            client.set_push_handler(pushes.append)
+
+            # Запрос без токена (как поддельный) и с чужим токеном подписку не включают
+            first = await client.subscribe(addr)
+            result["first"] = (first.status, first.token, dict(server.subscribers))
+            wrong = await client.subscribe(addr, first.token ^ 1)
+            result["wrong"] = (wrong.status, dict(server.subscribers))
+            put_minute(storage, BASE_MINUTE + 5)
+            server.update_data(storage)
+            await asyncio.sleep(0.2)
+            result["pushes_before"] = len(pushes)
+
+            confirmed = await client.subscribe(addr, first.token)
+            result["confirmed"] = (confirmed.status, len(server.subscribers))
+            put_minute(storage, BASE_MINUTE + 6)
+            server.update_data(storage)
+            result["pushed"] = await _wait_for(lambda: pushes)
+
+            # Второй клиент подтверждает подписку, но лимит исчерпан
+            other_first = await other.subscribe(addr)
+            result["other"] = (other_first.token != first.token,
+                               (await other.subscribe(addr, other_first.token)).status)
+
+            # Чужой токен не снимает подписку, свой – снимает
+            result["unsubscribe_wrong"] = ((await client.unsubscribe(addr, other_first.token)).status,
+                                           len(server.subscribers))
+            result["unsubscribe"] = ((await client.unsubscribe(addr, first.token)).status, len(server.subscribers))
+    finally:
+        udp_server.SUBSCRIPTION_MAX_SUBSCRIBERS = original_limit
+        server.stop()
+    return result
+
+def test_subscription_requires_token_and_limit():
+    """Тест 3: рассылка включается только после повтора токена адреса, число подписчиков ограничено"""
+    result = asyncio.run(_handshake_scenario())
+
+    status, token, subscribers = result["first"]
+    assert status == ServerResponseStatus.CONFIRM_SUBSCRIPTION and token != 0 and subscribers == {}
+    assert result["wrong"] == (ServerResponseStatus.CONFIRM_SUBSCRIPTION, {})
+    assert result["pushes_before"] == 0, "Неподтверждённый адрес получил рассылку"
+    assert result["confirmed"] == (ServerResponseStatus.OK, 1)
+    assert result["pushed"], "Подтверждённый подписчик не получил рассылку"
+    assert result["other"] == (True, ServerResponseStatus.BUSY)
+    assert result["unsubscribe_wrong"] == (ServerResponseStatus.NOT_FOUND, 1)
+    assert result["unsubscribe"] == (ServerResponseStatus.OK, 0)
+
+async def _pull_scenario():
+    storage = CandleStorage(capacity=60)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + 5):
+        put_minute(storage, minute)
+
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    addr = ("127.0.0.1", server.transport.get_extra_info('sockname')[1])
+    result = {}
+    original_chunk = downloader.RANGE_REQUEST_MINUTES
+    original_max = udp_server.RANGE_MAX_MINUTES
+    # Сервер обрезает диапазон до 4 минут, клиент докачивает кусками по 3
+    downloader.RANGE_REQUEST_MINUTES = 3
+    udp_server.RANGE_MAX_MINUTES = 4
+    try:
+        async with udp_client.UDPClient() as client:
+            subscription = KlinePushSubscription(client, addr)
+            # Клиент считает, что у него есть минуты до BASE-10, а на сервере их нет
+            subscription.start_from(BASE_MINUTE - 10)
+            task = asyncio.create_task(subscription.run())
+            try:
+                assert await _wait_for(lambda: server.subscribers), "Клиент не подписался"
+                put_minute(storage, BASE_MINUTE + 5)
+                server.update_data(storage)
+                result["failed"] = await subscription.wait_minutes(1.0)
+
+                # Тик с опросом сервера скачал недостающее – рассылка продолжает после него
+                subscription.start_from(BASE_MINUTE + 5)
+                subscription.start_from(BASE_MINUTE)
+                subscribers = dict(server.subscribers)
+                server.subscribers.clear()
+                for minute in range(BASE_MINUTE + 6, BASE_MINUTE + 16):
+                    put_minute(storage, minute)
+                    server.update_data(storage)
+                server.subscribers.update(subscribers)
+                put_minute(storage, BASE_MINUTE + 16)
+                server.update_data(storage)
+
+                pulled = await subscription.wait_minutes(5.0)
+                while len(pulled) < 11:
+                    more = await subscription.wait_minutes(2.0)
+                    if not more:
+                        break
+                    pulled.update(more)
+                result["pulled"] = pulled
+            finally:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    finally:
+        downloader.RANGE_REQUEST_MINUTES = original_chunk
+        udp_server.RANGE_MAX_MINUTES = original_max
+        server.stop()
+    return result
+
+def test_failed_pull_keeps_gap():
+    """Тест 4: недокачанный пропуск не пропускается, длинный пропуск докачивается кусками целиком"""
+    result = asyncio.run(_pull_scenario())
+
+    assert result["failed"] == {}, f"Доставлены минуты после недокачанного пропуска: {list(result['failed'])}"
+    assert list(result["pulled"]) == list(range(BASE_MINUTE + 6, BASE_MINUTE + 17)), f"Получены минуты {list(result['pulled'])}"
+    assert all(len(records) == len(SYMBOLS) for records in result["pulled"].values())
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_push_and_gap_repair,
+        test_subscription_on_shared_client,
+        test_subscription_requires_token_and_limit,
+        test_failed_pull_keeps_gap,
+    ]
+
+    print("Запуск тестов для рассылки минут...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,183 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+import struct
+
+import numpy as np
+
+import AnalyticsBot.udp_client as udp_client
+
+from candle_storage import CandleStorage
+from udp_server import UDPMarketDataServer
+from udp_server import UDPServerProtocol
+from udp_server import RANGE_FIRST_BURST_FRAGMENTS
+from DownloadBot.protocol_download import PacketType
+
+# Клиент по умолчанию слушает адрес сервера сигналов – в тесте всё на localhost
+udp_client.ALERT_SERVER_IP = "127.0.0.1"
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = [f"SYM{i}USDT" for i in range(300)]
+
+def make_storage(minutes: int) -> CandleStorage:
+    storage = CandleStorage(capacity=minutes)
+    rng = np.random.default_rng(1)
+    columns = np.array([storage.ensure_column(s) for s in SYMBOLS])
+    for minute in range(BASE_MINUTE, BASE_MINUTE + minutes):
+        storage.put_minute(minute, columns, rng.random((len(SYMBOLS), 8)) * 100, rng.integers(0, 1000, len(SYMBOLS)))
+    return storage
+
+async def _transfer(storage: CandleStorage, symbols: list[str], drop_every: int = 0):
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage)
+    await server.start()
+    port = server.transport.get_extra_info('sockname')[1]
+
+    # Теряем каждый drop_every-й фрагмент первой отправки
+    sent = {"fragments": 0, "dropped": set()}
+    original_send = UDPServerProtocol._send_response
+
+    def lossy_send(self, data: bytes, addr):
+        if data[0] == PacketType.KLINES_RANGE_RESPONSE and drop_every:
+            sent["fragments"] += 1
+            key = data[5:]
+            if sent["fragments"] % drop_every == 0 and key not in sent["dropped"]:
+                sent["dropped"].add(key)
+                return
+        original_send(self, data, addr)
+
+    UDPServerProtocol._send_response = lossy_send
+    try:
+        async with udp_client.UDPClient() as client:
+            response = await client.request_klines_range(BASE_MINUTE, len(storage), ("127.0.0.1", port), symbols=symbols, timeout=5.0)
+    finally:
+        UDPServerProtocol._send_response = original_send
+        server.stop()
+    return response, sent
+
+def test_full_range_in_one_request():
+    """Тест 1: весь диапазон приходит фрагментами и совпадает с хранилищем"""
+    storage = make_storage(60)
+    response, _ = asyncio.run(_transfer(storage, []))
+    assert response.status == 0
+    assert [m.minute_number for m in response.minutes] == list(range(BASE_MINUTE, BASE_MINUTE + 60))
+    for m in response.minutes:
+        expected = storage.get_minute(m.minute_number)
+        assert [r.symbol for r in m.records] == [r.symbol for r in expected]
+        assert [r.close for r in m.records] == [r.close for r in expected]
+
+def test_lost_fragments_are_rerequested():
+    """Тест 2: потерянные фрагменты перезапрашиваются выборочно"""
+    storage = make_storage(60)
+    response, sent = asyncio.run(_transfer(storage, [], drop_every=3))
+    assert sent["dropped"], "Ни один фрагмент не был потерян"
+    assert len(response.minutes) == 60
+
+def test_symbol_filter():
+    """Тест 3: сервер отдаёт только запрошенные тикеры"""
+    storage = make_storage(10)
+    response, _ = asyncio.run(_transfer(storage, ["SYM5USDT", "SYM7USDT", "UNKNOWN"]))
+    assert len(response.minutes) == 10
+    assert all(sorted(r.symbol for r in m.records) == ["SYM5USDT", "SYM7USDT"] for m in response.minutes)
+
+async def _subset_requests(storage: CandleStorage):
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.update_data(storage, published_minute=BASE_MINUTE + 1)
+    await server.start()
+    addr = ("127.0.0.1", server.transport.get_extra_info('sockname')[1])
+    try:
+        async with udp_client.UDPClient() as client:
+            first = await client.request_klines_subset(BASE_MINUTE, addr, ["SYM3USDT", "SYM250USDT"])
+            old_version = client.protocol.symbol_table.version
+
+            # Новый тикер на сервере – таблица меняется, клиент должен перезапросить её сам
+            storage.put("NEWUSDT", BASE_MINUTE + 2, [1.0] * 8, 1)
+            server.update_data(storage, published_minute=BASE_MINUTE + 2)
+            second = await client.request_klines_subset(BASE_MINUTE + 2, addr, ["SYM3USDT", "NEWUSDT"])
+            new_version = client.protocol.symbol_table.version
+            missing = await client.request_klines_subset(BASE_MINUTE + 3, addr, ["SYM3USDT"])
+    finally:
+        server.stop()
+    return first, second, missing, old_version, new_version
+
+def test_subset_request_with_symbol_table():
+    """Тест 4: запрос минуты по маске номеров тикеров, смена таблицы на сервере"""
+    storage = make_storage(4)
+    first, second, missing, old_version, new_version = asyncio.run(_subset_requests(storage))
+    assert first.status == 0
+    expected = {r.symbol: r for r in storage.get_minute(BASE_MINUTE)}
+    assert sorted(r.symbol for r in first.records) == ["SYM250USDT", "SYM3USDT"]
+    assert all(r.close == expected[r.symbol].close for r in first.records)
+
+    assert old_version != new_version
+    assert second.status == 0
+    assert sorted(r.symbol for r in second.records) == ["NEWUSDT", "SYM3USDT"]
+    assert missing.status == 1   # неопубликованная минута
+
+def test_reply_is_small_burst_of_small_datagrams():
+    """Тест 5: на запрос без списка фрагментов – только первые фрагменты, датаграммы не больше MTU, остальное клиент забирает сам"""
+    storage = make_storage(60)
+    replies: dict[int, list[int]] = {}
+    original_send = UDPServerProtocol._send_response
+
+    def recording_send(self, data: bytes, addr):
+        if data[0] == PacketType.KLINES_RANGE_RESPONSE:
+            packet_number = struct.unpack('!I', data[1:5])[0]
+            replies.setdefault(packet_number, []).append(len(data))
+        original_send(self, data, addr)
+
+    UDPServerProtocol._send_response = recording_send
+    try:
+        response, _ = asyncio.run(_transfer(storage, []))
+    finally:
+        UDPServerProtocol._send_response = original_send
+
+    assert len(response.minutes) == 60
+    first = min(replies)
+    assert len(replies[first]) == RANGE_FIRST_BURST_FRAGMENTS, replies[first]
+    assert len(replies) > 1, "Остальные фрагменты должны запрашиваться явно"
+    # IP-заголовок 20 байт + UDP 8 байт: датаграмма помещается в кадр Ethernet без фрагментации
+    assert max(size for sizes in replies.values() for size in sizes) + 28 <= 1500
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_full_range_in_one_request,
+        test_lost_fragments_are_rerequested,
+        test_symbol_filter,
+        test_subset_request_with_symbol_table,
+        test_reply_is_small_burst_of_small_datagrams,
+    ]
+
+    print("Запуск тестов для передачи диапазонов минут...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import struct
+import time
+
+import numpy as np
+
+from bot_types import KlineColumns
+from bot_types_serializer import KlineRecordSerializer
+from protocol_download_serializer import ProtocolSerializer
+
+MINUTE = 1700000000000 // 60000
+
+def make_rows(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    symbols = np.array([f"SYM{i}USDT".encode() for i in range(count)], dtype='S16')
+    return symbols, rng.random((count, 8)) * 1000, rng.integers(0, 10 ** 6, count)
+
+def test_array_matches_struct_unpack():
+    """Тест 1: структурный массив совпадает с построчным struct.unpack, в том числе для UTF-8 тикеров"""
+    symbols, values, trades = make_rows(50)
+    symbols[7] = "币安人生USDT".encode('utf-8')
+    data = KlineRecordSerializer.serialize_columns(symbols, values, trades, MINUTE * 60000, MINUTE * 60000 + 59999)
+    # Неполная запись в конце отбрасывается
+    columns = KlineRecordSerializer.columns_from_array(KlineRecordSerializer.deserialize_array(data + b'\x01\x02'))
+
+    expected = list(struct.iter_unpack(KlineRecordSerializer.RECORD_FORMAT, data))
+    assert len(columns) == len(expected)
+    for record, row in zip(columns, expected):
+        assert record.symbol == row[0].decode('utf-8').rstrip('\x00')
+        assert [record.open, record.close, record.high, record.low, record.volume, record.quote_assets_volume,
+                record.taker_buy_base_volume, record.taker_buy_quote_volume] == list(row[1:9])
+        assert (record.close_time, record.open_time, record.num_of_trades) == row[9:]
+    assert columns[7].symbol == "币安人生USDT"
+
+def test_columns_are_lazy():
+    """Тест 2: разбор ответа не создаёт KlineRecord, пока к ним не обратились"""
+    symbols, values, trades = make_rows(20, seed=1)
+    data = KlineRecordSerializer.serialize_columns(symbols, values, trades, MINUTE * 60000, MINUTE * 60000 + 59999)
+    packet = ProtocolSerializer.serialize_kline_response_data(MINUTE, 0, data, 1)
+    _, _, _, payload = ProtocolSerializer.deserialize_packet(packet)
+    response = ProtocolSerializer.deserialize_kline_response(payload)
+
+    columns = response.records
+    assert isinstance(columns, KlineColumns)
+    assert np.array_equal(columns.values, values)
+    selected = columns.select({"SYM3USDT", "SYM5USDT"})
+    assert selected.symbols == ["SYM3USDT", "SYM5USDT"]
+    assert columns._records is None and selected._records is None
+
+    assert selected[1].close == values[5, 1]
+    assert columns == KlineRecordSerializer.deserialize_records(data)
+
+def test_decode_speed():
+    """Тест 3: массивы против построчного разбора (выводит время на 200 тысяч свечей)"""
+    symbols, values, trades = make_rows(200000, seed=2)
+    data = KlineRecordSerializer.serialize_columns(symbols, values, trades, 0, 59999)
+
+    started = time.perf_counter()
+    columns = KlineRecordSerializer.columns_from_array(KlineRecordSerializer.deserialize_array(data))
+    array_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    records = columns.records
+    records_ms = (time.perf_counter() - started) * 1000
+
+    print(f"   колонки: {array_ms:.0f} мс, KlineRecord из колонок: {records_ms:.0f} мс")
+    assert len(records) == 200000
+    assert array_ms < records_ms
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_array_matches_struct_unpack,
+        test_columns_are_lazy,
+        test_decode_speed,
+    ]
+
+    print("Запуск тестов для разбора свечей в массивы NumPy...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,134 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+
+from candle_storage import CandleStorage
+from binance_utils import fetch_klines_for_symbols
+from DownloadBot.config import RECENT_GAP_MINUTES
+from DownloadBot.binance_limiter import BinanceRateLimiter
+from DownloadBot.binance_limiter import PrioritySemaphore
+from DownloadBot.binance_limiter import RequestPriority
+from DownloadBot.kline_planner import KlinePage
+from fake_binance import FakeSession
+
+BASE_MINUTE = 1700000000000 // 60000
+
+def test_page_priority():
+    """Тест 1: класс страницы определяется удалённостью её конца от текущей минуты"""
+    live = BASE_MINUTE
+    def page(end_minute: int) -> KlinePage:
+        return KlinePage("BTCUSDT", 100, (end_minute + 1) * 60000 - 1)
+    assert page(live).priority(live) == RequestPriority.LIVE
+    assert page(live - 1).priority(live) == RequestPriority.RECENT
+    assert page(live - RECENT_GAP_MINUTES).priority(live) == RequestPriority.RECENT
+    assert page(live - RECENT_GAP_MINUTES - 1).priority(live) == RequestPriority.BACKFILL
+
+def test_semaphore_order():
+    """Тест 2: освободившееся место семафора получает самый приоритетный ожидающий"""
+    order = []
+
+    async def worker(semaphore: PrioritySemaphore, name: str, priority: RequestPriority):
+        async with semaphore.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def run():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        tasks = [asyncio.create_task(worker(semaphore, name, priority)) for name, priority in
+                 (("backfill", RequestPriority.BACKFILL), ("recent", RequestPriority.RECENT),
+                  ("live-1", RequestPriority.LIVE), ("live-2", RequestPriority.LIVE))]
+        await asyncio.sleep(0)
+        # Отменённый ожидающий не забирает место
+        tasks[2].cancel()
+        semaphore.release()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        assert semaphore.in_flight == 0
+
+    asyncio.run(run())
+    assert order == ["live-2", "recent", "backfill"], order
+
+def test_limiter_order():
+    """Тест 3: пока ждёт запрос с текущей минутой, докачка не получает вес, даже если он есть"""
+    order = []
+
+    async def request(limiter: BinanceRateLimiter, name: str, weight: int, priority: RequestPriority):
+        await limiter.wait_if_needed(weight, priority)
+        order.append(name)
+
+    async def run():
+        limiter = BinanceRateLimiter(800, 11)
+        await limiter.wait_if_needed(9)
+        backfill = asyncio.create_task(request(limiter, "backfill", 5, RequestPriority.BACKFILL))
+        await asyncio.sleep(0)
+        live = asyncio.create_task(request(limiter, "live", 5, RequestPriority.LIVE))
+        await asyncio.sleep(0)
+        # Для BACKFILL веса 1 хватило бы, но впереди ждёт LIVE
+        small = asyncio.create_task(request(limiter, "small-backfill", 1, RequestPriority.BACKFILL))
+        await asyncio.sleep(0.05)
+        assert order == [], order
+        limiter._releases = []
+        limiter._used_weight = 0
+        limiter._used_requests = 0
+        limiter._schedule_wakeup()
+        await asyncio.wait_for(asyncio.gather(backfill, live, small), 1)
+
+    asyncio.run(run())
+    assert order == ["live", "backfill", "small-backfill"], order
+
+def test_live_pages_first():
+    """Тест 4: при догоняющей загрузке первыми уходят страницы с текущей минутой всех тикеров"""
+    symbols = [f"SYM{i}USDT" for i in range(6)]
+    session = FakeSession()
+    storage = CandleStorage(capacity=3000)
+    end_timestamp = (BASE_MINUTE + 1) * 60000 - 1
+
+    written = asyncio.run(fetch_klines_for_symbols(session, symbols, None, 2880, end_timestamp, storage, max_concurrent=1))
+    assert written == 2880 * len(symbols)
+    requests = [(params['symbol'], params['endTime'] // 60000) for params in session.requests]
+    live = [i for i, (_, end_minute) in enumerate(requests) if end_minute == BASE_MINUTE]
+    # Первый запрос занимает свободный семафор сразу, остальные – по приоритету
+    assert sorted(symbol for symbol, _ in requests[:len(symbols)]) == symbols
+    assert live == list(range(len(symbols))), requests
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_page_priority,
+        test_semaphore_order,
+        test_limiter_order,
+        test_live_pages_first,
+    ]
+
+    print("Запуск тестов для приоритетов запросов к Binance...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,148 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+from candle_storage import CandleStorage
+from udp_server import MinuteResponseCache
+from udp_server import UDPMarketDataServer
+from DownloadBot.protocol_download import KlineResponse
+from DownloadBot.protocol_download_serializer import ProtocolSerializer
+
+BASE_MINUTE = 1700000000000 // 60000
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+
+def make_storage(minutes: int) -> CandleStorage:
+    storage = CandleStorage(capacity=60)
+    for minute in range(BASE_MINUTE, BASE_MINUTE + minutes):
+        for i, symbol in enumerate(SYMBOLS):
+            price = 100.0 + i + (minute - BASE_MINUTE) * 0.5
+            storage.put(symbol, minute, [price, price + 1, price + 2, price - 1, 10.0, 1000.0, 5.0, 500.0], 42 + i)
+    return storage
+
+def test_cached_packet_matches_serializer():
+    """Тест 1: пакет из кеша побайтно совпадает с пакетом, собранным через KlineRecord"""
+    storage = make_storage(5)
+    cache = MinuteResponseCache()
+    assert cache.sync(storage, storage.last_minute) == 5
+
+    minute = BASE_MINUTE + 2
+    expected = ProtocolSerializer.serialize_kline_response(
+        KlineResponse(minute_number=minute, status=0, records=storage.get_minute(minute)), 12345)
+    assert ProtocolSerializer.patch_packet_number(cache.get(minute), 12345) == expected
+
+def test_only_changed_minutes_are_rebuilt():
+    """Тест 2: повторная синхронизация пересобирает только изменённые минуты"""
+    storage = make_storage(5)
+    cache = MinuteResponseCache()
+    cache.sync(storage, storage.last_minute)
+    assert cache.sync(storage, storage.last_minute) == 0
+
+    before = cache.get(BASE_MINUTE + 1)
+    storage.put("XRPUSDT", BASE_MINUTE + 1, [1.0] * 8, 7)
+    assert cache.sync(storage, storage.last_minute) == 1
+    assert cache.get(BASE_MINUTE + 1) != before
+
+def test_unpublished_and_evicted_minutes():
+    """Тест 3: неопубликованных и вытесненных минут в кеше нет"""
+    storage = make_storage(5)
+    cache = MinuteResponseCache()
+    cache.sync(storage, BASE_MINUTE + 3)
+    assert cache.get(BASE_MINUTE + 4) is None
+    assert cache.get(BASE_MINUTE + 3) is not None
+
+    storage.evict_before(BASE_MINUTE + 2)
+    cache.sync(storage, storage.last_minute)
+    assert cache.get(BASE_MINUTE + 1) is None
+    assert len(cache) == 3
+
+def test_snapshot_is_swapped_not_mutated():
+    """Тест 4: обновление подменяет срез целиком, старый срез остаётся прежним"""
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    assert server.snapshot is None   # холодный старт – клиенты получают BUSY
+
+    storage = make_storage(5)
+    server.update_symbols(SYMBOLS)
+    server.update_data(storage, published_minute=BASE_MINUTE + 3)
+    old = server.snapshot
+    assert old.published_minute == BASE_MINUTE + 3
+    assert old.symbols == tuple(SYMBOLS)
+    assert BASE_MINUTE + 4 not in old.packets
+
+    server.set_time_offset(250)
+    server.update_symbols(SYMBOLS + ["XRPUSDT"])
+    server.update_data(storage, published_minute=BASE_MINUTE + 4)
+    new = server.snapshot
+    assert new is not old
+    assert BASE_MINUTE + 4 in new.packets and new.time_offset_ms == 250
+    assert old.published_minute == BASE_MINUTE + 3 and BASE_MINUTE + 4 not in old.packets
+    assert old.symbols == tuple(SYMBOLS) and old.time_offset_ms == 0
+    # Неизменённые минуты не копируются
+    assert new.packets[BASE_MINUTE] is old.packets[BASE_MINUTE]
+
+def test_subset_after_storage_changes():
+    """Тест 5: запрос с маской к старому срезу отдаёт данные среза, даже когда хранилище изменилось или сдвинулось"""
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    storage = make_storage(5)
+    server.update_symbols(SYMBOLS)
+    server.update_data(storage)
+    snapshot = server.snapshot
+    columns = snapshot.bitmap_columns(snapshot.symbol_table.bitmap(["BTCUSDT", "SOLUSDT"]))
+
+    minutes = [BASE_MINUTE + 1, BASE_MINUTE + 3]
+    expected = {(m, v): snapshot.subset_packet(m, columns, v) for m in minutes for v in (0, 1)}
+
+    # Докачка пропуска перезаписывает свечу, опоздавший тикер дописывается в опубликованную минуту
+    storage.put("BTCUSDT", BASE_MINUTE + 3, [1.0] * 8, 1)
+    storage.put("XRPUSDT", BASE_MINUTE + 3, [2.0] * 8, 2)
+    # Кольцо сдвигается за опубликованные срезом минуты
+    for minute in range(BASE_MINUTE + 5, BASE_MINUTE + 62):
+        storage.put("BTCUSDT", minute, [3.0] * 8, 3)
+    assert storage.minute_arrays(BASE_MINUTE + 1) is None
+
+    for (minute, version), packet in expected.items():
+        assert snapshot.subset_packet(minute, columns, version) == packet, (minute, version)
+
+    # Новый срез отдаёт уже новые данные
+    server.update_data(storage)
+    assert server.snapshot.subset_packet(BASE_MINUTE + 1, columns) is None
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_cached_packet_matches_serializer,
+        test_only_changed_minutes_are_rebuilt,
+        test_unpublished_and_evicted_minutes,
+        test_snapshot_is_swapped_not_mutated,
+        test_subset_after_storage_changes,
+    ]
+
+    print("Запуск тестов для кеша ответов UDP сервера...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
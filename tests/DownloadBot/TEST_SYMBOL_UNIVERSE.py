@@ -0,0 +1,147 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import json
+import asyncio
+
+from symbol_universe import SymbolDiff
+from symbol_universe import SymbolUniverse
+from symbol_universe import exchange_info_digest
+from DownloadBot.udp_server import UDPMarketDataServer
+from fake_binance import FakeSession
+
+def exchange_info(symbols: list[str], server_time: int = 1700000000000) -> bytes:
+    """Тело exchangeInfo: тикеры в торговле плюс остановленный и квартальный контракт."""
+    infos = [{"symbol": s, "status": "TRADING", "contractType": "PERPETUAL"} for s in symbols]
+    infos.append({"symbol": "OLDUSDT", "status": "SETTLING", "contractType": "PERPETUAL"})
+    infos.append({"symbol": "BTCUSDT_260327", "status": "TRADING", "contractType": "CURRENT_QUARTER"})
+    infos.append({"symbol": "BTCUSDC", "status": "TRADING", "contractType": "PERPETUAL"})
+    return json.dumps({"timezone": "UTC", "serverTime": server_time, "symbols": infos}).encode()
+
+class ExchangeInfoSession(FakeSession):
+    """Отдаёт exchangeInfo с текущим списком тикеров и растущим serverTime, запоминает запросы."""
+    def __init__(self, symbols: list[str]):
+        super().__init__()
+        self.symbols = list(symbols)
+
+    def body(self, url, params):
+        return exchange_info(self.symbols, 1700000000000 + len(self.requests))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_digest_ignores_server_time():
+    """Тест 1: хеш не зависит от serverTime, но зависит от тикеров"""
+    a = exchange_info(["BTCUSDT"], 1)
+    assert exchange_info_digest(a) == exchange_info_digest(exchange_info(["BTCUSDT"], 2))
+    assert exchange_info_digest(a) != exchange_info_digest(exchange_info(["ETHUSDT"], 1))
+
+def test_ttl_cache():
+    """Тест 2: внутри TTL exchangeInfo не запрашивается, после – запрашивается, но без изменений не разбирается"""
+    session = ExchangeInfoSession(["BTCUSDT", "ETHUSDT"])
+    clock = FakeClock()
+    universe = SymbolUniverse(session, ttl=600, clock=clock)
+
+    async def run():
+        assert await universe.get() == ["BTCUSDT", "ETHUSDT"]
+        for _ in range(10):
+            clock.now += 30
+            assert await universe.get() == ["BTCUSDT", "ETHUSDT"]
+        assert len(session.requests) == 1
+        clock.now += 600
+        await universe.get()
+        assert len(session.requests) == 2
+        assert universe.downloads == 2 and universe.parses == 1
+        await universe.get(force=True)
+        assert len(session.requests) == 3
+
+    asyncio.run(run())
+
+def test_diff_events():
+    """Тест 3: листинги и делистинги приходят подписчику и серверу одним событием"""
+    session = ExchangeInfoSession(["BTCUSDT", "ETHUSDT", "XRPUSDT"])
+    clock = FakeClock()
+    server = UDPMarketDataServer()
+    events: list[SymbolDiff] = []
+
+    def on_change(diff: SymbolDiff):
+        events.append(diff)
+        server.update_symbols(list(diff.symbols), diff)
+
+    universe = SymbolUniverse(session, ttl=60, on_change=on_change, clock=clock)
+
+    async def run():
+        await universe.get()
+        session.symbols = ["BTCUSDT", "XRPUSDT", "NEWUSDT"]
+        clock.now += 60
+        assert await universe.get() == ["BTCUSDT", "XRPUSDT", "NEWUSDT"]
+
+    asyncio.run(run())
+    assert len(events) == 2
+    assert events[0].listed == ("BTCUSDT", "ETHUSDT", "XRPUSDT") and events[0].delisted == ()
+    assert events[1].listed == ("NEWUSDT",) and events[1].delisted == ("ETHUSDT",)
+    assert server.symbols == ["BTCUSDT", "XRPUSDT", "NEWUSDT"]
+
+def test_failure_keeps_cached_list():
+    """Тест 4: при ошибке Binance отдаётся прежний список, а запрос повторяется при следующем вызове"""
+    session = ExchangeInfoSession(["BTCUSDT"])
+    clock = FakeClock()
+    universe = SymbolUniverse(session, ttl=60, clock=clock)
+
+    async def run():
+        await universe.get()
+        session.status = 500
+        clock.now += 60
+        assert await universe.get() == ["BTCUSDT"]
+        requests = len(session.requests)
+        session.status = 200
+        session.symbols = ["BTCUSDT", "ETHUSDT"]
+        assert await universe.get() == ["BTCUSDT", "ETHUSDT"]
+        assert len(session.requests) == requests + 1
+
+    asyncio.run(run())
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_digest_ignores_server_time,
+        test_ttl_cache,
+        test_diff_events,
+        test_failure_keeps_cached_list,
+    ]
+
+    print("Запуск тестов для кеша списка тикеров...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,171 @@
+from pathlib import Path
+
+import sys
+
+src_path = Path(__file__).resolve().parent.parent.parent / "src"
+download_bot_src_path = src_path / "DownloadBot"
+sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(download_bot_src_path))
+print(f"src_path = {src_path}")
+print(f"download_bot_src_path = {download_bot_src_path}")
+
+import asyncio
+import tempfile
+
+import numpy as np
+
+import AnalyticsBot.udp_client as udp_client
+
+from candle_storage import CandleStorage
+from udp_server import UDPMarketDataServer
+from warm_store import MINUTES_PER_DAY
+from warm_store import WarmStore
+from warm_store import read_range
+
+# Клиент по умолчанию слушает адрес сервера сигналов – в тесте всё на localhost
+udp_client.ALERT_SERVER_IP = "127.0.0.1"
+
+# Начало суток UTC
+DAY = 1700000000000 // 60000 // MINUTES_PER_DAY + 1
+BASE_MINUTE = DAY * MINUTES_PER_DAY
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "XRPUSDT", "SOLUSDT"]
+
+def candle(symbol_id: int, minute: int) -> tuple[list[float], int]:
+    price = 100.0 * (symbol_id + 1) + (minute % 1000) / 8
+    return [price, price + 0.5, price + 1.0, price - 1.0, 10.0, 10.0 * price, 4.0, 4.0 * price], symbol_id * 1000 + minute % 1000
+
+def fill(storage: CandleStorage, start: int, stop: int, skip: tuple = ()) -> None:
+    """Свечи всех тикеров за минуты [start, stop), кроме (тикер, минута) из skip."""
+    columns = np.array([storage.ensure_column(s) for s in SYMBOLS])
+    for minute in range(start, stop):
+        keep = [i for i in range(len(SYMBOLS)) if (SYMBOLS[i], minute) not in skip]
+        values = np.array([candle(i, minute)[0] for i in keep])
+        trades = np.array([candle(i, minute)[1] for i in keep])
+        storage.put_minute(minute, columns[keep], values, trades)
+
+def test_seal_and_reload():
+    """Тест 1: сутки записываются через задержку после окончания и читаются после перезапуска"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=MINUTES_PER_DAY + 100, symbols_capacity=8)
+        fill(storage, BASE_MINUTE, BASE_MINUTE + MINUTES_PER_DAY + 30, skip={("XRPUSDT", BASE_MINUTE + 5)})
+        warm = WarmStore(path, seal_delay=60)
+        # Сутки закончились 30 минут назад – ещё рано
+        assert warm.seal_from(storage) == 0
+        fill(storage, BASE_MINUTE + MINUTES_PER_DAY + 30, BASE_MINUTE + MINUTES_PER_DAY + 60)
+        assert warm.seal_from(storage) == 1
+        assert warm.seal_from(storage) == 0
+
+        reopened = WarmStore(path)
+        assert reopened.days == [DAY]
+        assert reopened.segment_day(BASE_MINUTE + 100) == DAY
+        assert reopened.segment_day(BASE_MINUTE + MINUTES_PER_DAY) is None
+        symbols, values, trades, _ = reopened.minute_arrays(BASE_MINUTE + 5)
+        assert symbols.tolist() == [b"BTCUSDT", b"ETHUSDT", b"SOLUSDT"]
+        assert values[2].tolist() == candle(3, BASE_MINUTE + 5)[0]
+        assert trades.tolist() == [candle(i, BASE_MINUTE + 5)[1] for i in (0, 1, 3)]
+        assert reopened.disk_bytes() < storage.memory_bytes()
+
+def test_read_range_merges_tiers():
+    """Тест 2: диапазон через границу окна хранилища собирается из обоих уровней, горячий уровень важнее"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=MINUTES_PER_DAY + 100, symbols_capacity=8)
+        warm = WarmStore(path, seal_delay=60)
+        fill(storage, BASE_MINUTE, BASE_MINUTE + MINUTES_PER_DAY + 60)
+        warm.seal_from(storage)
+        # Горячее окно ушло вперёд: начало суток DAY осталось только в тёплом уровне
+        fill(storage, BASE_MINUTE + MINUTES_PER_DAY + 60, BASE_MINUTE + MINUTES_PER_DAY + 600)
+        assert storage.first_minute > BASE_MINUTE + 400
+        hot_minute = storage.first_minute + 1
+        storage.put("ETHUSDT", hot_minute, [7.0] * 8, 7)
+
+        start, end = BASE_MINUTE + 300, storage.first_minute + 10
+        values, trades, present = read_range(storage, warm, start, end, ["ETHUSDT", "UNKNOWN", "BTCUSDT"])
+        assert values.shape == (end - start + 1, 3, 8)
+        assert present[:, 0].all() and present[:, 2].all() and not present[:, 1].any()
+        assert values[0, 2].tolist() == candle(0, start)[0]
+        assert trades[0, 0] == candle(1, start)[1]
+        assert values[hot_minute - start, 0].tolist() == [7.0] * 8
+        assert values[end - start, 2].tolist() == candle(0, end)[0]
+
+def test_retention():
+    """Тест 3: сутки старше срока хранения удаляются, неполные первые сутки пишутся тем, что есть"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=MINUTES_PER_DAY + 100, symbols_capacity=8)
+        warm = WarmStore(path, retention_days=1, seal_delay=0)
+        fill(storage, BASE_MINUTE + 1000, BASE_MINUTE + MINUTES_PER_DAY)
+        assert warm.seal_from(storage) == 1
+        assert warm.first_minute == BASE_MINUTE + 1000
+        for day in range(1, 3):
+            fill(storage, BASE_MINUTE + day * MINUTES_PER_DAY, BASE_MINUTE + (day + 1) * MINUTES_PER_DAY)
+            warm.seal_from(storage)
+        assert warm.days == [DAY + 1, DAY + 2]
+        assert len(list(Path(path).glob("*.npz"))) == 2
+        assert warm.minute_arrays(BASE_MINUTE + 1000) is None
+
+async def _range_through_tiers(storage: CandleStorage, warm: WarmStore, start: int, count: int):
+    server = UDPMarketDataServer(host="127.0.0.1", port=0)
+    server.warm = warm
+    server.update_data(storage)
+    await server.start()
+    addr = ("127.0.0.1", server.transport.get_extra_info('sockname')[1])
+    try:
+        async with udp_client.UDPClient() as client:
+            full = await client.request_klines_range(start, count, addr, timeout=5.0)
+            subset = await client.request_klines_range(start, count, addr, symbols=["SOLUSDT", "BTCUSDT"], timeout=5.0)
+            single = await client.request_klines(start, addr)
+    finally:
+        server.stop()
+    return full, subset, single
+
+def test_udp_range_through_tiers():
+    """Тест 4: запрос диапазона по UDP прозрачно отдаёт минуты из тёплого уровня и из хранилища"""
+    with tempfile.TemporaryDirectory() as path:
+        storage = CandleStorage(capacity=MINUTES_PER_DAY + 100, symbols_capacity=8)
+        warm = WarmStore(path, seal_delay=60)
+        fill(storage, BASE_MINUTE, BASE_MINUTE + MINUTES_PER_DAY + 60)
+        warm.seal_from(storage)
+        fill(storage, BASE_MINUTE + MINUTES_PER_DAY + 60, BASE_MINUTE + MINUTES_PER_DAY + 200)
+        start = storage.first_minute - 20
+        full, subset, single = asyncio.run(_range_through_tiers(storage, warm, start, 40))
+
+    assert [m.minute_number for m in full.minutes] == list(range(start, start + 40))
+    for m in full.minutes:
+        assert [r.symbol for r in m.records] == SYMBOLS
+        assert [r.close for r in m.records] == [candle(i, m.minute_number)[0][1] for i in range(len(SYMBOLS))]
+    assert len(subset.minutes) == 40
+    assert all([r.symbol for r in m.records] == ["BTCUSDT", "SOLUSDT"] for m in subset.minutes)
+    assert [r.open for r in subset.minutes[0].records] == [candle(0, start)[0][0], candle(3, start)[0][0]]
+    assert single.status == 0 and len(single.records) == len(SYMBOLS)
+
+def run_all_tests():
+    """
+    Основная функция тестирования.
+    Запускает все тесты, перехватывает и выводит результаты.
+    """
+    tests = [
+        test_seal_and_reload,
+        test_read_range_merges_tiers,
+        test_retention,
+        test_udp_range_through_tiers,
+    ]
+
+    print("Запуск тестов для тёплого уровня хранения свечей...\n")
+    passed = 0
+    failed = 0
+
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}: OK")
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: FAILED - {e}")
+            failed += 1
+        except Exception as e:
+            print(f"⚠️ {test.__name__}: ERROR - {e}")
+            failed += 1
+
+    print(f"\nРезультаты: {passed} пройдено, {failed} упало.")
+
+if __name__ == "__main__":
+    run_all_tests()
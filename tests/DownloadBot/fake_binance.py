@@ -0,0 +1,78 @@
+"""
+Заменитель aiohttp.ClientSession для тестов DownloadBot: отвечает без сети.
+
+По умолчанию FakeSession отвечает как /fapi/v1/klines – свечами make_kline за минуты
+(endTime - limit, endTime]. Сценарий теста задаётся параметрами delay и status или
+переопределением методов:
+    respond(url, params) – статус и задержка ответа, вызывается в момент ответа;
+    body(url, params)    – тело ответа: объект JSON или готовые байты.
+Сессия запоминает запросы, считает одновременные и отменённые во время задержки.
+"""
+
+import json
+import asyncio
+
+from typing import Any
+from typing import Optional
+
+def make_kline(minute: int) -> list:
+    """Свеча минуты в формате ответа /fapi/v1/klines."""
+    return [minute * 60000, "1.0", "2.0", "0.5", "1.5", "10.0", minute * 60000 + 59999,
+            "15.0", 7, "5.0", "7.5", "0"]
+
+class FakeResponse:
+    def __init__(self, session: "FakeSession", url: str, params: Optional[dict]):
+        self.session = session
+        self.url = url
+        self.params = params
+        self.status = 200
+        self.headers = {}
+        self._body = b""
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def json(self) -> Any:
+        return json.loads(self._body)
+
+    async def __aenter__(self):
+        session = self.session
+        session.in_flight += 1
+        session.max_in_flight = max(session.max_in_flight, session.in_flight)
+        try:
+            self.status, delay = session.respond(self.url, self.params)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                session.cancelled += 1
+                raise
+        finally:
+            session.in_flight -= 1
+        if self.status == 200:
+            body = session.body(self.url, self.params)
+            self._body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+class FakeSession:
+    """Отвечает свечами по endTime и limit, как /fapi/v1/klines, через delay секунд со статусом status."""
+    def __init__(self, delay: float = 0.0, status: int = 200):
+        self.delay = delay
+        self.status = status
+        self.requests: list[dict] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+
+    def respond(self, url: str, params: Optional[dict]) -> tuple[int, float]:
+        return self.status, self.delay
+
+    def body(self, url: str, params: Optional[dict]) -> Any:
+        end_minute = params['endTime'] // 60000
+        return [make_kline(m) for m in range(end_minute - params['limit'] + 1, end_minute + 1)]
+
+    def get(self, url: str, params: Optional[dict] = None, timeout=None) -> FakeResponse:
+        self.requests.append(dict(params or {}))
+        return FakeResponse(self, url, params)